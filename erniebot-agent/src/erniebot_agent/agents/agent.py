@@ -37,9 +37,11 @@ from erniebot_agent.file import (
     get_default_file_manager,
 )
 from erniebot_agent.memory import Memory, WholeMemory
-from erniebot_agent.memory.messages import Message, SystemMessage
+from erniebot_agent.memory.messages import HumanMessage, Message, SystemMessage
 from erniebot_agent.tools.base import BaseTool
+from erniebot_agent.tools.tool_cache import ToolCache
 from erniebot_agent.tools.tool_manager import ToolManager
+from erniebot_agent.tools.tool_retriever import ToolRetriever
 from erniebot_agent.utils.exceptions import FileError
 
 _PLUGINS_WO_FILE_IO: Final[Tuple[str]] = ("eChart",)
@@ -72,6 +74,8 @@ class Agent(GradioMixin, BaseAgent[BaseERNIEBot]):
         callbacks: Optional[Union[CallbackManager, Iterable[CallbackHandler]]] = None,
         file_manager: Optional[FileManager] = None,
         plugins: Optional[List[str]] = None,
+        tool_retriever: Optional[ToolRetriever] = None,
+        tool_cache: Optional[ToolCache] = None,
     ) -> None:
         """Initialize an agent.
 
@@ -90,6 +94,11 @@ class Agent(GradioMixin, BaseAgent[BaseERNIEBot]):
             plugins: A list of names of the plugins for the agent to use. If
                 `None`, the agent will use a default list of plugins. Set
                 `plugins` to `[]` to disable the use of plugins.
+            tool_retriever: A tool retriever that selects the tools relevant
+                to the user input for each LLM call. If `None`, all tools are
+                passed to the LLM.
+            tool_cache: A cache of the results of idempotent tools. If `None`,
+                tool results are not cached.
         """
         super().__init__()
         self.llm = llm
@@ -113,6 +122,8 @@ class Agent(GradioMixin, BaseAgent[BaseERNIEBot]):
             self._callback_manager = CallbackManager(callbacks)
         self._file_manager = file_manager or get_default_file_manager()
         self._plugins = plugins
+        self._tool_retriever = tool_retriever
+        self._tool_cache = tool_cache
         self._init_file_needs_url()
 
     @final
@@ -321,7 +332,7 @@ class Agent(GradioMixin, BaseAgent[BaseERNIEBot]):
                 raise TypeError(f"`{reserved_opt}` should not be set.")
 
         if "functions" not in opts:
-            functions = self._tool_manager.get_tool_schemas()
+            functions = await self._get_tool_schemas(messages)
         else:
             functions = opts.pop("functions")
 
@@ -350,7 +361,7 @@ class Agent(GradioMixin, BaseAgent[BaseERNIEBot]):
                 raise TypeError(f"`{reserved_opt}` should not be set.")
 
         if "functions" not in opts:
-            functions = self._tool_manager.get_tool_schemas()
+            functions = await self._get_tool_schemas(messages)
         else:
             functions = opts.pop("functions")
 
@@ -365,6 +376,25 @@ class Agent(GradioMixin, BaseAgent[BaseERNIEBot]):
         async for msg in llm_ret:
             yield LLMResponse(message=msg)
 
+    async def _get_tool_schemas(self, messages: List[Message]) -> List[dict]:
+        tool_schemas = await self._select_tool_schemas(messages)
+        return self._tool_manager.compact_tool_schemas(tool_schemas, self.llm.model)
+
+    async def _select_tool_schemas(self, messages: List[Message]) -> List[dict]:
+        tool_schemas = self._tool_manager.get_tool_schemas()
+        if self._tool_retriever is None:
+            return tool_schemas
+        query = next((msg.content for msg in reversed(messages) if isinstance(msg, HumanMessage)), None)
+        if not query:
+            return tool_schemas
+        tool_schemas = await self._tool_retriever.select(query, tool_schemas)
+        await self._callback_manager.on_tools_selected(
+            agent=self,
+            query=query,
+            tools=[self._tool_manager.get_tool(schema["name"]) for schema in tool_schemas],
+        )
+        return tool_schemas
+
     async def _run_tool(self, tool: BaseTool, tool_args: str) -> ToolResponse:
         parsed_tool_args = self._parse_tool_args(tool_args)
         file_manager = self.get_file_manager()
@@ -372,12 +402,30 @@ class Agent(GradioMixin, BaseAgent[BaseERNIEBot]):
         # Can we make a protocol to statically recognize file inputs and outputs
         # or can we have the tools introspect about this?
         input_files = file_manager.sniff_and_extract_files_from_dict(parsed_tool_args)
-        tool_ret = await tool(**parsed_tool_args)
+        # The key is computed before the call, as tools may modify the arguments.
+        tool_cache = self._tool_cache
+        cache_key = tool_cache.get_key(tool, parsed_tool_args) if tool_cache is not None else None
+        if tool_cache is not None and cache_key is not None:
+            cached_json = await tool_cache.get(cache_key)
+            if cached_json is not None:
+                return ToolResponse(
+                    json=cached_json, input_files=input_files, output_files=[], cache_hit=True
+                )
+        try:
+            tool_ret = await tool(**parsed_tool_args)
+        finally:
+            # Even a failed call may have changed the state of the server.
+            if tool_cache is not None:
+                tool_cache.invalidate(tool)
         if isinstance(tool_ret, dict):
             output_files = file_manager.sniff_and_extract_files_from_dict(tool_ret)
         else:
             output_files = []
         tool_ret_json = json.dumps(tool_ret, ensure_ascii=False)
+        # Output files belong to the file manager that created them, so
+        # results with files are not cached.
+        if tool_cache is not None and cache_key is not None and not output_files:
+            await tool_cache.set(cache_key, tool_ret_json, tool)
         return ToolResponse(json=tool_ret_json, input_files=input_files, output_files=output_files)
 
     def _create_default_memory(self) -> Memory:
@@ -62,6 +62,9 @@ class CallbackManager(object):
     async def on_run_start(self, agent: BaseAgent, prompt: str) -> None:
         await self._handle_event(EventType.RUN_START, agent=agent, prompt=prompt)
 
+    async def on_tools_selected(self, agent: BaseAgent, query: str, tools: List[BaseTool]) -> None:
+        await self._handle_event(EventType.TOOLS_SELECTED, agent=agent, query=query, tools=tools)
+
     async def on_llm_start(self, agent: BaseAgent, llm: ChatModel, messages: List[Message]) -> None:
         await self._handle_event(EventType.LLM_START, agent=agent, llm=llm, messages=messages)
 
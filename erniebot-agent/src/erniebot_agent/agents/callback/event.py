@@ -17,6 +17,7 @@ import enum
 
 class EventType(enum.Enum):
     RUN_START = "run_start"
+    TOOLS_SELECTED = "tools_selected"
     LLM_START = "llm_start"
     LLM_END = "llm_end"
     LLM_ERROR = "llm_error"
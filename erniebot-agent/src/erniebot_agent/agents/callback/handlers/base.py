@@ -32,6 +32,16 @@ class CallbackHandler(object):
             prompt: The prompt that the agent uses as input.
         """
 
+    async def on_tools_selected(self, agent: BaseAgent, query: str, tools: List[BaseTool]) -> None:
+        """Called when the tools to pass to the LLM are selected by a tool
+        retriever.
+
+        Args:
+            agent: The agent that is running.
+            query: The user input that the tools are selected for.
+            tools: The selected tools.
+        """
+
     async def on_llm_start(self, agent: BaseAgent, llm: ChatModel, messages: List[Message]) -> None:
         """Called when the LLM starts running.
 
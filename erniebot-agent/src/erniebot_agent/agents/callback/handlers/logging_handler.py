@@ -58,6 +58,16 @@ class LoggingHandler(CallbackHandler):
             state="Start",
         )
 
+    async def on_tools_selected(self, agent: BaseAgent, query: str, tools: List[BaseTool]) -> None:
+        """Called to log when the tools to pass to the LLM are selected."""
+        self._agent_info(
+            "%d tools are selected: %s",
+            len(tools),
+            ", ".join(tool.tool_name for tool in tools),
+            subject="Tool",
+            state="Select",
+        )
+
     async def on_llm_start(self, agent: BaseAgent, llm: ChatModel, messages: List[Message]) -> None:
         """Called to log when the LLM starts running."""
         # TODO: Prettier messages
@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
 import logging
 from typing import (
     AsyncIterator,
@@ -47,7 +48,9 @@ from erniebot_agent.memory.messages import (
     Message,
 )
 from erniebot_agent.tools.base import BaseTool
+from erniebot_agent.tools.tool_cache import ToolCache
 from erniebot_agent.tools.tool_manager import ToolManager
+from erniebot_agent.tools.tool_retriever import ToolRetriever
 
 _MAX_STEPS: Final[int] = 5
 _logger = logging.getLogger(__name__)
@@ -67,11 +70,14 @@ class FunctionAgent(Agent):
         llm: The LLM that the agent uses.
         memory: The message storage that keeps the chat history.
         max_steps: The maximum number of steps in each agent run.
+        max_concurrent_tools: The maximum number of first tools that are
+            called at the same time.
     """
 
     llm: BaseERNIEBot
     memory: Memory
     max_steps: int
+    max_concurrent_tools: int
 
     def __init__(
         self,
@@ -85,6 +91,9 @@ class FunctionAgent(Agent):
         plugins: Optional[List[str]] = None,
         max_steps: Optional[int] = None,
         first_tools: Optional[Sequence[BaseTool]] = [],
+        max_concurrent_tools: int = 1,
+        tool_retriever: Optional[ToolRetriever] = None,
+        tool_cache: Optional[ToolCache] = None,
     ) -> None:
         """Initialize a function agent.
 
@@ -106,11 +115,25 @@ class FunctionAgent(Agent):
                 `plugins` to `[]` to disable the use of plugins.
             max_steps: The maximum number of steps in each agent run. If `None`,
                 use a default value.
-            first_tools: Tools scheduled to be called sequentially at the
-                beginning of each agent run.
+            first_tools: Tools scheduled to be called at the beginning of each
+                agent run.
+            max_concurrent_tools: The maximum number of first tools to call
+                at the same time. If 1, the first tools are called
+                sequentially, and the arguments of each tool are generated
+                with the results of the previous tools in the chat history.
+                Otherwise, the first tools must not depend on each other: the
+                arguments of all of them are generated from the user input,
+                and their results are added to the chat history in the order
+                of `first_tools`.
+            tool_retriever: A tool retriever that selects the tools relevant
+                to the user input for each LLM call. If `None`, all tools are
+                passed to the LLM.
+            tool_cache: A cache of the results of idempotent tools. If `None`,
+                tool results are not cached.
 
         Raises:
-            ValueError: if `max_steps` is non-positive.
+            ValueError: if `max_steps` or `max_concurrent_tools` is
+                non-positive.
             RuntimeError: if tools in first_tools but not in tools list.
 
         """
@@ -122,6 +145,8 @@ class FunctionAgent(Agent):
             callbacks=callbacks,
             file_manager=file_manager,
             plugins=plugins,
+            tool_retriever=tool_retriever,
+            tool_cache=tool_cache,
         )
         if max_steps is not None:
             if max_steps <= 0:
@@ -130,6 +155,10 @@ class FunctionAgent(Agent):
         else:
             self.max_steps = _MAX_STEPS
 
+        if max_concurrent_tools <= 0:
+            raise ValueError("Invalid `max_concurrent_tools` value")
+        self.max_concurrent_tools = max_concurrent_tools
+
         if first_tools:
             self._first_tools = first_tools
             for tool in self._first_tools:
@@ -149,8 +178,7 @@ class FunctionAgent(Agent):
         num_steps_taken = 0
         chat_history.append(run_input)
 
-        for tool in self._first_tools:
-            curr_step, new_messages = await self._call_first_tools(chat_history, selected_tool=tool)
+        async for tool, curr_step, new_messages in self._run_first_tools(chat_history):
             if not isinstance(curr_step, EndStep):
                 chat_history.extend(new_messages)
                 num_steps_taken += 1
@@ -181,6 +209,40 @@ class FunctionAgent(Agent):
         response = self._create_stopped_response(chat_history, steps_taken)
         return response
 
+    async def _run_first_tools(
+        self, chat_history: List[Message]
+    ) -> AsyncIterator[Tuple[BaseTool, AgentStep, List[Message]]]:
+        """Call the first tools.
+
+        The caller is expected to add the new messages of each step to
+        `chat_history` before requesting the next step.
+        """
+        if self.max_concurrent_tools == 1 or len(self._first_tools) <= 1:
+            for tool in self._first_tools:
+                curr_step, new_messages = await self._call_first_tools(chat_history, selected_tool=tool)
+                yield tool, curr_step, new_messages
+            return
+
+        semaphore = asyncio.Semaphore(self.max_concurrent_tools)
+        # All tools see the same chat history.
+        input_history = list(chat_history)
+
+        async def _call_with_limit(tool: BaseTool) -> Tuple[AgentStep, List[Message]]:
+            async with semaphore:
+                return await self._call_first_tools(input_history, selected_tool=tool)
+
+        tasks = [asyncio.ensure_future(_call_with_limit(tool)) for tool in self._first_tools]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            # Do not leave the other tools running when one fails.
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        for tool, (curr_step, new_messages) in zip(self._first_tools, results):
+            yield tool, curr_step, new_messages
+
     async def _call_first_tools(
         self, chat_history: List[Message], selected_tool: Optional[BaseTool] = None
     ) -> Tuple[AgentStep, List[Message]]:
@@ -192,7 +254,7 @@ class FunctionAgent(Agent):
         tool_choice = {"type": "function", "function": {"name": selected_tool.tool_name}}
         llm_resp = await self.run_llm(
             messages=input_messages,
-            functions=[selected_tool.function_call_schema()],  # only regist one tool
+            functions=[self._tool_manager.get_tool_schema(selected_tool.tool_name)],  # only regist one tool
             tool_choice=tool_choice,
         )
         return await self._process_step(llm_resp, chat_history)
@@ -243,8 +305,7 @@ class FunctionAgent(Agent):
         num_steps_taken = 0
         chat_history.append(run_input)
 
-        for tool in self._first_tools:
-            curr_step, new_messages = await self._call_first_tools(chat_history, selected_tool=tool)
+        async for tool, curr_step, new_messages in self._run_first_tools(chat_history):
             if not isinstance(curr_step, EndStep):
                 chat_history.extend(new_messages)
                 num_steps_taken += 1
@@ -308,6 +369,7 @@ class FunctionAgent(Agent):
                     result=tool_resp.json,
                     input_files=tool_resp.input_files,
                     output_files=tool_resp.output_files,
+                    cache_hit=tool_resp.cache_hit,
                 ),
                 new_messages,
             )
@@ -78,6 +78,7 @@ class ToolResponse(object):
     json: str
     input_files: List[File]
     output_files: List[File]
+    cache_hit: bool = False
 
 
 _IT = TypeVar("_IT", bound=Dict)
@@ -108,6 +109,9 @@ class AgentStepWithFiles(AgentStep[_IT, _RT]):
 class ToolStep(AgentStepWithFiles[ToolInfo, Any]):
     """A step taken by an agent that calls a tool."""
 
+    cache_hit: bool = False
+    """Whether the result was read from the tool cache of the agent."""
+
 
 @dataclass
 class PluginStep(AgentStepWithFiles[PluginInfo, str]):
@@ -12,17 +12,23 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
+import base64
+import binascii
 import contextlib
 import contextvars
 import logging
 import os
 import pathlib
+import re
 import tempfile
 import uuid
 from collections import deque
 from types import TracebackType
 from typing import (
     Any,
+    Awaitable,
+    Callable,
     Deque,
     Dict,
     Generator,
@@ -50,6 +56,11 @@ File: TypeAlias = Union[LocalFile, RemoteFile]
 
 _logger = logging.getLogger(__name__)
 
+# A multiple of 4, so that each chunk of base64 data is decoded independently.
+_BASE64_CHUNK_SIZE = 4 * 256 * 1024
+_NON_BASE64_PATTERN = re.compile(r"[^A-Za-z0-9+/=]")
+_NON_BASE64_BYTES_PATTERN = re.compile(rb"[^A-Za-z0-9+/=]")
+
 _default_file_manager_var: contextvars.ContextVar[Optional["FileManager"]] = contextvars.ContextVar(
     "_default_file_manager_var", default=None
 )
@@ -318,6 +329,54 @@ class FileManager(Closeable, Noncopyable):
 
         """
         self.ensure_not_closed()
+
+        async def _write(file_path: pathlib.Path) -> None:
+            async with await anyio.Path(file_path).open("wb") as f:
+                await f.write(file_contents)
+
+        return await self._create_file_with_writer(_write, filename, file_purpose, file_metadata, file_type)
+
+    async def create_file_from_base64(
+        self,
+        data: Union[str, bytes],
+        filename: str,
+        *,
+        file_purpose: protocol.FilePurpose = "assistants",
+        file_metadata: Optional[Dict[str, Any]] = None,
+        file_type: Optional[Literal["local", "remote"]] = None,
+    ) -> File:
+        """
+        Create a file from base64-encoded data.
+
+        The data is decoded and written to disk in chunks in a worker thread,
+        so that the decoded contents are never held in memory as a whole.
+
+        Args:
+            data (Union[str, bytes]): The base64-encoded contents of the file.
+            filename (str): The name of the file.
+            file_purpose (FilePurpose): The purpose or use case of the file.
+            file_metadata (Optional[Dict[str, Any]]): Additional metadata associated with the file.
+            file_type (Optional[Literal["local", "remote"]]): The type of file ("local" or "remote").
+
+        Returns:
+            Union[LocalFile, RemoteFile]: The created file.
+
+        """
+        self.ensure_not_closed()
+
+        async def _write(file_path: pathlib.Path) -> None:
+            await asyncio.get_running_loop().run_in_executor(None, _write_base64_to_file, data, file_path)
+
+        return await self._create_file_with_writer(_write, filename, file_purpose, file_metadata, file_type)
+
+    async def _create_file_with_writer(
+        self,
+        write: Callable[[pathlib.Path], Awaitable[None]],
+        filename: str,
+        file_purpose: protocol.FilePurpose,
+        file_metadata: Optional[Dict[str, Any]],
+        file_type: Optional[Literal["local", "remote"]],
+    ) -> File:
         if file_type is None:
             file_type = self._get_default_file_type()
         file_path = self._get_unique_file_path(
@@ -328,8 +387,7 @@ class FileManager(Closeable, Noncopyable):
         await async_file_path.touch()
         should_remove_file = True
         try:
-            async with await async_file_path.open("wb") as f:
-                await f.write(file_contents)
+            await write(file_path)
             file: File
             if file_type == "local":
                 file = await self._create_local_file_from_path(file_path, file_purpose, file_metadata)
@@ -544,3 +602,18 @@ class FileManager(Closeable, Noncopyable):
             temp_dir.cleanup()
         except Exception as e:
             _logger.warning("Failed to clean up temporary directory: %s", temp_dir.name, exc_info=e)
+
+
+def _write_base64_to_file(data: Union[str, bytes], file_path: pathlib.Path) -> None:
+    # Characters outside the alphabet, such as line breaks, would misalign the
+    # chunks.
+    if isinstance(data, str):
+        data = _NON_BASE64_PATTERN.sub("", data)
+    else:
+        data = _NON_BASE64_BYTES_PATTERN.sub(b"", data)
+    with open(file_path, "wb") as f:
+        for start in range(0, len(data), _BASE64_CHUNK_SIZE):
+            try:
+                f.write(base64.b64decode(data[start : start + _BASE64_CHUNK_SIZE]))
+            except (binascii.Error, ValueError) as e:
+                raise FileError("The data is not valid base64.") from e
@@ -22,6 +22,13 @@ from erniebot_agent.tools.schema import ToolParameterView, scrub_dict
 
 
 class BaseTool(ABC):
+    # Whether calls with the same arguments return the same result, so that
+    # the result can be cached by a `ToolCache`.
+    idempotent: bool = False
+    # The number of seconds for which a cached result is kept. If `None`, the
+    # default TTL of the cache is used.
+    cache_ttl: Optional[float] = None
+
     @property
     @abstractmethod
     def tool_name(self) -> str:
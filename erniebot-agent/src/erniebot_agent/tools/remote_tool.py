@@ -1,18 +1,24 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
 import dataclasses
+import functools
+import inspect
 import logging
 import os
 from copy import deepcopy
-from typing import Any, Dict, List, Optional, Type
+from typing import Any, Dict, List, Optional, Type, cast
 
-import requests
+import aiohttp
 
 from erniebot_agent.file import (
     FileManager,
     GlobalFileManagerHandler,
     get_default_file_manager,
 )
+from erniebot_agent.file.base import BaseFile
+from erniebot_agent.file.local_file import LocalFile
 from erniebot_agent.memory.messages import Message
 from erniebot_agent.tools.base import BaseTool
 from erniebot_agent.tools.schema import RemoteToolView
@@ -23,6 +29,11 @@ from erniebot_agent.tools.utils import (
     tool_response_contains_file,
 )
 from erniebot_agent.utils.exceptions import RemoteToolError
+from erniebot_agent.utils.http import (
+    ClientSessionPool,
+    HTTPResponse,
+    get_default_session_pool,
+)
 
 _logger = logging.getLogger(__name__)
 
@@ -37,6 +48,7 @@ class RemoteTool(BaseTool):
         file_manager: Optional[FileManager],
         examples: Optional[List[Message]] = None,
         tool_name_prefix: Optional[str] = None,
+        session_pool: Optional[ClientSessionPool] = None,
     ) -> None:
         self.tool_view = tool_view
         self.server_url = server_url
@@ -51,7 +63,11 @@ class RemoteTool(BaseTool):
                 self.tool_view, name=f"{self.tool_name_prefix}/{self.tool_view.name}"
             )
 
+        self.idempotent = self.tool_view.idempotent
+        self.cache_ttl = self.tool_view.cache_ttl
+
         self.response_prompt: Optional[str] = None
+        self.session_pool = session_pool or get_default_session_pool()
 
     @property
     def examples(self) -> List[Message]:
@@ -73,10 +89,23 @@ class RemoteTool(BaseTool):
         file_manager = self._get_file_manager()
 
         if self.tool_view.parameters is not None:
+            # Files uploaded as multipart form data are not read into memory
+            # here, but streamed from the file manager when sending the request.
+            upload_file_ids = {}
+            if self.tool_view.parameters_content_type == "multipart/form-data":
+                for file_key in get_file_info_from_param_view(self.tool_view.parameters).keys():
+                    if isinstance(tool_arguments.get(file_key, None), str):
+                        upload_file_ids[file_key] = tool_arguments.pop(file_key)
             tool_arguments = await parse_json_request(
                 self.tool_view.parameters, tool_arguments, file_manager
             )
-            tool_arguments = self.tool_view.parameters(**tool_arguments).model_dump(mode="json")
+            tool_arguments = self.tool_view.parameters.validate_to_json(
+                {**tool_arguments, **upload_file_ids}
+            )
+            for file_key, file_id in upload_file_ids.items():
+                tool_arguments[file_key] = file_manager.look_up_file_by_id(
+                    file_id.replace("<file>", "").replace("</file>", "")
+                )
 
         return tool_arguments
 
@@ -109,7 +138,15 @@ class RemoteTool(BaseTool):
 
     async def __call__(self, **tool_arguments: Dict[str, Any]) -> Any:
         tool_arguments = await self.__pre_process__(tool_arguments)
-        tool_response = await self.send_request(tool_arguments)
+        if inspect.iscoroutinefunction(self.send_request):
+            tool_response = await self.send_request(tool_arguments)
+        else:
+            # Custom tool classes may implement `send_request` with blocking
+            # calls. Run it in a thread so that it does not block the event loop.
+            loop = asyncio.get_running_loop()
+            tool_response = cast(
+                dict, await loop.run_in_executor(None, functools.partial(self.send_request, tool_arguments))
+            )
         return await self.__post_process__(tool_response)
 
     async def send_request(self, tool_arguments: Dict[str, Any]) -> dict:
@@ -122,41 +159,44 @@ class RemoteTool(BaseTool):
         if "EB_SDK_TRACE_APP_ID" in os.environ:
             headers["X-EB-SDK-TRACE-APP-ID"] = os.getenv("EB_SDK_TRACE_APP_ID")
 
-        requests_inputs = {
-            "headers": headers,
-        }
-        if self.tool_view.method == "get":
-            requests_inputs["params"] = tool_arguments
-        elif self.tool_view.parameters_content_type == "application/json":
-            requests_inputs["json"] = tool_arguments
-        elif self.tool_view.parameters_content_type in [
-            "application/x-www-form-urlencoded",
-        ]:
-            requests_inputs["data"] = tool_arguments
-        elif self.tool_view.parameters_content_type == "multipart/form-data":
-            parameter_file_infos = get_file_info_from_param_view(self.tool_view.parameters)
-            requests_inputs["files"] = {}
-            for file_key in parameter_file_infos.keys():
-                if file_key in tool_arguments:
-                    requests_inputs["files"][file_key] = tool_arguments.pop(file_key)
-                    headers.pop("Content-Type", None)
-            requests_inputs["data"] = tool_arguments
-        else:
-            raise RemoteToolError(
-                f"Unsupported content type: {self.tool_view.parameters_content_type}", stage="Executing"
-            )
-
-        if self.tool_view.method == "get":
-            response = requests.get(url, **requests_inputs)  # type: ignore
-        elif self.tool_view.method == "post":
-            response = requests.post(url, **requests_inputs)  # type: ignore
-        elif self.tool_view.method == "put":
-            response = requests.put(url, **requests_inputs)  # type: ignore
-        elif self.tool_view.method == "delete":
-            response = requests.delete(url, **requests_inputs)  # type: ignore
-        else:
+        if self.tool_view.method not in ("get", "post", "put", "delete"):
             raise RemoteToolError(f"method<{self.tool_view.method}> is invalid", stage="Executing")
 
+        with contextlib.ExitStack() as file_stack:
+            request_inputs: Dict[str, Any] = {
+                "headers": headers,
+            }
+            if self.tool_view.method == "get":
+                request_inputs["params"] = _to_query_params(tool_arguments)
+            elif self.tool_view.parameters_content_type == "application/json":
+                request_inputs["json"] = tool_arguments
+            elif self.tool_view.parameters_content_type in [
+                "application/x-www-form-urlencoded",
+            ]:
+                request_inputs["data"] = tool_arguments
+            elif self.tool_view.parameters_content_type == "multipart/form-data":
+                # The boundary is set by aiohttp.
+                headers.pop("Content-Type", None)
+                request_inputs["data"] = await self._create_form_data(tool_arguments, file_stack)
+            else:
+                raise RemoteToolError(
+                    f"Unsupported content type: {self.tool_view.parameters_content_type}", stage="Executing"
+                )
+
+            session = self.session_pool.get_session(self.server_url)
+            try:
+                async with session.request(self.tool_view.method.upper(), url, **request_inputs) as resp:
+                    response = await HTTPResponse.from_aiohttp_response(resp)
+            except asyncio.TimeoutError as e:
+                raise RemoteToolError(
+                    f"The resource requested by `{self.tool_name}` timed out.", stage="Executing"
+                ) from e
+            except aiohttp.ClientError as e:
+                raise RemoteToolError(
+                    f"The resource requested by `{self.tool_name}` could not be reached: {e}",
+                    stage="Executing",
+                ) from e
+
         if response.status_code != 200:
             _logger.debug(f"The resource requested returned the following headers: {response.headers}")
             raise RemoteToolError(
@@ -250,6 +290,24 @@ class RemoteTool(BaseTool):
             tool_response.pop("log_id")
         return tool_response
 
+    async def _create_form_data(
+        self, tool_arguments: Dict[str, Any], file_stack: contextlib.ExitStack
+    ) -> aiohttp.FormData:
+        form_data = aiohttp.FormData()
+        file_keys = get_file_info_from_param_view(self.tool_view.parameters).keys()
+        for key, value in tool_arguments.items():
+            if key not in file_keys:
+                form_data.add_field(key, value if isinstance(value, (str, bytes)) else str(value))
+            elif isinstance(value, LocalFile):
+                # aiohttp streams file objects in chunks.
+                file_obj = file_stack.enter_context(open(value.path, "rb"))
+                form_data.add_field(key, file_obj, filename=value.filename)
+            elif isinstance(value, BaseFile):
+                form_data.add_field(key, await value.read_contents(), filename=value.filename)
+            else:
+                form_data.add_field(key, value, filename=key)
+        return form_data
+
     def _get_file_manager(self) -> FileManager:
         if self.file_manager is None:
             file_manager = GlobalFileManagerHandler().get()
@@ -258,6 +316,20 @@ class RemoteTool(BaseTool):
         return file_manager
 
 
+def _to_query_params(tool_arguments: Dict[str, Any]) -> Dict[str, Any]:
+    # Unlike requests, aiohttp does not accept booleans and skips no values.
+    params = {}
+    for key, value in tool_arguments.items():
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            value = "true" if value else "false"
+        elif isinstance(value, list):
+            value = [str(item) for item in value]
+        params[key] = value
+    return params
+
+
 class RemoteToolRegistor:
     def __init__(self) -> None:
         self.tool_map: Dict[str, Type[RemoteTool]] = {}
@@ -1,11 +1,12 @@
 from __future__ import annotations
 
+import copy
 import json
 import logging
 import os
 import tempfile
 from dataclasses import asdict, dataclass, field
-from typing import Any, ClassVar, Dict, List, Optional, Type
+from typing import Any, ClassVar, Dict, List, NamedTuple, Optional, Set, Tuple, Type
 
 import requests
 from openapi_spec_validator.readers import read_from_filename
@@ -26,6 +27,7 @@ from erniebot_agent.tools.schema import (
     ToolParameterView,
     scrub_dict,
 )
+from erniebot_agent.tools.schema_compaction import SchemaCompactor
 from erniebot_agent.tools.utils import validate_openapi_yaml
 from erniebot_agent.utils import config_from_environ as C
 from erniebot_agent.utils.exceptions import RemoteToolError
@@ -34,9 +36,20 @@ from erniebot_agent.utils.http import url_file_exists
 _logger = logging.getLogger(__name__)
 
 
+class _ToolkitCache(NamedTuple):
+    tools: List[RemoteTool]
+    tool_index: Dict[str, RemoteTool]
+    duplicate_names: Set[str]
+    examples: Dict[str, Tuple[Message, ...]]
+
+
 @dataclass
 class RemoteToolkit:
-    """RemoteToolkit can be converted by openapi.yaml and endpoint"""
+    """RemoteToolkit can be converted by openapi.yaml and endpoint
+
+    The tools and the examples of each tool are built on first use and reused
+    until a field of the toolkit is reassigned.
+    """
 
     openapi: str
     info: EndpointInfo
@@ -47,6 +60,7 @@ class RemoteToolkit:
     component_schemas: dict[str, Type[ToolParameterView]]
     headers: dict
     examples: List[Message] = field(default_factory=list)
+    _cache: Optional[_ToolkitCache] = field(default=None, init=False, repr=False, compare=False)
     _AISTUDIO_HUB_BASE_URL: ClassVar[str] = "https://aistudio-hub.baidu.com"
 
     @property
@@ -56,88 +70,96 @@ class RemoteToolkit:
     def __getitem__(self, tool_name: str) -> RemoteTool:
         return self.get_tool(tool_name)
 
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        # The tools are built again if the toolkit is changed.
+        if name != "_cache":
+            super().__setattr__("_cache", None)
+
     def get_tools(self) -> List[RemoteTool]:
-        TOOL_CLASS = tool_registor.get_tool_class(self.info.title)
-        return [
-            TOOL_CLASS(
-                path,
-                self.servers[0].url,
-                self.headers,
-                self.info.version,
-                file_manager=self.file_manager,
-                examples=self.get_examples_by_name(path.name),
-                tool_name_prefix=self.tool_name_prefix,
-            )
-            for path in self.paths
-        ]
+        return list(self._get_cache().tools)
 
     def get_examples_by_name(self, tool_name: str) -> List[Message]:
         """get examples by tool-name
 
+        The names of the tools in the returned examples are prefixed with
+        `tool_name_prefix`. `self.examples` is not modified.
+
         Args:
             tool_name (str): the name of the tool
 
         Returns:
             List[Message]: the messages
         """
-        # 1. split messages
-        tool_examples: List[List[Message]] = []
-        examples: List[Message] = []
-        for example in self.examples:
-            if isinstance(example, HumanMessage):
-                if len(examples) == 0:
-                    examples.append(example)
-                else:
-                    tool_examples.append(examples)
-                    examples = [example]
-            else:
-                examples.append(example)
-
-        if len(examples) > 0:
-            tool_examples.append(examples)
-
-        final_exampels: List[Message] = []
-        # 2. find the target tool examples or empty messages
-        for examples in tool_examples:
-            tool_names = [
-                example.function_call.get("name", None)
-                for example in examples
-                if isinstance(example, AIMessage) and example.function_call is not None
-            ]
-            tool_names = [name for name in tool_names if name]
-
-            if tool_name in tool_names:
-                # 3. prepend `tool_name_prefix` to all tool names in examples
-                for example in examples:
-                    if isinstance(example, AIMessage) and example.function_call is not None:
-                        original_tool_name = example.function_call["name"]
-                        example.function_call["name"] = f"{self.tool_name_prefix}/{original_tool_name}"
-                final_exampels.extend(examples)
-
-        return final_exampels
+        return list(self._get_cache().examples.get(tool_name, ()))
 
     def get_tool(self, tool_name: str) -> RemoteTool:
-        paths = [path for path in self.paths if path.name == tool_name]
-        if len(paths) == 0:
-            raise RemoteToolError(
-                f"`{tool_name}` not found under RemoteToolkit `{self.tool_name_prefix}`", stage="Loading"
-            )
-        elif len(paths) > 1:
+        cache = self._get_cache()
+        if tool_name in cache.duplicate_names:
             raise RemoteToolError(
                 f"Found duplicate `{tool_name}` under RemoteToolkit `{self.tool_name_prefix}`",
                 stage="Loading",
             )
-
-        TOOL_CLASS = tool_registor.get_tool_class(self.info.title)
-        return TOOL_CLASS(
-            paths[0],
-            self.servers[0].url,
-            self.headers,
-            self.info.version,
-            file_manager=self.file_manager,
-            examples=self.get_examples_by_name(tool_name),
-            tool_name_prefix=self.tool_name_prefix,
-        )
+        if tool_name not in cache.tool_index:
+            raise RemoteToolError(
+                f"`{tool_name}` not found under RemoteToolkit `{self.tool_name_prefix}`", stage="Loading"
+            )
+        return cache.tool_index[tool_name]
+
+    def _get_cache(self) -> _ToolkitCache:
+        if self._cache is None:
+            examples = self._split_examples()
+            TOOL_CLASS = tool_registor.get_tool_class(self.info.title)
+            tools: List[RemoteTool] = []
+            tool_index: Dict[str, RemoteTool] = {}
+            duplicate_names: Set[str] = set()
+            for path in self.paths:
+                tool = TOOL_CLASS(
+                    path,
+                    self.servers[0].url,
+                    self.headers,
+                    self.info.version,
+                    file_manager=self.file_manager,
+                    examples=list(examples.get(path.name, ())),
+                    tool_name_prefix=self.tool_name_prefix,
+                )
+                tools.append(tool)
+                if path.name in tool_index:
+                    duplicate_names.add(path.name)
+                tool_index[path.name] = tool
+            # `__setattr__` is bypassed to keep the cache.
+            object.__setattr__(self, "_cache", _ToolkitCache(tools, tool_index, duplicate_names, examples))
+        return self._cache  # type: ignore[return-value]
+
+    def _split_examples(self) -> Dict[str, Tuple[Message, ...]]:
+        # 1. split messages
+        dialogues: List[List[Message]] = []
+        for example in self.examples:
+            if isinstance(example, HumanMessage) or len(dialogues) == 0:
+                dialogues.append([example])
+            else:
+                dialogues[-1].append(example)
+
+        tool_examples: Dict[str, List[Message]] = {}
+        for dialogue in dialogues:
+            # 2. prepend `tool_name_prefix` to all tool names in copies of the examples
+            tool_names: List[str] = []
+            prefixed_dialogue: List[Message] = []
+            for example in dialogue:
+                if isinstance(example, AIMessage) and example.function_call is not None:
+                    original_tool_name = example.function_call.get("name", None)
+                    if original_tool_name:
+                        tool_names.append(original_tool_name)
+                        function_call = copy.copy(example.function_call)
+                        function_call["name"] = f"{self.tool_name_prefix}/{original_tool_name}"
+                        example = copy.copy(example)
+                        example.function_call = function_call
+                prefixed_dialogue.append(example)
+            # 3. add the dialogue to the examples of all tools it calls
+            for tool_name in dict.fromkeys(tool_names):
+                tool_examples.setdefault(tool_name, []).extend(prefixed_dialogue)
+
+        return {tool_name: tuple(examples) for tool_name, examples in tool_examples.items()}
 
     def to_openapi_dict(self) -> dict:
         """convert plugin schema to openapi spec dict"""
@@ -392,5 +414,17 @@ class RemoteToolkit:
             raise RemoteToolError("invalid examples configuration file", stage="Loading")
         return cls.load_examples_dict(content)
 
-    def function_call_schemas(self) -> List[dict]:
-        return [tool.function_call_schema() for tool in self.get_tools()]
+    def function_call_schemas(
+        self, compactor: Optional[SchemaCompactor] = None, model: Optional[str] = None
+    ) -> List[dict]:
+        """Get the function call schemas of the tools in the toolkit.
+
+        Args:
+            compactor: If given, the schemas are compacted to fit the token
+                budget of `model`.
+            model: The name of the model that the schemas are sent to.
+        """
+        schemas = [tool.function_call_schema() for tool in self.get_tools()]
+        if compactor is not None:
+            schemas = compactor.compact(schemas, model)
+        return schemas
@@ -14,7 +14,9 @@
 
 from __future__ import annotations
 
+import hashlib
 import inspect
+import json
 import logging
 from dataclasses import dataclass
 from enum import Enum
@@ -30,6 +32,9 @@ INVALID_FIELD_NAME = "__invalid_field_name__"
 
 _logger = logging.getLogger(__name__)
 
+# Models created by `ToolParameterView.from_openapi_dict`, keyed by schema.
+_parameter_view_registry: Dict[str, Type[ToolParameterView]] = {}
+
 
 def is_optional_type(type: Optional[Type]):
     args = get_args(type)
@@ -232,13 +237,27 @@ class ToolParameterView(BaseModel):
     @classmethod
     def from_openapi_dict(cls, schema: dict) -> Type[ToolParameterView]:
         """parse openapi component schemas to ParameterView
+
+        The models are cached by the content of `schema`, so that identical
+        schemas, e.g. from the same toolkit loaded twice, share one model.
+
         Args:
             response_or_returns (dict): the content of status code
 
         Returns:
             _type_: _description_
         """
+        key = _get_schema_key(schema)
+        if key is None:
+            return cls._create_from_openapi_dict(schema)
+        model = _parameter_view_registry.get(key, None)
+        if model is None:
+            model = cls._create_from_openapi_dict(schema)
+            _parameter_view_registry[key] = model
+        return model
 
+    @classmethod
+    def _create_from_openapi_dict(cls, schema: dict) -> Type[ToolParameterView]:
         # TODO(wj-Mcat): to load Optional field
         fields = {}
         for field_name, field_dict in schema.get("properties", {}).items():
@@ -329,6 +348,22 @@ class ToolParameterView(BaseModel):
         result = scrub_dict(result, remove_empty_dict=True)  # type: ignore
         return result or {}
 
+    @classmethod
+    def validate_to_json(cls, arguments: Dict[str, Any]) -> dict:
+        """validate the arguments and convert them to JSON-compatible values
+
+        This is equivalent to `cls(**arguments).model_dump(mode="json")`, but
+        calls the compiled validator and serializer of the model directly.
+
+        Args:
+            arguments (Dict[str, Any]): the arguments to validate
+
+        Returns:
+            dict: the validated arguments
+        """
+        instance = cls.__pydantic_validator__.validate_python(arguments)
+        return cls.__pydantic_serializer__.to_python(instance, mode="json")
+
     @classmethod
     def function_call_schema(cls) -> dict:
         """get function_call schame
@@ -384,6 +419,24 @@ class RemoteToolView:
     returns_ref_uri: Optional[str] = None
     parameters_ref_uri: Optional[str] = None
 
+    # The `x-ebagent-cache` extension: a bool, or a dict with the optional
+    # `enabled` and `ttl` fields.
+    cache: Optional[Union[bool, Dict[str, Any]]] = None
+
+    @property
+    def idempotent(self) -> bool:
+        if isinstance(self.cache, dict):
+            return bool(self.cache.get("enabled", True))
+        if self.cache is not None:
+            return bool(self.cache)
+        return self.method.lower() == "get"
+
+    @property
+    def cache_ttl(self) -> Optional[float]:
+        if isinstance(self.cache, dict):
+            return self.cache.get("ttl", None)
+        return None
+
     def to_openapi_dict(self):
         result = {
             "operationId": self.name,
@@ -412,6 +465,8 @@ class RemoteToolView:
                 },
             }
             result["requestBody"] = parameters
+        if self.cache is not None:
+            result["x-ebagent-cache"] = self.cache
         return {self.method: result}
 
     @staticmethod
@@ -477,6 +532,7 @@ class RemoteToolView:
             # save ref id info
             returns_ref_uri=returns_ref_uri,
             parameters_ref_uri=parameters_ref_uri,
+            cache=path_info.get("x-ebagent-cache", None),
         )
 
     def function_call_schema(self):
@@ -506,3 +562,17 @@ class EndpointInfo:
     version: str
 
     description: Optional[str] = None
+
+
+def clear_parameter_view_registry() -> None:
+    """Remove all models cached by `ToolParameterView.from_openapi_dict`."""
+    _parameter_view_registry.clear()
+
+
+def _get_schema_key(schema: dict) -> Optional[str]:
+    try:
+        content = json.dumps(schema, sort_keys=True, ensure_ascii=False, default=str)
+    except TypeError:
+        # Keys of different types cannot be sorted.
+        return None
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
@@ -0,0 +1,186 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import copy
+import json
+import logging
+from typing import Any, Callable, List, Optional, Sequence
+
+import erniebot
+import erniebot.utils.token_helper as token_helper
+
+_logger = logging.getLogger(__name__)
+
+# Used for models unknown to the SDK.
+_DEFAULT_INPUT_TOKENS = 5120
+
+
+def _get_max_input_tokens(model: Optional[str]) -> int:
+    # The limits are taken from the SDK, which knows the models of each API
+    # type.
+    if model is not None:
+        for api_info in erniebot.ChatCompletion._API_INFO_DICT.values():
+            model_info = api_info["models"].get(model, None)
+            if model_info is not None and "max_input_tokens" in model_info:
+                return model_info["max_input_tokens"]
+    return _DEFAULT_INPUT_TOKENS
+
+
+def estimate_num_tokens(tool_schemas: Sequence[dict]) -> int:
+    """Estimate the number of tokens that the function call schemas take."""
+    return token_helper.approx_num_tokens(json.dumps(list(tool_schemas), ensure_ascii=False))
+
+
+class SchemaCompactor(object):
+    """Reduces the size of function call schemas to fit a token budget.
+
+    The following steps are applied in order, each only if the schemas still
+    exceed the budget:
+
+    1. Remove fields with empty values.
+    2. Remove the `responses` schemas.
+    3. Keep only the first `max_examples` examples of each tool.
+    4. Truncate descriptions to `max_description_length` characters.
+    5. Remove all examples.
+
+    The tools themselves are not changed, only the schemas sent to the LLM.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_tokens: Optional[int] = None,
+        context_ratio: float = 0.3,
+        max_examples: int = 1,
+        max_description_length: int = 64,
+    ) -> None:
+        """Initialize a schema compactor.
+
+        Args:
+            max_tokens: The token budget of the schemas. If `None`, the budget
+                is `context_ratio` of the maximum number of input tokens of
+                the model.
+            context_ratio: The share of the input tokens of the model that the
+                schemas may take.
+            max_examples: The number of examples to keep for each tool in
+                step 3.
+            max_description_length: The maximum length of descriptions in
+                step 4.
+
+        Raises:
+            ValueError: if `context_ratio` is not in (0, 1].
+        """
+        super().__init__()
+        if not 0 < context_ratio <= 1:
+            raise ValueError("Invalid `context_ratio` value")
+        self.max_tokens = max_tokens
+        self.context_ratio = context_ratio
+        self.max_examples = max_examples
+        self.max_description_length = max_description_length
+
+    def get_budget(self, model: Optional[str] = None) -> int:
+        """Get the token budget of the schemas for `model`."""
+        if self.max_tokens is not None:
+            return self.max_tokens
+        input_tokens = _get_max_input_tokens(model)
+        return int(input_tokens * self.context_ratio)
+
+    def compact(self, tool_schemas: Sequence[dict], model: Optional[str] = None) -> List[dict]:
+        """Compact the schemas to fit the budget of `model`.
+
+        Args:
+            tool_schemas: The function call schemas. They are not modified.
+            model: The name of the model that the schemas are sent to.
+
+        Returns:
+            The compacted schemas.
+        """
+        budget = self.get_budget(model)
+        num_tokens = estimate_num_tokens(tool_schemas)
+        if num_tokens <= budget:
+            return list(tool_schemas)
+
+        schemas = copy.deepcopy(list(tool_schemas))
+        steps: List[Callable[[dict], None]] = [
+            _remove_empty_fields,
+            _remove_responses,
+            self._trim_examples,
+            self._truncate_descriptions,
+            _remove_examples,
+        ]
+        for step in steps:
+            for schema in schemas:
+                step(schema)
+            num_tokens = estimate_num_tokens(schemas)
+            if num_tokens <= budget:
+                break
+        else:
+            _logger.warning(
+                "The function call schemas take about %d tokens after compaction, "
+                "which exceeds the budget of %d tokens.",
+                num_tokens,
+                budget,
+            )
+        return schemas
+
+    def _trim_examples(self, schema: dict) -> None:
+        if "examples" not in schema:
+            return
+        # Each example starts with a user message.
+        num_examples = 0
+        for idx, message in enumerate(schema["examples"]):
+            if message.get("role", None) == "user":
+                num_examples += 1
+                if num_examples > self.max_examples:
+                    schema["examples"] = schema["examples"][:idx]
+                    break
+        if not schema["examples"]:
+            schema.pop("examples")
+
+    def _truncate_descriptions(self, schema: Any) -> None:
+        if isinstance(schema, dict):
+            for key, value in schema.items():
+                if key == "description" and isinstance(value, str):
+                    if len(value) > self.max_description_length:
+                        schema[key] = value[: self.max_description_length]
+                elif key != "examples":
+                    self._truncate_descriptions(value)
+        elif isinstance(schema, list):
+            for item in schema:
+                self._truncate_descriptions(item)
+
+
+def _remove_empty_fields(schema: dict) -> None:
+    for key in list(schema.keys()):
+        value = schema[key]
+        if isinstance(value, dict):
+            _remove_empty_fields(value)
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, dict):
+                    _remove_empty_fields(item)
+        # Empty objects are kept, since they can be required, e.g., by
+        # `parameters` and `properties`.
+        if value is None or value == "" or value == []:
+            schema.pop(key)
+
+
+def _remove_responses(schema: dict) -> None:
+    schema.pop("responses", None)
+
+
+def _remove_examples(schema: dict) -> None:
+    schema.pop("examples", None)
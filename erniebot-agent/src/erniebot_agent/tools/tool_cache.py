@@ -0,0 +1,288 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from erniebot_agent.tools.base import BaseTool
+from erniebot_agent.utils.common import get_cache_dir
+
+_logger = logging.getLogger(__name__)
+
+
+class ToolCacheBackend(ABC):
+    """The storage of a `ToolCache`."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        """Return the value stored under `key`, or `None` if it is missing or
+        expired."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set(self, key: str, value: str, ttl: Optional[float]) -> None:
+        """Store `value` under `key` for `ttl` seconds, or forever if `ttl` is
+        `None`."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def clear(self) -> None:
+        raise NotImplementedError
+
+
+class InMemoryToolCacheBackend(ToolCacheBackend):
+    """Keeps the results in memory, evicting the least recently used ones."""
+
+    def __init__(self, max_size: int = 1024) -> None:
+        super().__init__()
+        if max_size <= 0:
+            raise ValueError("Invalid `max_size` value")
+        self.max_size = max_size
+        self._entries: collections.OrderedDict[str, Tuple[Optional[float], str]] = collections.OrderedDict()
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key, None)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: str, ttl: Optional[float]) -> None:
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+
+
+class DiskToolCacheBackend(ToolCacheBackend):
+    """Keeps the results in `cache_dir`, one JSON file per entry, so that they
+    survive restarts and can be shared by processes."""
+
+    def __init__(self, cache_dir: Optional[str] = None) -> None:
+        """Initialize a disk backend.
+
+        Args:
+            cache_dir: The directory of the cache. If `None`, the
+                `tool_results` directory under the cache directory of erniebot
+                agent will be used.
+        """
+        super().__init__()
+        if cache_dir is None:
+            cache_dir = os.path.join(get_cache_dir(), "tool_results")
+        self.cache_dir = cache_dir
+
+    async def get(self, key: str) -> Optional[str]:
+        return await asyncio.get_running_loop().run_in_executor(None, self._read, key)
+
+    async def set(self, key: str, value: str, ttl: Optional[float]) -> None:
+        expires_at = time.time() + ttl if ttl is not None else None
+        await asyncio.get_running_loop().run_in_executor(None, self._write, key, value, expires_at)
+
+    async def clear(self) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self._clear)
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _read(self, key: str) -> Optional[str]:
+        path = self._get_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError) as e:
+            _logger.warning("Failed to read the tool cache %s: %s", path, e)
+            return None
+        expires_at = entry.get("expires_at", None)
+        if expires_at is not None and expires_at <= time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return entry["value"]
+
+    def _write(self, key: str, value: str, expires_at: Optional[float]) -> None:
+        path = self._get_path(key)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # A unique temporary file, as threads and processes may write the
+        # same entry at once.
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.cache_dir)
+        try:
+            with open(fd, "w", encoding="utf-8") as f:
+                json.dump({"expires_at": expires_at, "value": value}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _clear(self) -> None:
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                os.remove(os.path.join(self.cache_dir, name))
+
+
+class ToolCache(object):
+    """Caches the results of idempotent tools.
+
+    A tool is cached if it is listed in `tools` or declares itself idempotent
+    via `BaseTool.idempotent`. For remote tools, `GET` endpoints are
+    idempotent, and the `x-ebagent-cache` extension of an operation can turn
+    caching on or off and set the TTL, e.g.:
+
+        x-ebagent-cache:
+          ttl: 600
+
+    Results are keyed by the tool name, the tool version, the server and the
+    credentials of remote tools, and the arguments, so that calls differing
+    only in the order of the arguments share an entry.
+
+    A call to a tool that is not cached, such as a `POST` endpoint, may change
+    what other tools of the same server return. Such a call invalidates the
+    cached results of that server. The invalidation only applies to this
+    `ToolCache` object; other processes sharing a `DiskToolCacheBackend` keep
+    using their entries until they expire.
+
+    The cache is best-effort: errors of the backend are logged, and the tools
+    are called as if their results were not cached.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[ToolCacheBackend] = None,
+        *,
+        default_ttl: Optional[float] = 300,
+        tools: Iterable[str] = (),
+        ttls: Optional[Dict[str, Optional[float]]] = None,
+    ) -> None:
+        """Initialize a tool cache.
+
+        Args:
+            backend: The storage of the results. If `None`, an
+                `InMemoryToolCacheBackend` will be used.
+            default_ttl: The number of seconds for which a result is kept, if
+                neither `ttls` nor the tool sets it. `None` means forever.
+            tools: The names of the tools to cache in addition to the
+                idempotent ones.
+            ttls: A mapping from tool names to TTLs. Tools in this mapping are
+                cached as well.
+        """
+        super().__init__()
+        self.backend = backend or InMemoryToolCacheBackend()
+        self.default_ttl = default_ttl
+        self.ttls = dict(ttls or {})
+        self._tool_names = set(tools) | set(self.ttls)
+        # Bumped to invalidate the cached results of a server.
+        self._generations: Dict[str, int] = {}
+
+    def is_cacheable(self, tool: BaseTool) -> bool:
+        return tool.tool_name in self._tool_names or tool.idempotent
+
+    def get_ttl(self, tool: BaseTool) -> Optional[float]:
+        if tool.tool_name in self.ttls:
+            return self.ttls[tool.tool_name]
+        if tool.cache_ttl is not None:
+            return tool.cache_ttl
+        return self.default_ttl
+
+    def get_key(self, tool: BaseTool, tool_args: Dict[str, Any]) -> Optional[str]:
+        """Return the cache key of a call, or `None` if the call should not be
+        cached."""
+        if not self.is_cacheable(tool):
+            return None
+        server_url = _get_server_url(tool)
+        try:
+            canonical = json.dumps(
+                {
+                    "tool": tool.tool_name,
+                    "version": getattr(tool, "version", None),
+                    "server_url": server_url,
+                    "credentials": _get_credentials_digest(tool),
+                    "generation": self._generations.get(server_url, 0) if server_url is not None else 0,
+                    "args": tool_args,
+                },
+                ensure_ascii=False,
+                sort_keys=True,
+                separators=(",", ":"),
+            )
+        except (TypeError, ValueError):
+            return None
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def invalidate(self, tool: BaseTool) -> None:
+        """Invalidate the cached results of the server of `tool`, if `tool` is
+        not cached itself."""
+        if self.is_cacheable(tool):
+            return
+        server_url = _get_server_url(tool)
+        if server_url is not None:
+            self._generations[server_url] = self._generations.get(server_url, 0) + 1
+
+    async def get(self, key: str) -> Optional[str]:
+        try:
+            return await self.backend.get(key)
+        except Exception as e:
+            _logger.warning("Failed to get a tool result from the cache: %s", e, exc_info=True)
+            return None
+
+    async def set(self, key: str, value: str, tool: BaseTool) -> None:
+        ttl = self.get_ttl(tool)
+        if ttl is not None and ttl <= 0:
+            return
+        try:
+            await self.backend.set(key, value, ttl)
+        except Exception as e:
+            _logger.warning("Failed to store a tool result in the cache: %s", e, exc_info=True)
+
+    async def clear(self) -> None:
+        await self.backend.clear()
+
+
+def _get_server_url(tool: BaseTool) -> Optional[str]:
+    server_url = getattr(tool, "server_url", None)
+    return server_url if isinstance(server_url, str) else None
+
+
+def _get_credentials_digest(tool: BaseTool) -> Optional[str]:
+    # Results may depend on the user, e.g. through the access token in the
+    # headers of remote tools. Only a digest is kept in the key.
+    headers = getattr(tool, "headers", None)
+    if not headers:
+        return None
+    canonical = json.dumps(headers, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
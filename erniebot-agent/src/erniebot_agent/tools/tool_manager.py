@@ -13,14 +13,18 @@
 # limitations under the License.
 from __future__ import annotations
 
+import copy
 import functools
 import json
 import types
-from typing import Callable, Dict, Iterable, List, final
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, final
 
 from erniebot_agent.tools.base import BaseTool, Tool
+from erniebot_agent.tools.schema_compaction import SchemaCompactor
 from erniebot_agent.tools.utils import get_fastapi_openapi
 
+_MAX_CACHED_COMPACTIONS = 64
+
 
 @final
 class ToolManager(object):
@@ -28,11 +32,25 @@ class ToolManager(object):
 
     This implementation is based on `ToolsManager` in
     https://github.com/deepset-ai/haystack/blob/main/haystack/agents/base.py
+
+    The function call schemas of the tools are computed once and cached until
+    the tool is removed. Call `clear_schema_cache` after changing a tool in a
+    way that affects its schema. Callers receive copies of the cached schemas,
+    which they are free to modify.
+
+    If `schema_compactor` is given, `compact_tool_schemas` shrinks the schemas
+    that exceed the token budget of the model. The results are cached as well.
     """
 
-    def __init__(self, tools: Iterable[BaseTool]) -> None:
+    def __init__(
+        self, tools: Iterable[BaseTool], *, schema_compactor: Optional[SchemaCompactor] = None
+    ) -> None:
         super().__init__()
         self._tools: Dict[str, BaseTool] = {}
+        self._schemas: Dict[str, dict] = {}
+        self._schema_list: Optional[List[dict]] = None
+        self._schema_compactor = schema_compactor
+        self._compacted_schemas: Dict[Tuple[Optional[str], Tuple[str, ...]], List[dict]] = {}
         for tool in tools:
             self.add_tool(tool)
 
@@ -44,6 +62,8 @@ class ToolManager(object):
         if tool_name in self._tools:
             raise ValueError(f"Name {repr(tool_name)} is already registered.")
         self._tools[tool_name] = tool
+        self._schema_list = None
+        self._compacted_schemas.clear()
 
     def remove_tool(self, tool: BaseTool) -> None:
         tool_name = tool.tool_name
@@ -52,6 +72,9 @@ class ToolManager(object):
         if self._tools[tool_name] is not tool:
             raise RuntimeError(f"The tool with the registered name {repr(tool_name)} is not the given tool.")
         self._tools.pop(tool_name)
+        self._schemas.pop(tool_name, None)
+        self._schema_list = None
+        self._compacted_schemas.clear()
 
     def get_tool(self, tool_name: str) -> BaseTool:
         if tool_name not in self._tools:
@@ -65,12 +88,41 @@ class ToolManager(object):
         return ", ".join(self._tools.keys())
 
     def get_tool_names_with_descriptions(self) -> str:
-        return "\n".join(
-            f"{name}:{json.dumps(tool.function_call_schema())}" for name, tool in self._tools.items()
-        )
+        return "\n".join(f"{name}:{json.dumps(self.get_tool_schema(name))}" for name in self._tools.keys())
+
+    def get_tool_schema(self, tool_name: str) -> dict:
+        schema = self._schemas.get(tool_name, None)
+        if schema is None:
+            schema = self.get_tool(tool_name).function_call_schema()
+            self._schemas[tool_name] = schema
+        return copy.deepcopy(schema)
 
-    def get_tool_schemas(self):
-        return [tool.function_call_schema() for tool in self._tools.values()]
+    def get_tool_schemas(self) -> List[dict]:
+        if self._schema_list is None:
+            self._schema_list = [self.get_tool_schema(tool_name) for tool_name in self._tools.keys()]
+        return copy.deepcopy(self._schema_list)
+
+    def compact_tool_schemas(self, tool_schemas: List[dict], model: Optional[str] = None) -> List[dict]:
+        """Compact the schemas of the managed tools to fit the budget of `model`.
+
+        The schemas are returned unchanged if no schema compactor is set.
+        """
+        if self._schema_compactor is None:
+            return tool_schemas
+        key = (model, tuple(schema["name"] for schema in tool_schemas))
+        compacted = self._compacted_schemas.get(key, None)
+        if compacted is None:
+            # The compactor may return the given schemas, which the caller owns.
+            compacted = copy.deepcopy(self._schema_compactor.compact(tool_schemas, model))
+            if len(self._compacted_schemas) >= _MAX_CACHED_COMPACTIONS:
+                self._compacted_schemas.pop(next(iter(self._compacted_schemas)))
+            self._compacted_schemas[key] = compacted
+        return copy.deepcopy(compacted)
+
+    def clear_schema_cache(self) -> None:
+        self._schemas.clear()
+        self._schema_list = None
+        self._compacted_schemas.clear()
 
     def serve(self, port: int = 5000):
         """start the local server for toolkit
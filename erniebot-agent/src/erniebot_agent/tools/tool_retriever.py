@@ -0,0 +1,179 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import math
+import os
+from typing import Dict, List, Optional, Sequence
+
+import erniebot
+
+from erniebot_agent.utils import config_from_environ as C
+
+_logger = logging.getLogger(__name__)
+
+_MAX_TEXT_LENGTH = 384
+_MAX_CACHED_QUERIES = 64
+
+
+class ToolRetriever(object):
+    """Selects the tools that are relevant to the user input.
+
+    The name and description of each tool are embedded once. For each LLM
+    call, the latest user input is embedded, and only the schemas of the
+    `top_k` most similar tools, plus the pinned tools, are passed to the LLM.
+
+    If `index_path` is given, the embeddings of the tools are saved to that
+    file and loaded when the retriever is created, so that tools are not
+    embedded again after a restart. Embeddings are keyed by the embedded text,
+    so a tool whose description changes is embedded again.
+    """
+
+    def __init__(
+        self,
+        *,
+        top_k: int = 5,
+        pinned_tools: Sequence[str] = (),
+        index_path: Optional[str] = None,
+        model: str = "ernie-text-embedding",
+        api_type: str = "aistudio",
+        access_token: Optional[str] = None,
+        batch_size: int = 16,
+    ) -> None:
+        """Initialize a tool retriever.
+
+        Args:
+            top_k: The number of tools to select, excluding the pinned tools.
+            pinned_tools: Names of the tools that are always selected.
+            index_path: Path of the file to persist the embeddings of the tools.
+            model: The embedding model.
+            api_type: The backend of erniebot.
+            access_token: The access token for the backend. If `None`, the
+                global access token will be used.
+            batch_size: The maximum number of texts embedded in one request.
+
+        Raises:
+            ValueError: if `top_k` or `batch_size` is non-positive.
+        """
+        super().__init__()
+        if top_k <= 0:
+            raise ValueError("Invalid `top_k` value")
+        if batch_size <= 0:
+            raise ValueError("Invalid `batch_size` value")
+        self.top_k = top_k
+        self.pinned_tools = list(pinned_tools)
+        self.index_path = index_path
+        self.model = model
+        self.api_type = api_type
+        if access_token is None:
+            access_token = C.get_global_access_token()
+        self.access_token = access_token
+        self.batch_size = batch_size
+
+        self._embeddings: Dict[str, List[float]] = {}
+        self._query_embeddings: Dict[str, List[float]] = {}
+        if index_path is not None and os.path.exists(index_path):
+            self._load_index(index_path)
+
+    async def select(self, query: str, tool_schemas: Sequence[dict]) -> List[dict]:
+        """Select the schemas of the tools that are relevant to `query`.
+
+        Args:
+            query: The user input.
+            tool_schemas: The function call schemas of all tools.
+
+        Returns:
+            The selected schemas, in the order of `tool_schemas`.
+        """
+        pinned = [schema for schema in tool_schemas if schema["name"] in self.pinned_tools]
+        candidates = [schema for schema in tool_schemas if schema["name"] not in self.pinned_tools]
+        if len(candidates) <= self.top_k:
+            return list(tool_schemas)
+
+        texts = [self._get_tool_text(schema) for schema in candidates]
+        await self._ensure_embeddings(texts)
+        query_embedding = await self._embed_query(query)
+        scores = [_cosine_similarity(query_embedding, self._embeddings[_hash_text(text)]) for text in texts]
+        ranked = sorted(range(len(candidates)), key=lambda idx: scores[idx], reverse=True)
+        selected_names = {schema["name"] for schema in pinned}
+        selected_names.update(candidates[idx]["name"] for idx in ranked[: self.top_k])
+        return [schema for schema in tool_schemas if schema["name"] in selected_names]
+
+    async def _embed(self, texts: List[str]) -> List[List[float]]:
+        embeddings: List[List[float]] = []
+        for i in range(0, len(texts), self.batch_size):
+            resp = await erniebot.Embedding.acreate(
+                model=self.model,
+                input=texts[i : i + self.batch_size],
+                _config_={"api_type": self.api_type, "access_token": self.access_token},
+            )
+            embeddings.extend(item["embedding"] for item in resp["data"])
+        return embeddings
+
+    async def _ensure_embeddings(self, texts: List[str]) -> None:
+        missing: Dict[str, str] = {}
+        for text in texts:
+            key = _hash_text(text)
+            if key not in self._embeddings:
+                missing[key] = text
+        if not missing:
+            return
+        _logger.debug("Embedding %d tools.", len(missing))
+        embeddings = await self._embed(list(missing.values()))
+        for key, embedding in zip(missing.keys(), embeddings):
+            self._embeddings[key] = embedding
+        if self.index_path is not None:
+            self._save_index(self.index_path)
+
+    async def _embed_query(self, query: str) -> List[float]:
+        query = query[:_MAX_TEXT_LENGTH]
+        embedding = self._query_embeddings.get(query, None)
+        if embedding is None:
+            embedding = (await self._embed([query]))[0]
+            if len(self._query_embeddings) >= _MAX_CACHED_QUERIES:
+                self._query_embeddings.pop(next(iter(self._query_embeddings)))
+            self._query_embeddings[query] = embedding
+        return embedding
+
+    def _get_tool_text(self, tool_schema: dict) -> str:
+        text = f"{tool_schema['name']}: {tool_schema.get('description', '')}"
+        return text[:_MAX_TEXT_LENGTH]
+
+    def _load_index(self, path: str) -> None:
+        with open(path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("model", None) != self.model:
+            _logger.warning("The tool index in %s is built with a different model and is ignored.", path)
+            return
+        self._embeddings.update(index["embeddings"])
+
+    def _save_index(self, path: str) -> None:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model, "embeddings": self._embeddings}, f)
+        os.replace(tmp_path, path)
+
+
+def _hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _cosine_similarity(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm > 0 else 0.0
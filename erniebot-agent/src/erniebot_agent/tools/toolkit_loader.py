@@ -0,0 +1,284 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+import aiohttp
+import yaml
+from openapi_spec_validator import validate
+
+from erniebot_agent.file import FileManager
+from erniebot_agent.memory.messages import Message
+from erniebot_agent.tools.remote_toolkit import RemoteToolkit
+from erniebot_agent.tools.schema import Endpoint
+from erniebot_agent.utils import config_from_environ as C
+from erniebot_agent.utils.common import get_cache_dir
+from erniebot_agent.utils.exceptions import RemoteToolError
+from erniebot_agent.utils.http import ClientSessionPool, get_default_session_pool
+
+_logger = logging.getLogger(__name__)
+
+
+class RemoteToolkitLoader(object):
+    """Loads remote toolkits asynchronously, with a disk cache.
+
+    `openapi.yaml` and `examples.yaml` of a toolkit are saved to `cache_dir`
+    together with the `ETag` and `Last-Modified` headers of the responses.
+    When the toolkit is loaded again, the files are requested conditionally,
+    and if the server replies `304 Not Modified`, the cached specs are used
+    without being parsed or validated again.
+
+    The `RemoteToolView` models derived from a spec are kept in memory and
+    shared by all toolkits loaded from the same spec.
+    """
+
+    def __init__(
+        self,
+        *,
+        cache_dir: Optional[str] = None,
+        use_cache: bool = True,
+        validate_specs: bool = True,
+        max_concurrency: int = 8,
+        session_pool: Optional[ClientSessionPool] = None,
+    ) -> None:
+        """Initialize a toolkit loader.
+
+        Args:
+            cache_dir: The directory of the disk cache. If `None`, the
+                `toolkits` directory under the cache directory of erniebot
+                agent will be used.
+            use_cache: Whether to use the disk cache.
+            validate_specs: Whether to validate newly downloaded specs with
+                openapi-spec-validator.
+            max_concurrency: The maximum number of toolkits loaded at the same
+                time by `load_many`.
+            session_pool: The pool of HTTP sessions. If `None`, the default
+                pool will be used.
+
+        Raises:
+            ValueError: if `max_concurrency` is non-positive.
+        """
+        super().__init__()
+        if max_concurrency <= 0:
+            raise ValueError("Invalid `max_concurrency` value")
+        if cache_dir is None and use_cache:
+            cache_dir = os.path.join(get_cache_dir(), "toolkits")
+        self.cache_dir = cache_dir if use_cache else None
+        self.validate_specs = validate_specs
+        self.max_concurrency = max_concurrency
+        self._session_pool = session_pool
+        self._toolkits: Dict[str, RemoteToolkit] = {}
+
+    async def load(
+        self,
+        url: str,
+        version: Optional[str] = None,
+        access_token: Optional[str] = None,
+        file_manager: Optional[FileManager] = None,
+    ) -> RemoteToolkit:
+        """Load the toolkit served at `url`.
+
+        This is the asynchronous counterpart of `RemoteToolkit.from_url`.
+        """
+        if access_token is None:
+            access_token = C.get_global_access_token()
+        url = url.rstrip("/")
+        headers = RemoteToolkit._get_authorization_headers(access_token)
+
+        cache = self._read_cache(url, version)
+        openapi_url = url + "/.well-known/openapi.yaml"
+        if version:
+            openapi_url += "?version=" + version
+        examples_url = url + "/.well-known/examples.yaml"
+        (openapi_entry, openapi_modified), (examples_entry, examples_modified) = await asyncio.gather(
+            self._fetch(openapi_url, headers, cache.get("openapi", None), required=True),
+            self._fetch(examples_url, headers, cache.get("examples", None), required=False),
+        )
+        assert openapi_entry is not None
+
+        if openapi_modified:
+            openapi_entry["spec"] = await self._parse_spec(openapi_entry.pop("content"), openapi_url)
+        if examples_modified and examples_entry is not None:
+            examples_dict = _parse_yaml(examples_entry.pop("content"), examples_url)
+            if not isinstance(examples_dict, dict) or "examples" not in examples_dict:
+                raise RemoteToolError("invalid examples configuration file", stage="Loading")
+            examples_entry["examples"] = examples_dict
+        if openapi_modified or examples_modified:
+            self._write_cache(url, version, {"openapi": openapi_entry, "examples": examples_entry})
+
+        examples: List[Message] = []
+        if examples_entry is not None:
+            examples = RemoteToolkit.load_examples_dict(examples_entry["examples"])
+
+        template = self._get_toolkit_template(openapi_entry["digest"], openapi_entry["spec"], access_token)
+        return dataclasses.replace(
+            template,
+            servers=[dataclasses.replace(server, url=url) for server in template.servers]
+            or [Endpoint(url=url)],
+            paths=list(template.paths),
+            component_schemas=dict(template.component_schemas),
+            headers=headers,
+            file_manager=file_manager,
+            examples=examples,
+        )
+
+    async def load_from_aistudio(
+        self,
+        tool_id: str,
+        version: Optional[str] = None,
+        access_token: Optional[str] = None,
+        file_manager: Optional[FileManager] = None,
+    ) -> RemoteToolkit:
+        """Load the toolkit with `tool_id` from AI Studio.
+
+        This is the asynchronous counterpart of `RemoteToolkit.from_aistudio`.
+        """
+        aistudio_base_url = os.getenv("AISTUDIO_HUB_BASE_URL", RemoteToolkit._AISTUDIO_HUB_BASE_URL)
+        parsed_url = urlparse(aistudio_base_url)
+        tool_url = parsed_url._replace(netloc=f"tool-{tool_id}.{parsed_url.netloc}").geturl()
+        return await self.load(
+            tool_url, version=version, access_token=access_token, file_manager=file_manager
+        )
+
+    async def load_many(
+        self,
+        urls: Sequence[str],
+        access_token: Optional[str] = None,
+        file_manager: Optional[FileManager] = None,
+    ) -> List[RemoteToolkit]:
+        """Load the toolkits served at `urls` concurrently.
+
+        Returns:
+            The toolkits, in the order of `urls`.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def _load(url: str) -> RemoteToolkit:
+            async with semaphore:
+                return await self.load(url, access_token=access_token, file_manager=file_manager)
+
+        return list(await asyncio.gather(*(_load(url) for url in urls)))
+
+    async def _fetch(
+        self, url: str, headers: dict, entry: Optional[dict], *, required: bool
+    ) -> Tuple[Optional[dict], bool]:
+        """Fetch `url`, revalidating the cache entry if there is one.
+
+        Returns:
+            The cache entry and whether it is new. For a new entry, the body is
+            stored in the `content` field.
+        """
+        request_headers = dict(headers)
+        if entry is not None:
+            if entry.get("etag", None):
+                request_headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified", None):
+                request_headers["If-Modified-Since"] = entry["last_modified"]
+
+        session_pool = self._session_pool or get_default_session_pool()
+        session = session_pool.get_session(url)
+        try:
+            async with session.request("GET", url, headers=request_headers) as response:
+                status = response.status
+                response_headers = response.headers
+                content = await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise RemoteToolError(f"Failed to request `{url}`: {repr(e)}", stage="Loading") from e
+
+        if status == 304 and entry is not None:
+            return entry, False
+        if status == 404 and not required:
+            return None, entry is not None
+        if status != 200:
+            _logger.debug(f"The resource requested returned the following headers: {response_headers}")
+            raise RemoteToolError(
+                f"`{url}` returned {status}: {content.decode('utf-8', errors='replace')}", stage="Loading"
+            )
+        text = content.decode("utf-8")
+        if not text.strip():
+            raise RemoteToolError(f"the content is empty from: {url}", stage="Loading")
+        new_entry = {
+            "etag": response_headers.get("ETag", None),
+            "last_modified": response_headers.get("Last-Modified", None),
+            "digest": hashlib.sha256(content).hexdigest(),
+            "content": text,
+        }
+        return new_entry, True
+
+    async def _parse_spec(self, content: str, url: str) -> dict:
+        spec_dict = _parse_yaml(content, url)
+        if not isinstance(spec_dict, dict):
+            raise RemoteToolError(f"invalid openapi yaml file: {url}", stage="Loading")
+        if self.validate_specs:
+            # Validation is slow, so it is done in a thread to let other
+            # toolkits be downloaded in the meantime.
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(None, validate, spec_dict)
+            except Exception as e:
+                raise RemoteToolError(f"invalid openapi yaml file: {url}: {e}", stage="Loading") from e
+        return spec_dict
+
+    def _get_toolkit_template(
+        self, digest: str, spec_dict: dict, access_token: Optional[str]
+    ) -> RemoteToolkit:
+        template = self._toolkits.get(digest, None)
+        if template is None:
+            template = RemoteToolkit.from_openapi_dict(spec_dict, access_token=access_token)
+            self._toolkits[digest] = template
+        return template
+
+    def _get_cache_path(self, url: str, version: Optional[str]) -> Optional[str]:
+        if self.cache_dir is None:
+            return None
+        key = hashlib.sha256(f"{url}?version={version or ''}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _read_cache(self, url: str, version: Optional[str]) -> Dict[str, Any]:
+        path = self._get_cache_path(url, version)
+        if path is None or not os.path.exists(path):
+            return {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            _logger.warning("Failed to read the toolkit cache %s: %s", path, e)
+            return {}
+
+    def _write_cache(self, url: str, version: Optional[str], cache: Dict[str, Any]) -> None:
+        path = self._get_cache_path(url, version)
+        if path is None:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            # YAML values such as dates are not JSON serializable.
+            json.dump(cache, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+
+
+def _parse_yaml(content: str, url: str) -> Any:
+    try:
+        return yaml.safe_load(content)
+    except yaml.YAMLError as e:
+        raise RemoteToolError(f"invalid yaml file: {url}: {e}", stage="Loading") from e
@@ -1,15 +1,32 @@
+import asyncio
 import base64
+import codecs
+import functools
 import inspect
+import io
 import logging
+import os
 import typing
 from copy import deepcopy
-from typing import Any, Dict, Optional, Type, no_type_check
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+    no_type_check,
+)
 
 from openapi_spec_validator import validate
 from openapi_spec_validator.readers import read_from_filename
 from requests import Response
 
 from erniebot_agent.file import File, FileManager
+from erniebot_agent.file.local_file import LocalFile
 from erniebot_agent.file.protocol import (
     FilePurpose,
     is_local_file_id,
@@ -22,9 +39,18 @@ from erniebot_agent.tools.schema import (
 )
 from erniebot_agent.utils.common import get_file_suffix, import_module, is_json_response
 from erniebot_agent.utils.exceptions import RemoteToolError
+from erniebot_agent.utils.http import HTTPResponse
 
 _logger = logging.getLogger(__name__)
 
+MAX_CONCURRENT_FILE_OPERATIONS = 8
+
+# A multiple of 3, so that each chunk is encoded without padding.
+_BASE64_CHUNK_SIZE = 3 * 256 * 1024
+
+# A pending file operation and where to store its result.
+_FileOperation = Tuple[Union[dict, list], Any, Callable[[], Awaitable[Any]]]
+
 
 def tool_response_contains_file(element: Any):
     if isinstance(element, str):
@@ -198,7 +224,12 @@ async def create_file_from_data(
 ) -> File:
     file_suffix = get_file_suffix(mime_type)
     if format == "byte":
-        content = base64.b64decode(content)
+        return await file_manager.create_file_from_base64(
+            content,
+            f"tool-{file_suffix}",
+            file_purpose=file_purpose,
+            file_metadata=file_metadata,
+        )
 
     return await file_manager.create_file_from_bytes(
         content,
@@ -211,13 +242,46 @@ async def create_file_from_data(
 async def get_content_by_file_id(file_id: str, format: str, file_manager: FileManager) -> str:
     file_id = file_id.replace("<file>", "").replace("</file>", "")
     file = file_manager.look_up_file_by_id(file_id)
-    byte_str = await file.read_contents()
     if format == "byte":
-        byte_str = base64.b64encode(byte_str)
+        loop = asyncio.get_running_loop()
+        if isinstance(file, LocalFile):
+            return await loop.run_in_executor(None, _encode_file_base64, file.path)
+        return await loop.run_in_executor(None, _encode_base64, await file.read_contents())
 
+    byte_str = await file.read_contents()
     return byte_str.decode()
 
 
+def _encode_base64(contents: bytes) -> str:
+    return base64.b64encode(contents).decode("ascii")
+
+
+def _encode_file_base64(file_path: Union[str, os.PathLike]) -> str:
+    # Read and encode the file in chunks, so that the raw contents are not
+    # held in memory together with the encoded contents.
+    buffer = io.BytesIO()
+    with open(file_path, "rb") as f:
+        while True:
+            chunk = f.read(_BASE64_CHUNK_SIZE)
+            if not chunk:
+                break
+            buffer.write(base64.b64encode(chunk))
+    return codecs.decode(buffer.getbuffer(), "ascii")
+
+
+async def _run_file_operations(operations: List[_FileOperation], max_concurrency: int) -> None:
+    """Run the file operations concurrently and store the results in place."""
+    if len(operations) == 0:
+        return
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _run(container: Union[dict, list], key: Any, operation: Callable[[], Awaitable[Any]]) -> None:
+        async with semaphore:
+            container[key] = await operation()
+
+    await asyncio.gather(*(_run(*operation) for operation in operations))
+
+
 def is_file_config(json_schema_extra: dict) -> bool:
     """check wheter is file-config
 
@@ -232,7 +296,24 @@ def is_file_config(json_schema_extra: dict) -> bool:
 
 @no_type_check
 async def parse_json_request(
-    view: Type[ToolParameterView], json_dict, file_manager: FileManager
+    view: Type[ToolParameterView],
+    json_dict,
+    file_manager: FileManager,
+    max_concurrency: int = MAX_CONCURRENT_FILE_OPERATIONS,
+) -> Dict[str, Any]:
+    """Replace the file IDs in the request with the contents of the files.
+
+    The files are read concurrently, at most `max_concurrency` at a time.
+    """
+    operations: List[_FileOperation] = []
+    result = _collect_request_files(view, json_dict, file_manager, operations)
+    await _run_file_operations(operations, max_concurrency)
+    return result
+
+
+@no_type_check
+def _collect_request_files(
+    view: Type[ToolParameterView], json_dict, file_manager: FileManager, operations: List[_FileOperation]
 ) -> Dict[str, Any]:
     result = {}
     for field_name, model_field in view.model_fields.items():
@@ -249,16 +330,26 @@ async def parse_json_request(
             if model_field.annotation == str and is_file_config(model_field.json_schema_extra):
                 format = model_field.json_schema_extra.get("format", None)
 
-                if format is not None:
-                    file_content = await get_content_by_file_id(
-                        json_dict[field_name], format=format, file_manager=file_manager
+                if format is not None and field_name in json_dict:
+                    result[field_name] = None
+                    operations.append(
+                        (
+                            result,
+                            field_name,
+                            functools.partial(
+                                get_content_by_file_id,
+                                json_dict[field_name],
+                                format=format,
+                                file_manager=file_manager,
+                            ),
+                        )
                     )
-                    result[field_name] = file_content
             elif issubclass(model_field.annotation, ToolParameterView):
-                files = await parse_json_request(
+                files = _collect_request_files(
                     model_field.annotation,
                     json_dict[field_name],
-                    file_manager=file_manager,
+                    file_manager,
+                    operations,
                 )
                 if len(files) > 0:
                     result[field_name] = files
@@ -268,21 +359,27 @@ async def parse_json_request(
             sub_class = get_args(model_field.annotation)[0]
             if list_type == "string" and is_file_config(array_json_schema):
                 format = array_json_schema["format"]
-                files = []
-                for file_id in json_dict[field_name]:
-                    file_content = await get_content_by_file_id(
-                        file_id,
-                        format=format,
-                        file_manager=file_manager,
+                files = [None] * len(json_dict[field_name])
+                for idx, file_id in enumerate(json_dict[field_name]):
+                    operations.append(
+                        (
+                            files,
+                            idx,
+                            functools.partial(
+                                get_content_by_file_id,
+                                file_id,
+                                format=format,
+                                file_manager=file_manager,
+                            ),
+                        )
                     )
-                    files.append(file_content)
 
                 result[field_name] = files
 
             elif list_type == "object":
                 sub_file_result = []
                 for file_dict in json_dict[field_name]:
-                    sub_file = await parse_json_request(sub_class, file_dict, file_manager)
+                    sub_file = _collect_request_files(sub_class, file_dict, file_manager, operations)
                     if len(sub_file) > 0:
                         sub_file_result.append(sub_file)
 
@@ -301,9 +398,35 @@ async def parse_json_request(
     return result
 
 
-@no_type_check
 async def parse_json_response(
-    view: Type[ToolParameterView], json_dict, file_manager: FileManager, file_metadata: Dict[str, str]
+    view: Type[ToolParameterView],
+    json_dict,
+    file_manager: FileManager,
+    file_metadata: Dict[str, str],
+    max_concurrency: int = MAX_CONCURRENT_FILE_OPERATIONS,
+) -> Dict[str, Any]:
+    """Replace the file contents in the response with the IDs of new files.
+
+    The files are created concurrently, at most `max_concurrency` at a time.
+    """
+    operations: List[_FileOperation] = []
+    result = _collect_response_files(view, json_dict, file_manager, file_metadata, operations)
+    await _run_file_operations(operations, max_concurrency)
+    return result
+
+
+async def _create_file_id_from_data(*args: Any, **kwargs: Any) -> str:
+    file = await create_file_from_data(*args, **kwargs)
+    return file.id
+
+
+@no_type_check
+def _collect_response_files(
+    view: Type[ToolParameterView],
+    json_dict,
+    file_manager: FileManager,
+    file_metadata: Dict[str, str],
+    operations: List[_FileOperation],
 ) -> Dict[str, Any]:
     result = {}
     for field_name, model_field in view.model_fields.items():
@@ -322,20 +445,28 @@ async def parse_json_response(
                 mime_type = model_field.json_schema_extra.get("x-ebagent-file-mime-type", None)
 
                 if format is not None and mime_type is not None:
-                    file = await create_file_from_data(
-                        json_dict[field_name],
-                        format=format,
-                        mime_type=mime_type,
-                        file_manager=file_manager,
-                        file_metadata=file_metadata,
+                    result[field_name] = None
+                    operations.append(
+                        (
+                            result,
+                            field_name,
+                            functools.partial(
+                                _create_file_id_from_data,
+                                json_dict[field_name],
+                                format=format,
+                                mime_type=mime_type,
+                                file_manager=file_manager,
+                                file_metadata=file_metadata,
+                            ),
+                        )
                     )
-                    result[field_name] = file.id
             elif issubclass(model_field.annotation, ToolParameterView):
-                files = await parse_json_response(
+                files = _collect_response_files(
                     model_field.annotation,
                     json_dict[field_name],
-                    file_manager=file_manager,
-                    file_metadata=file_metadata,
+                    file_manager,
+                    file_metadata,
+                    operations,
                 )
                 if len(files) > 0:
                     result[field_name] = files
@@ -350,21 +481,29 @@ async def parse_json_response(
             ):
                 format = array_json_schema["format"]
                 mime_type = array_json_schema["x-ebagent-file-mime-type"]
-                files = []
-                for file_content in json_dict[field_name]:
-                    file = await create_file_from_data(
-                        file_content,
-                        format=format,
-                        mime_type=mime_type,
-                        file_manager=file_manager,
-                        file_metadata=file_metadata,
+                files = [None] * len(json_dict[field_name])
+                for idx, file_content in enumerate(json_dict[field_name]):
+                    operations.append(
+                        (
+                            files,
+                            idx,
+                            functools.partial(
+                                _create_file_id_from_data,
+                                file_content,
+                                format=format,
+                                mime_type=mime_type,
+                                file_manager=file_manager,
+                                file_metadata=file_metadata,
+                            ),
+                        )
                     )
-                    files.append(file.id)
                 result[field_name] = files
             elif list_type == "object":
                 sub_file_result = []
                 for file_dict in json_dict[field_name]:
-                    sub_file = await parse_json_response(sub_class, file_dict, file_manager, file_metadata)
+                    sub_file = _collect_response_files(
+                        sub_class, file_dict, file_manager, file_metadata, operations
+                    )
                     if len(sub_file) > 0:
                         sub_file_result.append(sub_file)
 
@@ -385,7 +524,7 @@ async def parse_json_response(
 
 
 async def parse_response(
-    response: Response,
+    response: Union[Response, HTTPResponse],
     file_manager: FileManager,
     file_metadata: Dict[str, str] = {},
     tool_parameter_view: Optional[Type[ToolParameterView]] = None,
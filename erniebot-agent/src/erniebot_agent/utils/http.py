@@ -14,7 +14,18 @@
 
 from __future__ import annotations
 
+import asyncio
+import functools
+import json
+import threading
+import weakref
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+import asyncio_atexit  # type: ignore
 import requests
+from multidict import CIMultiDict
 
 
 def is_url(path):
@@ -43,3 +54,122 @@ def url_file_exists(url: str, headers: dict) -> bool:
 
     result = requests.head(url, headers=headers)
     return result.status_code == requests.codes.ok
+
+
+class HTTPResponse(object):
+    """A fully read HTTP response.
+
+    It provides the subset of the `requests.Response` interface used to parse
+    tool responses, so that the body can be parsed after the connection is
+    released.
+    """
+
+    def __init__(self, status_code: int, headers: CIMultiDict, content: bytes) -> None:
+        super().__init__()
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    @classmethod
+    async def from_aiohttp_response(cls, response: aiohttp.ClientResponse) -> "HTTPResponse":
+        content = await response.read()
+        return cls(response.status, CIMultiDict(response.headers), content)
+
+
+class ClientSessionPool(object):
+    """Pool of aiohttp sessions shared by all requests to the same server.
+
+    One session is created per event loop and per server origin (scheme, host,
+    and port), so that connections are kept alive and reused across tool
+    calls. The sessions of an event loop are closed when the loop closes.
+    """
+
+    def __init__(
+        self,
+        *,
+        limit_per_host: int = 16,
+        connect_timeout: Optional[float] = 10,
+        read_timeout: Optional[float] = 300,
+        keepalive_timeout: float = 30,
+    ) -> None:
+        """Initializes the pool.
+
+        Args:
+            limit_per_host: Maximum number of simultaneous connections to a
+                server.
+            connect_timeout: Seconds to wait for a connection to be
+                established, including waiting for a free connection in the
+                pool.
+            read_timeout: Seconds to wait for data to be read from the server.
+            keepalive_timeout: Seconds an idle connection is kept open.
+        """
+        super().__init__()
+        self.limit_per_host = limit_per_host
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.keepalive_timeout = keepalive_timeout
+        self._sessions: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, Dict[str, aiohttp.ClientSession]
+        ] = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def get_session(self, server_url: str) -> aiohttp.ClientSession:
+        """Returns the session for `server_url` on the running event loop."""
+        loop = asyncio.get_running_loop()
+        origin = _get_origin(server_url)
+        with self._lock:
+            sessions = self._sessions.get(loop, None)
+            if sessions is None:
+                sessions = self._sessions[loop] = {}
+                asyncio_atexit.register(functools.partial(self._close_sessions, loop), loop=loop)
+            session = sessions.get(origin, None)
+            if session is None or session.closed:
+                session = sessions[origin] = self._create_session()
+        return session
+
+    async def close(self) -> None:
+        """Closes the sessions of the running event loop."""
+        await self._close_sessions(asyncio.get_running_loop())
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=0, limit_per_host=self.limit_per_host, keepalive_timeout=self.keepalive_timeout
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=None, connect=self.connect_timeout, sock_read=self.read_timeout
+        )
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def _close_sessions(self, loop: asyncio.AbstractEventLoop) -> None:
+        with self._lock:
+            sessions = self._sessions.get(loop, None)
+            if sessions is None:
+                return
+            to_close = list(sessions.values())
+            sessions.clear()
+        for session in to_close:
+            await session.close()
+
+
+_default_session_pool: Optional[ClientSessionPool] = None
+_default_session_pool_lock = threading.Lock()
+
+
+def get_default_session_pool() -> ClientSessionPool:
+    global _default_session_pool
+    with _default_session_pool_lock:
+        if _default_session_pool is None:
+            _default_session_pool = ClientSessionPool()
+        return _default_session_pool
+
+
+def _get_origin(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
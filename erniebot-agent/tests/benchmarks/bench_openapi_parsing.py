@@ -0,0 +1,61 @@
+"""Measures parsing an OpenAPI spec into a toolkit and validating tool arguments.
+
+Usage:
+    python -m tests.benchmarks.bench_openapi_parsing [--num-endpoints 200] [--num-calls 20000]
+
+Each endpoint has its own request and response schemas. The first parse
+creates the pydantic models; later parses of the same spec, e.g. when an agent
+is built per session, reuse the cached models.
+"""
+
+import argparse
+import time
+import timeit
+
+from erniebot_agent.tools import RemoteToolkit
+from erniebot_agent.tools.schema import clear_parameter_view_registry
+from tests.benchmarks.bench_tool_schemas import _create_openapi_dict
+
+
+def _create_distinct_openapi_dict(num_endpoints):
+    openapi_dict, _ = _create_openapi_dict(num_endpoints)
+    schemas = openapi_dict["components"]["schemas"]
+    for i in range(num_endpoints):
+        schemas[f"request_{i}"]["properties"]["query"]["description"] = f"第{i}个工具的查询内容"
+        schemas[f"response_{i}"]["properties"]["results"]["description"] = f"第{i}个工具的结果列表"
+    return openapi_dict
+
+
+def _parse(openapi_dict):
+    start = time.perf_counter()
+    toolkit = RemoteToolkit.from_openapi_dict(openapi_dict, access_token="bench")
+    return toolkit, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-endpoints", type=int, default=200)
+    parser.add_argument("--num-calls", type=int, default=20000)
+    args = parser.parse_args()
+
+    openapi_dict = _create_distinct_openapi_dict(args.num_endpoints)
+    clear_parameter_view_registry()
+    toolkit, cold = _parse(openapi_dict)
+    _, warm = _parse(openapi_dict)
+
+    parameters = toolkit.paths[0].parameters
+    arguments = {"query": "天气", "limit": 10, "tags": ["a", "b"]}
+    model_dump = timeit.timeit(
+        lambda: parameters(**arguments).model_dump(mode="json"), number=args.num_calls
+    )
+    validate_to_json = timeit.timeit(lambda: parameters.validate_to_json(arguments), number=args.num_calls)
+
+    print(f"Endpoints: {args.num_endpoints}")
+    print(f"Parse with empty model registry: {cold * 1000:.1f} ms")
+    print(f"Parse with cached models:        {warm * 1000:.1f} ms")
+    print(f"Arguments via model_dump:        {model_dump / args.num_calls * 1e6:.2f} us/call")
+    print(f"Arguments via validate_to_json:  {validate_to_json / args.num_calls * 1e6:.2f} us/call")
+
+
+if __name__ == "__main__":
+    main()
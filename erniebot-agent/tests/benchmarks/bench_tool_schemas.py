@@ -0,0 +1,132 @@
+"""Measures the overhead of an agent step with many remote tools.
+
+Usage:
+    python -m tests.benchmarks.bench_tool_schemas [--num-tools 50] [--num-steps 200]
+
+The LLM is faked, so the reported time is the overhead of preparing an LLM
+request (mainly the function call schemas of the tools) in each step.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from erniebot_agent.agents import FunctionAgent
+from erniebot_agent.chat_models.erniebot import BaseERNIEBot
+from erniebot_agent.memory import AIMessage, HumanMessage, WholeMemory
+from erniebot_agent.tools import RemoteToolkit
+
+
+class _InstantERNIEBot(BaseERNIEBot):
+    def __init__(self):
+        super().__init__("instant")
+
+    async def chat(self, messages, *, stream=False, functions=None, **kwargs):
+        # Serialize the request like a real client does.
+        json.dumps(functions, ensure_ascii=False)
+        return AIMessage("Done.", function_call=None)
+
+
+def _create_openapi_dict(num_tools):
+    paths, schemas, examples = {}, {}, []
+    for i in range(num_tools):
+        paths[f"/tool_{i}"] = {
+            "post": {
+                "operationId": f"tool_{i}",
+                "description": f"第{i}个工具，根据查询内容返回对应的结果列表。",
+                "requestBody": {
+                    "content": {
+                        "application/json": {"schema": {"$ref": f"#/components/schemas/request_{i}"}}
+                    }
+                },
+                "responses": {
+                    "200": {
+                        "description": "成功",
+                        "content": {
+                            "application/json": {"schema": {"$ref": f"#/components/schemas/response_{i}"}}
+                        },
+                    }
+                },
+            }
+        }
+        schemas[f"request_{i}"] = {
+            "type": "object",
+            "required": ["query"],
+            "properties": {
+                "query": {"type": "string", "description": "查询内容"},
+                "limit": {"type": "integer", "description": "返回结果的数量"},
+                "tags": {"type": "array", "items": {"type": "string"}, "description": "标签"},
+            },
+        }
+        schemas[f"response_{i}"] = {
+            "type": "object",
+            "properties": {
+                "results": {
+                    "type": "array",
+                    "description": "结果列表",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "title": {"type": "string", "description": "标题"},
+                            "score": {"type": "number", "description": "相关度"},
+                        },
+                    },
+                }
+            },
+        }
+        examples.append(
+            {
+                "context": [
+                    {"role": "user", "content": f"用第{i}个工具查询天气"},
+                    {
+                        "role": "bot",
+                        "plugin": {
+                            "operationId": f"tool_{i}",
+                            "thoughts": "需要查询天气",
+                            "requestArguments": {"query": "天气"},
+                        },
+                    },
+                ]
+            }
+        )
+    openapi_dict = {
+        "openapi": "3.0.1",
+        "info": {"title": "bench", "description": "benchmark", "version": "v1"},
+        "servers": [{"url": "http://127.0.0.1"}],
+        "paths": paths,
+        "components": {"schemas": schemas},
+    }
+    return openapi_dict, {"examples": examples}
+
+
+async def _measure(agent, num_steps, clear_cache):
+    messages = [HumanMessage("你好")]
+    start = time.perf_counter()
+    for _ in range(num_steps):
+        if clear_cache:
+            agent._tool_manager.clear_schema_cache()
+        await agent.run_llm(messages)
+    return (time.perf_counter() - start) / num_steps
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-tools", type=int, default=50)
+    parser.add_argument("--num-steps", type=int, default=200)
+    args = parser.parse_args()
+
+    openapi_dict, examples_dict = _create_openapi_dict(args.num_tools)
+    toolkit = RemoteToolkit.from_openapi_dict(openapi_dict, access_token="bench")
+    toolkit.examples = RemoteToolkit.load_examples_dict(examples_dict)
+    agent = FunctionAgent(llm=_InstantERNIEBot(), tools=toolkit.get_tools(), memory=WholeMemory())
+
+    uncached = await _measure(agent, args.num_steps, clear_cache=True)
+    cached = await _measure(agent, args.num_steps, clear_cache=False)
+    print(f"Tools: {args.num_tools}, steps: {args.num_steps}")
+    print(f"Step overhead without schema cache: {uncached * 1000:.3f} ms")
+    print(f"Step overhead with schema cache:    {cached * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,13 +1,15 @@
+import asyncio
 import json
 
 import pytest
 
 from erniebot_agent.agents import FunctionAgent
 from erniebot_agent.memory import AIMessage, HumanMessage
-from erniebot_agent.memory.messages import FunctionCall
+from erniebot_agent.memory.messages import FunctionCall, FunctionMessage
 from tests.unit_tests.testing_utils.components import CountingCallbackHandler
 from tests.unit_tests.testing_utils.mocks.mock_chat_models import (
     FakeERNIEBotWithPresetResponses,
+    FakeERNIEBotWithToolChoice,
     FakeSimpleChatModel,
 )
 from tests.unit_tests.testing_utils.mocks.mock_memory import FakeMemory
@@ -231,3 +233,109 @@ async def test_function_agent_system():
     )
     response = await agent.run("Run!")
     assert "Recieved system message" in response.text
+
+
+class RunningCounter(object):
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+
+
+class SleepTool(FakeTool):
+    def __init__(self, name, delay, counter=None):
+        super().__init__(
+            name=name,
+            description="This tool sleeps for a while.",
+            parameters={"type": "object", "properties": {}},
+            responses={"type": "object", "properties": {}},
+            function=None,
+        )
+        self.delay = delay
+        # Tools sharing a counter track how many of them run at once.
+        self.counter = counter if counter is not None else RunningCounter()
+        self.num_finished = 0
+
+    @property
+    def max_running(self):
+        return self.counter.max_running
+
+    async def __call__(self):
+        self.counter.running += 1
+        self.counter.max_running = max(self.counter.max_running, self.counter.running)
+        await asyncio.sleep(self.delay)
+        self.counter.running -= 1
+        self.num_finished += 1
+        return {"name": self.name}
+
+
+class FailingTool(SleepTool):
+    async def __call__(self):
+        await asyncio.sleep(self.delay)
+        raise RuntimeError("The tool failed.")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("max_concurrent_tools", [1, 3])
+async def test_function_agent_first_tools(max_concurrent_tools):
+    counter = RunningCounter()
+    tools = [
+        SleepTool("slow_tool", 0.02, counter),
+        SleepTool("fast_tool", 0.01, counter),
+        SleepTool("other_tool", 0.01, counter),
+    ]
+    agent = FunctionAgent(
+        llm=FakeERNIEBotWithToolChoice(),
+        tools=tools,
+        memory=FakeMemory(),
+        first_tools=tools,
+        max_concurrent_tools=max_concurrent_tools,
+    )
+
+    response = await agent.run("Run!")
+
+    assert response.status == "FINISHED"
+    # The results are in call order even if the slow tool finishes last.
+    assert [step.info["tool_name"] for step in response.steps] == [tool.name for tool in tools]
+    function_messages = [msg for msg in response.chat_history if isinstance(msg, FunctionMessage)]
+    assert [msg.name for msg in function_messages] == [tool.name for tool in tools]
+    assert counter.max_running == max_concurrent_tools
+
+
+@pytest.mark.asyncio
+async def test_function_agent_max_concurrent_tools():
+    tool = SleepTool("sleep_tool", 0.1)
+    agent = FunctionAgent(
+        llm=FakeERNIEBotWithToolChoice(),
+        tools=[tool],
+        memory=FakeMemory(),
+        first_tools=[tool] * 4,
+        max_concurrent_tools=2,
+    )
+
+    response = await agent.run("Run!")
+
+    assert len(response.steps) == 4
+    assert tool.max_running == 2
+
+    with pytest.raises(ValueError):
+        FunctionAgent(llm=FakeERNIEBotWithToolChoice(), tools=[], max_concurrent_tools=0)
+
+
+@pytest.mark.asyncio
+async def test_function_agent_cancels_first_tools_when_one_fails():
+    slow_tool = SleepTool("slow_tool", 0.2)
+    tools = [slow_tool, FailingTool("failing_tool", 0.01)]
+    agent = FunctionAgent(
+        llm=FakeERNIEBotWithToolChoice(),
+        tools=tools,
+        memory=FakeMemory(),
+        first_tools=tools,
+        max_concurrent_tools=2,
+    )
+
+    with pytest.raises(RuntimeError, match="The tool failed."):
+        await agent.run("Run!")
+
+    assert asyncio.all_tasks() == {asyncio.current_task()}
+    await asyncio.sleep(0.3)
+    assert slow_tool.num_finished == 0
@@ -0,0 +1,29 @@
+import base64
+from unittest import mock
+
+import pytest
+
+import erniebot_agent.file.file_manager as file_manager_module
+from erniebot_agent.file import FileManager
+from erniebot_agent.utils.exceptions import FileError
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("as_bytes", [False, True])
+async def test_create_file_from_base64_ignores_non_alphabet_characters(as_bytes):
+    contents = bytes(range(256)) * 4
+    encoded = base64.b64encode(contents).decode("ascii")
+    # Insert characters outside the alphabet at positions that are not
+    # multiples of 4.
+    data = "\t".join(encoded[i : i + 7] for i in range(0, len(encoded), 7)) + "\f"
+    if as_bytes:
+        data = data.encode("ascii")
+
+    # Use small chunks, so that misaligned chunks would corrupt the data.
+    with mock.patch.object(file_manager_module, "_BASE64_CHUNK_SIZE", 16):
+        async with FileManager() as file_manager:
+            file = await file_manager.create_file_from_base64(data, "data.bin", file_type="local")
+            assert await file.read_contents() == contents
+
+            with pytest.raises(FileError):
+                await file_manager.create_file_from_base64("abc", "invalid.bin", file_type="local")
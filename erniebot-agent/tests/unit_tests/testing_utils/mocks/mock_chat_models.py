@@ -1,6 +1,7 @@
 from erniebot_agent.chat_models.base import ChatModel
 from erniebot_agent.chat_models.erniebot import BaseERNIEBot, ERNIEBot
 from erniebot_agent.memory import AIMessage
+from erniebot_agent.memory.messages import FunctionCall
 
 
 class FakeSimpleChatModel(ChatModel):
@@ -35,6 +36,33 @@ class FakeERNIEBotWithPresetResponses(BaseERNIEBot):
         return response
 
 
+class FakeERNIEBotWithToolChoice(BaseERNIEBot):
+    """Calls the tool in `tool_choice` if given, and finishes otherwise."""
+
+    def __init__(self):
+        super().__init__("erniebot_with_tool_choice")
+
+    async def chat(self, messages, *, stream=False, functions=None, tool_choice=None, **kwargs):
+        if stream:
+            raise ValueError("Streaming is not supported.")
+        if tool_choice is None:
+            return AIMessage("Done.", function_call=None)
+        function_call = FunctionCall(name=tool_choice["function"]["name"], thoughts="", arguments="{}")
+        return AIMessage("", function_call=function_call)
+
+
+class RecordingERNIEBot(BaseERNIEBot):
+    """Records the functions passed to each call, and finishes."""
+
+    def __init__(self, model="ernie-3.5"):
+        super().__init__(model)
+        self.functions = []
+
+    async def chat(self, messages, *, stream=False, functions=None, **kwargs):
+        self.functions.append(functions)
+        return AIMessage("Done.", function_call=None)
+
+
 class FakeERNIEBotWithAllInput(ERNIEBot):
     def __init__(
         self,
@@ -0,0 +1,83 @@
+import contextlib
+import functools
+import json as jsonlib
+from unittest import mock
+from urllib.parse import urlsplit, urlunsplit
+
+from multidict import CIMultiDict
+
+from erniebot_agent.utils.http import ClientSessionPool
+
+
+class FakeClientSessionPool(ClientSessionPool):
+    """Session pool that serves registered responses instead of sending requests."""
+
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+        self._responses = {}
+
+    def add(self, method, url, *, json=None, body=b"", status=200, headers=None):
+        headers = CIMultiDict(headers or {})
+        if json is not None:
+            body = jsonlib.dumps(json).encode("utf-8")
+            headers.setdefault("Content-Type", "application/json")
+        self._responses[(method.upper(), url)] = FakeResponse(status, headers, body)
+
+    def get(self, url, **kwargs):
+        self.add("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        self.add("POST", url, **kwargs)
+
+    def get_session(self, server_url):
+        return FakeClientSession(self)
+
+    async def close(self):
+        pass
+
+    def find_response(self, method, url):
+        response = self._responses.get((method, url), None)
+        if response is None:
+            # Like `responses`, the query string is ignored if the registered
+            # URL has none.
+            parts = urlsplit(url)
+            url_without_query = urlunsplit(parts._replace(query=""))
+            response = self._responses.get((method, url_without_query), None)
+        if response is None:
+            raise ConnectionRefusedError(f"No response is registered for {method} {url}")
+        return response
+
+
+class FakeClientSession(object):
+    def __init__(self, pool):
+        super().__init__()
+        self._pool = pool
+
+    @contextlib.asynccontextmanager
+    async def request(self, method, url, **kwargs):
+        self._pool.requests.append((method, url, kwargs))
+        yield self._pool.find_response(method, url)
+
+
+class FakeResponse(object):
+    def __init__(self, status, headers, body):
+        super().__init__()
+        self.status = status
+        self.headers = headers
+        self._body = body
+
+    async def read(self):
+        return self._body
+
+
+def mock_session_pool(func):
+    """Passes a `FakeClientSessionPool` used by all remote tools to the test."""
+
+    @functools.wraps(func)
+    async def _wrapper(*args, **kwargs):
+        pool = FakeClientSessionPool()
+        with mock.patch("erniebot_agent.tools.remote_tool.get_default_session_pool", return_value=pool):
+            return await func(*args, pool, **kwargs)
+
+    return _wrapper
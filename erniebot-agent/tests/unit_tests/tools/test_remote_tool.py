@@ -0,0 +1,198 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+
+import requests
+from aiohttp import web
+
+from erniebot_agent.file import FileManager
+from erniebot_agent.tools import RemoteToolkit
+from erniebot_agent.tools.remote_tool import RemoteTool
+from erniebot_agent.utils.exceptions import RemoteToolError
+from erniebot_agent.utils.http import ClientSessionPool
+
+OPENAPI_DICT = {
+    "openapi": "3.0.1",
+    "info": {"title": "TestTool", "description": "测试工具", "version": "v1"},
+    "servers": [{"url": "http://placeholder"}],
+    "paths": {
+        "/echo": {
+            "post": {
+                "operationId": "echo",
+                "description": "返回输入的文本",
+                "requestBody": {
+                    "content": {"application/json": {"schema": {"$ref": "#/components/schemas/echoRequest"}}}
+                },
+            }
+        },
+        "/search": {
+            "get": {
+                "operationId": "search",
+                "description": "搜索",
+                "requestBody": {
+                    "content": {
+                        "application/json": {"schema": {"$ref": "#/components/schemas/searchRequest"}}
+                    }
+                },
+            }
+        },
+        "/upload": {
+            "post": {
+                "operationId": "upload",
+                "description": "上传文件",
+                "requestBody": {
+                    "content": {
+                        "multipart/form-data": {"schema": {"$ref": "#/components/schemas/uploadRequest"}}
+                    }
+                },
+            }
+        },
+    },
+    "components": {
+        "schemas": {
+            "echoRequest": {
+                "type": "object",
+                "properties": {
+                    "text": {"type": "string", "description": "文本"},
+                    "delay": {"type": "number", "description": "延迟"},
+                },
+            },
+            "searchRequest": {
+                "type": "object",
+                "properties": {
+                    "query": {"type": "string", "description": "查询"},
+                    "page": {"type": "integer", "description": "页码"},
+                },
+            },
+            "uploadRequest": {
+                "type": "object",
+                "required": ["file"],
+                "properties": {
+                    "file": {"type": "string", "format": "binary", "description": "文件的 ID"},
+                    "name": {"type": "string", "description": "名称"},
+                },
+            },
+        }
+    },
+}
+
+
+class TestRemoteTool(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.peers = set()
+        app = web.Application()
+        app.router.add_post("/echo", self._echo)
+        app.router.add_get("/search", self._search)
+        app.router.add_post("/upload", self._upload)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.server_url = f"http://127.0.0.1:{port}"
+
+        self.file_manager = FileManager()
+        self.session_pool = ClientSessionPool(read_timeout=1)
+        self.toolkit = RemoteToolkit.from_openapi_dict(
+            OPENAPI_DICT, access_token="test-token", file_manager=self.file_manager
+        )
+        self.toolkit.servers[0].url = self.server_url
+
+    async def asyncTearDown(self):
+        await self.session_pool.close()
+        await self.file_manager.close()
+        await self.runner.cleanup()
+
+    async def _echo(self, request):
+        self.peers.add(request.transport.get_extra_info("peername"))
+        body = await request.json()
+        await asyncio.sleep(body.get("delay", 0))
+        return web.json_response({"text": body["text"]})
+
+    async def _search(self, request):
+        query = dict(request.query)
+        query.pop("version")
+        return web.json_response(query)
+
+    async def _upload(self, request):
+        form = await request.post()
+        return web.json_response(
+            {
+                "filename": form["file"].filename,
+                "content": form["file"].file.read().decode("utf-8"),
+                "name": form["name"],
+            }
+        )
+
+    def _get_tool(self, tool_name, tool_class=RemoteTool):
+        tool = self.toolkit.get_tool(tool_name)
+        return tool_class(
+            tool.tool_view,
+            self.server_url,
+            self.toolkit.headers,
+            self.toolkit.info.version,
+            file_manager=self.file_manager,
+            session_pool=self.session_pool,
+        )
+
+    async def test_concurrent_calls_do_not_block_event_loop(self):
+        tool = self._get_tool("echo")
+        ticks = 0
+
+        async def _tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(_tick())
+        start = time.monotonic()
+        results = await asyncio.gather(*(tool(text=str(i), delay=0.3) for i in range(10)))
+        duration = time.monotonic() - start
+        ticker.cancel()
+
+        self.assertEqual([result["text"] for result in results], [str(i) for i in range(10)])
+        self.assertLess(duration, 2.0)
+        self.assertGreater(ticks, 10)
+
+    async def test_connections_are_reused(self):
+        tool = self._get_tool("echo")
+        for i in range(5):
+            await tool(text=str(i), delay=0)
+        self.assertEqual(len(self.peers), 1)
+        self.assertIs(
+            self.session_pool.get_session(self.server_url),
+            self.session_pool.get_session(self.server_url + "/other/"),
+        )
+
+    async def test_read_timeout(self):
+        tool = self._get_tool("echo")
+        with self.assertRaises(RemoteToolError):
+            await tool(text="slow", delay=3)
+
+    async def test_get_params(self):
+        tool = self._get_tool("search")
+        result = await tool(query="天气", page=2)
+        self.assertEqual(result, {"query": "天气", "page": "2"})
+
+    async def test_multipart_upload_from_local_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "words.txt")
+            with open(file_path, "w", encoding="utf-8") as f:
+                f.write("hello")
+            file = await self.file_manager.create_file_from_path(file_path)
+            tool = self._get_tool("upload")
+            result = await tool(file=file.id, name="words")
+        self.assertEqual(result, {"filename": "words.txt", "content": "hello", "name": "words"})
+
+    async def test_blocking_send_request_runs_in_thread(self):
+        class _BlockingTool(RemoteTool):
+            def send_request(self, tool_arguments):
+                url = self.server_url + self.tool_view.uri
+                return requests.post(url, json=tool_arguments, headers=self.headers).json()
+
+        tool = self._get_tool("echo", tool_class=_BlockingTool)
+        result = await tool(text="blocking", delay=0)
+        self.assertEqual(result, {"text": "blocking"})
@@ -14,28 +14,37 @@
 
 from __future__ import annotations
 
+import asyncio
 import base64
+import copy
+import os
 import unittest
 from enum import Enum
 from inspect import isclass
 from typing import List, Optional, Type, get_args
+from unittest import mock
 from uuid import uuid4
 
-import responses
 from openapi_spec_validator.readers import read_from_filename
-from pydantic import Field
+from pydantic import Field, ValidationError
 
 from erniebot_agent.file.file_manager import File
 from erniebot_agent.file.global_file_manager_handler import GlobalFileManagerHandler
 from erniebot_agent.tools import RemoteToolkit
 from erniebot_agent.tools.schema import (
     ToolParameterView,
+    clear_parameter_view_registry,
     get_typing_list_type,
     is_optional_type,
     json_type,
 )
-from erniebot_agent.tools.utils import parse_json_request, tool_response_contains_file
+from erniebot_agent.tools.utils import (
+    parse_json_request,
+    parse_json_response,
+    tool_response_contains_file,
+)
 from erniebot_agent.utils.common import create_enum_class
+from tests.unit_tests.testing_utils.mocks.mock_session_pool import mock_session_pool
 
 
 class TestToolSchema(unittest.TestCase):
@@ -215,6 +224,52 @@ class TestToolSchema(unittest.TestCase):
         self.assertEqual(examples[1].function_call["name"], "单词本/v1/getWordbook")
         self.assertEqual(examples[1].function_call["thoughts"], "这是一个展示单词本的需求")
 
+    def test_parameter_views_are_cached(self):
+        schema = {
+            "type": "object",
+            "properties": {
+                "query": {"type": "string", "description": "查询"},
+                "page": {"type": "integer", "description": "页码", "default": 1},
+                "items": {
+                    "type": "array",
+                    "items": {"type": "object", "properties": {"name": {"type": "string"}}},
+                },
+            },
+        }
+        clear_parameter_view_registry()
+        view = ToolParameterView.from_openapi_dict(schema)
+        self.assertIs(ToolParameterView.from_openapi_dict(copy.deepcopy(schema)), view)
+        self.assertIsNot(ToolParameterView.from_openapi_dict({**schema, "x-ebagent-prompt": "提示"}), view)
+
+        first = RemoteToolkit.from_openapi_file(self.openapi_file)
+        second = RemoteToolkit.from_openapi_file(self.openapi_file)
+        self.assertIs(first.paths[0].returns, second.paths[0].returns)
+
+        arguments = {"query": "天气", "items": [{"name": "a"}]}
+        self.assertEqual(view.validate_to_json(arguments), view(**arguments).model_dump(mode="json"))
+        with self.assertRaises(ValidationError):
+            view.validate_to_json({"page": "not a number"})
+
+    def test_tools_are_memoized(self):
+        toolkit = RemoteToolkit.from_openapi_file(self.openapi_file)
+        toolkit.examples = toolkit.load_examples_yaml(self.examples_file)
+
+        tools = toolkit.get_tools()
+        self.assertEqual([id(tool) for tool in toolkit.get_tools()], [id(tool) for tool in tools])
+        self.assertIs(toolkit.get_tool("addWord"), tools[2])
+        self.assertIs(toolkit["addWord"], tools[2])
+
+        # Repeated calls do not prefix the names again.
+        for _ in range(3):
+            examples = toolkit.get_examples_by_name("getWordbook")
+        self.assertEqual(examples[1].function_call["name"], "单词本/v1/getWordbook")
+        self.assertEqual(toolkit.examples[3].function_call["name"], "getWordbook")
+
+        # Reassigning a field rebuilds the tools.
+        toolkit.examples = []
+        self.assertIsNot(toolkit.get_tool("addWord"), tools[2])
+        self.assertEqual(toolkit.get_tool("addWord").examples, [])
+
     def test_dynamic_enum_class(self):
         # 使用函数创建枚举类
         member_names = ["MEMBER1", "MEMBER2", "MEMBER3"]
@@ -331,12 +386,12 @@ class TestFileSchema(unittest.IsolatedAsyncioTestCase):
     def setUp(self) -> None:
         self.toolkit = RemoteToolkit.from_openapi_file("./tests/fixtures/openapis/file.yaml")
 
-    @responses.activate
-    async def test_file_v1(self):
+    @mock_session_pool
+    async def test_file_v1(self, mocked):
         tool = self.toolkit.get_tool("file_v1")
 
         file_content_0, file_content_1 = str(uuid4()), str(uuid4())
-        responses.post(
+        mocked.post(
             "http://example.com/file_v1",
             json={
                 "file": [file_content_0, file_content_1],
@@ -364,12 +419,12 @@ class TestFileSchema(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(result["not_file_field"], "file_v1")
         self.assertEqual(result["not_in_yaml_field"], "not_in_yaml_value")
 
-    @responses.activate
-    async def test_file_v2(self):
+    @mock_session_pool
+    async def test_file_v2(self, mocked):
         tool = self.toolkit.get_tool("file_v2")
 
         file_content = str(uuid4())
-        responses.post(
+        mocked.post(
             "http://example.com/file_v2",
             json={"file": file_content, "level_0": {"level_1": {"level_2": "level_2"}}},
         )
@@ -384,12 +439,12 @@ class TestFileSchema(unittest.IsolatedAsyncioTestCase):
 
         self.assertEqual(result["level_0"]["level_1"]["level_2"], "level_2")
 
-    @responses.activate
-    async def test_file_v3(self):
+    @mock_session_pool
+    async def test_file_v3(self, mocked):
         tool = self.toolkit.get_tool("file_v3")
 
         file_content = str(uuid4())
-        responses.post("http://example.com/file_v3", json={"file": {"file": file_content}})
+        mocked.post("http://example.com/file_v3", json={"file": {"file": file_content}})
 
         file_manager = GlobalFileManagerHandler().get()
 
@@ -400,12 +455,12 @@ class TestFileSchema(unittest.IsolatedAsyncioTestCase):
         file_content = base64.b64decode(file_content)
         self.assertEqual(file_content, file_content_from_file_manager)
 
-    @responses.activate
-    async def test_file_v4(self):
+    @mock_session_pool
+    async def test_file_v4(self, mocked):
         tool = self.toolkit.get_tool("file_v4")
 
         file_content_0, file_content_1 = str(uuid4()), str(uuid4())
-        responses.post(
+        mocked.post(
             "http://example.com/file_v4", json={"file": [{"file": file_content_0}, {"file": file_content_1}]}
         )
 
@@ -424,12 +479,12 @@ class TestFileSchema(unittest.IsolatedAsyncioTestCase):
         file_content = base64.b64decode(file_content_1)
         self.assertEqual(file_content, file_content_from_file_manager)
 
-    @responses.activate
-    async def test_file_v5(self):
+    @mock_session_pool
+    async def test_file_v5(self, mocked):
         tool = self.toolkit.get_tool("file_v5")
 
         file_content_0, file_content_1 = str(uuid4()), str(uuid4())
-        responses.post(
+        mocked.post(
             "http://example.com/file_v5",
             json={
                 "file": {
@@ -460,12 +515,12 @@ class TestFileSchema(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(result["file"]["file"][0]["not_file_field"], "file_0")
         self.assertEqual(result["file"]["file"][1]["not_file_field"], "file_1")
 
-    @responses.activate
-    async def test_file_v6(self):
+    @mock_session_pool
+    async def test_file_v6(self, mocked):
         tool = self.toolkit.get_tool("file_v6")
 
         file_content_0, file_content_1 = str(uuid4()), str(uuid4())
-        responses.post(
+        mocked.post(
             "http://example.com/file_v6", json={"first_file": file_content_0, "second_file": file_content_1}
         )
 
@@ -483,8 +538,8 @@ class TestFileSchema(unittest.IsolatedAsyncioTestCase):
         file_content = base64.b64decode(file_content_1)
         self.assertEqual(file_content, file_content_from_file_manager)
 
-    @responses.activate
-    async def test_file_v7(self):
+    @mock_session_pool
+    async def test_file_v7(self, mocked):
         tool = self.toolkit.get_tool("file_v7")
 
         file_manager = GlobalFileManagerHandler().get()
@@ -493,7 +548,7 @@ class TestFileSchema(unittest.IsolatedAsyncioTestCase):
         file_content_base64 = base64.b64encode(file_content.encode())
         file = await file_manager.create_file_from_bytes(file_content_base64, filename="a.png")
 
-        responses.post("http://example.com/file_v7", json={"second_file": file_content_base64.decode()})
+        mocked.post("http://example.com/file_v7", json={"second_file": file_content_base64.decode()})
 
         result = await tool(first_file=file.id)
 
@@ -502,8 +557,8 @@ class TestFileSchema(unittest.IsolatedAsyncioTestCase):
         file_content = base64.b64decode(file_content_base64)
         self.assertEqual(file_content, file_content_from_file_manager)
 
-    @responses.activate
-    async def test_file_v8(self):
+    @mock_session_pool
+    async def test_file_v8(self, mocked):
         tool = self.toolkit.get_tool("file_v8")
         file_manager = GlobalFileManagerHandler().get()
 
@@ -516,7 +571,7 @@ class TestFileSchema(unittest.IsolatedAsyncioTestCase):
             file = await file_manager.create_file_from_bytes(file_content, filename="a.png")
             file_ids.append(file.id)
 
-        responses.post("http://example.com/file_v8", json={})
+        mocked.post("http://example.com/file_v8", json={})
         self.assertIsNotNone(tool.tool_view.parameters)
         tool_arguments = await parse_json_request(
             tool.tool_view.parameters, {"file": file_ids}, file_manager=file_manager
@@ -527,16 +582,57 @@ class TestFileSchema(unittest.IsolatedAsyncioTestCase):
         result = await tool(file=file_ids)
         self.assertEqual(len(result), 0)
 
+    async def test_files_are_processed_concurrently(self):
+        file_manager = GlobalFileManagerHandler().get()
+
+        # Large enough to be encoded and decoded in several chunks.
+        file_contents = [os.urandom(2 * 1024 * 1024 + i) for i in range(2)]
+        file_contents += [str(uuid4()).encode() for _ in range(10)]
+        file_ids = []
+        for file_content in file_contents:
+            file = await file_manager.create_file_from_bytes(file_content, filename="a.png")
+            file_ids.append(file.id)
+        encoded = [base64.b64encode(file_content).decode() for file_content in file_contents]
+
+        parameters = self.toolkit.get_tool("file_v8").tool_view.parameters
+        tool_arguments = await parse_json_request(
+            parameters, {"file": list(file_ids)}, file_manager=file_manager
+        )
+        self.assertEqual(tool_arguments["file"], encoded)
+
+        num_running, max_num_running = 0, 0
+        create_file_from_base64 = file_manager.create_file_from_base64
+
+        async def _create_file_from_base64(*args, **kwargs):
+            nonlocal num_running, max_num_running
+            num_running += 1
+            max_num_running = max(max_num_running, num_running)
+            await asyncio.sleep(0.05)
+            try:
+                return await create_file_from_base64(*args, **kwargs)
+            finally:
+                num_running -= 1
+
+        returns = self.toolkit.get_tool("file_v1").tool_view.returns
+        with mock.patch.object(file_manager, "create_file_from_base64", _create_file_from_base64):
+            result = await parse_json_response(
+                returns, {"file": list(encoded)}, file_manager, file_metadata={}, max_concurrency=4
+            )
+        self.assertEqual(max_num_running, 4)
+        for file_id, file_content in zip(result["file"], file_contents):
+            file = file_manager.look_up_file_by_id(file_id)
+            self.assertEqual(await file.read_contents(), file_content)
+
 
 class TestEnumSchema(unittest.IsolatedAsyncioTestCase):
     def setUp(self) -> None:
         self.toolkit = RemoteToolkit.from_openapi_file("./tests/fixtures/openapis/enum.yaml")
 
-    @responses.activate
-    async def test_enum_v1(self):
+    @mock_session_pool
+    async def test_enum_v1(self, mocked):
         tool = self.toolkit.get_tool("enum_v1")
 
-        responses.post(
+        mocked.post(
             "http://example.com/enum_v1",
             json={"enum_field": "2", "no_enum_field": "no_enum_value"},
         )
@@ -570,11 +666,11 @@ class TestEnumSchema(unittest.IsolatedAsyncioTestCase):
     #     self.assertEqual(result["enum_field"], 2)
     #     self.assertEqual(result["no_enum_field"], "no_enum_value")
 
-    @responses.activate
-    async def test_enum_v2(self):
+    @mock_session_pool
+    async def test_enum_v2(self, mocked):
         tool = self.toolkit.get_tool("enum_v2")
 
-        responses.post(
+        mocked.post(
             "http://example.com/enum_v2",
             json={"enum_field": ["1", "2", "4"], "no_enum_field": "no_enum_value"},
         )
@@ -585,10 +681,10 @@ class TestEnumSchema(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(result["enum_field"], ["1", "2", "4"])
         self.assertEqual(result["no_enum_field"], "no_enum_value")
 
-    @responses.activate
-    async def test_enum_v3(self):
+    @mock_session_pool
+    async def test_enum_v3(self, mocked):
         tool = self.toolkit.get_tool("enum_v3")
-        responses.post(
+        mocked.post(
             "http://example.com/enum_v3",
             json={"enum_field": {"enum_array": ["1", "2", "4"]}, "no_enum_field": "no_enum_value"},
         )
@@ -604,20 +700,20 @@ class TestFixedValueSchema(unittest.IsolatedAsyncioTestCase):
     def setUp(self) -> None:
         self.toolkit = RemoteToolkit.from_openapi_file("./tests/fixtures/openapis/fixed_value.yaml")
 
-    @responses.activate
-    async def test_value_v1(self):
+    @mock_session_pool
+    async def test_value_v1(self, mocked):
         tool = self.toolkit.get_tool("value_v1")
 
-        responses.post("http://example.com/value_v1", json={"field": "2"})
+        mocked.post("http://example.com/value_v1", json={"field": "2"})
         result = await tool()
 
         self.assertEqual(result["field"], "12345")
 
-    @responses.activate
-    async def test_value_v2(self):
+    @mock_session_pool
+    async def test_value_v2(self, mocked):
         tool = self.toolkit.get_tool("value_v2")
 
-        responses.post("http://example.com/value_v2", json={"field": "2"})
+        mocked.post("http://example.com/value_v2", json={"field": "2"})
         result = await tool()
 
         self.assertEqual(result["field"], "12345")
@@ -0,0 +1,125 @@
+import copy
+
+import pytest
+
+from erniebot_agent.agents import FunctionAgent
+from erniebot_agent.tools.schema_compaction import SchemaCompactor, estimate_num_tokens
+from erniebot_agent.tools.tool_manager import ToolManager
+from tests.unit_tests.testing_utils.mocks.mock_chat_models import RecordingERNIEBot
+from tests.unit_tests.testing_utils.mocks.mock_memory import FakeMemory
+from tests.unit_tests.testing_utils.mocks.mock_tool import FakeTool
+
+
+def make_schema(name):
+    examples = []
+    for i in range(3):
+        examples.append({"role": "user", "content": f"Example question {i} for {name}"})
+        examples.append(
+            {"role": "assistant", "content": None, "function_call": {"name": name, "arguments": "{}"}}
+        )
+    return {
+        "name": name,
+        "description": f"The tool {name} " + "does many things. " * 20,
+        "parameters": {
+            "type": "object",
+            "properties": {"query": {"type": "string", "description": "The query. " * 20}},
+            "required": [],
+        },
+        "responses": {
+            "type": "object",
+            "properties": {"result": {"type": "string", "description": "The result. " * 20}},
+        },
+        "examples": examples,
+    }
+
+
+def make_tool(name):
+    schema = make_schema(name)
+    return FakeTool(
+        name=name,
+        description=schema["description"],
+        parameters=schema["parameters"],
+        responses=schema["responses"],
+        function=lambda query: {"result": query},
+    )
+
+
+def test_schemas_within_budget_are_unchanged():
+    schemas = [make_schema("a")]
+    compactor = SchemaCompactor(max_tokens=estimate_num_tokens(schemas))
+    assert compactor.compact(schemas) == schemas
+
+
+def test_budget_depends_on_model():
+    compactor = SchemaCompactor(context_ratio=0.5)
+    assert compactor.get_budget("ernie-speed-128k") > compactor.get_budget("ernie-3.5")
+    # The limits are those of the SDK.
+    assert compactor.get_budget("ernie-speed") == int(6144 * 0.5)
+    assert compactor.get_budget("unknown-model") == compactor.get_budget(None)
+    assert SchemaCompactor(max_tokens=100).get_budget("ernie-speed-128k") == 100
+    with pytest.raises(ValueError):
+        SchemaCompactor(context_ratio=0)
+
+
+def test_compaction_steps_are_progressive():
+    schemas = [make_schema("a"), make_schema("b")]
+    original = copy.deepcopy(schemas)
+    full_tokens = estimate_num_tokens(schemas)
+
+    # Removing `responses` and empty fields is enough.
+    compacted = SchemaCompactor(max_tokens=full_tokens - 50).compact(schemas)
+    assert "responses" not in compacted[0]
+    assert "required" not in compacted[0]["parameters"]
+    assert len(compacted[0]["examples"]) == 6
+    assert compacted[0]["description"] == schemas[0]["description"]
+
+    # Examples are trimmed, then descriptions are truncated.
+    compacted = SchemaCompactor(max_tokens=full_tokens * 2 // 3, max_examples=1).compact(schemas)
+    assert [message["role"] for message in compacted[0]["examples"]] == ["user", "assistant"]
+    assert estimate_num_tokens(compacted) <= full_tokens * 2 // 3
+
+    compacted = SchemaCompactor(max_tokens=1, max_description_length=16).compact(schemas)
+    assert len(compacted[0]["description"]) == 16
+    assert len(compacted[0]["parameters"]["properties"]["query"]["description"]) == 16
+    assert "examples" not in compacted[0]
+    assert compacted[0]["name"] == "a"
+
+    # The input is not modified.
+    assert schemas == original
+
+
+def test_tool_manager_caches_compacted_schemas():
+    compactor = SchemaCompactor(max_tokens=1)
+    manager = ToolManager([make_tool("a"), make_tool("b")], schema_compactor=compactor)
+    schemas = manager.get_tool_schemas()
+
+    compacted = manager.compact_tool_schemas(schemas, "ernie-3.5")
+    assert all("examples" not in schema and "responses" not in schema for schema in compacted)
+    assert manager.compact_tool_schemas(schemas, "ernie-3.5") == compacted
+    assert manager.get_tool_schema("a") == schemas[0]
+    assert "responses" in schemas[0]
+
+    # Modifying the returned schemas does not affect the cache.
+    compacted[0]["description"] = "Modified."
+    schemas[0]["description"] = "Modified."
+    assert (
+        manager.compact_tool_schemas(manager.get_tool_schemas(), "ernie-3.5")[0]["description"]
+        != "Modified."
+    )
+
+    assert ToolManager([make_tool("a")]).compact_tool_schemas(schemas[:1]) == schemas[:1]
+
+
+@pytest.mark.asyncio
+async def test_agent_sends_compacted_schemas():
+    llm = RecordingERNIEBot(model="ernie-3.5")
+    manager = ToolManager(
+        [make_tool(name) for name in "abcdefghij"], schema_compactor=SchemaCompactor(context_ratio=0.3)
+    )
+    agent = FunctionAgent(llm=llm, tools=manager, memory=FakeMemory())
+
+    await agent.run("Hello")
+
+    functions = llm.functions[0]
+    assert len(functions) == 10
+    assert estimate_num_tokens(functions) <= SchemaCompactor(context_ratio=0.3).get_budget("ernie-3.5")
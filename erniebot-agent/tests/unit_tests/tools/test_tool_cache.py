@@ -0,0 +1,231 @@
+import asyncio
+import copy
+import json
+import os
+import tempfile
+from unittest import mock
+
+import pytest
+import yaml
+
+from erniebot_agent.agents import FunctionAgent
+from erniebot_agent.memory import AIMessage
+from erniebot_agent.memory.messages import FunctionCall
+from erniebot_agent.tools.remote_toolkit import RemoteToolkit
+from erniebot_agent.tools.tool_cache import (
+    DiskToolCacheBackend,
+    InMemoryToolCacheBackend,
+    ToolCache,
+)
+from tests.unit_tests.testing_utils.mocks.mock_chat_models import (
+    FakeERNIEBotWithPresetResponses,
+)
+from tests.unit_tests.testing_utils.mocks.mock_memory import FakeMemory
+from tests.unit_tests.testing_utils.mocks.mock_tool import FakeTool
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "fixtures")
+
+
+def load_openapi_dict():
+    with open(os.path.join(FIXTURES_DIR, "openapi.yaml"), "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+
+def get_remote_tools(openapi_dict, access_token="token"):
+    toolkit = RemoteToolkit.from_openapi_dict(copy.deepcopy(openapi_dict), access_token=access_token)
+    return {tool.tool_view.name.split("/")[-1]: tool for tool in toolkit.get_tools()}
+
+
+class FailingBackend(InMemoryToolCacheBackend):
+    async def get(self, key):
+        raise OSError("Disk full.")
+
+    async def set(self, key, value, ttl):
+        raise OSError("Disk full.")
+
+
+def make_counting_tool(name="search"):
+    calls = []
+
+    def _search(query, limit=10):
+        calls.append((query, limit))
+        return {"results": [query] * limit}
+
+    tool = FakeTool(
+        name=name,
+        description="Searches for something.",
+        parameters={"type": "object", "properties": {}},
+        responses={"type": "object", "properties": {}},
+        function=_search,
+    )
+    return tool, calls
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend_type", ["memory", "disk"])
+async def test_backend_expires_entries(backend_type):
+    with tempfile.TemporaryDirectory() as cache_dir:
+        if backend_type == "memory":
+            backend = InMemoryToolCacheBackend()
+        else:
+            backend = DiskToolCacheBackend(cache_dir)
+        await backend.set("a", '{"x": 1}', ttl=10)
+        await backend.set("b", '{"x": 2}', ttl=None)
+        assert await backend.get("a") == '{"x": 1}'
+        assert await backend.get("missing") is None
+
+        with mock.patch("time.monotonic", return_value=1e12), mock.patch("time.time", return_value=1e12):
+            assert await backend.get("a") is None
+            assert await backend.get("b") == '{"x": 2}'
+
+        await backend.clear()
+        assert await backend.get("b") is None
+
+
+@pytest.mark.asyncio
+async def test_disk_backend_concurrent_writes():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        backend = DiskToolCacheBackend(cache_dir)
+        values = [json.dumps({"x": i}) for i in range(8)]
+        await asyncio.gather(*(backend.set("a", value, ttl=None) for value in values))
+        assert await backend.get("a") in values
+        assert os.listdir(cache_dir) == ["a.json"]
+
+
+@pytest.mark.asyncio
+async def test_in_memory_backend_evicts_least_recently_used():
+    backend = InMemoryToolCacheBackend(max_size=2)
+    await backend.set("a", "1", ttl=None)
+    await backend.set("b", "2", ttl=None)
+    await backend.get("a")
+    await backend.set("c", "3", ttl=None)
+    assert await backend.get("a") == "1"
+    assert await backend.get("b") is None
+    with pytest.raises(ValueError):
+        InMemoryToolCacheBackend(max_size=0)
+
+
+def test_keys_and_ttls():
+    tool, _ = make_counting_tool()
+    other_tool, _ = make_counting_tool("other")
+
+    assert ToolCache().get_key(tool, {"query": "a"}) is None
+
+    cache = ToolCache(default_ttl=60, tools=["search"], ttls={"other": 5})
+    key = cache.get_key(tool, {"query": "a", "limit": 1})
+    assert key == cache.get_key(tool, {"limit": 1, "query": "a"})
+    assert key != cache.get_key(tool, {"query": "b", "limit": 1})
+    assert key != cache.get_key(other_tool, {"query": "a", "limit": 1})
+    assert cache.get_ttl(tool) == 60
+    assert cache.get_ttl(other_tool) == 5
+
+    tool.idempotent = True
+    tool.cache_ttl = 30
+    assert ToolCache().get_ttl(tool) == 30
+    assert ToolCache().get_key(tool, {"query": "a"}) is not None
+
+
+def test_remote_tools_declare_idempotency():
+    openapi_dict = load_openapi_dict()
+    # GET endpoints are idempotent unless `x-ebagent-cache` says otherwise.
+    openapi_dict["paths"]["/add_word"]["post"]["x-ebagent-cache"] = {"ttl": 600}
+    openapi_dict["paths"]["/delete_word"]["delete"]["x-ebagent-cache"] = False
+
+    toolkit = RemoteToolkit.from_openapi_dict(openapi_dict)
+    tools = {tool.tool_view.name.split("/")[-1]: tool for tool in toolkit.get_tools()}
+    assert tools["getWordbook"].idempotent
+    assert tools["getWordbook"].cache_ttl is None
+    assert not tools["generateSentences"].idempotent
+    assert tools["addWord"].idempotent
+    assert tools["addWord"].cache_ttl == 600
+    assert not tools["deleteWord"].idempotent
+
+    # The extension survives a round trip.
+    openapi_dict = toolkit.to_openapi_dict()
+    assert openapi_dict["paths"]["/add_word"]["post"]["x-ebagent-cache"] == {"ttl": 600}
+
+
+def test_keys_of_remote_tools():
+    openapi_dict = load_openapi_dict()
+    cache = ToolCache()
+    tools = get_remote_tools(openapi_dict)
+    args = {"word": "a"}
+    key = cache.get_key(tools["getWordbook"], args)
+    assert key is not None
+    assert key == cache.get_key(get_remote_tools(openapi_dict)["getWordbook"], args)
+
+    # Results are not shared between users or servers.
+    assert key != cache.get_key(get_remote_tools(openapi_dict, access_token="other")["getWordbook"], args)
+    openapi_dict["servers"] = [{"url": "http://127.0.0.1:8082"}]
+    assert key != cache.get_key(get_remote_tools(openapi_dict)["getWordbook"], args)
+
+
+def test_non_idempotent_calls_invalidate_the_server():
+    cache = ToolCache()
+    tools = get_remote_tools(load_openapi_dict())
+    key = cache.get_key(tools["getWordbook"], {})
+    cache.invalidate(tools["getWordbook"])
+    assert cache.get_key(tools["getWordbook"], {}) == key
+    cache.invalidate(tools["addWord"])
+    assert cache.get_key(tools["getWordbook"], {}) != key
+
+    # Tools without a server are left alone.
+    tool, _ = make_counting_tool()
+    cache = ToolCache(tools=["search"])
+    key = cache.get_key(tool, {"query": "a"})
+    cache.invalidate(make_counting_tool("other")[0])
+    assert cache.get_key(tool, {"query": "a"}) == key
+
+
+@pytest.mark.asyncio
+async def test_agent_ignores_cache_errors():
+    tool, calls = make_counting_tool()
+    function_call = FunctionCall(name="search", thoughts="", arguments=json.dumps({"query": "a"}))
+    agent = FunctionAgent(
+        llm=FakeERNIEBotWithPresetResponses(
+            [
+                AIMessage("", function_call=function_call),
+                AIMessage("", function_call=function_call),
+                AIMessage("Done.", function_call=None),
+            ]
+        ),
+        tools=[tool],
+        memory=FakeMemory(),
+        tool_cache=ToolCache(FailingBackend(), tools=["search"]),
+    )
+
+    response = await agent.run("Search for a.")
+
+    assert response.status == "FINISHED"
+    assert calls == [("a", 10), ("a", 10)]
+    assert [step.cache_hit for step in response.steps] == [False, False]
+
+
+@pytest.mark.asyncio
+async def test_agent_reports_cache_hits():
+    tool, calls = make_counting_tool()
+
+    def _call(arguments):
+        return AIMessage(
+            "", function_call=FunctionCall(name="search", thoughts="", arguments=json.dumps(arguments))
+        )
+
+    agent = FunctionAgent(
+        llm=FakeERNIEBotWithPresetResponses(
+            [
+                _call({"query": "a", "limit": 2}),
+                _call({"limit": 2, "query": "a"}),
+                _call({"query": "b", "limit": 2}),
+                AIMessage("Done.", function_call=None),
+            ]
+        ),
+        tools=[tool],
+        memory=FakeMemory(),
+        tool_cache=ToolCache(tools=["search"]),
+    )
+
+    response = await agent.run("Search for a and b.")
+
+    assert calls == [("a", 2), ("b", 2)]
+    assert [step.cache_hit for step in response.steps] == [False, True, False]
+    assert response.steps[1].result == response.steps[0].result
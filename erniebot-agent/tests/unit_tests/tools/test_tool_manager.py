@@ -96,3 +96,60 @@ def test_tool_manager_get_names_and_descriptions():
 
 def test_tool_manager_get_schemas():
     pass
+
+
+class CountingCalculatorTool(CalculatorTool):
+    def __init__(self, name):
+        super().__init__()
+        self.name = name
+        self.num_schema_calls = 0
+
+    def function_call_schema(self) -> dict:
+        self.num_schema_calls += 1
+        return super().function_call_schema()
+
+
+class TestToolManagerSchemaCache(unittest.TestCase):
+    def test_schemas_are_cached(self):
+        tools = [CountingCalculatorTool("tool_a"), CountingCalculatorTool("tool_b")]
+        tool_manager = ToolManager(tools)
+
+        schemas = tool_manager.get_tool_schemas()
+        self.assertEqual([schema["name"] for schema in schemas], ["tool_a", "tool_b"])
+        for _ in range(3):
+            self.assertEqual(tool_manager.get_tool_schemas(), schemas)
+        self.assertEqual(tool_manager.get_tool_schema("tool_a"), schemas[0])
+        self.assertEqual([tool.num_schema_calls for tool in tools], [1, 1])
+
+        # Modifying the returned schemas does not affect the cache.
+        schemas[0]["description"] = "Modified."
+        schemas[0]["parameters"]["properties"].clear()
+        schema = tool_manager.get_tool_schema("tool_a")
+        schema["name"] = "modified"
+        schemas.pop()
+        self.assertEqual(
+            tool_manager.get_tool_schemas(),
+            [tools[0].function_call_schema(), tools[1].function_call_schema()],
+        )
+
+    def test_cache_is_invalidated(self):
+        tool_a, tool_b = CountingCalculatorTool("tool_a"), CountingCalculatorTool("tool_b")
+        tool_manager = ToolManager([tool_a])
+        tool_manager.get_tool_schemas()
+
+        tool_manager.add_tool(tool_b)
+        self.assertEqual(
+            [schema["name"] for schema in tool_manager.get_tool_schemas()], ["tool_a", "tool_b"]
+        )
+        self.assertEqual(tool_a.num_schema_calls, 1)
+
+        tool_manager.remove_tool(tool_a)
+        self.assertEqual([schema["name"] for schema in tool_manager.get_tool_schemas()], ["tool_b"])
+
+        tool_a.description = "A new description."
+        tool_manager.add_tool(tool_a)
+        self.assertEqual(tool_manager.get_tool_schema("tool_a")["description"], "A new description.")
+
+        tool_manager.clear_schema_cache()
+        tool_manager.get_tool_schemas()
+        self.assertEqual(tool_b.num_schema_calls, 2)
@@ -0,0 +1,110 @@
+import os
+import tempfile
+
+import pytest
+
+from erniebot_agent.agents import FunctionAgent
+from erniebot_agent.agents.callback.handlers.base import CallbackHandler
+from erniebot_agent.tools.tool_retriever import ToolRetriever
+from tests.unit_tests.testing_utils.mocks.mock_chat_models import RecordingERNIEBot
+from tests.unit_tests.testing_utils.mocks.mock_memory import FakeMemory
+from tests.unit_tests.testing_utils.mocks.mock_tool import FakeTool
+
+KEYWORDS = ["weather", "translate", "ocr", "search", "currency", "time"]
+
+
+class KeywordToolRetriever(ToolRetriever):
+    """Embeds texts as keyword counts and records the embedded texts."""
+
+    def __init__(self, **kwargs):
+        super().__init__(access_token="test", **kwargs)
+        self.embedded_texts = []
+
+    async def _embed(self, texts):
+        self.embedded_texts.extend(texts)
+        return [[float(text.lower().count(keyword)) for keyword in KEYWORDS] for text in texts]
+
+
+class SelectionHandler(CallbackHandler):
+    def __init__(self):
+        super().__init__()
+        self.selections = []
+
+    async def on_tools_selected(self, agent, query, tools):
+        self.selections.append((query, [tool.tool_name for tool in tools]))
+
+
+def make_tool(name):
+    return FakeTool(
+        name=name,
+        description=f"Use {name} to handle {name} requests.",
+        parameters={"type": "object", "properties": {}},
+        responses={"type": "object", "properties": {}},
+        function=lambda: {},
+    )
+
+
+def make_schemas(names):
+    return [make_tool(name).function_call_schema() for name in names]
+
+
+@pytest.mark.asyncio
+async def test_select_top_k_and_pinned_tools():
+    retriever = KeywordToolRetriever(top_k=2, pinned_tools=["time"])
+    schemas = make_schemas(KEYWORDS)
+
+    selected = await retriever.select("Translate the OCR result", schemas)
+
+    assert [schema["name"] for schema in selected] == ["translate", "ocr", "time"]
+
+
+@pytest.mark.asyncio
+async def test_select_all_tools_if_few():
+    retriever = KeywordToolRetriever(top_k=5)
+    schemas = make_schemas(["weather", "search"])
+
+    selected = await retriever.select("What is the weather?", schemas)
+
+    assert selected == schemas
+    assert retriever.embedded_texts == []
+
+
+@pytest.mark.asyncio
+async def test_tools_are_embedded_once():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        index_path = os.path.join(temp_dir, "tools.json")
+        retriever = KeywordToolRetriever(top_k=1, index_path=index_path)
+        schemas = make_schemas(KEYWORDS)
+
+        await retriever.select("weather", schemas)
+        await retriever.select("weather", schemas)
+        await retriever.select("search", schemas)
+        # Six tools and two queries.
+        assert len(retriever.embedded_texts) == 8
+
+        new_retriever = KeywordToolRetriever(top_k=1, index_path=index_path)
+        selected = await new_retriever.select("currency", schemas)
+        assert [schema["name"] for schema in selected] == ["currency"]
+        assert new_retriever.embedded_texts == ["currency"]
+
+        schemas[0]["description"] = "Use weather to get the weather forecast."
+        await new_retriever.select("currency", schemas)
+        assert new_retriever.embedded_texts[-1] == "weather: " + schemas[0]["description"]
+
+
+@pytest.mark.asyncio
+async def test_agent_passes_selected_tools_to_llm():
+    llm = RecordingERNIEBot()
+    handler = SelectionHandler()
+    agent = FunctionAgent(
+        llm=llm,
+        tools=[make_tool(name) for name in KEYWORDS],
+        memory=FakeMemory(),
+        callbacks=[handler],
+        tool_retriever=KeywordToolRetriever(top_k=1, pinned_tools=["time"]),
+    )
+
+    await agent.run("Search for something")
+
+    assert [schema["name"] for schema in llm.functions[0]] == ["search", "time"]
+    assert handler.selections == [("Search for something", ["search", "time"])]
@@ -0,0 +1,128 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from aiohttp import web
+from openapi_spec_validator import validate
+
+from erniebot_agent.tools.remote_toolkit import RemoteToolkit
+from erniebot_agent.tools.toolkit_loader import RemoteToolkitLoader
+from erniebot_agent.utils.exceptions import RemoteToolError
+from erniebot_agent.utils.http import ClientSessionPool
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "fixtures")
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), "rb") as f:
+        return f.read()
+
+
+def to_dicts(messages):
+    return [message.to_dict() for message in messages]
+
+
+class TestRemoteToolkitLoader(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.files = {
+            "openapi.yaml": read_fixture("openapi.yaml"),
+            "examples.yaml": read_fixture("examples.yaml"),
+        }
+        self.requests = []
+        self.delay = 0
+        app = web.Application()
+        app.router.add_get("/{toolkit}/.well-known/{name}", self._serve)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.server_url = f"http://127.0.0.1:{port}"
+
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.session_pool = ClientSessionPool()
+
+    async def asyncTearDown(self):
+        await self.session_pool.close()
+        await self.runner.cleanup()
+        self.temp_dir.cleanup()
+
+    async def _serve(self, request):
+        name = request.match_info["name"]
+        await asyncio.sleep(self.delay)
+        if name not in self.files:
+            self.requests.append((name, 404))
+            raise web.HTTPNotFound()
+        content = self.files[name]
+        etag = '"' + hashlib.md5(content).hexdigest() + '"'
+        if request.headers.get("If-None-Match", None) == etag:
+            self.requests.append((name, 304))
+            return web.Response(status=304, headers={"ETag": etag})
+        self.requests.append((name, 200))
+        return web.Response(body=content, headers={"ETag": etag})
+
+    def _make_loader(self, **kwargs):
+        return RemoteToolkitLoader(cache_dir=self.temp_dir.name, session_pool=self.session_pool, **kwargs)
+
+    async def test_load(self):
+        url = self.server_url + "/wordbook"
+        toolkit = await self._make_loader().load(url, access_token="test-token")
+
+        expected = RemoteToolkit.from_openapi_file(
+            os.path.join(FIXTURES_DIR, "openapi.yaml"), access_token="test-token"
+        )
+        self.assertEqual([path.name for path in toolkit.paths], [path.name for path in expected.paths])
+        self.assertEqual(toolkit.servers[0].url, url)
+        self.assertEqual(toolkit.headers["Authorization"], "token test-token")
+        expected_examples = RemoteToolkit.load_examples_yaml(os.path.join(FIXTURES_DIR, "examples.yaml"))
+        self.assertEqual(to_dicts(toolkit.examples), to_dicts(expected_examples))
+        self.assertEqual(len(toolkit.get_tools()), len(expected.paths))
+
+    async def test_cache_hit_skips_validation(self):
+        url = self.server_url + "/wordbook"
+        with mock.patch("erniebot_agent.tools.toolkit_loader.validate", wraps=validate) as mocked_validate:
+            first = await self._make_loader().load(url)
+            self.assertEqual(mocked_validate.call_count, 1)
+
+            # A new loader, e.g., after a restart, revalidates the cache.
+            loader = self._make_loader()
+            second = await loader.load(url)
+            self.assertEqual(mocked_validate.call_count, 1)
+            self.assertEqual(sorted(self.requests[-2:]), [("examples.yaml", 304), ("openapi.yaml", 304)])
+            self.assertEqual(second.to_openapi_dict(), first.to_openapi_dict())
+            self.assertEqual(to_dicts(second.examples), to_dicts(first.examples))
+
+            # Toolkits loaded from the same spec share the derived models.
+            third = await loader.load(url, access_token="other-token")
+            self.assertIs(third.paths[0], second.paths[0])
+            self.assertEqual(third.headers["Authorization"], "token other-token")
+
+            # A modified spec is downloaded and validated again.
+            self.files["openapi.yaml"] = self.files["openapi.yaml"].replace(b"v1", b"v2")
+            fourth = await self._make_loader().load(url)
+            self.assertEqual(mocked_validate.call_count, 2)
+            self.assertEqual(fourth.info.version, "v2")
+
+    async def test_load_many_concurrently(self):
+        self.delay = 0.2
+        urls = [f"{self.server_url}/toolkit{i}" for i in range(10)]
+        loader = self._make_loader(max_concurrency=10)
+
+        start = asyncio.get_running_loop().time()
+        toolkits = await loader.load_many(urls)
+        duration = asyncio.get_running_loop().time() - start
+
+        self.assertEqual([toolkit.servers[0].url for toolkit in toolkits], urls)
+        self.assertLess(duration, 1.0)
+
+    async def test_missing_examples_and_spec(self):
+        del self.files["examples.yaml"]
+        toolkit = await self._make_loader(use_cache=False).load(self.server_url + "/wordbook")
+        self.assertEqual(toolkit.examples, [])
+
+        del self.files["openapi.yaml"]
+        with self.assertRaises(RemoteToolError):
+            await self._make_loader(use_cache=False).load(self.server_url + "/wordbook")
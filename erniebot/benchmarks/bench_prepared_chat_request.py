@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import json
+import logging
+import time
+
+import erniebot
+from erniebot.http_client import EBClient
+
+# Benchmark of request preparation with and without `ChatCompletion.prepare`.
+# No requests are sent to the server unless `--online` is given.
+
+
+def make_functions(num_functions):
+    return [
+        {
+            "name": f"get_weather_{i}",
+            "description": "获取指定城市的天气信息",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "location": {"type": "string", "description": "城市名称"},
+                    "date": {"type": "string", "description": "日期，格式为YYYY-MM-DD"},
+                    "unit": {"type": "string", "enum": ["摄氏度", "华氏度"]},
+                },
+                "required": ["location"],
+            },
+            "responses": {
+                "type": "object",
+                "properties": {
+                    "temperature": {"type": "integer", "description": "城市气温"},
+                    "weather": {"type": "string", "description": "天气状况"},
+                },
+            },
+        }
+        for i in range(num_functions)
+    ]
+
+
+def make_messages(num_turns):
+    messages = []
+    for i in range(num_turns):
+        messages.append({"role": "user", "content": f"第{i}个问题：北京今天天气怎么样？"})
+        messages.append({"role": "assistant", "content": "北京今天晴，气温25摄氏度。"})
+    messages.append({"role": "user", "content": "深圳呢？"})
+    return messages
+
+
+def benchmark_prepared_chat_request(num_functions, num_turns, num_iters):
+    config = dict(api_type="aistudio", access_token="<access-token>")
+    functions = make_functions(num_functions)
+    messages = make_messages(num_turns)
+    client = EBClient(base_url="http://localhost")
+
+    resource = erniebot.ChatCompletion(**config)
+    st = time.perf_counter()
+    for _ in range(num_iters):
+        req = resource._prepare_create(
+            dict(
+                model="ernie-3.5",
+                messages=messages,
+                functions=functions,
+                system="你是一个天气助手。",
+                validate_functions=True,
+            )
+        )
+        _, _, data_baseline = client.prepare_request(req.method, req.path, req.headers, req.params)
+    time_baseline = (time.perf_counter() - st) / num_iters
+
+    prepared = erniebot.ChatCompletion.prepare(
+        model="ernie-3.5",
+        functions=functions,
+        system="你是一个天气助手。",
+        validate_functions=True,
+        _config_=config,
+    )
+    st = time.perf_counter()
+    for _ in range(num_iters):
+        req = prepared._prepare(dict(messages=messages), None, None, None)
+        _, _, data_prepared = client.prepare_request(req.method, req.path, req.headers, req.params)
+    time_prepared = (time.perf_counter() - st) / num_iters
+
+    assert data_baseline is not None and data_prepared is not None
+    assert json.loads(data_baseline) == json.loads(data_prepared)
+    print(f"Functions: {num_functions}, messages: {len(messages)}, iterations: {num_iters}")
+    print(f"`ChatCompletion.create`: {time_baseline * 1e3:.3f} ms per request")
+    print(f"`PreparedChatRequest.create`: {time_prepared * 1e3:.3f} ms per request")
+    print(f"Speedup: {time_baseline / time_prepared:.1f}x")
+
+
+def send_prepared_chat_request():
+    prepared = erniebot.ChatCompletion.prepare(
+        model="ernie-3.5",
+        functions=make_functions(1),
+        validate_functions=True,
+    )
+    response = prepared.create(messages=[{"role": "user", "content": "深圳市今天天气如何？"}])
+    print(response.get_result())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-functions", type=int, default=30)
+    parser.add_argument("--num-turns", type=int, default=5)
+    parser.add_argument("--num-iters", type=int, default=200)
+    parser.add_argument("--online", action="store_true", help="Also send a request to the server.")
+    args = parser.parse_args()
+
+    benchmark_prepared_chat_request(args.num_functions, args.num_turns, args.num_iters)
+    if args.online:
+        send_prepared_chat_request()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+import erniebot
+
+# Multi-process benchmark of `SharedTokenBucketRateLimiter`. Every worker
+# acquires permits as fast as it can; the aggregate throughput must stay under
+# the configured rate (plus the initial burst).
+
+
+def run_worker(path, rate, burst, start_at, duration, queue):
+    limiter = erniebot.SharedTokenBucketRateLimiter(path, rate=rate, burst=burst)
+    num_acquired = 0
+    num_calls = 0
+    time_in_reserve = 0.0
+    # All workers share the same time window.
+    time.sleep(max(0.0, start_at - time.monotonic()))
+    deadline = start_at + duration
+    while True:
+        st = time.perf_counter()
+        wait_secs = limiter.reserve()
+        time_in_reserve += time.perf_counter() - st
+        num_calls += 1
+        if time.monotonic() >= deadline:
+            break
+        if wait_secs <= 0:
+            num_acquired += 1
+        else:
+            time.sleep(min(wait_secs, max(0.0, deadline - time.monotonic())))
+    limiter.close()
+    queue.put((num_acquired, num_calls, time_in_reserve))
+
+
+def benchmark_shared_rate_limiter(num_procs, rate, burst, duration):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "bucket")
+        # Create the state file up front so that all workers share the initial burst.
+        erniebot.SharedTokenBucketRateLimiter(path, rate=rate, burst=burst).close()
+        queue = multiprocessing.Queue()
+        start_at = time.monotonic() + 1
+        procs = [
+            multiprocessing.Process(target=run_worker, args=(path, rate, burst, start_at, duration, queue))
+            for _ in range(num_procs)
+        ]
+        for proc in procs:
+            proc.start()
+        results = [queue.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+
+    total_acquired = sum(r[0] for r in results)
+    total_calls = sum(r[1] for r in results)
+    total_time_in_reserve = sum(r[2] for r in results)
+    limit = rate * duration + burst
+    print(f"Processes: {num_procs}, rate: {rate}/s, burst: {burst}, duration: {duration}s")
+    print(f"Permits acquired: {total_acquired} (upper bound: {limit:.0f})")
+    print(f"Aggregate throughput: {total_acquired / duration:.1f}/s")
+    print(f"Mean overhead of `reserve`: {total_time_in_reserve / total_calls * 1e6:.1f} us")
+    assert total_acquired <= limit, "The aggregate throughput exceeds the configured limit."
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-procs", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=200)
+    parser.add_argument("--burst", type=float, default=10)
+    parser.add_argument("--duration", type=float, default=5)
+    args = parser.parse_args()
+
+    benchmark_shared_rate_limiter(args.num_procs, args.rate, args.burst, args.duration)
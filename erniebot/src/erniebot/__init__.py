@@ -13,10 +13,20 @@
 # limitations under the License.
 
 from . import errors
+from .cassettes import CassetteTransport
+from .coalescing import RequestCoalescer
 from .config import GlobalConfig
 from .config import init_global_config as _init_global_config
+from .context_window import ContextWindowFitter
+from .credentials import Credential, CredentialPool
 from .errors import ConfigItemNotFoundError as _ConfigItemNotFoundError
 from .intro import Model
+from .metering import UsageMeter
+from .rate_limiting import (
+    RateLimiter,
+    SharedTokenBucketRateLimiter,
+    TokenBucketRateLimiter,
+)
 from .resources import (
     ChatCompletion,
     ChatCompletionResponse,
@@ -27,10 +37,16 @@ from .resources import (
     ImageResponse,
     ImageV1,
     ImageV2,
+    PreparedChatRequest,
 )
 from .response import EBResponse
+from .scheduling import RequestScheduler
+from .streaming import AsyncResponseStream, ResponseStream
+from .sync_client import SyncClient
+from .transports import AiohttpTransport, HTTPXTransport, RequestsTransport, Transport
 from .utils.logging import setup_logging as _setup_logging
 from .version import VERSION
+from .warmup import WarmupReport, awarmup, warmup
 
 __version__ = VERSION
 
@@ -49,7 +65,28 @@ __all__ = [
     "ChatCompletionResponse",
     "EmbeddingResponse",
     "ImageResponse",
+    "ResponseStream",
+    "AsyncResponseStream",
+    "PreparedChatRequest",
     "GlobalConfig",
+    "Credential",
+    "CredentialPool",
+    "RequestScheduler",
+    "RateLimiter",
+    "TokenBucketRateLimiter",
+    "SharedTokenBucketRateLimiter",
+    "RequestCoalescer",
+    "UsageMeter",
+    "ContextWindowFitter",
+    "SyncClient",
+    "Transport",
+    "RequestsTransport",
+    "AiohttpTransport",
+    "HTTPXTransport",
+    "CassetteTransport",
+    "warmup",
+    "awarmup",
+    "WarmupReport",
     "__version__",
 ]
 
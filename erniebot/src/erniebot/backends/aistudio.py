@@ -13,7 +13,7 @@
 # limitations under the License.
 
 import os
-from typing import AsyncIterator, ClassVar, Iterator, Optional, Union
+from typing import AsyncIterator, ClassVar, Iterator, Optional, Union, cast
 
 import erniebot.errors as errors
 import erniebot.utils.logging as logging
@@ -31,7 +31,11 @@ class AIStudioBackend(EBBackend):
     def __init__(self, config_dict: ConfigDictType) -> None:
         super().__init__(config_dict=config_dict)
         access_token = self._cfg.get("access_token", None)
-        if access_token is None:
+        if self._credential_pool is not None:
+            for credential in self._credential_pool.credentials:
+                if credential.access_token is None:
+                    raise RuntimeError("No access token is configured for a credential in the pool.")
+        elif access_token is None:
             access_token = os.environ.get("AISTUDIO_ACCESS_TOKEN", None)
             if access_token is None:
                 raise RuntimeError("No access token is configured.")
@@ -53,15 +57,21 @@ class AIStudioBackend(EBBackend):
             supplied_headers=headers,
             params=params,
         )
-        headers = self._add_aistudio_fields_to_headers(headers)
-        return self._client.send_request(
-            method,
-            url,
-            stream,
-            data=data,
-            headers=headers,
-            request_timeout=request_timeout,
-        )
+
+        def _send(access_token: str) -> Union[EBResponse, Iterator[EBResponse]]:
+            return self._client.send_request(
+                method,
+                url,
+                stream,
+                data=data,
+                headers=self._add_aistudio_fields_to_headers(dict(headers), access_token),
+                request_timeout=request_timeout,
+            )
+
+        if self._credential_pool is not None:
+            return self._credential_pool.run(lambda credential: _send(cast(str, credential.access_token)))
+        else:
+            return _send(cast(str, self._access_token))
 
     async def arequest(
         self,
@@ -79,15 +89,23 @@ class AIStudioBackend(EBBackend):
             supplied_headers=headers,
             params=params,
         )
-        headers = self._add_aistudio_fields_to_headers(headers)
-        return await self._client.asend_request(
-            method,
-            url,
-            stream,
-            data=data,
-            headers=headers,
-            request_timeout=request_timeout,
-        )
+
+        async def _asend(access_token: str) -> Union[EBResponse, AsyncIterator[EBResponse]]:
+            return await self._client.asend_request(
+                method,
+                url,
+                stream,
+                data=data,
+                headers=self._add_aistudio_fields_to_headers(dict(headers), access_token),
+                request_timeout=request_timeout,
+            )
+
+        if self._credential_pool is not None:
+            return await self._credential_pool.arun(
+                lambda credential: _asend(cast(str, credential.access_token))
+            )
+        else:
+            return await _asend(cast(str, self._access_token))
 
     @classmethod
     def handle_response(cls, resp: EBResponse) -> EBResponse:
@@ -111,11 +129,11 @@ class AIStudioBackend(EBBackend):
         else:
             return EBResponse(resp.rcode, resp.result, resp.rheaders)
 
-    def _add_aistudio_fields_to_headers(self, headers: HeadersType) -> HeadersType:
+    def _add_aistudio_fields_to_headers(self, headers: HeadersType, access_token: str) -> HeadersType:
         if "Authorization" in headers:
             logging.warning(
                 "Key 'Authorization' already exists in `headers`: %r",
                 headers["Authorization"],
             )
-        headers["Authorization"] = f"token {self._access_token}"
+        headers["Authorization"] = f"token {access_token}"
         return headers
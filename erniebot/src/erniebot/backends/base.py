@@ -15,8 +15,11 @@
 from typing import AsyncIterator, ClassVar, Iterator, Optional, Union
 
 from erniebot.api_types import APIType
+from erniebot.cassettes import get_cassette_transport
+from erniebot.credentials import CredentialPool
 from erniebot.http_client import EBClient
 from erniebot.response import EBResponse
+from erniebot.transports import Transport
 from erniebot.types import ConfigDictType, HeadersType, ParamsType
 
 
@@ -28,12 +31,23 @@ class EBBackend(object):
         super().__init__()
         self._base_url = config_dict.get("api_base_url", None) or type(self).base_url
         self._cfg = config_dict
+        self._credential_pool: Optional[CredentialPool] = self._cfg.get("credential_pool", None)
+        transport: Optional[Transport] = self._cfg.get("transport", None)
+        cassette_path = self._cfg.get("cassette_path", None)
+        if transport is None and cassette_path is not None:
+            transport = get_cassette_transport(
+                cassette_path, self._cfg.get("cassette_mode", None) or "replay"
+            )
         self._client = EBClient(
             self._base_url,
             session=self._cfg.get("requests_session", None),
             asession=self._cfg.get("aiohttp_session", None),
             response_handler=self.handle_response,
             proxy=self._cfg.get("proxy", None),
+            stream_connect_timeout=self._cfg.get("stream_connect_timeout", None),
+            stream_first_chunk_timeout=self._cfg.get("stream_first_chunk_timeout", None),
+            stream_idle_timeout=self._cfg.get("stream_idle_timeout", None),
+            transport=transport,
         )
 
     def request(
@@ -60,6 +74,23 @@ class EBBackend(object):
     ) -> Union[EBResponse, AsyncIterator[EBResponse]]:
         raise NotImplementedError
 
+    def prefetch_auth_tokens(self) -> int:
+        """Fetches the auth tokens that would otherwise be fetched by the first
+        request.
+
+        Returns:
+            The number of tokens fetched.
+        """
+        return 0
+
+    def preconnect(self, num_connections: int, timeout: Optional[float] = None) -> int:
+        """Opens connections to the base URL for synchronous requests."""
+        return self._client.preconnect(num_connections, timeout)
+
+    async def apreconnect(self, num_connections: int, timeout: Optional[float] = None) -> int:
+        """Opens connections to the base URL for asynchronous requests."""
+        return await self._client.apreconnect(num_connections, timeout)
+
     @classmethod
     def handle_response(cls, resp: EBResponse) -> EBResponse:
         raise NotImplementedError
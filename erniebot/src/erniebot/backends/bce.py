@@ -16,6 +16,7 @@ import asyncio
 import datetime
 import hashlib
 import hmac
+import threading
 import urllib.parse
 from typing import (
     AsyncIterator,
@@ -27,12 +28,14 @@ from typing import (
     Optional,
     Tuple,
     Union,
+    cast,
 )
 
 import erniebot.errors as errors
 import erniebot.utils.logging as logging
 from erniebot.api_types import APIType
-from erniebot.auth import build_auth_token_manager
+from erniebot.auth import AuthTokenManager, build_auth_token_manager
+from erniebot.credentials import Credential
 from erniebot.response import EBResponse
 from erniebot.types import ConfigDictType, HeadersType, ParamsType
 from erniebot.utils.url import add_query_params
@@ -50,6 +53,8 @@ class _BCELegacyBackend(EBBackend):
             ak=self._cfg["ak"],
             sk=self._cfg["sk"],
         )
+        self._pooled_auth_managers: Dict[Credential, AuthTokenManager] = {}
+        self._pooled_auth_managers_lock = threading.Lock()
 
     def request(
         self,
@@ -68,7 +73,82 @@ class _BCELegacyBackend(EBBackend):
             params=params,
         )
 
-        access_token = self._auth_manager.get_auth_token()
+        def _send(auth_manager: AuthTokenManager) -> Union[EBResponse, Iterator[EBResponse]]:
+            return self._send_request_with_token(
+                auth_manager,
+                method,
+                url,
+                stream,
+                data=data,
+                headers=headers,
+                request_timeout=request_timeout,
+            )
+
+        if self._credential_pool is not None:
+            return self._credential_pool.run(
+                lambda credential: _send(self._get_pooled_auth_manager(credential))
+            )
+        else:
+            return _send(self._auth_manager)
+
+    async def arequest(
+        self,
+        method: str,
+        path: str,
+        stream: bool,
+        *,
+        params: Optional[ParamsType] = None,
+        headers: Optional[HeadersType] = None,
+        request_timeout: Optional[float] = None,
+    ) -> Union[EBResponse, AsyncIterator[EBResponse]]:
+        url, headers, data = self._client.prepare_request(
+            method,
+            path,
+            supplied_headers=headers,
+            params=params,
+        )
+
+        async def _asend(auth_manager: AuthTokenManager) -> Union[EBResponse, AsyncIterator[EBResponse]]:
+            return await self._asend_request_with_token(
+                auth_manager,
+                method,
+                url,
+                stream,
+                data=data,
+                headers=headers,
+                request_timeout=request_timeout,
+            )
+
+        if self._credential_pool is not None:
+            return await self._credential_pool.arun(
+                lambda credential: _asend(self._get_pooled_auth_manager(credential))
+            )
+        else:
+            return await _asend(self._auth_manager)
+
+    def prefetch_auth_tokens(self) -> int:
+        if self._credential_pool is not None:
+            auth_managers = [
+                self._get_pooled_auth_manager(credential) for credential in self._credential_pool.credentials
+            ]
+        else:
+            auth_managers = [self._auth_manager]
+        for auth_manager in auth_managers:
+            auth_manager.get_auth_token()
+        return len(auth_managers)
+
+    def _send_request_with_token(
+        self,
+        auth_manager: AuthTokenManager,
+        method: str,
+        url: str,
+        stream: bool,
+        *,
+        data: Optional[bytes],
+        headers: HeadersType,
+        request_timeout: Optional[float],
+    ) -> Union[EBResponse, Iterator[EBResponse]]:
+        access_token = auth_manager.get_auth_token()
         url_with_token = add_query_params(url, [("access_token", access_token)])
         try:
             return self._client.send_request(
@@ -84,7 +164,7 @@ class _BCELegacyBackend(EBBackend):
                 "The access token provided is invalid or has expired."
                 " An automatic update will be performed before retrying."
             )
-            access_token = self._auth_manager.update_auth_token()
+            access_token = auth_manager.update_auth_token()
             url_with_token = add_query_params(url, [("access_token", access_token)])
             return self._client.send_request(
                 method,
@@ -95,26 +175,20 @@ class _BCELegacyBackend(EBBackend):
                 request_timeout=request_timeout,
             )
 
-    async def arequest(
+    async def _asend_request_with_token(
         self,
+        auth_manager: AuthTokenManager,
         method: str,
-        path: str,
+        url: str,
         stream: bool,
         *,
-        params: Optional[ParamsType] = None,
-        headers: Optional[HeadersType] = None,
-        request_timeout: Optional[float] = None,
+        data: Optional[bytes],
+        headers: HeadersType,
+        request_timeout: Optional[float],
     ) -> Union[EBResponse, AsyncIterator[EBResponse]]:
-        url, headers, data = self._client.prepare_request(
-            method,
-            path,
-            supplied_headers=headers,
-            params=params,
-        )
-
         loop = asyncio.get_running_loop()
         # XXX: The default executor is used.
-        access_token = await loop.run_in_executor(None, self._auth_manager.get_auth_token)
+        access_token = await loop.run_in_executor(None, auth_manager.get_auth_token)
         url_with_token = add_query_params(url, [("access_token", access_token)])
         try:
             return await self._client.asend_request(
@@ -131,7 +205,7 @@ class _BCELegacyBackend(EBBackend):
                 " An automatic update will be performed before retrying."
             )
             # XXX: The default executor is used.
-            access_token = await loop.run_in_executor(None, self._auth_manager.update_auth_token)
+            access_token = await loop.run_in_executor(None, auth_manager.update_auth_token)
             url_with_token = add_query_params(url, [("access_token", access_token)])
             return await self._client.asend_request(
                 method,
@@ -142,6 +216,20 @@ class _BCELegacyBackend(EBBackend):
                 request_timeout=request_timeout,
             )
 
+    def _get_pooled_auth_manager(self, credential: Credential) -> AuthTokenManager:
+        # One manager per credential. The tokens themselves are shared across
+        # managers via the global token cache.
+        with self._pooled_auth_managers_lock:
+            if credential not in self._pooled_auth_managers:
+                self._pooled_auth_managers[credential] = build_auth_token_manager(
+                    "bce",
+                    self.api_type,
+                    auth_token=credential.access_token,
+                    ak=credential.ak,
+                    sk=credential.sk,
+                )
+            return self._pooled_auth_managers[credential]
+
 
 class _BCEBackend(EBBackend):
     _SIG_EXPIRATION_IN_SECS: Final[float] = 1800
@@ -150,7 +238,11 @@ class _BCEBackend(EBBackend):
         super().__init__(config_dict=config_dict)
         ak = self._cfg.get("ak")
         sk = self._cfg.get("sk")
-        if ak is None or sk is None:
+        if self._credential_pool is not None:
+            for credential in self._credential_pool.credentials:
+                if credential.ak is None or credential.sk is None:
+                    raise RuntimeError("Invalid access key ID or secret access key in the credential pool")
+        elif ak is None or sk is None:
             raise RuntimeError("Invalid access key ID or secret access key")
         self._ak = ak
         self._sk = sk
@@ -171,15 +263,23 @@ class _BCEBackend(EBBackend):
             supplied_headers=headers,
             params=params,
         )
-        headers = self._add_bce_fields_to_headers(headers, method, url)
-        return self._client.send_request(
-            method,
-            url,
-            stream,
-            data=data,
-            headers=headers,
-            request_timeout=request_timeout,
-        )
+
+        def _send(ak: str, sk: str) -> Union[EBResponse, Iterator[EBResponse]]:
+            return self._client.send_request(
+                method,
+                url,
+                stream,
+                data=data,
+                headers=self._add_bce_fields_to_headers(dict(headers), method, url, ak=ak, sk=sk),
+                request_timeout=request_timeout,
+            )
+
+        if self._credential_pool is not None:
+            return self._credential_pool.run(
+                lambda credential: _send(cast(str, credential.ak), cast(str, credential.sk))
+            )
+        else:
+            return _send(cast(str, self._ak), cast(str, self._sk))
 
     async def arequest(
         self,
@@ -197,22 +297,32 @@ class _BCEBackend(EBBackend):
             supplied_headers=headers,
             params=params,
         )
-        headers = self._add_bce_fields_to_headers(headers, method, url)
-        return await self._client.asend_request(
-            method,
-            url,
-            stream,
-            data=data,
-            headers=headers,
-            request_timeout=request_timeout,
-        )
 
-    def _add_bce_fields_to_headers(self, headers: HeadersType, method: str, url: str) -> HeadersType:
+        async def _asend(ak: str, sk: str) -> Union[EBResponse, AsyncIterator[EBResponse]]:
+            return await self._client.asend_request(
+                method,
+                url,
+                stream,
+                data=data,
+                headers=self._add_bce_fields_to_headers(dict(headers), method, url, ak=ak, sk=sk),
+                request_timeout=request_timeout,
+            )
+
+        if self._credential_pool is not None:
+            return await self._credential_pool.arun(
+                lambda credential: _asend(cast(str, credential.ak), cast(str, credential.sk))
+            )
+        else:
+            return await _asend(cast(str, self._ak), cast(str, self._sk))
+
+    def _add_bce_fields_to_headers(
+        self, headers: HeadersType, method: str, url: str, *, ak: str, sk: str
+    ) -> HeadersType:
         host, path, query_params = self._get_url_parts(url)
         headers["Host"] = urllib.parse.quote(host)
         x_bce_date = self._get_canonical_time()
         headers["x-bce-date"] = x_bce_date
-        credentials = {"ak": self._ak, "sk": self._sk}
+        credentials = {"ak": ak, "sk": sk}
         headers["Authorization"] = self._sign(
             credentials=credentials,
             method=method,
@@ -52,14 +52,22 @@ class CustomBackend(EBBackend):
             supplied_headers=headers,
             params=params,
         )
-        return self._client.send_request(
-            method,
-            url,
-            stream,
-            data=data,
-            headers=headers,
-            request_timeout=request_timeout,
-        )
+
+        def _send(access_token: Optional[str]) -> Union[EBResponse, Iterator[EBResponse]]:
+            return self._client.send_request(
+                method,
+                url,
+                stream,
+                data=data,
+                headers=self._add_aistudio_fields_to_headers(dict(headers), access_token),
+                request_timeout=request_timeout,
+            )
+
+        if self._credential_pool is not None:
+            return self._credential_pool.run(lambda credential: _send(credential.access_token))
+        else:
+            # The access token is not sent in synchronous requests.
+            return _send(None)
 
     async def arequest(
         self,
@@ -77,26 +85,35 @@ class CustomBackend(EBBackend):
             supplied_headers=headers,
             params=params,
         )
-        if self._access_token is not None:
-            headers = self._add_aistudio_fields_to_headers(headers)
-        return await self._client.asend_request(
-            method,
-            url,
-            stream,
-            data=data,
-            headers=headers,
-            request_timeout=request_timeout,
-        )
+
+        async def _asend(access_token: Optional[str]) -> Union[EBResponse, AsyncIterator[EBResponse]]:
+            return await self._client.asend_request(
+                method,
+                url,
+                stream,
+                data=data,
+                headers=self._add_aistudio_fields_to_headers(dict(headers), access_token),
+                request_timeout=request_timeout,
+            )
+
+        if self._credential_pool is not None:
+            return await self._credential_pool.arun(lambda credential: _asend(credential.access_token))
+        else:
+            return await _asend(self._access_token)
 
     @classmethod
     def handle_response(cls, resp: EBResponse) -> EBResponse:
         return QianfanLegacyBackend.handle_response(resp)
 
-    def _add_aistudio_fields_to_headers(self, headers: HeadersType) -> HeadersType:
+    def _add_aistudio_fields_to_headers(
+        self, headers: HeadersType, access_token: Optional[str]
+    ) -> HeadersType:
+        if access_token is None:
+            return headers
         if "Authorization" in headers:
             logging.warning(
                 "Key 'Authorization' already exists in `headers`: %r",
                 headers["Authorization"],
             )
-        headers["Authorization"] = f"{self._access_token}"
+        headers["Authorization"] = f"{access_token}"
         return headers
@@ -0,0 +1,228 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import collections
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import aiohttp
+
+from .utils.token_helper import approx_num_tokens
+
+__all__ = ["BenchmarkResult", "run_benchmark"]
+
+RequestFunc = Callable[[Dict[str, Any]], Any]
+
+
+@dataclass
+class _Sample(object):
+    latency: float
+    ttft: Optional[float] = None
+    num_output_tokens: Optional[int] = None
+
+
+@dataclass
+class BenchmarkResult(object):
+    duration: float
+    samples: List[_Sample] = field(default_factory=list)
+    errors: Dict[str, int] = field(default_factory=lambda: collections.defaultdict(int))
+
+    @property
+    def num_succeeded(self) -> int:
+        return len(self.samples)
+
+    @property
+    def num_failed(self) -> int:
+        return sum(self.errors.values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        num_requests = self.num_succeeded + self.num_failed
+        dict_: Dict[str, Any] = {
+            "num_requests": num_requests,
+            "num_succeeded": self.num_succeeded,
+            "num_failed": self.num_failed,
+            "duration_secs": self.duration,
+            "throughput_rps": self.num_succeeded / self.duration if self.duration > 0 else 0.0,
+            "latency_secs": _summarize([s.latency for s in self.samples]),
+            "errors": dict(self.errors),
+        }
+        ttfts = [s.ttft for s in self.samples if s.ttft is not None]
+        if len(ttfts) > 0:
+            dict_["ttft_secs"] = _summarize(ttfts)
+        token_counts = [s.num_output_tokens for s in self.samples if s.num_output_tokens is not None]
+        if len(token_counts) > 0:
+            dict_["output_tokens_per_sec"] = self._summarize_token_rates()
+            dict_["total_output_tokens_per_sec"] = (
+                sum(token_counts) / self.duration if self.duration > 0 else 0.0
+            )
+        return dict_
+
+    def format(self) -> str:
+        dict_ = self.to_dict()
+        lines = [
+            f"Requests: {dict_['num_requests']} "
+            f"(succeeded: {dict_['num_succeeded']}, failed: {dict_['num_failed']})",
+            f"Duration: {dict_['duration_secs']:.2f} s",
+            f"Throughput: {dict_['throughput_rps']:.2f} requests/s",
+            "Latency (s): " + _format_summary(dict_["latency_secs"]),
+        ]
+        if "ttft_secs" in dict_:
+            lines.append("Time to first token (s): " + _format_summary(dict_["ttft_secs"]))
+        if "output_tokens_per_sec" in dict_:
+            lines.append("Output tokens/s per request: " + _format_summary(dict_["output_tokens_per_sec"]))
+            lines.append(f"Output tokens/s in total: {dict_['total_output_tokens_per_sec']:.2f}")
+        if len(dict_["errors"]) > 0:
+            lines.append("Errors:")
+            for name, count in sorted(dict_["errors"].items(), key=lambda item: -item[1]):
+                lines.append(f"  {name}: {count}")
+        return "\n".join(lines)
+
+    def _summarize_token_rates(self) -> Dict[str, float]:
+        rates = []
+        for s in self.samples:
+            if s.num_output_tokens is None:
+                continue
+            # For streamed responses, measure the generation phase only.
+            secs = s.latency - s.ttft if s.ttft is not None else s.latency
+            if secs > 0:
+                rates.append(s.num_output_tokens / secs)
+        return _summarize(rates)
+
+
+async def run_benchmark(
+    request_func: RequestFunc,
+    *,
+    duration: float,
+    concurrency: Optional[int] = None,
+    rate: Optional[float] = None,
+    stream: bool = False,
+) -> BenchmarkResult:
+    """Drives requests at a target concurrency or rate for a duration.
+
+    Args:
+        request_func: Coroutine function that sends a request. It is called
+            with the settings to pass as `_config_`.
+        duration: Number of seconds during which new requests are issued.
+        concurrency: Number of requests kept in flight (closed loop).
+        rate: Number of requests issued per second, regardless of how long
+            the requests take (open loop). `concurrency`, if given, caps the
+            number of requests in flight.
+        stream: Whether `request_func` returns a stream.
+
+    Returns:
+        Latency, time to first token, throughput, and errors.
+    """
+    if concurrency is None and rate is None:
+        raise ValueError("Either `concurrency` or `rate` must be given.")
+    result = BenchmarkResult(duration=0.0)
+    connector = aiohttp.TCPConnector(limit=concurrency or 0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        config = {"aiohttp_session": session}
+        start = time.perf_counter()
+        deadline = start + duration
+
+        async def _run_one() -> None:
+            await _measure(request_func, config, stream, result)
+
+        if rate is None:
+            assert concurrency is not None
+
+            async def _worker() -> None:
+                while time.perf_counter() < deadline:
+                    await _run_one()
+
+            await asyncio.gather(*(_worker() for _ in range(concurrency)))
+        else:
+            semaphore = asyncio.Semaphore(concurrency) if concurrency is not None else None
+            tasks = []
+            for idx in range(int(math.ceil(duration * rate))):
+                delay = start + idx / rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if semaphore is not None:
+                    await semaphore.acquire()
+                task = asyncio.ensure_future(_run_one())
+                if semaphore is not None:
+                    task.add_done_callback(lambda _: semaphore.release())  # type: ignore
+                tasks.append(task)
+            await asyncio.gather(*tasks)
+        result.duration = time.perf_counter() - start
+    return result
+
+
+async def _measure(
+    request_func: RequestFunc, config: Dict[str, Any], stream: bool, result: BenchmarkResult
+) -> None:
+    st = time.perf_counter()
+    try:
+        resp = await request_func(config)
+        if stream:
+            ttft = None
+            num_output_tokens = None
+            texts = []
+            async for chunk in resp:
+                if ttft is None:
+                    ttft = time.perf_counter() - st
+                texts.append(chunk.get_result() or "")
+                usage = getattr(chunk, "usage", None)
+                if isinstance(usage, dict) and "completion_tokens" in usage:
+                    num_output_tokens = usage["completion_tokens"]
+            if num_output_tokens is None:
+                num_output_tokens = approx_num_tokens("".join(texts))
+            sample = _Sample(
+                latency=time.perf_counter() - st, ttft=ttft, num_output_tokens=num_output_tokens
+            )
+        else:
+            usage = getattr(resp, "usage", None)
+            num_output_tokens = None
+            if isinstance(usage, dict) and "completion_tokens" in usage:
+                num_output_tokens = usage["completion_tokens"]
+            sample = _Sample(latency=time.perf_counter() - st, num_output_tokens=num_output_tokens)
+    except Exception as e:
+        # Unexpected errors, e.g., from malformed chunks, are counted as well,
+        # so that they do not abort the whole run.
+        result.errors[type(e).__name__] += 1
+    else:
+        result.samples.append(sample)
+
+
+def _percentile(sorted_values: Sequence[float], q: float) -> float:
+    # Linear interpolation between the closest ranks.
+    pos = (len(sorted_values) - 1) * q
+    lo = int(math.floor(pos))
+    hi = int(math.ceil(pos))
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def _summarize(values: Sequence[float]) -> Dict[str, float]:
+    if len(values) == 0:
+        return {}
+    sorted_values = sorted(values)
+    return {
+        "mean": sum(sorted_values) / len(sorted_values),
+        "min": sorted_values[0],
+        "p50": _percentile(sorted_values, 0.5),
+        "p90": _percentile(sorted_values, 0.9),
+        "p99": _percentile(sorted_values, 0.99),
+        "max": sorted_values[-1],
+    }
+
+
+def _format_summary(summary: Dict[str, float]) -> str:
+    if len(summary) == 0:
+        return "n/a"
+    return ", ".join(f"{key} {val:.3f}" for key, val in summary.items())
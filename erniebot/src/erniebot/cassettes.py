@@ -0,0 +1,484 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import collections
+import json
+import threading
+import time
+import urllib.parse
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from . import errors
+from .coalescing import make_request_key
+from .transports import (
+    AiohttpTransport,
+    AsyncTransportResponse,
+    RequestsTransport,
+    StreamTimeouts,
+    Transport,
+    TransportResponse,
+)
+from .types import HeadersType
+from .utils import logging
+
+__all__ = ["CassetteTransport", "get_cassette_transport"]
+
+# Query parameters that carry credentials and are neither matched nor saved.
+_SECRET_QUERY_PARAMS = ("access_token",)
+
+_ERROR_TYPES = {"timeout": errors.TimeoutError, "connection": errors.ConnectionError}
+
+
+class CassetteTransport(Transport):
+    """Transport that records HTTP exchanges to a cassette file and replays
+    them.
+
+    In `"record"` mode, requests are sent by an underlying transport, and each
+    exchange, including the time taken by the response headers and by each
+    line of a streamed body, is appended to the cassette once the response is
+    fully read. In `"replay"` mode, no request leaves the process: responses
+    are served from the cassette with the recorded timing multiplied by
+    `time_scale`.
+
+    Requests are matched by a canonical hash of the method, the URL, and the
+    body. Headers and credentials in the URL are ignored, so a cassette can be
+    replayed with different credentials. Identical requests are answered in
+    the order they were recorded, and the last recorded exchange is reused
+    once they run out.
+
+    A cassette is a JSON Lines file with one exchange per line. Request
+    headers and credentials are not saved.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        mode: str = "replay",
+        transport: Optional[Transport] = None,
+        time_scale: float = 1.0,
+    ) -> None:
+        """Initializes the transport.
+
+        Args:
+            path: Path of the cassette file.
+            mode: `"record"` to overwrite the cassette with new exchanges, or
+                `"replay"` to serve responses from it.
+            transport: Transport to send requests with in `"record"` mode.
+                If not given, `RequestsTransport` and `AiohttpTransport` are
+                used for synchronous and asynchronous requests, respectively.
+            time_scale: Factor by which recorded delays are multiplied when
+                replaying. 0 replays without delays.
+        """
+        super().__init__()
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unsupported mode: {mode}")
+        if time_scale < 0:
+            raise ValueError("`time_scale` must not be negative.")
+        self.path = path
+        self.mode = mode
+        self.time_scale = time_scale
+        self._transport = transport if transport is not None else RequestsTransport()
+        self._atransport = transport if transport is not None else AiohttpTransport()
+        self._lock = threading.Lock()
+        self._exchanges: Dict[str, Deque[Dict[str, Any]]] = collections.defaultdict(collections.deque)
+        if mode == "record":
+            # Start a new cassette.
+            open(self.path, "w", encoding="utf-8").close()
+        else:
+            self._load()
+
+    def send(
+        self,
+        method: str,
+        url: str,
+        *,
+        headers: Optional[HeadersType],
+        data: Optional[bytes],
+        stream: bool,
+        timeout: float,
+        stream_timeouts: Optional[StreamTimeouts] = None,
+    ) -> TransportResponse:
+        exchange = self._new_exchange(method, url, data)
+        if self.mode == "replay":
+            recorded = self._find(exchange)
+            delay, error = self._get_header_delay(recorded, timeout, stream_timeouts)
+            time.sleep(delay)
+            if error is not None:
+                raise error
+            return _ReplayResponse(recorded["response"], self.time_scale)
+
+        start = time.monotonic()
+        try:
+            response = self._transport.send(
+                method,
+                url,
+                headers=headers,
+                data=data,
+                stream=stream,
+                timeout=timeout,
+                stream_timeouts=stream_timeouts,
+            )
+        except (errors.TimeoutError, errors.ConnectionError) as e:
+            self._record_error(exchange, e, time.monotonic() - start)
+            raise
+        return _RecordingResponse(response, self._start_response(exchange, response, start), self._save)
+
+    async def asend(
+        self,
+        method: str,
+        url: str,
+        *,
+        headers: Optional[HeadersType],
+        data: Optional[bytes],
+        stream: bool,
+        timeout: float,
+        stream_timeouts: Optional[StreamTimeouts] = None,
+    ) -> AsyncTransportResponse:
+        exchange = self._new_exchange(method, url, data)
+        if self.mode == "replay":
+            recorded = self._find(exchange)
+            delay, error = self._get_header_delay(recorded, timeout, stream_timeouts)
+            await asyncio.sleep(delay)
+            if error is not None:
+                raise error
+            return _AsyncReplayResponse(recorded["response"], self.time_scale)
+
+        start = time.monotonic()
+        try:
+            response = await self._atransport.asend(
+                method,
+                url,
+                headers=headers,
+                data=data,
+                stream=stream,
+                timeout=timeout,
+                stream_timeouts=stream_timeouts,
+            )
+        except (errors.TimeoutError, errors.ConnectionError) as e:
+            self._record_error(exchange, e, time.monotonic() - start)
+            raise
+        return _AsyncRecordingResponse(response, self._start_response(exchange, response, start), self._save)
+
+    def preconnect(self, url: str, num_connections: int, timeout: float) -> int:
+        if self.mode == "replay":
+            return 0
+        return self._transport.preconnect(url, num_connections, timeout)
+
+    async def apreconnect(self, url: str, num_connections: int, timeout: float) -> int:
+        if self.mode == "replay":
+            return 0
+        return await self._atransport.apreconnect(url, num_connections, timeout)
+
+    def close(self) -> None:
+        self._transport.close()
+        if self._atransport is not self._transport:
+            self._atransport.close()
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+        if self._atransport is not self._transport:
+            await self._atransport.aclose()
+
+    def _new_exchange(self, method: str, url: str, data: Optional[bytes]) -> Dict[str, Any]:
+        url = _strip_secrets(url)
+        body: Any = None
+        if data is not None:
+            text = data.decode("utf-8", errors="surrogateescape")
+            try:
+                # Ignore the order of keys.
+                body = json.loads(text)
+            except ValueError:
+                body = text
+        return {"key": make_request_key(method.upper(), url, body), "method": method.upper(), "url": url}
+
+    def _find(self, exchange: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            queue = self._exchanges.get(exchange["key"], None)
+            if not queue:
+                raise errors.UnrecordedRequestError(
+                    f"No exchange for {exchange['method']} {exchange['url']} is recorded in {self.path}."
+                )
+            if len(queue) > 1:
+                return queue.popleft()
+            return queue[0]
+
+    def _get_header_delay(
+        self, recorded: Dict[str, Any], timeout: float, stream_timeouts: Optional[StreamTimeouts]
+    ) -> Tuple[float, Optional[Exception]]:
+        delay = recorded["response"]["delay"] * self.time_scale
+        limit = stream_timeouts.first_chunk if stream_timeouts is not None else timeout
+        if delay > limit:
+            return limit, errors.TimeoutError("Request timed out (replayed).")
+        if recorded["response"]["status_code"] is None:
+            # The request failed before the response headers arrived.
+            return delay, _make_error(recorded["response"]["error"])
+        return delay, None
+
+    def _start_response(self, exchange: Dict[str, Any], response: Any, start: float) -> Dict[str, Any]:
+        exchange["response"] = {
+            "delay": time.monotonic() - start,
+            "status_code": response.status_code,
+            "headers": dict(response.headers),
+            "chunks": [],
+            "error": None,
+        }
+        return exchange
+
+    def _record_error(self, exchange: Dict[str, Any], error: Exception, delay: float) -> None:
+        exchange["response"] = {
+            "delay": delay,
+            "status_code": None,
+            "headers": {},
+            "chunks": [],
+            "error": _describe_error(error),
+        }
+        self._save(exchange)
+
+    def _save(self, exchange: Dict[str, Any]) -> None:
+        line = json.dumps(exchange, ensure_ascii=True)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def _load(self) -> None:
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    exchange = json.loads(line)
+                    self._exchanges[exchange["key"]].append(exchange)
+        logging.debug("%d exchanges loaded from %s", sum(map(len, self._exchanges.values())), self.path)
+
+
+_CASSETTE_TRANSPORTS: Dict[Tuple[str, str], CassetteTransport] = {}
+_CASSETTE_TRANSPORTS_LOCK = threading.Lock()
+
+
+def get_cassette_transport(path: str, mode: str) -> CassetteTransport:
+    """Returns the transport of the process for a cassette, which is created
+    on first use."""
+    with _CASSETTE_TRANSPORTS_LOCK:
+        transport = _CASSETTE_TRANSPORTS.get((path, mode), None)
+        if transport is None:
+            transport = CassetteTransport(path, mode=mode)
+            _CASSETTE_TRANSPORTS[(path, mode)] = transport
+        return transport
+
+
+class _RecordingResponse(TransportResponse):
+    def __init__(
+        self, response: TransportResponse, exchange: Dict[str, Any], save: Callable[[Dict[str, Any]], None]
+    ) -> None:
+        super().__init__()
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self._response = response
+        self._exchange = exchange
+        self._save = save
+        self._last = time.monotonic()
+        self._complete = False
+
+    def read(self) -> bytes:
+        try:
+            body = self._response.read()
+        except (errors.TimeoutError, errors.ConnectionError) as e:
+            self._finish_with_error(e)
+            raise
+        self._add_chunk(body)
+        self._complete = True
+        return body
+
+    def iter_lines(self) -> Iterator[bytes]:
+        try:
+            for line in self._response.iter_lines():
+                line = line.rstrip(b"\r\n")
+                self._add_chunk(line)
+                yield line
+        except (errors.TimeoutError, errors.ConnectionError) as e:
+            self._finish_with_error(e)
+            raise
+        self._complete = True
+
+    def set_read_timeout(self, timeout: Optional[float]) -> None:
+        self._response.set_read_timeout(timeout)
+
+    def close(self) -> None:
+        self._response.close()
+        if self._complete:
+            # Responses that are not fully read are not recorded.
+            self._complete = False
+            self._save(self._exchange)
+
+    def _add_chunk(self, chunk: bytes) -> None:
+        now = time.monotonic()
+        self._exchange["response"]["chunks"].append([now - self._last, _encode(chunk)])
+        self._last = now
+
+    def _finish_with_error(self, error: Exception) -> None:
+        self._exchange["response"]["error"] = _describe_error(error)
+        self._complete = True
+
+
+class _AsyncRecordingResponse(AsyncTransportResponse):
+    def __init__(
+        self,
+        response: AsyncTransportResponse,
+        exchange: Dict[str, Any],
+        save: Callable[[Dict[str, Any]], None],
+    ) -> None:
+        super().__init__()
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self._response = response
+        self._exchange = exchange
+        self._save = save
+        self._last = time.monotonic()
+        self._complete = False
+
+    async def read(self) -> bytes:
+        try:
+            body = await self._response.read()
+        except (errors.TimeoutError, errors.ConnectionError) as e:
+            self._finish_with_error(e)
+            raise
+        self._add_chunk(body)
+        self._complete = True
+        return body
+
+    async def iter_lines(self) -> AsyncIterator[bytes]:
+        try:
+            async for line in self._response.iter_lines():
+                line = line.rstrip(b"\r\n")
+                self._add_chunk(line)
+                yield line
+        except (errors.TimeoutError, errors.ConnectionError) as e:
+            self._finish_with_error(e)
+            raise
+        self._complete = True
+
+    async def aclose(self) -> None:
+        await self._response.aclose()
+        if self._complete:
+            self._complete = False
+            self._save(self._exchange)
+
+    def _add_chunk(self, chunk: bytes) -> None:
+        now = time.monotonic()
+        self._exchange["response"]["chunks"].append([now - self._last, _encode(chunk)])
+        self._last = now
+
+    def _finish_with_error(self, error: Exception) -> None:
+        self._exchange["response"]["error"] = _describe_error(error)
+        self._complete = True
+
+
+class _ReplayResponse(TransportResponse):
+    def __init__(self, recorded: Dict[str, Any], time_scale: float) -> None:
+        super().__init__()
+        self.status_code = recorded["status_code"]
+        self.headers = recorded["headers"]
+        self._chunks: List[Tuple[float, str]] = recorded["chunks"]
+        self._error = recorded["error"]
+        self._time_scale = time_scale
+        self._read_timeout: Optional[float] = None
+
+    def read(self) -> bytes:
+        time.sleep(sum(delay for delay, _ in self._chunks) * self._time_scale)
+        body = b"".join(_decode(chunk) for _, chunk in self._chunks)
+        if self._error is not None:
+            raise _make_error(self._error)
+        return body
+
+    def iter_lines(self) -> Iterator[bytes]:
+        for delay, chunk in self._chunks:
+            delay *= self._time_scale
+            if self._read_timeout is not None and delay > self._read_timeout:
+                time.sleep(self._read_timeout)
+                raise errors.TimeoutError("Request timed out (replayed).")
+            time.sleep(delay)
+            yield _decode(chunk)
+        if self._error is not None:
+            raise _make_error(self._error)
+
+    def set_read_timeout(self, timeout: Optional[float]) -> None:
+        self._read_timeout = timeout
+
+    def close(self) -> None:
+        pass
+
+
+class _AsyncReplayResponse(AsyncTransportResponse):
+    def __init__(self, recorded: Dict[str, Any], time_scale: float) -> None:
+        super().__init__()
+        self.status_code = recorded["status_code"]
+        self.headers = recorded["headers"]
+        self._chunks: List[Tuple[float, str]] = recorded["chunks"]
+        self._error = recorded["error"]
+        self._time_scale = time_scale
+
+    async def read(self) -> bytes:
+        await asyncio.sleep(sum(delay for delay, _ in self._chunks) * self._time_scale)
+        body = b"".join(_decode(chunk) for _, chunk in self._chunks)
+        if self._error is not None:
+            raise _make_error(self._error)
+        return body
+
+    async def iter_lines(self) -> AsyncIterator[bytes]:
+        # `EBClient` enforces the stream timeouts of asynchronous requests.
+        for delay, chunk in self._chunks:
+            await asyncio.sleep(delay * self._time_scale)
+            yield _decode(chunk)
+        if self._error is not None:
+            raise _make_error(self._error)
+
+    async def aclose(self) -> None:
+        pass
+
+
+def _strip_secrets(url: str) -> str:
+    parts = urllib.parse.urlsplit(url)
+    query = [
+        (k, v)
+        for k, v in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+        if k not in _SECRET_QUERY_PARAMS
+    ]
+    return urllib.parse.urlunsplit(parts._replace(query=urllib.parse.urlencode(query)))
+
+
+def _encode(chunk: bytes) -> str:
+    return chunk.decode("utf-8", errors="surrogateescape")
+
+
+def _decode(chunk: str) -> bytes:
+    return chunk.encode("utf-8", errors="surrogateescape")
+
+
+def _describe_error(error: Exception) -> Dict[str, str]:
+    type_ = "timeout" if isinstance(error, errors.TimeoutError) else "connection"
+    return {"type": type_, "message": str(error)}
+
+
+def _make_error(error: Dict[str, str]) -> Exception:
+    return _ERROR_TYPES[error["type"]](f"{error['message']} (replayed)")
@@ -13,10 +13,16 @@
 # limitations under the License.
 
 import argparse
+import asyncio
+import json
 import logging
+import os
+
+import aiohttp
 
 import erniebot
 
+from .bench import run_benchmark
 from .config import GlobalConfig
 from .errors import EBError
 from .response import EBResponse
@@ -38,7 +44,7 @@ def console_main():
     if args.api_type:
         cfg.set_value("api_type", args.api_type)
     if args.api_base_url:
-        cfg.set_value("base_url", args.api_base_url)
+        cfg.set_value("api_base_url", args.api_base_url)
     if args.access_token:
         cfg.set_value("access_token", args.access_token)
     if args.ak:
@@ -88,12 +94,92 @@ def parse_args(*args, **kwargs):
     api_parsers = subparser_api.add_subparsers(dest="api", required=True)
     _register_resource(api_parsers, ChatCompletionHelper, "chat_completion")
     _register_resource(api_parsers, ChatFileHelper, "chat_file")
+    _register_resource(api_parsers, EmbeddingHelper, "embedding")
     _register_resource(api_parsers, ImageV2Helper, "image")
     _register_resource(api_parsers, ModelHelper, "model")
 
+    subparser_bench = subparsers.add_parser("bench", help="Load testing.")
+    _add_bench_arguments(subparser_bench)
+    subparser_bench.set_defaults(api_invoker=_run_bench)
+
     return parser.parse_args(*args, **kwargs)
 
 
+def _add_bench_arguments(parser):
+    parser.add_argument(
+        "--resource",
+        type=str,
+        choices=["chat_completion", "embedding"],
+        default="chat_completion",
+        help="Resource to call.",
+    )
+    parser.add_argument("--model", type=str, required=True, help="Model to use.")
+    parser.add_argument(
+        "--message",
+        type=str,
+        default="你好，请介绍一下你自己。",
+        help="Content of the user message (chat_completion) or the input text (embedding).",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Whether to stream messages. Time to first token and tokens/s are measured in this mode.",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        help="Number of requests kept in flight. When used with `--rate`, it caps the number of requests in flight.",
+    )
+    parser.add_argument("--rate", type=float, help="Number of requests issued per second.")
+    parser.add_argument(
+        "--duration", type=float, default=10, help="Number of seconds during which requests are issued."
+    )
+    parser.add_argument(
+        "--request-timeout",
+        type=float,
+        help="How many seconds to wait for the server to send data before giving up.",
+    )
+    parser.add_argument("--json", action="store_true", help="Whether to print the results as JSON.")
+    return parser
+
+
+def _run_bench(args):
+    if args.resource == "chat_completion":
+        kwargs = {
+            "model": args.model,
+            "messages": [{"role": "user", "content": args.message}],
+            "stream": args.stream,
+        }
+        resource_cls = erniebot.ChatCompletion
+    else:
+        if args.stream:
+            raise ValueError("Streaming is not supported by the embedding API.")
+        kwargs = {"model": args.model, "input": [args.message]}
+        resource_cls = erniebot.Embedding
+    if args.request_timeout:
+        kwargs["request_timeout"] = args.request_timeout
+    concurrency = args.concurrency
+    if concurrency is None and args.rate is None:
+        concurrency = 1
+
+    async def _request(config):
+        return await resource_cls.acreate(**kwargs, _config_=config)
+
+    result = asyncio.run(
+        run_benchmark(
+            _request,
+            duration=args.duration,
+            concurrency=concurrency,
+            rate=args.rate,
+            stream=args.stream,
+        )
+    )
+    if args.json:
+        print(json.dumps(result.to_dict(), indent=2))
+    else:
+        print(result.format())
+
+
 def _register_resource(subparsers, resource, parser_name_prefix):
     api_names = resource.get_api_names()
     for api_name in api_names:
@@ -134,6 +220,147 @@ class _ResourceCLIHelper(object):
 
         return parser
 
+    # Batch mode
+    @classmethod
+    def add_batch_arguments(cls, parser):
+        parser.add_argument(
+            "--input",
+            type=str,
+            required=True,
+            help="Path of a JSONL file, each line of which is a JSON object holding the arguments of a request. An optional `custom_id` field is copied to the result.",
+        )
+        parser.add_argument(
+            "--output",
+            type=str,
+            required=True,
+            help="Path of the JSONL file to write results to. If the file already exists, requests that have results in it are skipped.",
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=8, help="Maximum number of concurrent requests."
+        )
+        parser.add_argument(
+            "--retry-failed",
+            action="store_true",
+            help="Whether to rerun requests that failed in a previous run.",
+        )
+        parser.add_argument(
+            "--request-timeout",
+            type=float,
+            help="How many seconds to wait for the server to send data before giving up.",
+        )
+        return parser
+
+    @classmethod
+    def batch(cls, args):
+        runner = _BatchRunner(
+            cls.get_resource_class(),
+            concurrency=args.concurrency,
+            request_timeout=args.request_timeout,
+        )
+        stats = asyncio.run(runner.run(args.input, args.output, retry_failed=args.retry_failed))
+        print(
+            "Succeeded: %d, failed: %d, skipped: %d"
+            % (stats["succeeded"], stats["failed"], stats["skipped"])
+        )
+
+
+class _BatchRunner(object):
+    def __init__(self, resource_cls, *, concurrency, request_timeout=None):
+        super().__init__()
+        if concurrency <= 0:
+            raise ValueError("`concurrency` must be positive.")
+        self.resource_cls = resource_cls
+        self.concurrency = concurrency
+        self.request_timeout = request_timeout
+
+    async def run(self, input_path, output_path, *, retry_failed=False):
+        finished = self._load_finished_indices(output_path, retry_failed)
+        stats = {"succeeded": 0, "failed": 0, "skipped": 0}
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+        # All requests share one connection pool.
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            config = {"aiohttp_session": session}
+            with open(input_path, "r", encoding="utf-8") as fin, open(
+                output_path, "a", encoding="utf-8"
+            ) as fout:
+                # Read the input lazily, so that at most `concurrency` requests
+                # are pending at any time.
+                for index, line in enumerate(fin):
+                    if index in finished or not line.strip():
+                        stats["skipped"] += 1
+                        continue
+                    await semaphore.acquire()
+                    task = asyncio.ensure_future(self._run_one(index, line, config, fout, stats))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    task.add_done_callback(lambda _: semaphore.release())
+                if len(tasks) > 0:
+                    await asyncio.gather(*tasks)
+        return stats
+
+    async def _run_one(self, index, line, config, fout, stats):
+        record = {"index": index}
+        try:
+            kwargs = json.loads(line)
+            if not isinstance(kwargs, dict):
+                raise ValueError("Each line of the input file must be a JSON object.")
+            if "custom_id" in kwargs:
+                record["custom_id"] = kwargs.pop("custom_id")
+            if kwargs.get("stream", False):
+                raise ValueError("Streaming is not supported in batch mode.")
+            if self.request_timeout is not None and "request_timeout" not in kwargs:
+                kwargs["request_timeout"] = self.request_timeout
+            kwargs["_config_"] = config
+            resp = await self.resource_cls.acreate(**kwargs)
+        except Exception as e:
+            logging.warning("Request %d failed: %s", index, e)
+            record["error"] = {"type": type(e).__name__, "message": str(e)}
+            stats["failed"] += 1
+        else:
+            record["response"] = resp.to_dict()
+            stats["succeeded"] += 1
+        # Results are written as soon as they are available.
+        fout.write(json.dumps(record, ensure_ascii=False) + "\n")
+        fout.flush()
+
+    @staticmethod
+    def _load_finished_indices(output_path, retry_failed):
+        finished = set()
+        if not os.path.exists(output_path):
+            return finished
+        # When failed requests are retried, their old results are dropped, so
+        # that each request has one result in the output file.
+        temp_path = output_path + ".tmp"
+        ftemp = open(temp_path, "wb") if retry_failed else None
+        try:
+            with open(output_path, "rb+") as f:
+                end_of_last_line = 0
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # The last line was only partially written.
+                        break
+                    end_of_last_line += len(line)
+                    try:
+                        record = json.loads(line)
+                        index = record["index"]
+                    except (ValueError, KeyError, TypeError):
+                        index = None
+                    if index is not None:
+                        if retry_failed and "response" not in record:
+                            continue
+                        finished.add(index)
+                    if ftemp is not None:
+                        ftemp.write(line)
+                f.truncate(end_of_last_line)
+        finally:
+            if ftemp is not None:
+                ftemp.close()
+        if retry_failed:
+            os.replace(temp_path, output_path)
+        return finished
+
 
 class ChatCompletionHelper(_ResourceCLIHelper):
     @classmethod
@@ -142,7 +369,7 @@ class ChatCompletionHelper(_ResourceCLIHelper):
 
     @classmethod
     def get_api_names(cls):
-        return ["create"]
+        return ["create", "batch"]
 
     @classmethod
     def get_resource_class(cls):
@@ -258,6 +485,20 @@ class ChatFileHelper(_ResourceCLIHelper):
             print(r.result)
 
 
+class EmbeddingHelper(_ResourceCLIHelper):
+    @classmethod
+    def add_resource_arguments(cls, parser):
+        return parser
+
+    @classmethod
+    def get_api_names(cls):
+        return ["batch"]
+
+    @classmethod
+    def get_resource_class(cls):
+        return erniebot.Embedding
+
+
 class ImageV1Helper(_ResourceCLIHelper):
     @classmethod
     def add_resource_arguments(cls, parser):
@@ -308,7 +549,7 @@ class ImageV2Helper(_ResourceCLIHelper):
 
     @classmethod
     def get_api_names(cls):
-        return ["create"]
+        return ["create", "batch"]
 
     @classmethod
     def get_resource_class(cls):
@@ -0,0 +1,410 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import threading
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+    cast,
+)
+
+from . import metering
+from .response import EBResponse
+
+__all__ = ["RequestCoalescer"]
+
+
+def make_request_key(*parts: Any) -> str:
+    """Computes a canonical hash of the given request parts.
+
+    Mappings are compared regardless of key order. Objects that cannot be
+    serialized to JSON are represented by `repr`.
+    """
+    canonical = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=repr)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class RequestCoalescer(object):
+    """Single-flight layer for identical in-flight requests.
+
+    When a request is issued while an identical one is still in flight, the
+    new caller is attached to the pending request instead of sending another
+    one. Once the request finishes, the next identical request is sent as
+    usual, so no results are cached beyond the lifetime of a request.
+
+    Streamed responses are fanned out: every caller receives all chunks from
+    the beginning, including a caller that joins after some chunks have
+    already been received. The upstream stream is closed early only when all
+    callers have stopped consuming it.
+
+    A coalescer can be configured via the `coalescer` setting. Only chat
+    completion and embedding requests are coalesced. Note that coalesced
+    callers share a single response, so sampling parameters such as
+    `temperature` do not lead to different results among them.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._num_requests = 0
+        self._num_coalesced = 0
+        self._lock = threading.Lock()
+
+    def run(self, key: str, func: Callable[[], Any], stream: bool) -> Any:
+        """Calls `func`, or waits for the result of an identical call.
+
+        Args:
+            key: Canonical hash of the request.
+            func: Function that sends the request.
+            stream: Whether `func` returns a stream.
+
+        Returns:
+            The response, or an iterator of the streamed response.
+        """
+        flight, is_leader = self._join(key, stream, lambda _: concurrent.futures.Future())
+        future = cast(concurrent.futures.Future, flight.future)
+        if not is_leader:
+            _mark_coalesced()
+        if is_leader:
+            try:
+                resp = func()
+            except BaseException as e:
+                self._land(flight)
+                future.set_exception(e)
+                if not stream:
+                    raise
+            else:
+                if stream:
+                    future.set_result(_StreamFanOut(resp, lambda: self._land(flight)))
+                else:
+                    self._land(flight)
+                    future.set_result(resp)
+                    return resp
+
+        try:
+            result = future.result()
+        except BaseException:
+            if stream:
+                self._release(flight)
+            raise
+        if stream:
+            return _StreamConsumer(result, lambda: self._release(flight))
+        return result
+
+    async def arun(self, key: str, func: Callable[[], Awaitable[Any]], stream: bool) -> Any:
+        """Asynchronous version of `run`.
+
+        Requests are coalesced only among callers running on the same event
+        loop. The request is sent in a separate task, so it is cancelled only
+        when all callers waiting for it are cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        flight, is_leader = self._join(
+            (loop, key), stream, lambda flight: self._create_task(loop, flight, func, stream)
+        )
+        if not is_leader:
+            _mark_coalesced()
+        task = cast(asyncio.Future, flight.future)
+        try:
+            result = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            with self._lock:
+                flight.num_waiters -= 1
+                if flight.num_waiters == 0 and not task.done():
+                    task.cancel()
+            if stream:
+                self._release(flight)
+            raise
+        except BaseException:
+            with self._lock:
+                flight.num_waiters -= 1
+            if stream:
+                self._release(flight)
+            raise
+        with self._lock:
+            flight.num_waiters -= 1
+        if stream:
+            return _AsyncStreamConsumer(result, lambda: self._release(flight))
+        return result
+
+    def get_metrics(self) -> Dict[str, int]:
+        """Returns the number of requests sent and the number of coalesced
+        calls."""
+        with self._lock:
+            return {
+                "num_in_flight": len(self._flights),
+                "num_requests": self._num_requests,
+                "num_coalesced": self._num_coalesced,
+            }
+
+    def _join(
+        self, key: Hashable, stream: bool, create_future: Callable[["_Flight"], Any]
+    ) -> Tuple["_Flight", bool]:
+        with self._lock:
+            flight = self._flights.get(key, None)
+            is_leader = flight is None
+            if flight is None:
+                flight = _Flight(key)
+                flight.future = create_future(flight)
+                self._flights[key] = flight
+                self._num_requests += 1
+            else:
+                self._num_coalesced += 1
+            flight.num_waiters += 1
+            if stream:
+                flight.num_consumers += 1
+            return flight, is_leader
+
+    def _create_task(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        flight: "_Flight",
+        func: Callable[[], Awaitable[Any]],
+        stream: bool,
+    ) -> asyncio.Future:
+        task = loop.create_task(self._run_task(flight, func, stream))
+        task.add_done_callback(lambda task: self._on_task_done(flight, task))
+        return task
+
+    async def _run_task(self, flight: "_Flight", func: Callable[[], Awaitable[Any]], stream: bool) -> Any:
+        try:
+            resp = await func()
+        except BaseException:
+            self._land(flight)
+            raise
+        if stream:
+            return _AsyncStreamFanOut(resp, lambda: self._land(flight))
+        self._land(flight)
+        return resp
+
+    def _on_task_done(self, flight: "_Flight", task: asyncio.Future) -> None:
+        # The task may be cancelled before it starts running.
+        if task.cancelled():
+            self._land(flight)
+
+    def _land(self, flight: "_Flight") -> None:
+        # Stops attaching new callers to the flight.
+        with self._lock:
+            if self._flights.get(flight.key, None) is flight:
+                del self._flights[flight.key]
+
+    def _release(self, flight: "_Flight") -> None:
+        # Called when a caller stops consuming a stream.
+        with self._lock:
+            flight.num_consumers -= 1
+            if flight.num_consumers > 0:
+                return
+            if self._flights.get(flight.key, None) is flight:
+                del self._flights[flight.key]
+        future = flight.future
+        if future is None:
+            return
+        if not future.done():
+            # All callers waiting for the request were cancelled.
+            future.cancel()
+        elif not future.cancelled() and future.exception() is None:
+            future.result().close_upstream()
+
+
+def _mark_coalesced() -> None:
+    record = metering.get_current_record()
+    if record is not None:
+        record.coalesced = True
+
+
+class _Flight(object):
+    def __init__(self, key: Hashable) -> None:
+        super().__init__()
+        self.key = key
+        self.future: Union[concurrent.futures.Future, asyncio.Future, None] = None
+        self.num_waiters = 0
+        self.num_consumers = 0
+
+
+class _StreamFanOut(object):
+    def __init__(self, upstream: Iterator[EBResponse], on_finish: Callable[[], None]) -> None:
+        super().__init__()
+        self._upstream = upstream
+        self._on_finish = on_finish
+        self._chunks: List[EBResponse] = []
+        self._finished = False
+        self._error: Optional[BaseException] = None
+        self._fetch_lock = threading.Lock()
+
+    def get(self, idx: int) -> Optional[EBResponse]:
+        while True:
+            if idx < len(self._chunks):
+                return self._chunks[idx]
+            if self._finished:
+                if self._error is not None:
+                    raise self._error
+                return None
+            with self._fetch_lock:
+                # Another consumer may have fetched the chunk in the meantime.
+                if idx < len(self._chunks) or self._finished:
+                    continue
+                try:
+                    self._chunks.append(next(self._upstream))
+                except StopIteration:
+                    self._finish()
+                except BaseException as e:
+                    self._error = e
+                    self._finish()
+
+    def close_upstream(self) -> None:
+        with self._fetch_lock:
+            if self._finished:
+                return
+            self._finish()
+            close = getattr(self._upstream, "close", None)
+            if close is not None:
+                close()
+
+    def _finish(self) -> None:
+        self._finished = True
+        self._on_finish()
+
+
+class _StreamConsumer(Iterator[EBResponse]):
+    def __init__(self, fan_out: _StreamFanOut, on_close: Callable[[], None]) -> None:
+        super().__init__()
+        self._fan_out = fan_out
+        self._on_close: Optional[Callable[[], None]] = on_close
+        self._idx = 0
+
+    def __next__(self) -> EBResponse:
+        if self._on_close is None:
+            raise StopIteration
+        try:
+            chunk = self._fan_out.get(self._idx)
+        except BaseException:
+            self.close()
+            raise
+        if chunk is None:
+            self.close()
+            raise StopIteration
+        self._idx += 1
+        return chunk
+
+    def __del__(self) -> None:
+        self.close()
+
+    def close(self) -> None:
+        on_close, self._on_close = self._on_close, None
+        if on_close is not None:
+            on_close()
+
+
+class _AsyncStreamFanOut(object):
+    def __init__(self, upstream: AsyncIterator[EBResponse], on_finish: Callable[[], None]) -> None:
+        super().__init__()
+        self._upstream = upstream
+        self._on_finish = on_finish
+        self._chunks: List[EBResponse] = []
+        self._finished = False
+        self._error: Optional[BaseException] = None
+        self._fetch: Optional[asyncio.Future] = None
+        self._loop = asyncio.get_running_loop()
+
+    async def get(self, idx: int) -> Optional[EBResponse]:
+        while True:
+            if idx < len(self._chunks):
+                return self._chunks[idx]
+            if self._finished:
+                if self._error is not None:
+                    raise self._error
+                return None
+            if self._fetch is None:
+                self._fetch = asyncio.ensure_future(self._fetch_next())
+            # Cancelling one consumer must not interrupt the shared stream.
+            await asyncio.shield(self._fetch)
+
+    def close_upstream(self) -> None:
+        # May be called from a finalizer, so defer the work to the loop.
+        self._loop.call_soon_threadsafe(self._close_upstream)
+
+    async def _fetch_next(self) -> None:
+        try:
+            self._chunks.append(await self._upstream.__anext__())
+        except StopAsyncIteration:
+            self._finish()
+        except BaseException as e:
+            self._error = e
+            self._finish()
+        finally:
+            self._fetch = None
+
+    def _close_upstream(self) -> None:
+        if self._finished:
+            return
+        self._finish()
+        if self._fetch is not None:
+            self._fetch.cancel()
+        else:
+            aclose = getattr(self._upstream, "aclose", None)
+            if aclose is not None:
+                asyncio.ensure_future(aclose())
+
+    def _finish(self) -> None:
+        self._finished = True
+        self._on_finish()
+
+
+class _AsyncStreamConsumer(AsyncIterator[EBResponse]):
+    def __init__(self, fan_out: _AsyncStreamFanOut, on_close: Callable[[], None]) -> None:
+        super().__init__()
+        self._fan_out = fan_out
+        self._on_close: Optional[Callable[[], None]] = on_close
+        self._idx = 0
+
+    async def __anext__(self) -> EBResponse:
+        if self._on_close is None:
+            raise StopAsyncIteration
+        try:
+            chunk = await self._fan_out.get(self._idx)
+        except BaseException:
+            await self.aclose()
+            raise
+        if chunk is None:
+            await self.aclose()
+            raise StopAsyncIteration
+        self._idx += 1
+        return chunk
+
+    def __del__(self) -> None:
+        on_close, self._on_close = self._on_close, None
+        if on_close is not None:
+            try:
+                on_close()
+            except RuntimeError:
+                # The event loop is already closed.
+                pass
+
+    async def aclose(self) -> None:
+        on_close, self._on_close = self._on_close, None
+        if on_close is not None:
+            on_close()
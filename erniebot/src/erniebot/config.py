@@ -41,6 +41,8 @@ def init_global_config() -> None:
     cfg.add_item(StringItem(key="ak", env_key="EB_AK"))
     # Secret key or secret access key
     cfg.add_item(StringItem(key="sk", env_key="EB_SK"))
+    # Pool of credentials to spread requests across
+    cfg.add_item(AnyObjectItem(key="credential_pool"))
 
     # Retrying settings
     # Maximum number of retries
@@ -52,6 +54,38 @@ def init_global_config() -> None:
     # Maximum retry delay (not taking account of jitter)
     cfg.add_item(PositiveNumberItem(key="max_retry_delay", env_key="EB_MAX_RETRY_DELAY", default=10))
 
+    # Timeout settings of streamed requests
+    # Timeout for establishing a connection
+    cfg.add_item(PositiveNumberItem(key="stream_connect_timeout", env_key="EB_STREAM_CONNECT_TIMEOUT"))
+    # Timeout for receiving the first chunk
+    cfg.add_item(
+        PositiveNumberItem(key="stream_first_chunk_timeout", env_key="EB_STREAM_FIRST_CHUNK_TIMEOUT")
+    )
+    # Maximum time between two chunks
+    cfg.add_item(PositiveNumberItem(key="stream_idle_timeout", env_key="EB_STREAM_IDLE_TIMEOUT"))
+
+    # Scheduling settings
+    # Request scheduler
+    cfg.add_item(AnyObjectItem(key="scheduler"))
+    # Priority class of requests
+    cfg.add_item(StringItem(key="priority", env_key="EB_PRIORITY"))
+    # Tenant that issues requests
+    cfg.add_item(StringItem(key="tenant", env_key="EB_TENANT"))
+    # Client-side rate limiter
+    cfg.add_item(AnyObjectItem(key="rate_limiter"))
+    # Coalescer of identical in-flight requests
+    cfg.add_item(AnyObjectItem(key="coalescer"))
+
+    # Metering settings
+    # Meter that aggregates the usage of responses
+    cfg.add_item(AnyObjectItem(key="usage_meter"))
+    # Tags to group the metered usage by
+    cfg.add_item(AnyObjectItem(key="usage_tags"))
+
+    # Context window settings
+    # Fitter that shortens chat requests exceeding the context window
+    cfg.add_item(AnyObjectItem(key="context_window_fitter"))
+
     # Miscellaneous settings
     # Proxy to use
     cfg.add_item(URLItem(key="proxy", env_key="EB_PROXY"))
@@ -59,6 +93,12 @@ def init_global_config() -> None:
     cfg.add_item(AnyObjectItem(key="requests_session"))
     # aiohttp session
     cfg.add_item(AnyObjectItem(key="aiohttp_session"))
+    # Transport that sends HTTP requests
+    cfg.add_item(AnyObjectItem(key="transport"))
+    # Cassette file to record HTTP exchanges to or replay them from
+    cfg.add_item(StringItem(key="cassette_path", env_key="EB_CASSETTE_PATH"))
+    # Whether to record or replay the cassette
+    cfg.add_item(StringItem(key="cassette_mode", env_key="EB_CASSETTE_MODE", default="replay"))
 
 
 class _Config(object):
@@ -0,0 +1,247 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import functools
+import heapq
+import json
+from dataclasses import dataclass
+from typing import Callable, Final, List, Optional, Tuple
+
+from . import errors
+from .utils import logging
+from .utils.token_helper import approx_num_tokens
+
+__all__ = ["ContextWindowFitter", "FittedContext"]
+
+_TRUNCATION_MARK: Final[str] = "..."
+
+
+@dataclass
+class FittedContext(object):
+    messages: List[dict]
+    system: Optional[str]
+    num_tokens: int
+
+
+class ContextWindowFitter(object):
+    """Fits chat requests into the context window of the model.
+
+    Before a chat request is sent, the fitter estimates the number of input
+    tokens taken by `messages`, `system`, and `functions`, and, if the estimate
+    exceeds the input limit of the model, shortens the conversation according
+    to a policy:
+    1. "drop_oldest": The oldest turns are dropped. A turn starts with a user
+        message and includes all following messages up to the next user
+        message. The last turn is always kept.
+    2. "truncate_longest": The content of the longest message is truncated,
+        repeatedly, until the request fits. Function messages are not
+        truncated.
+    3. "summarize": Like "drop_oldest", but the dropped messages are passed to
+        `summarize_func`, and the returned summary is prepended to `system`.
+        If the summary does not fit along with the kept turns, more turns are
+        dropped and summarized again.
+
+    Token counts are cached by text, so that only new messages are counted
+    when a growing conversation is sent repeatedly.
+
+    A fitter can be configured via the `context_window_fitter` setting. The
+    input limits of the models are listed in `ChatCompletion._API_INFO_DICT`.
+    """
+
+    POLICIES: Final[tuple] = ("drop_oldest", "truncate_longest", "summarize")
+
+    def __init__(
+        self,
+        policy: str = "drop_oldest",
+        *,
+        summarize_func: Optional[Callable[[List[dict]], str]] = None,
+        safety_margin: float = 0.1,
+        token_counter: Callable[[str], int] = approx_num_tokens,
+        cache_size: int = 4096,
+    ) -> None:
+        """Initializes the fitter.
+
+        Args:
+            policy: Policy used to shorten the conversation.
+            summarize_func: Function that summarizes the dropped messages.
+                Required by the "summarize" policy.
+            safety_margin: Fraction of the input limit that is left unused to
+                make up for errors in token estimation.
+            token_counter: Function that estimates the number of tokens for a
+                text.
+            cache_size: Maximum number of cached token counts.
+        """
+        super().__init__()
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unsupported policy: {repr(policy)}. Supported: {self.POLICIES}")
+        if policy == "summarize" and summarize_func is None:
+            raise ValueError("`summarize_func` must be provided for the 'summarize' policy.")
+        if not 0 <= safety_margin < 1:
+            raise ValueError("`safety_margin` must be in [0, 1).")
+        self.policy = policy
+        self.summarize_func = summarize_func
+        self.safety_margin = safety_margin
+        self._count_text_tokens = functools.lru_cache(maxsize=cache_size)(token_counter)
+
+    def count_tokens(
+        self,
+        messages: List[dict],
+        *,
+        system: Optional[str] = None,
+        functions: Optional[List[dict]] = None,
+    ) -> int:
+        """Estimates the number of input tokens of a chat request."""
+        num_tokens = sum(self._count_message_tokens(message) for message in messages)
+        return num_tokens + self._count_extra_tokens(system, functions)
+
+    def fit(
+        self,
+        messages: List[dict],
+        max_input_tokens: int,
+        *,
+        system: Optional[str] = None,
+        functions: Optional[List[dict]] = None,
+    ) -> FittedContext:
+        """Shortens a conversation so that it fits into the input limit.
+
+        The input objects are not modified.
+
+        Args:
+            messages: Messages comprising the conversation.
+            max_input_tokens: Input limit of the model.
+            system: Text that tells the model how to interpret the conversation.
+            functions: Descriptions of the functions.
+
+        Returns:
+            The fitted messages and system text, and the estimated number of
+            input tokens.
+
+        Raises:
+            erniebot.errors.ContextWindowExceededError: The request cannot fit.
+        """
+        budget = int(max_input_tokens * (1 - self.safety_margin))
+        counts = [self._count_message_tokens(message) for message in messages]
+        extra = self._count_extra_tokens(system, functions)
+        total = sum(counts) + extra
+        if total <= budget:
+            return FittedContext(messages=messages, system=system, num_tokens=total)
+
+        logging.info(
+            "The estimated number of input tokens (%d) exceeds the budget (%d). Applying policy %r.",
+            total,
+            budget,
+            self.policy,
+        )
+        if self.policy == "truncate_longest":
+            messages, total = self._truncate_longest(messages, counts, budget - extra)
+            total += extra
+        else:
+            turn_starts = self._get_turn_starts(messages)
+            start, messages_total = self._find_first_kept_turn(turn_starts, counts, budget - extra)
+            total = messages_total + extra
+            fitted_system = system
+            if self.policy == "summarize":
+                # The summary takes up room as well, so drop more turns until
+                # the summary and the kept turns fit together.
+                assert self.summarize_func is not None
+                while start > 0:
+                    summary = self.summarize_func(messages[:start])
+                    fitted_system = summary if system is None else summary + "\n" + system
+                    total = sum(counts[start:]) + self._count_extra_tokens(fitted_system, functions)
+                    if total <= budget or start == turn_starts[-1]:
+                        break
+                    start = next(turn_start for turn_start in turn_starts if turn_start > start)
+            messages = messages[start:]
+            system = fitted_system
+        if total > budget:
+            raise errors.ContextWindowExceededError(
+                f"The request takes approximately {total} tokens, "
+                f"which exceeds the budget of {budget} tokens."
+            )
+        return FittedContext(messages=messages, system=system, num_tokens=total)
+
+    def _count_message_tokens(self, message: dict) -> int:
+        num_tokens = 0
+        content = message.get("content", None)
+        if content:
+            num_tokens += self._count_text_tokens(content)
+        function_call = message.get("function_call", None)
+        if function_call:
+            num_tokens += self._count_text_tokens(json.dumps(function_call, ensure_ascii=False))
+        return num_tokens
+
+    def _count_extra_tokens(self, system: Optional[str], functions: Optional[List[dict]]) -> int:
+        num_tokens = 0
+        if system:
+            num_tokens += self._count_text_tokens(system)
+        if functions:
+            num_tokens += self._count_text_tokens(json.dumps(functions, ensure_ascii=False))
+        return num_tokens
+
+    @staticmethod
+    def _get_turn_starts(messages: List[dict]) -> List[int]:
+        turn_starts = [i for i, message in enumerate(messages) if message.get("role", None) == "user"]
+        if len(turn_starts) == 0 or turn_starts[0] != 0:
+            turn_starts.insert(0, 0)
+        return turn_starts
+
+    @staticmethod
+    def _find_first_kept_turn(turn_starts: List[int], counts: List[int], budget: int) -> Tuple[int, int]:
+        # Scan turns from the newest to the oldest and keep as many as possible.
+        start = len(counts)
+        total = 0
+        for turn_start in reversed(turn_starts):
+            turn_total = sum(counts[turn_start:start])
+            if start != len(counts) and total + turn_total > budget:
+                break
+            total += turn_total
+            start = turn_start
+        return start, total
+
+    def _truncate_longest(
+        self, messages: List[dict], counts: List[int], budget: int
+    ) -> Tuple[List[dict], int]:
+        messages = list(messages)
+        counts = list(counts)
+        total = sum(counts)
+        heap = [
+            (-count, idx)
+            for idx, count in enumerate(counts)
+            # The content of function messages is JSON, which would be broken
+            # by truncation.
+            if isinstance(messages[idx].get("content"), str)
+            and messages[idx].get("role", None) != "function"
+        ]
+        heapq.heapify(heap)
+        mark_count = self._count_text_tokens(_TRUNCATION_MARK)
+        while total > budget and len(heap) > 0:
+            _, idx = heapq.heappop(heap)
+            message = messages[idx]
+            content = message["content"]
+            count = counts[idx]
+            # Leave room for the truncation mark.
+            target = max(count - (total - budget) - mark_count, 0)
+            # Token counts are not additive in characters, so shrink the content
+            # proportionally and count again.
+            new_len = int(len(content) * target / count) if count > 0 else 0
+            new_content = content[:new_len] + _TRUNCATION_MARK if new_len > 0 else _TRUNCATION_MARK
+            message = dict(message)
+            message["content"] = new_content
+            messages[idx] = message
+            new_count = self._count_message_tokens(message)
+            total += new_count - count
+            counts[idx] = new_count
+            if new_len > 0 and new_count < count:
+                heapq.heappush(heap, (-new_count, idx))
+        return messages, total
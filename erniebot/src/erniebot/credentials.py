@@ -0,0 +1,318 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Final,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    TypeVar,
+    Union,
+)
+
+from . import errors, metering
+from .streaming import aclose_iterator, close_iterator
+from .utils import logging
+
+__all__ = ["Credential", "CredentialPool"]
+
+_T = TypeVar("_T")
+
+
+@dataclass(frozen=True)
+class Credential(object):
+    """A set of authentication parameters for a single key.
+
+    Depending on the backend, either `access_token` or the pair of `ak` and
+    `sk` should be provided.
+    """
+
+    ak: Optional[str] = None
+    sk: Optional[str] = None
+    access_token: Optional[str] = None
+
+    def __post_init__(self) -> None:
+        if self.access_token is None and (self.ak is None or self.sk is None):
+            raise ValueError("Either `access_token` or both `ak` and `sk` must be provided.")
+
+    def __repr__(self) -> str:
+        # Do not leak secrets to logs.
+        if self.ak is not None:
+            return f"{self.__class__.__name__}(ak={repr(self.ak)})"
+        else:
+            assert self.access_token is not None
+            return f"{self.__class__.__name__}(access_token={repr(self.access_token[:6] + '...')})"
+
+
+@dataclass
+class _CredentialState(object):
+    credential: Credential
+    num_in_flight: int = 0
+    num_requests: int = 0
+    num_rate_limited: int = 0
+    num_auth_errors: int = 0
+    last_rate_limited_at: Optional[float] = None
+    sidelined_until: float = 0.0
+
+
+class CredentialPool(object):
+    """Spreads requests across multiple credentials.
+
+    A credential pool can be configured via the `credential_pool` setting
+    (either globally or via `_config_`). The backend acquires a credential from
+    the pool for each request and reports the outcome back to the pool, so that
+    keys that hit rate limits or authentication errors are temporarily
+    sidelined.
+
+    Supported strategies:
+    1. "round_robin": Credentials are used in turn.
+    2. "least_loaded": The credential with the fewest in-flight requests is
+        used.
+    """
+
+    STRATEGIES: Final[tuple] = ("round_robin", "least_loaded")
+
+    def __init__(
+        self,
+        credentials: Iterable[Union[Credential, Mapping[str, Any]]],
+        *,
+        strategy: str = "round_robin",
+        rate_limit_cooldown_secs: float = 10,
+        auth_error_cooldown_secs: float = 300,
+    ) -> None:
+        """Initializes the pool.
+
+        Args:
+            credentials: Credentials to use. Each item can be a `Credential`
+                object or a mapping with keys `ak`, `sk`, and `access_token`.
+            strategy: Strategy used to pick a credential.
+            rate_limit_cooldown_secs: How long a credential is sidelined after
+                hitting a rate limit.
+            auth_error_cooldown_secs: How long a credential is sidelined after
+                an authentication error.
+        """
+        super().__init__()
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unsupported strategy: {repr(strategy)}. Supported: {self.STRATEGIES}")
+        states = []
+        for cred in credentials:
+            if not isinstance(cred, Credential):
+                cred = Credential(**cred)
+            states.append(_CredentialState(credential=cred))
+        if len(states) == 0:
+            raise ValueError("At least one credential must be provided.")
+        self.strategy = strategy
+        self.rate_limit_cooldown_secs = rate_limit_cooldown_secs
+        self.auth_error_cooldown_secs = auth_error_cooldown_secs
+        self._states: List[_CredentialState] = states
+        self._state_dict: Dict[Credential, _CredentialState] = {s.credential: s for s in states}
+        self._next_idx = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    @property
+    def credentials(self) -> List[Credential]:
+        return [s.credential for s in self._states]
+
+    def acquire(self) -> Credential:
+        """Picks a credential and marks it as in use.
+
+        Sidelined credentials are skipped. If all credentials are sidelined,
+        the one that becomes available the soonest is returned.
+        """
+        with self._lock:
+            now = time.monotonic()
+            num_states = len(self._states)
+            # Rotate the candidates so that ties are broken in round-robin order.
+            candidates = [self._states[(self._next_idx + i) % num_states] for i in range(num_states)]
+            available = [s for s in candidates if s.sidelined_until <= now]
+            if len(available) == 0:
+                state = min(candidates, key=lambda s: s.sidelined_until)
+                logging.warning("All credentials are sidelined. %r will be used.", state.credential)
+            elif self.strategy == "least_loaded":
+                state = min(available, key=lambda s: s.num_in_flight)
+            else:
+                state = available[0]
+            self._next_idx = (self._states.index(state) + 1) % num_states
+            state.num_in_flight += 1
+            state.num_requests += 1
+        return state.credential
+
+    def release(self, credential: Credential, error: Optional[BaseException] = None) -> None:
+        """Marks a credential as no longer in use and records the outcome.
+
+        Args:
+            credential: The credential returned by `acquire`.
+            error: The exception raised while using the credential, if any.
+        """
+        state = self._state_dict[credential]
+        with self._lock:
+            state.num_in_flight -= 1
+            if error is None:
+                return
+            now = time.monotonic()
+            if isinstance(error, (errors.RateLimitError, errors.RequestLimitError)):
+                state.num_rate_limited += 1
+                state.last_rate_limited_at = now
+                cooldown = self.rate_limit_cooldown_secs
+            elif isinstance(
+                error, (errors.InvalidTokenError, errors.TokenExpiredError, errors.TokenUpdateFailedError)
+            ):
+                state.num_auth_errors += 1
+                cooldown = self.auth_error_cooldown_secs
+            else:
+                return
+            state.sidelined_until = max(state.sidelined_until, now + cooldown)
+        logging.info("%r is sidelined for %s seconds due to: %s", credential, cooldown, type(error).__name__)
+
+    def run(self, func: Callable[[Credential], _T]) -> _T:
+        """Calls `func` with an acquired credential.
+
+        If `func` returns an iterator, the credential is released once the
+        iterator is exhausted or closed.
+        """
+        credential = self._acquire_for_call()
+        try:
+            result = func(credential)
+        except BaseException as e:
+            self.release(credential, e)
+            raise
+        if isinstance(result, Iterator):
+            return self._wrap_iterator(credential, result)  # type: ignore
+        self.release(credential)
+        return result
+
+    async def arun(self, func: Callable[[Credential], Awaitable[_T]]) -> _T:
+        """Asynchronous version of `run`."""
+        credential = self._acquire_for_call()
+        try:
+            result = await func(credential)
+        except BaseException as e:
+            self.release(credential, e)
+            raise
+        if isinstance(result, AsyncIterator):
+            return self._wrap_async_iterator(credential, result)  # type: ignore
+        self.release(credential)
+        return result
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        """Returns a snapshot of the per-credential state."""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "credential": s.credential,
+                    "num_in_flight": s.num_in_flight,
+                    "num_requests": s.num_requests,
+                    "num_rate_limited": s.num_rate_limited,
+                    "num_auth_errors": s.num_auth_errors,
+                    "sidelined_for_secs": max(0.0, s.sidelined_until - now),
+                }
+                for s in self._states
+            ]
+
+    def _acquire_for_call(self) -> Credential:
+        credential = self.acquire()
+        record = metering.get_current_record()
+        if record is not None:
+            record.credential = metering.get_credential_label(credential.ak, credential.access_token)
+        return credential
+
+    def _wrap_iterator(self, credential: Credential, iterator: Iterator[_T]) -> Iterator[_T]:
+        return _ReleasingIterator(self, credential, iterator)
+
+    def _wrap_async_iterator(self, credential: Credential, iterator: AsyncIterator[_T]) -> AsyncIterator[_T]:
+        return _ReleasingAsyncIterator(self, credential, iterator)
+
+
+class _ReleasingIterator(Iterator[_T]):
+    """Releases the credential once the iterator is exhausted, fails, or is
+    closed, even if it was closed before the first item."""
+
+    def __init__(self, pool: CredentialPool, credential: Credential, iterator: Iterator[_T]) -> None:
+        super().__init__()
+        self._pool = pool
+        self._credential = credential
+        self._iterator = iterator
+        self._released = False
+
+    def __next__(self) -> _T:
+        if self._released:
+            raise StopIteration
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            self._release(None)
+            raise
+        except BaseException as e:
+            self._release(e)
+            raise
+
+    def close(self) -> None:
+        try:
+            close_iterator(self._iterator)
+        finally:
+            self._release(None)
+
+    def _release(self, error: Optional[BaseException]) -> None:
+        if not self._released:
+            self._released = True
+            self._pool.release(self._credential, error)
+
+
+class _ReleasingAsyncIterator(AsyncIterator[_T]):
+    """Asynchronous version of `_ReleasingIterator`."""
+
+    def __init__(self, pool: CredentialPool, credential: Credential, iterator: AsyncIterator[_T]) -> None:
+        super().__init__()
+        self._pool = pool
+        self._credential = credential
+        self._iterator = iterator
+        self._released = False
+
+    async def __anext__(self) -> _T:
+        if self._released:
+            raise StopAsyncIteration
+        try:
+            return await self._iterator.__anext__()
+        except StopAsyncIteration:
+            await self._close(None)
+            raise
+        except BaseException as e:
+            await self._close(e)
+            raise
+
+    async def aclose(self) -> None:
+        await self._close(None)
+
+    async def _close(self, error: Optional[BaseException]) -> None:
+        if self._released:
+            return
+        self._released = True
+        try:
+            await aclose_iterator(self._iterator)
+        finally:
+            self._pool.release(self._credential, error)
@@ -19,6 +19,9 @@ __all__ = [
     "InvalidArgumentError",
     "TokenUpdateFailedError",
     "UnsupportedAPITypeError",
+    "RequestRejectedError",
+    "ContextWindowExceededError",
+    "UnrecordedRequestError",
     "HTTPRequestError",
     "ConnectionError",
     "TimeoutError",
@@ -59,6 +62,22 @@ class UnsupportedAPITypeError(EBError):
     """An unsupported API type was used."""
 
 
+class RequestRejectedError(EBError):
+    """The request was rejected by the client-side scheduler."""
+
+    def __init__(self, message: str, reason: str) -> None:
+        super().__init__(message)
+        self.reason = reason
+
+
+class ContextWindowExceededError(EBError):
+    """The request does not fit into the context window of the model."""
+
+
+class UnrecordedRequestError(EBError):
+    """No recorded exchange matches the request being replayed."""
+
+
 class HTTPRequestError(EBError):
     """An HTTP request failed."""
 
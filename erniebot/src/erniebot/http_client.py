@@ -42,20 +42,19 @@ from __future__ import annotations
 import asyncio
 import http
 import json
-from contextlib import asynccontextmanager, contextmanager
+import time
 from json import JSONDecodeError
 from typing import (
     Any,
-    AsyncGenerator,
     AsyncIterator,
     Callable,
     Final,
-    Generator,
     Iterator,
     Mapping,
     Optional,
     Tuple,
     Union,
+    cast,
 )
 
 import aiohttp
@@ -65,7 +64,16 @@ import erniebot
 
 from . import constants, errors
 from .response import EBResponse
-from .types import HeadersType, ParamsType
+from .streaming import ClosingAsyncIterator, ClosingIterator
+from .transports import (
+    AiohttpTransport,
+    AsyncTransportResponse,
+    RequestsTransport,
+    StreamTimeouts,
+    Transport,
+    TransportResponse,
+)
+from .types import HeadersType, ParamsType, PreEncodedParams
 from .utils import logging
 from .utils.url import add_query_params
 
@@ -77,9 +85,6 @@ class EBClient(object):
 
     DEFAULT_REQUEST_TIMEOUT_SECS: Final[float] = constants.DEFAULT_REQUEST_TIMEOUT_SECS
 
-    _session: Optional[requests.Session]
-    _asession: Optional[aiohttp.ClientSession]
-
     def __init__(
         self,
         base_url: str,
@@ -88,13 +93,24 @@ class EBClient(object):
         asession: Optional[aiohttp.ClientSession] = None,
         response_handler: Optional[Callable[[EBResponse], EBResponse]] = None,
         proxy: Optional[str] = None,
+        stream_connect_timeout: Optional[float] = None,
+        stream_first_chunk_timeout: Optional[float] = None,
+        stream_idle_timeout: Optional[float] = None,
+        transport: Optional[Transport] = None,
     ) -> None:
         super().__init__()
         self._base_url = base_url
-        self._session = session
-        self._asession = asession
         self._resp_handler = response_handler
-        self._proxy = proxy
+        self._transport: Transport
+        self._atransport: Transport
+        if transport is not None:
+            self._transport = self._atransport = transport
+        else:
+            self._transport = RequestsTransport(session, proxy)
+            self._atransport = AiohttpTransport(asession, proxy)
+        self._stream_connect_timeout = stream_connect_timeout
+        self._stream_first_chunk_timeout = stream_first_chunk_timeout
+        self._stream_idle_timeout = stream_idle_timeout
 
     def prepare_request(
         self,
@@ -112,7 +128,10 @@ class EBClient(object):
                 url = add_query_params(url, [(str(k), str(v)) for k, v in params.items() if v is not None])
         elif method == "POST" or method == "PUT":
             if params:
-                data = json.dumps(params).encode()
+                if isinstance(params, PreEncodedParams):
+                    data = params.to_json_bytes()
+                else:
+                    data = json.dumps(params).encode()
         else:
             raise errors.ConnectionError(f"Unrecognized HTTP method: {repr(method)}")
 
@@ -133,51 +152,41 @@ class EBClient(object):
         headers: Optional[HeadersType] = None,
         request_timeout: Optional[float] = None,
     ) -> Union[EBResponse, Iterator[EBResponse]]:
-        ctx = self._make_requests_session_context_manager()
-        session = ctx.__enter__()
-        should_clean_up_ctx = True
-
+        stream_timeouts = self._get_stream_timeouts(request_timeout) if stream else None
+        start_time = time.monotonic()
+        result = self.send_request_raw(
+            method.upper(),
+            url,
+            data=data,
+            headers=headers,
+            stream=stream,
+            request_timeout=request_timeout,
+            stream_timeouts=stream_timeouts,
+        )
+        should_clean_up_result = True
         try:
-            result = self.send_request_raw(
-                session,
-                method.upper(),
-                url,
-                data=data,
-                headers=headers,
-                stream=stream,
-                request_timeout=request_timeout,
-            )
-            should_clean_up_result = True
-            try:
-                resp, got_stream = self._interpret_response(result)
-                if stream != got_stream:
-                    logging.warning("Unexpected response: %s", resp)
-                    logging.warning(
-                        f"A {'streamed' if stream else 'non-streamed'} response was expected, "
-                        f"but got a {'streamed' if got_stream else 'non-streamed'} response. "
+            resp, got_stream = self._interpret_response(result)
+            if stream != got_stream:
+                logging.warning("Unexpected response: %s", resp)
+                logging.warning(
+                    f"A {'streamed' if stream else 'non-streamed'} response was expected, "
+                    f"but got a {'streamed' if got_stream else 'non-streamed'} response. "
+                )
+            if got_stream:
+                assert isinstance(resp, Iterator)
+                if stream_timeouts is not None:
+                    resp = self._apply_stream_timeouts(
+                        result,
+                        cast(Iterator[EBResponse], resp),
+                        stream_timeouts,
+                        start_time + stream_timeouts.first_chunk,
                     )
-                if got_stream:
-
-                    def wrap_resp(resp: Iterator) -> Iterator[EBResponse]:
-                        try:
-                            for r in resp:
-                                yield r
-                        finally:
-                            result.close()
-                            ctx.__exit__(None, None, None)
-
-                    assert isinstance(resp, Iterator)
-                    resp = wrap_resp(resp)
-
-                    should_clean_up_result = False
-                    should_clean_up_ctx = False
-            finally:
-                if should_clean_up_result:
-                    result.close()
+                resp = ClosingIterator(resp, on_close=lambda error: result.close())
+
+                should_clean_up_result = False
         finally:
-            if should_clean_up_ctx:
-                # We don't care about the exception type and the stack trace.
-                ctx.__exit__(None, None, None)
+            if should_clean_up_result:
+                result.close()
 
         return resp
 
@@ -191,106 +200,159 @@ class EBClient(object):
         headers: Optional[HeadersType] = None,
         request_timeout: Optional[float] = None,
     ) -> Union[EBResponse, AsyncIterator[EBResponse]]:
-        ctx = self._make_aiohttp_session_context_manager()
-        session = await ctx.__aenter__()
-        should_clean_up_ctx = True
-
+        stream_timeouts = self._get_stream_timeouts(request_timeout) if stream else None
+        start_time = time.monotonic()
+        result = await self.asend_request_raw(
+            method.upper(),
+            url,
+            data=data,
+            headers=headers,
+            stream=stream,
+            request_timeout=request_timeout,
+            stream_timeouts=stream_timeouts,
+        )
+        should_clean_up_result = True
         try:
-            result = await self.asend_request_raw(
-                session,
-                method.upper(),
-                url,
-                data=data,
-                headers=headers,
-                request_timeout=request_timeout,
-            )
-            should_clean_up_result = True
-            try:
-                resp, got_stream = await self._interpret_async_response(result)
-                if stream != got_stream:
-                    logging.warning("Unexpected response: %s", resp)
-                    logging.warning(
-                        f"A {'streamed' if stream else 'non-streamed'} response was expected, "
-                        f"but got a {'streamed' if got_stream else 'non-streamed'} response. "
+            resp, got_stream = await self._interpret_async_response(result)
+            if stream != got_stream:
+                logging.warning("Unexpected response: %s", resp)
+                logging.warning(
+                    f"A {'streamed' if stream else 'non-streamed'} response was expected, "
+                    f"but got a {'streamed' if got_stream else 'non-streamed'} response. "
+                )
+            if got_stream:
+                assert isinstance(resp, AsyncIterator)
+                if stream_timeouts is not None:
+                    resp = self._aapply_stream_timeouts(
+                        resp, stream_timeouts, start_time + stream_timeouts.first_chunk
                     )
-                if got_stream:
-
-                    async def wrap_resp(resp: AsyncIterator) -> AsyncIterator[EBResponse]:
-                        try:
-                            async for r in resp:
-                                yield r
-                        finally:
-                            result.release()
-                            await ctx.__aexit__(None, None, None)
-
-                    assert isinstance(resp, AsyncIterator)
-                    resp = wrap_resp(resp)
-
-                    should_clean_up_result = False
-                    should_clean_up_ctx = False
-            finally:
-                if should_clean_up_result:
-                    result.release()
+                resp = ClosingAsyncIterator(resp, on_aclose=lambda error: result.aclose())
+
+                should_clean_up_result = False
         finally:
-            if should_clean_up_ctx:
-                await ctx.__aexit__(None, None, None)
+            if should_clean_up_result:
+                await result.aclose()
 
         return resp
 
     def send_request_raw(
         self,
-        session: requests.Session,
         method: str,
         url: str,
         data: Optional[bytes],
         headers: Optional[HeadersType],
         stream: bool,
         request_timeout: Optional[float],
-    ) -> requests.Response:
-        try:
-            result = session.request(
-                method,
-                url,
-                headers=headers,
-                data=data,
-                stream=stream,
-                timeout=request_timeout if request_timeout else self.DEFAULT_REQUEST_TIMEOUT_SECS,
-                proxies=session.proxies,
-            )
-        except requests.exceptions.Timeout as e:
-            raise errors.TimeoutError(f"Request timed out: {e}") from e
-        except requests.exceptions.RequestException as e:
-            raise errors.ConnectionError(f"Error communicating with server: {e}") from e
-
-        return result
+        stream_timeouts: Optional[StreamTimeouts] = None,
+    ) -> TransportResponse:
+        return self._transport.send(
+            method,
+            url,
+            headers=headers,
+            data=data,
+            stream=stream,
+            timeout=request_timeout if request_timeout else self.DEFAULT_REQUEST_TIMEOUT_SECS,
+            stream_timeouts=stream_timeouts,
+        )
 
     async def asend_request_raw(
         self,
-        session: aiohttp.ClientSession,
         method: str,
         url: str,
         data: Optional[bytes],
         headers: Optional[HeadersType],
+        stream: bool,
         request_timeout: Optional[float],
-    ) -> aiohttp.ClientResponse:
-        timeout = aiohttp.ClientTimeout(
-            total=request_timeout if request_timeout else self.DEFAULT_REQUEST_TIMEOUT_SECS
+        stream_timeouts: Optional[StreamTimeouts] = None,
+    ) -> AsyncTransportResponse:
+        return await self._atransport.asend(
+            method,
+            url,
+            headers=headers,
+            data=data,
+            stream=stream,
+            timeout=request_timeout if request_timeout else self.DEFAULT_REQUEST_TIMEOUT_SECS,
+            stream_timeouts=stream_timeouts,
         )
 
-        request_kwargs: dict = {
-            "headers": headers,
-            "data": data,
-            "timeout": timeout,
-        }
+    def preconnect(self, num_connections: int, timeout: Optional[float] = None) -> int:
+        """Opens connections to the base URL for subsequent requests.
 
-        try:
-            result = await session.request(method=method, url=url, **request_kwargs)
-        except (aiohttp.ServerTimeoutError, asyncio.TimeoutError) as e:
-            raise errors.TimeoutError(f"Request timed out: {e}") from e
-        except aiohttp.ClientError as e:
-            raise errors.ConnectionError(f"Error communicating with server: {e}") from e
+        Returns:
+            The number of connections opened.
+        """
+        return self._transport.preconnect(
+            self._base_url, num_connections, timeout if timeout else self.DEFAULT_REQUEST_TIMEOUT_SECS
+        )
+
+    async def apreconnect(self, num_connections: int, timeout: Optional[float] = None) -> int:
+        return await self._atransport.apreconnect(
+            self._base_url, num_connections, timeout if timeout else self.DEFAULT_REQUEST_TIMEOUT_SECS
+        )
 
-        return result
+    def _get_stream_timeouts(self, request_timeout: Optional[float]) -> Optional[StreamTimeouts]:
+        if (
+            self._stream_connect_timeout is None
+            and self._stream_first_chunk_timeout is None
+            and self._stream_idle_timeout is None
+        ):
+            # Fall back to the total timeout.
+            return None
+        # The total timeout is not applied to streams with stream timeouts, so
+        # unset ones fall back to it to prevent a stalled stream from hanging.
+        default_timeout = request_timeout if request_timeout else self.DEFAULT_REQUEST_TIMEOUT_SECS
+        first_chunk_timeout = self._stream_first_chunk_timeout
+        if first_chunk_timeout is None:
+            first_chunk_timeout = default_timeout
+        idle_timeout = self._stream_idle_timeout
+        if idle_timeout is None:
+            idle_timeout = default_timeout
+        return StreamTimeouts(
+            connect=self._stream_connect_timeout,
+            first_chunk=first_chunk_timeout,
+            idle=idle_timeout,
+        )
+
+    def _apply_stream_timeouts(
+        self,
+        result: TransportResponse,
+        resp: Iterator[EBResponse],
+        timeouts: StreamTimeouts,
+        first_chunk_deadline: float,
+    ) -> Iterator[EBResponse]:
+        # Read timeouts are enforced by the transport.
+        waiting_for = "the first chunk"
+        result.set_read_timeout(max(first_chunk_deadline - time.monotonic(), 0.001))
+        while True:
+            try:
+                r = next(resp)
+            except StopIteration:
+                return
+            except errors.TimeoutError as e:
+                raise errors.TimeoutError(f"Timed out waiting for {waiting_for}.") from e
+            if waiting_for != "the next chunk":
+                waiting_for = "the next chunk"
+                result.set_read_timeout(timeouts.idle)
+            yield r
+
+    async def _aapply_stream_timeouts(
+        self,
+        resp: AsyncIterator[EBResponse],
+        timeouts: StreamTimeouts,
+        first_chunk_deadline: float,
+    ) -> AsyncIterator[EBResponse]:
+        waiting_for = "the first chunk"
+        timeout: Optional[float] = max(first_chunk_deadline - time.monotonic(), 0)
+        while True:
+            try:
+                r = await asyncio.wait_for(resp.__anext__(), timeout)
+            except StopAsyncIteration:
+                return
+            except (asyncio.TimeoutError, errors.TimeoutError) as e:
+                raise errors.TimeoutError(f"Timed out waiting for {waiting_for}.") from e
+            waiting_for = "the next chunk"
+            timeout = timeouts.idle
+            yield r
 
     def _get_request_headers(self, method: str, supplied_headers: Optional[HeadersType]) -> HeadersType:
         headers = {}
@@ -315,7 +377,7 @@ class EBClient(object):
                 raise TypeError("Header values must be strings.")
 
     def _interpret_response(
-        self, response: requests.Response
+        self, response: TransportResponse
     ) -> Tuple[Union[EBResponse, Iterator[EBResponse]], bool]:
         if "Content-Type" in response.headers and response.headers["Content-Type"].startswith(
             "text/event-stream"
@@ -327,7 +389,7 @@ class EBClient(object):
         else:
             return (
                 self._interpret_response_line(
-                    response.content.decode("utf-8"),
+                    response.read().decode("utf-8"),
                     response.status_code,
                     response.headers,
                     stream=False,
@@ -336,7 +398,7 @@ class EBClient(object):
             )
 
     async def _interpret_async_response(
-        self, response: aiohttp.ClientResponse
+        self, response: AsyncTransportResponse
     ) -> Tuple[Union[EBResponse, AsyncIterator[EBResponse]], bool]:
         if "Content-Type" in response.headers and response.headers["Content-Type"].startswith(
             "text/event-stream"
@@ -346,31 +408,27 @@ class EBClient(object):
                 True,
             )
         else:
-            try:
-                rbody = await response.read()
-            except (aiohttp.ServerTimeoutError, asyncio.TimeoutError) as e:
-                raise errors.TimeoutError(f"Request timed out: {str(e)}") from e
-            else:
-                return (
-                    self._interpret_response_line(
-                        rbody.decode("utf-8"),
-                        response.status,
-                        response.headers,
-                        stream=False,
-                    ),
-                    False,
-                )
+            rbody = await response.read()
+            return (
+                self._interpret_response_line(
+                    rbody.decode("utf-8"),
+                    response.status_code,
+                    response.headers,
+                    stream=False,
+                ),
+                False,
+            )
 
-    def _interpret_stream_response(self, response: requests.Response) -> Iterator[EBResponse]:
+    def _interpret_stream_response(self, response: TransportResponse) -> Iterator[EBResponse]:
         for line in self._parse_stream(response.iter_lines()):
             resp = self._interpret_response_line(line, response.status_code, response.headers, stream=True)
             yield resp
 
     async def _interpret_async_stream_response(
-        self, response: aiohttp.ClientResponse
+        self, response: AsyncTransportResponse
     ) -> AsyncIterator[EBResponse]:
-        async for line in self._parse_async_stream(response.content):
-            resp = self._interpret_response_line(line, response.status, response.headers, stream=True)
+        async for line in self._parse_async_stream(response.iter_lines()):
+            resp = self._interpret_response_line(line, response.status_code, response.headers, stream=True)
             yield resp
 
     def _interpret_response_line(
@@ -429,7 +487,7 @@ class EBClient(object):
             if _line is not None:
                 yield _line
 
-    async def _parse_async_stream(self, rbody: aiohttp.StreamReader) -> AsyncIterator[str]:
+    async def _parse_async_stream(self, rbody: AsyncIterator[bytes]) -> AsyncIterator[str]:
         async for line in rbody:
             _line = self._parse_line(line)
             if _line is not None:
@@ -444,37 +502,3 @@ class EBClient(object):
                 # Filter out other lines
                 return None
         return None
-
-    @contextmanager
-    def _make_requests_session_context_manager(self) -> Generator[requests.Session, None, None]:
-        if self._session is not None:
-            session = self._session
-            should_close_session = False
-        else:
-            session = requests.Session()
-            should_close_session = True
-        try:
-            if self._proxy is not None:
-                proxies = {"http": self._proxy, "https": self._proxy}
-                session.proxies = proxies
-            yield session
-        finally:
-            if should_close_session:
-                session.close()
-
-    @asynccontextmanager
-    async def _make_aiohttp_session_context_manager(
-        self,
-    ) -> AsyncGenerator[aiohttp.ClientSession, None]:
-        # TODO: Support proxies
-        if self._asession is not None:
-            session = self._asession
-            should_close_session = False
-        else:
-            session = aiohttp.ClientSession()
-            should_close_session = True
-        try:
-            yield session
-        finally:
-            if should_close_session:
-                await session.close()
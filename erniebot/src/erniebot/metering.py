@@ -0,0 +1,325 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import contextvars
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from .response import EBResponse
+from .utils import logging
+
+__all__ = ["UsageMeter"]
+
+_Key = Tuple[str, str, Optional[str], Tuple[Tuple[str, str], ...]]
+
+# Usage record of the request being sent in the current context.
+_current_record: "contextvars.ContextVar[Optional[UsageRecord]]" = contextvars.ContextVar(
+    "erniebot_usage_record", default=None
+)
+
+
+class UsageMeter(object):
+    """Aggregates token usage, request counts, and latency of responses.
+
+    A meter can be configured via the `usage_meter` setting. Every request
+    made by a resource (chat completions, chat completions with plugins,
+    embeddings, images, etc.) is then metered, grouped by model, API type,
+    credential, and the tags given by the `usage_tags` setting. For streamed
+    responses, the usage reported in the last chunk is recorded once the
+    stream ends. Calls served by a `RequestCoalescer` are counted separately
+    and do not add to the token counts.
+
+    Counters are kept per thread, so recording does not take any lock.
+    Snapshots merge the counters of all threads; a snapshot taken while
+    requests finish in other threads may not include them yet.
+    """
+
+    def __init__(
+        self,
+        *,
+        snapshot_interval: Optional[float] = None,
+        on_snapshot: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> None:
+        """Initializes the meter.
+
+        Args:
+            snapshot_interval: If given, `on_snapshot` is called with a
+                snapshot every `snapshot_interval` seconds from a daemon
+                thread.
+            on_snapshot: Callback receiving periodic snapshots.
+        """
+        super().__init__()
+        if (snapshot_interval is None) != (on_snapshot is None):
+            raise ValueError("`snapshot_interval` and `on_snapshot` must be given together.")
+        if snapshot_interval is not None and snapshot_interval <= 0:
+            raise ValueError("`snapshot_interval` must be positive.")
+        self._started_at = time.time()
+        self._shards: List[Dict[_Key, _Counters]] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if snapshot_interval is not None and on_snapshot is not None:
+            self._thread = threading.Thread(
+                target=self._report_periodically,
+                args=(snapshot_interval, on_snapshot),
+                name="erniebot-usage-meter",
+                daemon=True,
+            )
+            self._thread.start()
+
+    def record(
+        self,
+        *,
+        model: str,
+        api_type: str,
+        credential: Optional[str] = None,
+        tags: Optional[Mapping[str, str]] = None,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        total_tokens: int = 0,
+        latency: float = 0.0,
+        failed: bool = False,
+        coalesced: bool = False,
+    ) -> None:
+        """Records a finished request.
+
+        Args:
+            model: Name of the model, or path of the API if the model is
+                unknown.
+            api_type: Name of the API type.
+            credential: Label of the credential used.
+            tags: Caller-supplied tags.
+            prompt_tokens: Number of tokens in the prompt.
+            completion_tokens: Number of tokens in the completion.
+            total_tokens: Total number of tokens.
+            latency: Seconds taken by the request, including the whole stream.
+            failed: Whether the request failed.
+            coalesced: Whether the call was served by another identical
+                request.
+        """
+        key = (model, api_type, credential, tuple(sorted((tags or {}).items())))
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {}
+            self._local.shard = shard
+            with self._lock:
+                self._shards.append(shard)
+        counters = shard.get(key, None)
+        if counters is None:
+            counters = shard[key] = _Counters()
+        counters.num_requests += 1
+        counters.latency_sum += latency
+        if latency > counters.latency_max:
+            counters.latency_max = latency
+        if failed:
+            counters.num_errors += 1
+        if coalesced:
+            counters.num_coalesced += 1
+        else:
+            counters.prompt_tokens += prompt_tokens
+            counters.completion_tokens += completion_tokens
+            counters.total_tokens += total_tokens
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns the counters accumulated since the meter was created.
+
+        Returns:
+            A JSON-serializable dictionary with one entry per combination of
+            model, API type, credential, and tags.
+        """
+        merged: Dict[_Key, _Counters] = {}
+        with self._lock:
+            # Copying a dictionary is atomic, even if its thread is writing
+            # to it.
+            shards = [shard.copy() for shard in self._shards]
+        for shard in shards:
+            for key, counters in shard.items():
+                merged.setdefault(key, _Counters()).merge(counters)
+        entries = []
+        for (model, api_type, credential, tags), counters in sorted(
+            merged.items(), key=lambda kv: repr(kv[0])
+        ):
+            entry: Dict[str, Any] = {
+                "model": model,
+                "api_type": api_type,
+                "credential": credential,
+                "tags": dict(tags),
+            }
+            entry.update(counters.to_dict())
+            entries.append(entry)
+        return {"started_at": self._started_at, "taken_at": time.time(), "entries": entries}
+
+    def to_json(self, **kwargs: Any) -> str:
+        """Returns a snapshot encoded as JSON. `kwargs` are passed to
+        `json.dumps`."""
+        return json.dumps(self.snapshot(), **kwargs)
+
+    def export(self, path: str) -> None:
+        """Writes a snapshot to a JSON file, replacing the file atomically."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_json(ensure_ascii=False, indent=2))
+        os.replace(tmp_path, path)
+
+    def close(self) -> None:
+        """Stops the periodic snapshots."""
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def start_record(
+        self, model: str, api_type: str, credential: Optional[str], tags: Optional[Mapping[str, str]]
+    ) -> "UsageRecord":
+        return UsageRecord(self, model, api_type, credential, tags)
+
+    def _report_periodically(self, interval: float, on_snapshot: Callable[[Dict[str, Any]], None]) -> None:
+        while not self._stopped.wait(interval):
+            try:
+                on_snapshot(self.snapshot())
+            except Exception:
+                logging.error("Failed to report usage snapshot.", exc_info=True)
+
+
+class UsageRecord(object):
+    """Usage of a single request that is in progress."""
+
+    def __init__(
+        self,
+        meter: UsageMeter,
+        model: str,
+        api_type: str,
+        credential: Optional[str],
+        tags: Optional[Mapping[str, str]],
+    ) -> None:
+        super().__init__()
+        self.credential = credential
+        self.coalesced = False
+        self._meter = meter
+        self._model = model
+        self._api_type = api_type
+        self._tags = tags
+        self._usage: Optional[Mapping[str, Any]] = None
+        self._num_chunks = 0
+        self._started_at = time.monotonic()
+        self._finished = False
+
+    def observe(self, resp: EBResponse) -> None:
+        """Takes the usage from a response or a response chunk."""
+        usage = resp.get("usage", None)
+        if isinstance(usage, Mapping):
+            # The usage in streamed chunks is cumulative.
+            self._usage = usage
+
+    def observe_chunk(self, chunk: EBResponse) -> EBResponse:
+        """Takes the usage from a streamed chunk and returns the chunk."""
+        self._num_chunks += 1
+        self.observe(chunk)
+        return chunk
+
+    def finish_stream(self, error: Optional[BaseException]) -> None:
+        """Finishes the record of a stream that ended with `error`, if any.
+
+        A stream closed before its first chunk counts as failed; one closed
+        after that counts as succeeded, with the usage seen so far.
+        """
+        self.finish(failed=error is not None or self._num_chunks == 0)
+
+    def finish(self, failed: bool = False) -> None:
+        if self._finished:
+            return
+        self._finished = True
+        usage = self._usage or {}
+        self._meter.record(
+            model=self._model,
+            api_type=self._api_type,
+            credential=self.credential,
+            tags=self._tags,
+            prompt_tokens=usage.get("prompt_tokens", 0) or 0,
+            completion_tokens=usage.get("completion_tokens", 0) or 0,
+            total_tokens=usage.get("total_tokens", 0) or 0,
+            latency=time.monotonic() - self._started_at,
+            failed=failed,
+            coalesced=self.coalesced,
+        )
+
+
+class _Counters(object):
+    __slots__ = (
+        "num_requests",
+        "num_errors",
+        "num_coalesced",
+        "prompt_tokens",
+        "completion_tokens",
+        "total_tokens",
+        "latency_sum",
+        "latency_max",
+    )
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.num_requests = 0
+        self.num_errors = 0
+        self.num_coalesced = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.total_tokens = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+
+    def merge(self, other: "_Counters") -> None:
+        self.num_requests += other.num_requests
+        self.num_errors += other.num_errors
+        self.num_coalesced += other.num_coalesced
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.total_tokens += other.total_tokens
+        self.latency_sum += other.latency_sum
+        self.latency_max = max(self.latency_max, other.latency_max)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "num_requests": self.num_requests,
+            "num_errors": self.num_errors,
+            "num_coalesced": self.num_coalesced,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "mean_latency": self.latency_sum / self.num_requests if self.num_requests > 0 else 0.0,
+            "max_latency": self.latency_max,
+        }
+
+
+def get_current_record() -> Optional[UsageRecord]:
+    return _current_record.get()
+
+
+def set_current_record(record: Optional[UsageRecord]) -> contextvars.Token:
+    return _current_record.set(record)
+
+
+def reset_current_record(token: contextvars.Token) -> None:
+    _current_record.reset(token)
+
+
+def get_credential_label(ak: Optional[str], access_token: Optional[str]) -> Optional[str]:
+    """Returns a label that identifies a credential without revealing it."""
+    if ak is not None:
+        return ak
+    if access_token is not None:
+        return access_token[:6] + "..."
+    return None
@@ -0,0 +1,176 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Final, Optional
+
+__all__ = ["RateLimiter", "TokenBucketRateLimiter", "SharedTokenBucketRateLimiter"]
+
+
+class RateLimiter(object):
+    """Base class of client-side rate limiters.
+
+    A rate limiter hands out "permits" at a configured rate. Subclasses only
+    need to implement `reserve`, which is non-blocking; `acquire` and
+    `aacquire` are built on top of it.
+    """
+
+    def reserve(self, cost: float = 1) -> float:
+        """Tries to take `cost` permits without blocking.
+
+        Returns:
+            0 if the permits were taken. Otherwise, the number of seconds to
+            wait before trying again. In the latter case, no permits are taken.
+        """
+        raise NotImplementedError
+
+    def acquire(self, cost: float = 1) -> None:
+        """Blocks until `cost` permits are taken."""
+        while True:
+            wait_secs = self.reserve(cost)
+            if wait_secs <= 0:
+                return
+            time.sleep(wait_secs)
+
+    async def aacquire(self, cost: float = 1) -> None:
+        """Asynchronous version of `acquire`."""
+        while True:
+            wait_secs = self.reserve(cost)
+            if wait_secs <= 0:
+                return
+            await asyncio.sleep(wait_secs)
+
+
+class TokenBucketRateLimiter(RateLimiter):
+    """In-process token bucket.
+
+    The bucket refills at `rate` permits per second and holds at most `burst`
+    permits.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        super().__init__()
+        if rate <= 0:
+            raise ValueError("`rate` must be positive.")
+        if burst is None:
+            burst = max(rate, 1)
+        if burst <= 0:
+            raise ValueError("`burst` must be positive.")
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, cost: float = 1) -> float:
+        if cost > self.burst:
+            raise ValueError(f"`cost` ({cost}) exceeds the bucket capacity ({self.burst}).")
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            if self._tokens >= cost:
+                self._tokens -= cost
+                return 0
+            return (cost - self._tokens) / self.rate
+
+
+class SharedTokenBucketRateLimiter(RateLimiter):
+    """Token bucket shared by all processes on the same host.
+
+    The bucket state lives in a small memory-mapped file, and updates are
+    serialized with POSIX record locks, so that all processes (e.g., workers of
+    a web server) using the same `path` share a single quota. The locks are
+    released by the OS when a process dies, and the stored state is clamped on
+    every update, so a crashed process cannot leave the bucket stuck.
+
+    This class is only available on POSIX systems.
+    """
+
+    _STATE_FORMAT: Final[str] = "=dd"
+    _STATE_SIZE: Final[int] = struct.calcsize(_STATE_FORMAT)
+
+    def __init__(self, path: str, rate: float, burst: Optional[float] = None) -> None:
+        """Initializes the limiter.
+
+        Args:
+            path: Path of the file that holds the bucket state. All processes
+                that should share the quota must use the same path.
+            rate: Number of permits added per second.
+            burst: Capacity of the bucket.
+        """
+        super().__init__()
+        try:
+            import fcntl
+        except ImportError as e:
+            raise RuntimeError(f"{self.__class__.__name__} is not supported on this platform.") from e
+        if rate <= 0:
+            raise ValueError("`rate` must be positive.")
+        if burst is None:
+            burst = max(rate, 1)
+        if burst <= 0:
+            raise ValueError("`burst` must be positive.")
+        self.path = path
+        self.rate = rate
+        self.burst = burst
+        self._fcntl = fcntl
+        # POSIX record locks do not exclude threads of the same process.
+        self._thread_lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(self._fd).st_size < self._STATE_SIZE:
+                    os.ftruncate(self._fd, self._STATE_SIZE)
+                    os.pwrite(self._fd, struct.pack(self._STATE_FORMAT, burst, time.monotonic()), 0)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+            self._mm = mmap.mmap(self._fd, self._STATE_SIZE)
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+    def reserve(self, cost: float = 1) -> float:
+        if cost > self.burst:
+            raise ValueError(f"`cost` ({cost}) exceeds the bucket capacity ({self.burst}).")
+        fcntl = self._fcntl
+        with self._thread_lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                tokens, updated_at = struct.unpack_from(self._STATE_FORMAT, self._mm, 0)
+                # `time.monotonic` uses a system-wide clock, so timestamps are
+                # comparable across processes.
+                now = time.monotonic()
+                if not (0 <= tokens <= self.burst) or updated_at > now:
+                    tokens, updated_at = self.burst, now
+                tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+                if tokens >= cost:
+                    tokens -= cost
+                    wait_secs = 0.0
+                else:
+                    wait_secs = (cost - tokens) / self.rate
+                struct.pack_into(self._STATE_FORMAT, self._mm, 0, tokens, now)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        return wait_secs
+
+    def close(self) -> None:
+        """Releases the file resources held by the limiter."""
+        self._mm.close()
+        os.close(self._fd)
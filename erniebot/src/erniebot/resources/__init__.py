@@ -12,7 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from .chat_completion import ChatCompletion, ChatCompletionResponse
+from .chat_completion import ChatCompletion, ChatCompletionResponse, PreparedChatRequest
 from .chat_completion_with_plugins import ChatCompletionWithPlugins
 from .embedding import Embedding, EmbeddingResponse
 from .fine_tuning import FineTuningJob, FineTuningTask
@@ -28,4 +28,5 @@ __all__ = [
     "ChatCompletionResponse",
     "EmbeddingResponse",
     "ImageResponse",
+    "PreparedChatRequest",
 ]
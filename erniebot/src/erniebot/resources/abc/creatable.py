@@ -34,6 +34,7 @@ class Creatable(Resource):
             params=req.params,
             headers=req.headers,
             request_timeout=req.timeout,
+            model=req.model,
         )
         resp = self._postprocess_create(resp)
         return resp
@@ -48,6 +49,7 @@ class Creatable(Resource):
             params=req.params,
             headers=req.headers,
             request_timeout=req.timeout,
+            model=req.model,
         )
         resp = self._postprocess_create(resp)
         return resp
@@ -71,6 +73,7 @@ class CreatableWithStreaming(Resource):
             params=req.params,
             headers=req.headers,
             request_timeout=req.timeout,
+            model=req.model,
         )
         if isinstance(resp, EBResponse):
             resp = self._postprocess_create(resp)
@@ -88,6 +91,7 @@ class CreatableWithStreaming(Resource):
             params=req.params,
             headers=req.headers,
             request_timeout=req.timeout,
+            model=req.model,
         )
         if isinstance(resp, EBResponse):
             resp = self._postprocess_create(resp)
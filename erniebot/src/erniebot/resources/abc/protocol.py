@@ -45,6 +45,7 @@ class Resource(Protocol):
         params: Optional[ParamsType] = ...,
         headers: Optional[HeadersType] = ...,
         request_timeout: Optional[float] = ...,
+        model: Optional[str] = ...,
     ) -> EBResponse:
         ...
 
@@ -58,6 +59,7 @@ class Resource(Protocol):
         params: Optional[ParamsType] = ...,
         headers: Optional[HeadersType] = ...,
         request_timeout: Optional[float] = ...,
+        model: Optional[str] = ...,
     ) -> Iterator[EBResponse]:
         ...
 
@@ -71,6 +73,7 @@ class Resource(Protocol):
         params: Optional[ParamsType] = ...,
         headers: Optional[HeadersType] = ...,
         request_timeout: Optional[float] = ...,
+        model: Optional[str] = ...,
     ) -> Union[EBResponse, Iterator[EBResponse]]:
         ...
 
@@ -83,6 +86,7 @@ class Resource(Protocol):
         params: Optional[ParamsType] = None,
         headers: Optional[HeadersType] = None,
         request_timeout: Optional[float] = None,
+        model: Optional[str] = None,
     ) -> Union[EBResponse, Iterator[EBResponse]]:
         """Makes an HTTP request for the resource.
 
@@ -93,6 +97,7 @@ class Resource(Protocol):
             params: Parameters to send.
             headers: Headers to add to the request.
             request_timeout: Request timeout in seconds.
+            model: Name of the model, used to meter the usage.
 
         Returns:
             If `stream` is True, returns an iterator that yields response
@@ -110,6 +115,7 @@ class Resource(Protocol):
         params: Optional[ParamsType] = ...,
         headers: Optional[HeadersType] = ...,
         request_timeout: Optional[float] = ...,
+        model: Optional[str] = ...,
     ) -> EBResponse:
         ...
 
@@ -123,6 +129,7 @@ class Resource(Protocol):
         params: Optional[ParamsType] = ...,
         headers: Optional[HeadersType] = ...,
         request_timeout: Optional[float] = ...,
+        model: Optional[str] = ...,
     ) -> AsyncIterator[EBResponse]:
         ...
 
@@ -136,6 +143,7 @@ class Resource(Protocol):
         params: Optional[ParamsType] = ...,
         headers: Optional[HeadersType] = ...,
         request_timeout: Optional[float] = ...,
+        model: Optional[str] = ...,
     ) -> Union[EBResponse, AsyncIterator[EBResponse]]:
         ...
 
@@ -148,6 +156,7 @@ class Resource(Protocol):
         params: Optional[ParamsType] = None,
         headers: Optional[HeadersType] = None,
         request_timeout: Optional[float] = None,
+        model: Optional[str] = None,
     ) -> Union[EBResponse, AsyncIterator[EBResponse]]:
         """Asynchronous version of `request`."""
         ...
@@ -12,6 +12,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
+import dataclasses
+from dataclasses import dataclass
 from typing import (
     Any,
     AsyncIterator,
@@ -31,15 +34,22 @@ import jsonschema.exceptions
 
 import erniebot.errors as errors
 from erniebot.api_types import APIType
+from erniebot.context_window import ContextWindowFitter
 from erniebot.response import EBResponse
-from erniebot.types import ConfigDictType, HeadersType, RequestWithStream
+from erniebot.types import (
+    ConfigDictType,
+    HeadersType,
+    ParamsType,
+    PreEncodedParams,
+    RequestWithStream,
+)
 from erniebot.utils import logging
 from erniebot.utils.misc import NOT_GIVEN, NotGiven, filter_args, transform
 
 from .abc import CreatableWithStreaming
 from .resource import EBResource
 
-__all__ = ["ChatCompletion", "ChatCompletionResponse"]
+__all__ = ["ChatCompletion", "ChatCompletionResponse", "PreparedChatRequest"]
 
 
 class ChatCompletion(EBResource, CreatableWithStreaming):
@@ -48,37 +58,47 @@ class ChatCompletion(EBResource, CreatableWithStreaming):
         APIType.AISTUDIO,
         APIType.CUSTOM,
     )
+    SUPPORTS_COALESCING: ClassVar[bool] = True
     _API_INFO_DICT: ClassVar[Dict[APIType, Dict[str, Any]]] = {
         APIType.QIANFAN: {
             "resource_id": "chat",
             "models": {
                 "ernie-3.5": {
                     "model_id": "completions",
+                    "max_input_tokens": 5120,
                 },
                 "ernie-3.5-8k": {
                     "model_id": "completions",
+                    "max_input_tokens": 5120,
                 },
                 "ernie-lite": {
                     "model_id": "eb-instant",
+                    "max_input_tokens": 6144,
                 },
                 "ernie-4.0": {
                     "model_id": "completions_pro",
+                    "max_input_tokens": 5120,
                 },
                 "ernie-longtext": {
                     # ernie-longtext(ernie_bot_8k) will be deprecated in 2024.4.11
                     "model_id": "completions",
+                    "max_input_tokens": 5120,
                 },
                 "ernie-speed": {
                     "model_id": "ernie_speed",
+                    "max_input_tokens": 6144,
                 },
                 "ernie-speed-128k": {
                     "model_id": "ernie-speed-128k",
+                    "max_input_tokens": 126976,
                 },
                 "ernie-tiny-8k": {
                     "model_id": "ernie-tiny-8k",
+                    "max_input_tokens": 6144,
                 },
                 "ernie-char-8k": {
                     "model_id": "ernie-char-8k",
+                    "max_input_tokens": 6144,
                 },
             },
         },
@@ -87,31 +107,40 @@ class ChatCompletion(EBResource, CreatableWithStreaming):
             "models": {
                 "ernie-3.5": {
                     "model_id": "completions",
+                    "max_input_tokens": 5120,
                 },
                 "ernie-3.5-8k": {
                     "model_id": "completions",
+                    "max_input_tokens": 5120,
                 },
                 "ernie-lite": {
                     "model_id": "eb-instant",
+                    "max_input_tokens": 6144,
                 },
                 "ernie-4.0": {
                     "model_id": "completions_pro",
+                    "max_input_tokens": 5120,
                 },
                 "ernie-longtext": {
                     # ernie-longtext(ernie_bot_8k) will be deprecated in 2024.4.11
                     "model_id": "completions",
+                    "max_input_tokens": 5120,
                 },
                 "ernie-speed": {
                     "model_id": "ernie_speed",
+                    "max_input_tokens": 6144,
                 },
                 "ernie-speed-128k": {
                     "model_id": "ernie-speed-128k",
+                    "max_input_tokens": 126976,
                 },
                 "ernie-tiny-8k": {
                     "model_id": "ernie-tiny-8k",
+                    "max_input_tokens": 6144,
                 },
                 "ernie-char-8k": {
                     "model_id": "ernie-char-8k",
+                    "max_input_tokens": 6144,
                 },
             },
         },
@@ -120,20 +149,32 @@ class ChatCompletion(EBResource, CreatableWithStreaming):
             "models": {
                 "ernie-3.5": {
                     "model_id": "completions",
+                    "max_input_tokens": 5120,
                 },
                 "ernie-4.0": {
                     "model_id": "completions_pro",
+                    "max_input_tokens": 5120,
                 },
                 "ernie-longtext": {
                     "model_id": "completions",
+                    "max_input_tokens": 5120,
                 },
                 "ernie-speed": {
                     "model_id": "ernie_speed",
+                    "max_input_tokens": 6144,
                 },
             },
         },
     }
 
+    _STATIC_KEYS: ClassVar[Tuple[str, ...]] = (
+        "model",
+        "functions",
+        "system",
+        "validate_functions",
+        "headers",
+    )
+
     @overload
     @classmethod
     def create(
@@ -458,6 +499,44 @@ class ChatCompletion(EBResource, CreatableWithStreaming):
         resp = await resource.acreate_resource(**kwargs)
         return transform(ChatCompletionResponse.from_mapping, resp)
 
+    @classmethod
+    def prepare(
+        cls,
+        model: str,
+        *,
+        functions: Union[List[dict], NotGiven] = NOT_GIVEN,
+        system: Union[str, NotGiven] = NOT_GIVEN,
+        validate_functions: bool = False,
+        headers: Optional[HeadersType] = None,
+        _config_: Optional[ConfigDictType] = None,
+    ) -> "PreparedChatRequest":
+        """Prepares a template for requests that share the model, functions,
+        and system text.
+
+        The static parts are validated and serialized only once, which saves
+        time when the same functions are sent repeatedly (e.g., by agents).
+
+        Args:
+            model: Name of the model to use.
+            functions: Descriptions of the functions that the model may generate
+                JSON inputs for.
+            system: Text that tells the model how to interpret the conversation.
+            validate_functions: Whether to validate the function descriptions.
+            headers: Custom headers to send with the requests.
+            _config_: Overrides the global settings.
+
+        Returns:
+            A prepared request, on which `create` and `acreate` can be called
+            with the messages and other per-request arguments.
+        """
+        config = _config_ or {}
+        resource = cls(**config)
+        static_kwargs = filter_args(model=model, functions=functions, system=system)
+        static_kwargs["validate_functions"] = validate_functions
+        if headers is not None:
+            static_kwargs["headers"] = headers
+        return PreparedChatRequest(resource, resource._prepare_static_parts(static_kwargs))
+
     def _check_model_kwargs(self, model_name: str, kwargs: Dict[str, Any]) -> None:
         if model_name in ("ernie-speed", "ernie-speed-128k", "ernie-char-8k", "ernie-tiny-8k", "ernie-lite"):
             for arg in ("functions", "disable_search", "enable_citation", "tool_choice"):
@@ -465,20 +544,6 @@ class ChatCompletion(EBResource, CreatableWithStreaming):
                     raise errors.InvalidArgumentError(f"`{arg}` is not supported by the {model_name} model.")
 
     def _prepare_create(self, kwargs: Dict[str, Any]) -> RequestWithStream:
-        def _update_model_name(given_name: str, old_name_to_new_name: Dict[str, str]) -> str:
-            if given_name in old_name_to_new_name:
-                new_name = old_name_to_new_name[given_name]
-                logging.warning(
-                    "'%s' will be deprecated in the future. Please use '%s' instead.", given_name, new_name
-                )
-                return new_name
-            else:
-                return given_name
-
-        def _set_val_if_key_exists(src: dict, dst: dict, key: str) -> None:
-            if key in src:
-                dst[key] = src[key]
-
         valid_keys = {
             "model",
             "messages",
@@ -505,6 +570,22 @@ class ChatCompletion(EBResource, CreatableWithStreaming):
         if len(invalid_keys) > 0:
             raise ValueError(f"Invalid keys found in `kwargs`: {list(invalid_keys)}")
 
+        static_kwargs = {k: v for k, v in kwargs.items() if k in self._STATIC_KEYS}
+        dynamic_kwargs = {k: v for k, v in kwargs.items() if k not in self._STATIC_KEYS}
+        static_parts = self._prepare_static_parts(static_kwargs)
+        return self._prepare_request(static_parts, dynamic_kwargs, dict(static_parts.params))
+
+    def _prepare_static_parts(self, kwargs: Dict[str, Any]) -> "_StaticChatParts":
+        def _update_model_name(given_name: str, old_name_to_new_name: Dict[str, str]) -> str:
+            if given_name in old_name_to_new_name:
+                new_name = old_name_to_new_name[given_name]
+                logging.warning(
+                    "'%s' will be deprecated in the future. Please use '%s' instead.", given_name, new_name
+                )
+                return new_name
+            else:
+                return given_name
+
         # model
         if "model" not in kwargs:
             raise errors.ArgumentNotFoundError("model")
@@ -522,11 +603,6 @@ class ChatCompletion(EBResource, CreatableWithStreaming):
             },
         )
 
-        # messages
-        if "messages" not in kwargs:
-            raise errors.ArgumentNotFoundError("messages")
-        messages = kwargs["messages"]
-
         # path
         if self.api_type in self.SUPPORTED_API_TYPES:
             api_info = self._API_INFO_DICT[self.api_type]
@@ -542,16 +618,61 @@ class ChatCompletion(EBResource, CreatableWithStreaming):
         params = {}
         self._check_model_kwargs(model, kwargs)
 
-        params["messages"] = messages
         if "functions" in kwargs:
             functions = kwargs["functions"]
             if kwargs.get("validate_functions", False):
                 self._validate_functions(functions)
             params["functions"] = functions
+        if "system" in kwargs:
+            params["system"] = kwargs["system"]
+
+        # headers
+        headers: HeadersType = {}
+        if self.api_type is APIType.AISTUDIO or self.api_type is APIType.CUSTOM:
+            headers["Content-Type"] = "application/json"
+        if "headers" in kwargs:
+            headers.update(kwargs["headers"])
+
+        return _StaticChatParts(
+            model=model,
+            path=path,
+            max_input_tokens=api_info["models"][model].get("max_input_tokens", None),
+            params=params,
+            headers=headers,
+        )
+
+    def _prepare_request(
+        self, static_parts: "_StaticChatParts", kwargs: Dict[str, Any], params: ParamsType
+    ) -> RequestWithStream:
+        def _set_val_if_key_exists(src: dict, dst: dict, key: str) -> None:
+            if key in src:
+                dst[key] = src[key]
+
+        # messages
+        if "messages" not in kwargs:
+            raise errors.ArgumentNotFoundError("messages")
+        messages = kwargs["messages"]
+
+        # params
+        self._check_model_kwargs(static_parts.model, kwargs)
+
+        fitter: Optional[ContextWindowFitter] = self._cfg["context_window_fitter"]
+        if fitter is not None and static_parts.max_input_tokens is not None:
+            system = static_parts.params.get("system", None)
+            fitted = fitter.fit(
+                messages,
+                static_parts.max_input_tokens,
+                system=system,
+                functions=static_parts.params.get("functions", None),
+            )
+            messages = fitted.messages
+            if fitted.system is not system:
+                params["system"] = fitted.system
+
+        params["messages"] = messages
         _set_val_if_key_exists(kwargs, params, "temperature")
         _set_val_if_key_exists(kwargs, params, "top_p")
         _set_val_if_key_exists(kwargs, params, "penalty_score")
-        _set_val_if_key_exists(kwargs, params, "system")
         _set_val_if_key_exists(kwargs, params, "stop")
         _set_val_if_key_exists(kwargs, params, "disable_search")
         _set_val_if_key_exists(kwargs, params, "enable_citation")
@@ -566,9 +687,7 @@ class ChatCompletion(EBResource, CreatableWithStreaming):
             params.update(kwargs["extra_params"])
 
         # headers
-        headers: HeadersType = {}
-        if self.api_type is APIType.AISTUDIO or self.api_type is APIType.CUSTOM:
-            headers["Content-Type"] = "application/json"
+        headers = static_parts.headers.copy()
         if "headers" in kwargs:
             headers.update(kwargs["headers"])
 
@@ -580,11 +699,12 @@ class ChatCompletion(EBResource, CreatableWithStreaming):
 
         return RequestWithStream(
             method="POST",
-            path=path,
+            path=static_parts.path,
             params=params,
             headers=headers,
             timeout=request_timeout,
             stream=stream,
+            model=static_parts.model,
         )
 
     @classmethod
@@ -617,6 +737,272 @@ class ChatCompletion(EBResource, CreatableWithStreaming):
             return True
 
 
+@dataclass
+class _StaticChatParts(object):
+    model: str
+    path: str
+    max_input_tokens: Optional[int]
+    params: ParamsType
+    headers: HeadersType
+
+
+class PreparedChatRequest(object):
+    """Chat request template created by `ChatCompletion.prepare`."""
+
+    def __init__(self, resource: ChatCompletion, static_parts: _StaticChatParts) -> None:
+        super().__init__()
+        self._resource = resource
+        # The static parameters are encoded only once, so the template keeps
+        # its own copy, which callers cannot modify in place.
+        self._static_parts = dataclasses.replace(static_parts, params=copy.deepcopy(static_parts.params))
+        self._encoded_static_params = PreEncodedParams.encode_static_params(self._static_parts.params)
+
+    @property
+    def model(self) -> str:
+        return self._static_parts.model
+
+    @overload
+    def create(
+        self,
+        messages: List[dict],
+        *,
+        temperature: Union[float, NotGiven] = ...,
+        top_p: Union[float, NotGiven] = ...,
+        penalty_score: Union[float, NotGiven] = ...,
+        stop: Union[str, NotGiven] = ...,
+        disable_search: Union[bool, NotGiven] = ...,
+        enable_citation: Union[bool, NotGiven] = ...,
+        user_id: Union[str, NotGiven] = ...,
+        tool_choice: Union[dict, NotGiven] = ...,
+        stream: Union[Literal[False], NotGiven] = ...,
+        extra_params: Optional[dict] = ...,
+        headers: Optional[HeadersType] = ...,
+        request_timeout: Optional[float] = ...,
+        max_output_tokens: Optional[int] = ...,
+    ) -> "ChatCompletionResponse":
+        ...
+
+    @overload
+    def create(
+        self,
+        messages: List[dict],
+        *,
+        temperature: Union[float, NotGiven] = ...,
+        top_p: Union[float, NotGiven] = ...,
+        penalty_score: Union[float, NotGiven] = ...,
+        stop: Union[str, NotGiven] = ...,
+        disable_search: Union[bool, NotGiven] = ...,
+        enable_citation: Union[bool, NotGiven] = ...,
+        user_id: Union[str, NotGiven] = ...,
+        tool_choice: Union[dict, NotGiven] = ...,
+        stream: Literal[True],
+        extra_params: Optional[dict] = ...,
+        headers: Optional[HeadersType] = ...,
+        request_timeout: Optional[float] = ...,
+        max_output_tokens: Optional[int] = ...,
+    ) -> Iterator["ChatCompletionResponse"]:
+        ...
+
+    @overload
+    def create(
+        self,
+        messages: List[dict],
+        *,
+        temperature: Union[float, NotGiven] = ...,
+        top_p: Union[float, NotGiven] = ...,
+        penalty_score: Union[float, NotGiven] = ...,
+        stop: Union[str, NotGiven] = ...,
+        disable_search: Union[bool, NotGiven] = ...,
+        enable_citation: Union[bool, NotGiven] = ...,
+        user_id: Union[str, NotGiven] = ...,
+        tool_choice: Union[dict, NotGiven] = ...,
+        stream: bool,
+        extra_params: Optional[dict] = ...,
+        headers: Optional[HeadersType] = ...,
+        request_timeout: Optional[float] = ...,
+        max_output_tokens: Optional[int] = ...,
+    ) -> Union["ChatCompletionResponse", Iterator["ChatCompletionResponse"]]:
+        ...
+
+    def create(
+        self,
+        messages: List[dict],
+        *,
+        temperature: Union[float, NotGiven] = NOT_GIVEN,
+        top_p: Union[float, NotGiven] = NOT_GIVEN,
+        penalty_score: Union[float, NotGiven] = NOT_GIVEN,
+        stop: Union[str, NotGiven] = NOT_GIVEN,
+        disable_search: Union[bool, NotGiven] = NOT_GIVEN,
+        enable_citation: Union[bool, NotGiven] = NOT_GIVEN,
+        user_id: Union[str, NotGiven] = NOT_GIVEN,
+        tool_choice: Union[dict, NotGiven] = NOT_GIVEN,
+        stream: Union[bool, NotGiven] = NOT_GIVEN,
+        extra_params: Optional[dict] = None,
+        headers: Optional[HeadersType] = None,
+        request_timeout: Optional[float] = None,
+        max_output_tokens: Optional[int] = None,
+    ) -> Union["ChatCompletionResponse", Iterator["ChatCompletionResponse"]]:
+        """Creates a model response for the given conversation.
+
+        See `ChatCompletion.create` for the arguments.
+        """
+        req = self._prepare(
+            filter_args(
+                messages=messages,
+                temperature=temperature,
+                top_p=top_p,
+                penalty_score=penalty_score,
+                stop=stop,
+                disable_search=disable_search,
+                enable_citation=enable_citation,
+                user_id=user_id,
+                tool_choice=tool_choice,
+                stream=stream,
+                max_output_tokens=max_output_tokens,
+            ),
+            extra_params,
+            headers,
+            request_timeout,
+        )
+        resp = self._resource.request(
+            method=req.method,
+            path=req.path,
+            stream=req.stream,
+            params=req.params,
+            headers=req.headers,
+            request_timeout=req.timeout,
+            model=req.model,
+        )
+        return transform(ChatCompletionResponse.from_mapping, resp)
+
+    @overload
+    async def acreate(
+        self,
+        messages: List[dict],
+        *,
+        temperature: Union[float, NotGiven] = ...,
+        top_p: Union[float, NotGiven] = ...,
+        penalty_score: Union[float, NotGiven] = ...,
+        stop: Union[str, NotGiven] = ...,
+        disable_search: Union[bool, NotGiven] = ...,
+        enable_citation: Union[bool, NotGiven] = ...,
+        user_id: Union[str, NotGiven] = ...,
+        tool_choice: Union[dict, NotGiven] = ...,
+        stream: Union[Literal[False], NotGiven] = ...,
+        extra_params: Optional[dict] = ...,
+        headers: Optional[HeadersType] = ...,
+        request_timeout: Optional[float] = ...,
+        max_output_tokens: Optional[int] = ...,
+    ) -> "ChatCompletionResponse":
+        ...
+
+    @overload
+    async def acreate(
+        self,
+        messages: List[dict],
+        *,
+        temperature: Union[float, NotGiven] = ...,
+        top_p: Union[float, NotGiven] = ...,
+        penalty_score: Union[float, NotGiven] = ...,
+        stop: Union[str, NotGiven] = ...,
+        disable_search: Union[bool, NotGiven] = ...,
+        enable_citation: Union[bool, NotGiven] = ...,
+        user_id: Union[str, NotGiven] = ...,
+        tool_choice: Union[dict, NotGiven] = ...,
+        stream: Literal[True],
+        extra_params: Optional[dict] = ...,
+        headers: Optional[HeadersType] = ...,
+        request_timeout: Optional[float] = ...,
+        max_output_tokens: Optional[int] = ...,
+    ) -> AsyncIterator["ChatCompletionResponse"]:
+        ...
+
+    @overload
+    async def acreate(
+        self,
+        messages: List[dict],
+        *,
+        temperature: Union[float, NotGiven] = ...,
+        top_p: Union[float, NotGiven] = ...,
+        penalty_score: Union[float, NotGiven] = ...,
+        stop: Union[str, NotGiven] = ...,
+        disable_search: Union[bool, NotGiven] = ...,
+        enable_citation: Union[bool, NotGiven] = ...,
+        user_id: Union[str, NotGiven] = ...,
+        tool_choice: Union[dict, NotGiven] = ...,
+        stream: bool,
+        extra_params: Optional[dict] = ...,
+        headers: Optional[HeadersType] = ...,
+        request_timeout: Optional[float] = ...,
+        max_output_tokens: Optional[int] = ...,
+    ) -> Union["ChatCompletionResponse", AsyncIterator["ChatCompletionResponse"]]:
+        ...
+
+    async def acreate(
+        self,
+        messages: List[dict],
+        *,
+        temperature: Union[float, NotGiven] = NOT_GIVEN,
+        top_p: Union[float, NotGiven] = NOT_GIVEN,
+        penalty_score: Union[float, NotGiven] = NOT_GIVEN,
+        stop: Union[str, NotGiven] = NOT_GIVEN,
+        disable_search: Union[bool, NotGiven] = NOT_GIVEN,
+        enable_citation: Union[bool, NotGiven] = NOT_GIVEN,
+        user_id: Union[str, NotGiven] = NOT_GIVEN,
+        tool_choice: Union[dict, NotGiven] = NOT_GIVEN,
+        stream: Union[bool, NotGiven] = NOT_GIVEN,
+        extra_params: Optional[dict] = None,
+        headers: Optional[HeadersType] = None,
+        request_timeout: Optional[float] = None,
+        max_output_tokens: Optional[int] = None,
+    ) -> Union["ChatCompletionResponse", AsyncIterator["ChatCompletionResponse"]]:
+        """Asynchronous version of `create`."""
+        req = self._prepare(
+            filter_args(
+                messages=messages,
+                temperature=temperature,
+                top_p=top_p,
+                penalty_score=penalty_score,
+                stop=stop,
+                disable_search=disable_search,
+                enable_citation=enable_citation,
+                user_id=user_id,
+                tool_choice=tool_choice,
+                stream=stream,
+                max_output_tokens=max_output_tokens,
+            ),
+            extra_params,
+            headers,
+            request_timeout,
+        )
+        resp = await self._resource.arequest(
+            method=req.method,
+            path=req.path,
+            stream=req.stream,
+            params=req.params,
+            headers=req.headers,
+            request_timeout=req.timeout,
+            model=req.model,
+        )
+        return transform(ChatCompletionResponse.from_mapping, resp)
+
+    def _prepare(
+        self,
+        kwargs: Dict[str, Any],
+        extra_params: Optional[dict],
+        headers: Optional[HeadersType],
+        request_timeout: Optional[float],
+    ) -> RequestWithStream:
+        if extra_params is not None:
+            kwargs["extra_params"] = extra_params
+        if headers is not None:
+            kwargs["headers"] = headers
+        if request_timeout is not None:
+            kwargs["request_timeout"] = request_timeout
+        params = PreEncodedParams(self._static_parts.params, self._encoded_static_params)
+        return self._resource._prepare_request(self._static_parts, kwargs, params)
+
+
 class ChatCompletionResponse(EBResponse):
     @property
     def is_function_response(self) -> bool:
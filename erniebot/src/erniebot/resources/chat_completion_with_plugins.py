@@ -44,6 +44,7 @@ class ChatCompletionWithPlugins(EBResource, CreatableWithStreaming):
         APIType.CUSTOM,
         APIType.AISTUDIO,
     )
+    SUPPORTS_COALESCING: ClassVar[bool] = True
     _API_INFO_DICT: ClassVar[Dict[APIType, Dict[str, Any]]] = {
         APIType.QIANFAN: {
             "path": "/erniebot/plugins",
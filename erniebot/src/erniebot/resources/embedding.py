@@ -31,6 +31,7 @@ class Embedding(EBResource, Creatable):
         APIType.QIANFAN,
         APIType.AISTUDIO,
     )
+    SUPPORTS_COALESCING: ClassVar[bool] = True
     _API_INFO_DICT: ClassVar[Dict[APIType, Dict[str, Any]]] = {
         APIType.QIANFAN: {
             "resource_id": "embeddings",
@@ -188,6 +189,7 @@ class Embedding(EBResource, Creatable):
             params=params,
             headers=headers,
             timeout=request_timeout,
+            model=model,
         )
 
 
@@ -27,6 +27,7 @@ from typing import (
     Optional,
     Tuple,
     Union,
+    cast,
     final,
     overload,
 )
@@ -35,11 +36,16 @@ import tenacity
 
 import erniebot.constants as constants
 import erniebot.errors as errors
+import erniebot.metering as metering
 import erniebot.utils.logging as logging
 from erniebot.api_types import APIType, convert_str_to_api_type
 from erniebot.backends import build_backend
+from erniebot.coalescing import RequestCoalescer, make_request_key
 from erniebot.config import GlobalConfig
+from erniebot.rate_limiting import RateLimiter
 from erniebot.response import EBResponse
+from erniebot.scheduling import RequestScheduler, _Ticket
+from erniebot.streaming import ClosingAsyncIterator, ClosingIterator
 from erniebot.types import ConfigDictType, HeadersType, ParamsType
 
 
@@ -60,6 +66,8 @@ class EBResource(object):
     POLLING_INTERVAL_SECS: Final[float] = constants.POLLING_INTERVAL_SECS
 
     SUPPORTED_API_TYPES: ClassVar[Tuple[APIType, ...]]
+    # Whether identical in-flight requests can be served by a single call.
+    SUPPORTS_COALESCING: ClassVar[bool] = False
 
     def __init__(self, **config: Any) -> None:
         object.__init__(self)
@@ -75,6 +83,13 @@ class EBResource(object):
 
         self._backend = build_backend(self.api_type, self._cfg)
 
+        self._scheduler: Optional[RequestScheduler] = self._cfg["scheduler"]
+        self._rate_limiter: Optional[RateLimiter] = self._cfg["rate_limiter"]
+        self._coalescer: Optional[RequestCoalescer] = (
+            self._cfg["coalescer"] if self.SUPPORTS_COALESCING else None
+        )
+        self._usage_meter: Optional[metering.UsageMeter] = self._cfg["usage_meter"]
+
     @overload
     def request(
         self,
@@ -85,6 +100,7 @@ class EBResource(object):
         params: Optional[ParamsType] = ...,
         headers: Optional[HeadersType] = ...,
         request_timeout: Optional[float] = ...,
+        model: Optional[str] = ...,
     ) -> EBResponse:
         ...
 
@@ -98,6 +114,7 @@ class EBResource(object):
         params: Optional[ParamsType] = ...,
         headers: Optional[HeadersType] = ...,
         request_timeout: Optional[float] = ...,
+        model: Optional[str] = ...,
     ) -> Iterator[EBResponse]:
         ...
 
@@ -111,6 +128,7 @@ class EBResource(object):
         params: Optional[ParamsType] = ...,
         headers: Optional[HeadersType] = ...,
         request_timeout: Optional[float] = ...,
+        model: Optional[str] = ...,
     ) -> Union[EBResponse, Iterator[EBResponse]]:
         ...
 
@@ -124,34 +142,25 @@ class EBResource(object):
         params: Optional[ParamsType] = None,
         headers: Optional[HeadersType] = None,
         request_timeout: Optional[float] = None,
+        model: Optional[str] = None,
     ) -> Union[EBResponse, Iterator[EBResponse]]:
-        retrying = tenacity.Retrying(
-            stop=tenacity.stop_after_attempt(self.max_retries + 1),
-            wait=tenacity.wait_exponential(multiplier=1, max=self.retry_after[1], min=self.retry_after[0])
-            + tenacity.wait_random(min=0, max=0.5),
-            retry=(
-                tenacity.retry_if_exception_type(errors.TryAgain)
-                | tenacity.retry_if_exception_type(errors.RateLimitError)
-                | tenacity.retry_if_exception_type(errors.TimeoutError)
-            ),
-            before_sleep=lambda retry_state: logging.warning(
-                "Retrying requests: Attempt %s ended with: %s",
-                retry_state.attempt_number,
-                retry_state.outcome,
-            ),
-            reraise=True,
-        )
-        for attempt in retrying:
-            with attempt:
-                return self._request(
-                    method=method,
-                    path=path,
-                    stream=stream,
-                    params=params,
-                    headers=headers,
-                    request_timeout=request_timeout,
-                )
-        raise AssertionError
+        if self._usage_meter is None:
+            return self._request_coalesced(method, path, stream, params, headers, request_timeout)
+        record = self._start_usage_record(model or path)
+        token = metering.set_current_record(record)
+        try:
+            resp = self._request_coalesced(method, path, stream, params, headers, request_timeout)
+        except BaseException:
+            # Includes cancellation.
+            record.finish(failed=True)
+            raise
+        finally:
+            metering.reset_current_record(token)
+        if stream:
+            return self._meter_stream(record, cast(Iterator[EBResponse], resp))
+        record.observe(cast(EBResponse, resp))
+        record.finish()
+        return resp
 
     @overload
     async def arequest(
@@ -163,6 +172,7 @@ class EBResource(object):
         params: Optional[ParamsType] = ...,
         headers: Optional[HeadersType] = ...,
         request_timeout: Optional[float] = ...,
+        model: Optional[str] = ...,
     ) -> EBResponse:
         ...
 
@@ -176,6 +186,7 @@ class EBResource(object):
         params: Optional[ParamsType] = ...,
         headers: Optional[HeadersType] = ...,
         request_timeout: Optional[float] = ...,
+        model: Optional[str] = ...,
     ) -> AsyncIterator[EBResponse]:
         ...
 
@@ -189,6 +200,7 @@ class EBResource(object):
         params: Optional[ParamsType] = ...,
         headers: Optional[HeadersType] = ...,
         request_timeout: Optional[float] = ...,
+        model: Optional[str] = ...,
     ) -> Union[EBResponse, AsyncIterator[EBResponse]]:
         ...
 
@@ -202,6 +214,107 @@ class EBResource(object):
         params: Optional[ParamsType] = None,
         headers: Optional[HeadersType] = None,
         request_timeout: Optional[float] = None,
+        model: Optional[str] = None,
+    ) -> Union[EBResponse, AsyncIterator[EBResponse]]:
+        if self._usage_meter is None:
+            return await self._arequest_coalesced(method, path, stream, params, headers, request_timeout)
+        record = self._start_usage_record(model or path)
+        token = metering.set_current_record(record)
+        try:
+            resp = await self._arequest_coalesced(method, path, stream, params, headers, request_timeout)
+        except BaseException:
+            # Includes cancellation.
+            record.finish(failed=True)
+            raise
+        finally:
+            metering.reset_current_record(token)
+        if stream:
+            return self._ameter_stream(record, cast(AsyncIterator[EBResponse], resp))
+        record.observe(cast(EBResponse, resp))
+        record.finish()
+        return resp
+
+    def _request_coalesced(
+        self,
+        method: str,
+        path: str,
+        stream: bool,
+        params: Optional[ParamsType],
+        headers: Optional[HeadersType],
+        request_timeout: Optional[float],
+    ) -> Union[EBResponse, Iterator[EBResponse]]:
+        if self._coalescer is not None:
+            key = self._get_coalescing_key(method, path, stream, params, headers)
+            return self._coalescer.run(
+                key,
+                lambda: self._request_with_retries(method, path, stream, params, headers, request_timeout),
+                stream,
+            )
+        return self._request_with_retries(method, path, stream, params, headers, request_timeout)
+
+    async def _arequest_coalesced(
+        self,
+        method: str,
+        path: str,
+        stream: bool,
+        params: Optional[ParamsType],
+        headers: Optional[HeadersType],
+        request_timeout: Optional[float],
+    ) -> Union[EBResponse, AsyncIterator[EBResponse]]:
+        if self._coalescer is not None:
+            key = self._get_coalescing_key(method, path, stream, params, headers)
+            return await self._coalescer.arun(
+                key,
+                lambda: self._arequest_with_retries(method, path, stream, params, headers, request_timeout),
+                stream,
+            )
+        return await self._arequest_with_retries(method, path, stream, params, headers, request_timeout)
+
+    def _request_with_retries(
+        self,
+        method: str,
+        path: str,
+        stream: bool,
+        params: Optional[ParamsType],
+        headers: Optional[HeadersType],
+        request_timeout: Optional[float],
+    ) -> Union[EBResponse, Iterator[EBResponse]]:
+        retrying = tenacity.Retrying(
+            stop=tenacity.stop_after_attempt(self.max_retries + 1),
+            wait=tenacity.wait_exponential(multiplier=1, max=self.retry_after[1], min=self.retry_after[0])
+            + tenacity.wait_random(min=0, max=0.5),
+            retry=(
+                tenacity.retry_if_exception_type(errors.TryAgain)
+                | tenacity.retry_if_exception_type(errors.RateLimitError)
+                | tenacity.retry_if_exception_type(errors.TimeoutError)
+            ),
+            before_sleep=lambda retry_state: logging.warning(
+                "Retrying requests: Attempt %s ended with: %s",
+                retry_state.attempt_number,
+                retry_state.outcome,
+            ),
+            reraise=True,
+        )
+        for attempt in retrying:
+            with attempt:
+                return self._request(
+                    method=method,
+                    path=path,
+                    stream=stream,
+                    params=params,
+                    headers=headers,
+                    request_timeout=request_timeout,
+                )
+        raise AssertionError
+
+    async def _arequest_with_retries(
+        self,
+        method: str,
+        path: str,
+        stream: bool,
+        params: Optional[ParamsType],
+        headers: Optional[HeadersType],
+        request_timeout: Optional[float],
     ) -> Union[EBResponse, AsyncIterator[EBResponse]]:
         async_retrying = tenacity.AsyncRetrying(
             stop=tenacity.stop_after_attempt(self.max_retries + 1),
@@ -337,20 +450,29 @@ class EBResource(object):
         headers: Optional[HeadersType],
         request_timeout: Optional[float],
     ) -> Union[EBResponse, Iterator[EBResponse]]:
-        resp = self._backend.request(
-            method,
-            path,
-            stream,
-            params=params,
-            headers=headers,
-            request_timeout=request_timeout,
-        )
-        if stream:
-            if not isinstance(resp, Iterator):
-                raise RuntimeError("Expected an iterator of response objects")
-        else:
-            if not isinstance(resp, EBResponse):
-                raise RuntimeError("Expected a response object")
+        ticket = self._admit(params)
+        try:
+            resp = self._backend.request(
+                method,
+                path,
+                stream,
+                params=params,
+                headers=headers,
+                request_timeout=request_timeout,
+            )
+            if stream:
+                if not isinstance(resp, Iterator):
+                    raise RuntimeError("Expected an iterator of response objects")
+            else:
+                if not isinstance(resp, EBResponse):
+                    raise RuntimeError("Expected a response object")
+        except BaseException:
+            self._dismiss(ticket)
+            raise
+        if stream and ticket is not None:
+            # See https://github.com/python/mypy/issues/16590
+            return self._dismiss_on_exhaustion(ticket, cast(Iterator[EBResponse], resp))
+        self._dismiss(ticket)
         return resp
 
     @overload
@@ -399,22 +521,104 @@ class EBResource(object):
         headers: Optional[HeadersType],
         request_timeout: Optional[float],
     ) -> Union[EBResponse, AsyncIterator[EBResponse]]:
-        resp = await self._backend.arequest(
-            method,
-            path,
-            stream,
-            params=params,
-            headers=headers,
-            request_timeout=request_timeout,
-        )
-        if stream:
-            if not isinstance(resp, AsyncIterator):
-                raise RuntimeError("Expected an iterator of response objects")
-        else:
-            if not isinstance(resp, EBResponse):
-                raise RuntimeError("Expected a response object")
+        ticket = await self._aadmit(params)
+        try:
+            resp = await self._backend.arequest(
+                method,
+                path,
+                stream,
+                params=params,
+                headers=headers,
+                request_timeout=request_timeout,
+            )
+            if stream:
+                if not isinstance(resp, AsyncIterator):
+                    raise RuntimeError("Expected an iterator of response objects")
+            else:
+                if not isinstance(resp, EBResponse):
+                    raise RuntimeError("Expected a response object")
+        except BaseException:
+            self._dismiss(ticket)
+            raise
+        if stream and ticket is not None:
+            return self._adismiss_on_exhaustion(ticket, cast(AsyncIterator[EBResponse], resp))
+        self._dismiss(ticket)
         return resp
 
+    def _admit(self, params: Optional[ParamsType]) -> Optional[_Ticket]:
+        ticket = None
+        if self._scheduler is not None:
+            ticket = self._scheduler.acquire(self._cfg["priority"], self._get_tenant(params))
+        if self._rate_limiter is not None:
+            try:
+                self._rate_limiter.acquire()
+            except BaseException:
+                self._dismiss(ticket)
+                raise
+        return ticket
+
+    async def _aadmit(self, params: Optional[ParamsType]) -> Optional[_Ticket]:
+        ticket = None
+        if self._scheduler is not None:
+            ticket = await self._scheduler.aacquire(self._cfg["priority"], self._get_tenant(params))
+        if self._rate_limiter is not None:
+            try:
+                await self._rate_limiter.aacquire()
+            except BaseException:
+                self._dismiss(ticket)
+                raise
+        return ticket
+
+    def _dismiss(self, ticket: Optional[_Ticket]) -> None:
+        if ticket is not None:
+            assert self._scheduler is not None
+            self._scheduler.release(ticket)
+
+    def _dismiss_on_exhaustion(self, ticket: _Ticket, resp: Iterator[EBResponse]) -> Iterator[EBResponse]:
+        # The ticket is also released if the stream is closed before its first
+        # item, or dropped without being closed.
+        return ClosingIterator(resp, on_close=lambda error: self._dismiss(ticket))
+
+    def _adismiss_on_exhaustion(
+        self, ticket: _Ticket, resp: AsyncIterator[EBResponse]
+    ) -> AsyncIterator[EBResponse]:
+        return ClosingAsyncIterator(resp, on_close=lambda error: self._dismiss(ticket))
+
+    def _start_usage_record(self, model: str) -> metering.UsageRecord:
+        assert self._usage_meter is not None
+        # With a credential pool, the backend labels the record with the
+        # credential it picks.
+        credential = metering.get_credential_label(self._cfg["ak"], self._cfg["access_token"])
+        return self._usage_meter.start_record(model, self.api_type.name, credential, self._cfg["usage_tags"])
+
+    def _meter_stream(
+        self, record: metering.UsageRecord, resp: Iterator[EBResponse]
+    ) -> Iterator[EBResponse]:
+        return ClosingIterator(resp, func=record.observe_chunk, on_close=record.finish_stream)
+
+    def _ameter_stream(
+        self, record: metering.UsageRecord, resp: AsyncIterator[EBResponse]
+    ) -> AsyncIterator[EBResponse]:
+        return ClosingAsyncIterator(resp, func=record.observe_chunk, on_close=record.finish_stream)
+
+    def _get_coalescing_key(
+        self,
+        method: str,
+        path: str,
+        stream: bool,
+        params: Optional[ParamsType],
+        headers: Optional[HeadersType],
+    ) -> str:
+        # Requests sent with different credentials are never coalesced.
+        credentials = [self._cfg[k] for k in ("api_base_url", "access_token", "ak", "sk", "credential_pool")]
+        return make_request_key(self.api_type.name, credentials, method, path, stream, params, headers)
+
+    def _get_tenant(self, params: Optional[ParamsType]) -> Optional[str]:
+        tenant = self._cfg["tenant"]
+        if tenant is None and params is not None:
+            tenant = params.get("user_id", None)
+        return tenant
+
     def _create_config_dict(self, overrides: Any) -> ConfigDictType:
         cfg_dict = GlobalConfig().create_dict(**overrides)
         api_type_str = cfg_dict["api_type"]
@@ -0,0 +1,342 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import collections
+import itertools
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Mapping, Optional, Sequence
+
+from . import errors
+from .rate_limiting import RateLimiter
+from .utils import logging
+
+__all__ = ["RequestScheduler"]
+
+
+class _Waiter(object):
+    def __init__(self, priority: str, rank: int, tenant: str, seq: int) -> None:
+        super().__init__()
+        self.priority = priority
+        self.rank = rank
+        self.tenant = tenant
+        self.seq = seq
+        self.start_tag = 0.0
+        self.finish_tag = 0.0
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+        self.error: Optional[errors.RequestRejectedError] = None
+        self._event: Optional[threading.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._future: Optional[asyncio.Future] = None
+
+    def bind_event(self) -> threading.Event:
+        self._event = threading.Event()
+        return self._event
+
+    def bind_future(self) -> asyncio.Future:
+        self._loop = asyncio.get_running_loop()
+        self._future = self._loop.create_future()
+        return self._future
+
+    def wake_up(self) -> None:
+        if self._event is not None:
+            self._event.set()
+        elif self._loop is not None:
+            self._loop.call_soon_threadsafe(self._resolve_future)
+
+    def _resolve_future(self) -> None:
+        assert self._future is not None
+        if not self._future.done():
+            self._future.set_result(None)
+
+
+class _Ticket(object):
+    def __init__(self, priority: str) -> None:
+        super().__init__()
+        self.priority = priority
+        self.released = False
+
+
+@dataclass
+class _ClassStats(object):
+    num_in_flight: int = 0
+    num_admitted: int = 0
+    num_rejected: Dict[str, int] = field(default_factory=lambda: collections.defaultdict(int))
+    total_wait_secs: float = 0.0
+    max_wait_secs: float = 0.0
+
+
+class RequestScheduler(object):
+    """Admission control for API requests.
+
+    A scheduler bounds the number of in-flight requests. When all slots are
+    busy, requests are queued and admitted according to:
+    1. Priority classes: A queued request of a higher priority class is always
+        admitted before those of lower priority classes.
+    2. Weighted fair queuing: Within a priority class, tenants share the
+        capacity in proportion to their weights.
+
+    When the queue is full, a newly arrived request preempts the most recently
+    queued request of a lower priority class, if any; otherwise it is rejected.
+    Requests that cannot be admitted within the queue timeout are rejected as
+    well. Rejected requests raise `erniebot.errors.RequestRejectedError`.
+
+    If a rate limiter is given, a request is admitted only when both a slot and
+    a permit are available, so queued requests obtain permits in scheduling
+    order.
+
+    A scheduler can be configured via the `scheduler` setting. The priority
+    class and tenant of a request are taken from the `priority` and `tenant`
+    settings, and the tenant falls back to `user_id` of the request.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        *,
+        priority_classes: Sequence[str] = ("interactive", "default", "batch"),
+        default_priority: str = "default",
+        tenant_weights: Optional[Mapping[str, float]] = None,
+        max_queue_size: Optional[int] = None,
+        queue_timeout_secs: Optional[float] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+    ) -> None:
+        """Initializes the scheduler.
+
+        Args:
+            max_concurrency: Maximum number of in-flight requests.
+            priority_classes: Names of priority classes, from the highest
+                priority to the lowest.
+            default_priority: Priority class used when none is specified.
+            tenant_weights: Weights of tenants. Tenants not listed here have a
+                weight of 1.
+            max_queue_size: Maximum number of queued requests. `None` means no
+                limit.
+            queue_timeout_secs: Default maximum time a request may wait in the
+                queue. `None` means no limit.
+            rate_limiter: Rate limiter to consult before admitting a request.
+        """
+        super().__init__()
+        if max_concurrency <= 0:
+            raise ValueError("`max_concurrency` must be positive.")
+        if len(priority_classes) == 0:
+            raise ValueError("At least one priority class must be provided.")
+        if default_priority not in priority_classes:
+            raise ValueError(f"{repr(default_priority)} is not a priority class.")
+        self.max_concurrency = max_concurrency
+        self.priority_classes = tuple(priority_classes)
+        self.default_priority = default_priority
+        self.tenant_weights = dict(tenant_weights or {})
+        self.max_queue_size = max_queue_size
+        self.queue_timeout_secs = queue_timeout_secs
+        self.rate_limiter = rate_limiter
+
+        self._ranks = {name: rank for rank, name in enumerate(self.priority_classes)}
+        # rank -> tenant -> waiters
+        self._queues: List[Dict[str, Deque[_Waiter]]] = [
+            collections.OrderedDict() for _ in self.priority_classes
+        ]
+        self._virtual_times = [0.0 for _ in self.priority_classes]
+        self._last_finish_tags: List[Dict[str, float]] = [{} for _ in self.priority_classes]
+        self._stats = {name: _ClassStats() for name in self.priority_classes}
+        self._num_queued = 0
+        self._num_in_flight = 0
+        self._seq = itertools.count()
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def acquire(
+        self, priority: Optional[str] = None, tenant: Optional[str] = None, timeout: Optional[float] = None
+    ) -> _Ticket:
+        """Blocks until the request is admitted.
+
+        Args:
+            priority: Priority class of the request.
+            tenant: Tenant that issues the request.
+            timeout: Maximum time to wait in the queue. Defaults to
+                `queue_timeout_secs`.
+
+        Returns:
+            A ticket that must be passed to `release` when the request is done.
+        """
+        waiter = self._create_waiter(priority, tenant)
+        event = waiter.bind_event()
+        self._enqueue(waiter)
+        if waiter.error is None:
+            event.wait(self._get_timeout(timeout))
+        return self._finish_waiting(waiter)
+
+    async def aacquire(
+        self, priority: Optional[str] = None, tenant: Optional[str] = None, timeout: Optional[float] = None
+    ) -> _Ticket:
+        """Asynchronous version of `acquire`."""
+        waiter = self._create_waiter(priority, tenant)
+        future = waiter.bind_future()
+        self._enqueue(waiter)
+        if waiter.error is not None:
+            return self._finish_waiting(waiter)
+        try:
+            await asyncio.wait_for(future, self._get_timeout(timeout))
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            self._cancel(waiter)
+            raise
+        return self._finish_waiting(waiter)
+
+    def release(self, ticket: _Ticket) -> None:
+        """Frees the slot held by an admitted request."""
+        with self._lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            self._num_in_flight -= 1
+            self._stats[ticket.priority].num_in_flight -= 1
+            self._dispatch()
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Returns queue depth, in-flight requests, and wait times per class."""
+        with self._lock:
+            metrics = {}
+            for rank, name in enumerate(self.priority_classes):
+                stats = self._stats[name]
+                num_admitted = stats.num_admitted
+                metrics[name] = {
+                    "queue_depth": sum(len(q) for q in self._queues[rank].values()),
+                    "num_in_flight": stats.num_in_flight,
+                    "num_admitted": num_admitted,
+                    "num_rejected": dict(stats.num_rejected),
+                    "avg_wait_secs": stats.total_wait_secs / num_admitted if num_admitted > 0 else 0.0,
+                    "max_wait_secs": stats.max_wait_secs,
+                }
+            return metrics
+
+    def _get_timeout(self, timeout: Optional[float]) -> Optional[float]:
+        return timeout if timeout is not None else self.queue_timeout_secs
+
+    def _create_waiter(self, priority: Optional[str], tenant: Optional[str]) -> _Waiter:
+        if priority is None:
+            priority = self.default_priority
+        if priority not in self._ranks:
+            raise ValueError(f"{repr(priority)} is not a priority class.")
+        if tenant is None:
+            tenant = ""
+        return _Waiter(priority, self._ranks[priority], tenant, next(self._seq))
+
+    def _enqueue(self, waiter: _Waiter) -> None:
+        rank = waiter.rank
+        tenant = waiter.tenant
+        with self._lock:
+            if self._num_in_flight >= self.max_concurrency or self._num_queued > 0:
+                if self.max_queue_size is not None and self._num_queued >= self.max_queue_size:
+                    victim = self._find_victim(rank)
+                    if victim is None:
+                        self._reject(waiter, "queue_full")
+                        return
+                    self._remove(victim)
+                    self._reject(victim, "preempted")
+                    victim.wake_up()
+
+            weight = self.tenant_weights.get(tenant, 1.0)
+            last_finish_tags = self._last_finish_tags[rank]
+            waiter.start_tag = max(self._virtual_times[rank], last_finish_tags.get(tenant, 0.0))
+            waiter.finish_tag = waiter.start_tag + 1.0 / weight
+            last_finish_tags[tenant] = waiter.finish_tag
+            self._queues[rank].setdefault(tenant, collections.deque()).append(waiter)
+            self._num_queued += 1
+            self._dispatch()
+
+    def _finish_waiting(self, waiter: _Waiter) -> _Ticket:
+        with self._lock:
+            if not waiter.granted and waiter.error is None:
+                self._remove(waiter)
+                self._reject(waiter, "timeout")
+            if waiter.error is not None:
+                raise waiter.error
+            wait_secs = time.monotonic() - waiter.enqueued_at
+            stats = self._stats[waiter.priority]
+            stats.total_wait_secs += wait_secs
+            stats.max_wait_secs = max(stats.max_wait_secs, wait_secs)
+        return _Ticket(waiter.priority)
+
+    def _cancel(self, waiter: _Waiter) -> None:
+        with self._lock:
+            if waiter.granted:
+                # The slot was granted but will never be used.
+                self._num_in_flight -= 1
+                self._stats[waiter.priority].num_in_flight -= 1
+                self._dispatch()
+            elif waiter.error is None:
+                self._remove(waiter)
+
+    def _find_victim(self, rank: int) -> Optional[_Waiter]:
+        for victim_rank in range(len(self.priority_classes) - 1, rank, -1):
+            candidates = list(itertools.chain.from_iterable(self._queues[victim_rank].values()))
+            if len(candidates) > 0:
+                return max(candidates, key=lambda w: w.seq)
+        return None
+
+    def _remove(self, waiter: _Waiter) -> None:
+        queue = self._queues[waiter.rank][waiter.tenant]
+        queue.remove(waiter)
+        if len(queue) == 0:
+            del self._queues[waiter.rank][waiter.tenant]
+        self._num_queued -= 1
+
+    def _reject(self, waiter: _Waiter, reason: str) -> None:
+        waiter.error = errors.RequestRejectedError(f"The request was rejected ({reason}).", reason=reason)
+        self._stats[waiter.priority].num_rejected[reason] += 1
+
+    def _peek(self) -> Optional[_Waiter]:
+        for queues in self._queues:
+            if len(queues) > 0:
+                return min((q[0] for q in queues.values()), key=lambda w: (w.finish_tag, w.seq))
+        return None
+
+    def _dispatch(self) -> None:
+        # Must be called with `self._lock` held.
+        while self._num_in_flight < self.max_concurrency:
+            waiter = self._peek()
+            if waiter is None:
+                return
+            if self.rate_limiter is not None:
+                wait_secs = self.rate_limiter.reserve()
+                if wait_secs > 0:
+                    self._schedule_dispatch(wait_secs)
+                    return
+            self._remove(waiter)
+            self._virtual_times[waiter.rank] = waiter.start_tag
+            waiter.granted = True
+            self._num_in_flight += 1
+            stats = self._stats[waiter.priority]
+            stats.num_in_flight += 1
+            stats.num_admitted += 1
+            waiter.wake_up()
+
+    def _schedule_dispatch(self, delay: float) -> None:
+        if self._timer is not None and self._timer.is_alive():
+            return
+
+        def _on_timer() -> None:
+            with self._lock:
+                self._timer = None
+                self._dispatch()
+
+        logging.debug("Rate limit reached. Dispatching will resume in %.3f seconds.", delay)
+        self._timer = threading.Timer(delay, _on_timer)
+        self._timer.daemon = True
+        self._timer.start()
@@ -0,0 +1,204 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, Optional, TypeVar
+
+__all__ = ["ResponseStream", "AsyncResponseStream"]
+
+_T = TypeVar("_T")
+
+
+class ResponseStream(Iterator[_T]):
+    """Iterator over a streamed response.
+
+    Closing the stream, either explicitly or by leaving a `with` block,
+    releases the underlying connection immediately, even if the response has
+    not been consumed completely.
+    """
+
+    def __init__(self, iterator: Iterator[_T]) -> None:
+        super().__init__()
+        self._iterator = iterator
+
+    def __next__(self) -> _T:
+        return next(self._iterator)
+
+    def __enter__(self) -> "ResponseStream[_T]":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        close_iterator(self._iterator)
+
+
+class AsyncResponseStream(AsyncIterator[_T]):
+    """Asynchronous version of `ResponseStream`."""
+
+    def __init__(self, iterator: AsyncIterator[_T]) -> None:
+        super().__init__()
+        self._iterator = iterator
+
+    async def __anext__(self) -> _T:
+        return await self._iterator.__anext__()
+
+    async def __aenter__(self) -> "AsyncResponseStream[_T]":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await aclose_iterator(self._iterator)
+
+
+class ClosingIterator(Iterator[_T]):
+    """Iterator that cleans up once the wrapped iterator is exhausted or fails,
+    or once it is closed.
+
+    Cleaning up closes the wrapped iterator and calls `on_close` with the error
+    that ended the iteration, if any. Unlike a generator with a `finally`
+    clause, this also happens if the iterator is closed before its first item,
+    or dropped without being closed.
+    """
+
+    def __init__(
+        self,
+        iterator: Iterator[Any],
+        *,
+        func: Optional[Callable[[Any], _T]] = None,
+        on_close: Optional[Callable[[Optional[BaseException]], None]] = None,
+    ) -> None:
+        """Initializes the iterator.
+
+        Args:
+            iterator: The wrapped iterator.
+            func: If given, applied to each item of `iterator`.
+            on_close: Called once when cleaning up.
+        """
+        super().__init__()
+        self._iterator = iterator
+        self._func = func
+        self._on_close = on_close
+        self._closed = False
+
+    def __next__(self) -> _T:
+        if self._closed:
+            raise StopIteration
+        try:
+            item = next(self._iterator)
+            if self._func is not None:
+                item = self._func(item)
+        except StopIteration:
+            self._close(None)
+            raise
+        except BaseException as e:
+            self._close(e)
+            raise
+        return item
+
+    def close(self) -> None:
+        self._close(None)
+
+    def __del__(self) -> None:
+        if not getattr(self, "_closed", True):
+            self._close(None)
+
+    def _close(self, error: Optional[BaseException]) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            close_iterator(self._iterator)
+        finally:
+            if self._on_close is not None:
+                self._on_close(error)
+
+
+class ClosingAsyncIterator(AsyncIterator[_T]):
+    """Asynchronous version of `ClosingIterator`.
+
+    `on_aclose` is awaited before `on_close` is called. If the iterator is
+    dropped without being closed, only `on_close` is called.
+    """
+
+    def __init__(
+        self,
+        iterator: AsyncIterator[Any],
+        *,
+        func: Optional[Callable[[Any], _T]] = None,
+        on_close: Optional[Callable[[Optional[BaseException]], None]] = None,
+        on_aclose: Optional[Callable[[Optional[BaseException]], Awaitable[None]]] = None,
+    ) -> None:
+        super().__init__()
+        self._iterator = iterator
+        self._func = func
+        self._on_close = on_close
+        self._on_aclose = on_aclose
+        self._closed = False
+
+    async def __anext__(self) -> _T:
+        if self._closed:
+            raise StopAsyncIteration
+        try:
+            item = await self._iterator.__anext__()
+            if self._func is not None:
+                item = self._func(item)
+        except StopAsyncIteration:
+            await self._aclose(None)
+            raise
+        except BaseException as e:
+            await self._aclose(e)
+            raise
+        return item
+
+    async def aclose(self) -> None:
+        await self._aclose(None)
+
+    def __del__(self) -> None:
+        # The wrapped iterator cannot be closed here. Asynchronous generators
+        # are closed by the event loop.
+        if not getattr(self, "_closed", True):
+            self._closed = True
+            if self._on_close is not None:
+                self._on_close(None)
+
+    async def _aclose(self, error: Optional[BaseException]) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            try:
+                await aclose_iterator(self._iterator)
+            finally:
+                if self._on_aclose is not None:
+                    await self._on_aclose(error)
+        finally:
+            if self._on_close is not None:
+                self._on_close(error)
+
+
+def close_iterator(iterator: Iterator[Any]) -> None:
+    """Closes an iterator if it supports closing."""
+    close = getattr(iterator, "close", None)
+    if close is not None:
+        close()
+
+
+async def aclose_iterator(iterator: AsyncIterator[Any]) -> None:
+    """Closes an asynchronous iterator if it supports closing."""
+    aclose = getattr(iterator, "aclose", None)
+    if aclose is not None:
+        await aclose()
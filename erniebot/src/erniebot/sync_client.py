@@ -0,0 +1,270 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import concurrent.futures
+import threading
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterator,
+    Optional,
+    Set,
+    TypeVar,
+)
+
+import aiohttp
+
+from .types import ConfigDictType
+from .utils import logging
+from .warmup import WarmupReport, awarmup
+
+__all__ = ["SyncClient"]
+
+_T = TypeVar("_T")
+
+_RESOURCE_NAMES = ("ChatCompletion", "ChatCompletionWithPlugins", "Embedding", "Image", "ImageV1", "ImageV2")
+
+
+class SyncClient(object):
+    """Synchronous client backed by a shared background event loop.
+
+    All calls made through a client, from any number of threads, run on a
+    single asyncio event loop in a background thread and share one aiohttp
+    connection pool. Blocking callers only wait on a future, so many
+    concurrent callers are multiplexed over at most `max_connections`
+    connections.
+
+    Resources are accessed as attributes, and their `create` methods have
+    the same signatures as the synchronous API:
+
+        client = erniebot.SyncClient(max_connections=32)
+        resp = client.ChatCompletion.create(model="ernie-3.5", messages=...)
+        for chunk in client.ChatCompletion.create(..., stream=True):
+            ...
+        client.close()
+
+    After `close` is called, new calls raise `RuntimeError`. In-flight calls
+    are given `timeout` seconds to finish and are cancelled afterwards.
+
+    If `warmup_connections` is positive, the client warms up in the
+    background right after it is created (see `erniebot.warmup`), and
+    `wait_until_ready` can be used to wait for the warm-up to finish.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_connections: int = 100,
+        warmup_connections: int = 0,
+        _config_: Optional[ConfigDictType] = None,
+    ) -> None:
+        """Initializes the client and starts the background event loop.
+
+        Args:
+            max_connections: Maximum number of connections in the pool.
+            warmup_connections: Number of connections to open to the backend
+                in advance. If positive, auth tokens are also fetched in
+                advance.
+            _config_: Overrides the global settings for all calls.
+        """
+        super().__init__()
+        if max_connections <= 0:
+            raise ValueError("`max_connections` must be positive.")
+        if warmup_connections < 0 or warmup_connections > max_connections:
+            raise ValueError("`warmup_connections` must be between 0 and `max_connections`.")
+        self.max_connections = max_connections
+        self._config = dict(_config_ or {})
+        self._closed = False
+        self._lock = threading.Lock()
+        self._pending: Set[concurrent.futures.Future] = set()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="erniebot-sync-client", daemon=True)
+        self._thread.start()
+        self._session: aiohttp.ClientSession = asyncio.run_coroutine_threadsafe(
+            self._create_session(), self._loop
+        ).result()
+        self._warmup_future: Optional[concurrent.futures.Future] = None
+        if warmup_connections > 0:
+            self._warmup_future = asyncio.run_coroutine_threadsafe(
+                awarmup(num_connections=warmup_connections, _config_=self._get_config()), self._loop
+            )
+
+    def __enter__(self) -> "SyncClient":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def __getattr__(self, name: str) -> "_SyncResource":
+        if name in _RESOURCE_NAMES:
+            import erniebot
+
+            return _SyncResource(self, getattr(erniebot, name))
+        raise AttributeError(f"{repr(type(self).__name__)} object has no attribute {repr(name)}")
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def call(self, func: Callable[..., Awaitable[_T]], *args: Any, **kwargs: Any) -> _T:
+        """Calls a coroutine function on the background loop and waits for the
+        result.
+
+        If the result is an asynchronous iterator, a synchronous iterator that
+        consumes it on the background loop is returned instead.
+        """
+        result = self._run(func(*args, **kwargs))
+        if isinstance(result, AsyncIterator):
+            return _SyncStream(self, result)  # type: ignore
+        return result
+
+    def create(self, resource_cls: Any, **kwargs: Any) -> Any:
+        """Calls `resource_cls.acreate` with the shared connection pool."""
+        config = self._get_config(kwargs.pop("_config_", None))
+        return self.call(resource_cls.acreate, _config_=config, **kwargs)
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> Optional[WarmupReport]:
+        """Waits for the warm-up to finish.
+
+        Args:
+            timeout: Maximum number of seconds to wait.
+
+        Returns:
+            The warm-up report, or None if the client does not warm up.
+
+        Raises:
+            concurrent.futures.TimeoutError: The warm-up did not finish in
+                time.
+        """
+        if self._warmup_future is None:
+            return None
+        return self._warmup_future.result(timeout)
+
+    def close(self, timeout: Optional[float] = 10) -> None:
+        """Shuts down the client.
+
+        Args:
+            timeout: Seconds to wait for in-flight calls before they are
+                cancelled.
+        """
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("`close` cannot be called from the background loop.")
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            pending = list(self._pending)
+        _, not_done = concurrent.futures.wait(pending, timeout=timeout)
+        if len(not_done) > 0:
+            logging.warning("Cancelling %d in-flight calls.", len(not_done))
+            for future in not_done:
+                future.cancel()
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def _run(self, coro: Awaitable[_T]) -> _T:
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("Blocking calls cannot be made from the background loop.")
+        with self._lock:
+            if self._closed:
+                if asyncio.iscoroutine(coro):
+                    coro.close()
+                raise RuntimeError("The client is closed.")
+            future = asyncio.run_coroutine_threadsafe(coro, self._loop)  # type: ignore
+            self._pending.add(future)
+        future.add_done_callback(self._discard_pending)
+        try:
+            return future.result()
+        except BaseException:
+            # E.g., `KeyboardInterrupt` in the caller thread.
+            future.cancel()
+            raise
+
+    def _get_config(self, overrides: Optional[ConfigDictType] = None) -> ConfigDictType:
+        config = {**self._config, **(overrides or {})}
+        config["aiohttp_session"] = self._session
+        return config
+
+    def _discard_pending(self, future: concurrent.futures.Future) -> None:
+        with self._lock:
+            self._pending.discard(future)
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    async def _create_session(self) -> aiohttp.ClientSession:
+        return aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.max_connections))
+
+    async def _shutdown(self) -> None:
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Close unfinished streams before the connections they hold.
+        await self._loop.shutdown_asyncgens()
+        await self._session.close()
+
+
+class _SyncResource(object):
+    def __init__(self, client: SyncClient, resource_cls: Any) -> None:
+        super().__init__()
+        self._client = client
+        self._resource_cls = resource_cls
+
+    def create(self, **kwargs: Any) -> Any:
+        return self._client.create(self._resource_cls, **kwargs)
+
+
+class _SyncStream(Iterator[_T]):
+    def __init__(self, client: SyncClient, aiterator: AsyncIterator[_T]) -> None:
+        super().__init__()
+        self._client = client
+        self._aiterator = aiterator
+        self._exhausted = False
+
+    def __next__(self) -> _T:
+        if self._exhausted:
+            raise StopIteration
+        try:
+            return self._client._run(self._anext())
+        except StopAsyncIteration:
+            self._exhausted = True
+            raise StopIteration from None
+
+    def __enter__(self) -> "_SyncStream[_T]":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    async def _anext(self) -> _T:
+        # `__anext__` must be called on the background loop, so that the loop
+        # tracks the async generator and closes it on shutdown.
+        return await self._aiterator.__anext__()
+
+    def close(self) -> None:
+        """Releases the underlying connection without consuming the rest of
+        the stream."""
+        if self._exhausted:
+            return
+        self._exhausted = True
+        aclose = getattr(self._aiterator, "aclose", None)
+        if aclose is not None and not self._client.closed:
+            self._client._run(aclose())
@@ -0,0 +1,600 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import concurrent.futures
+import contextlib
+import threading
+import weakref
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterator,
+    Mapping,
+    MutableMapping,
+    NamedTuple,
+    Optional,
+    Union,
+)
+
+import aiohttp
+import requests
+import urllib3
+
+from . import errors
+from .types import HeadersType
+
+__all__ = [
+    "Transport",
+    "TransportResponse",
+    "AsyncTransportResponse",
+    "RequestsTransport",
+    "AiohttpTransport",
+    "HTTPXTransport",
+]
+
+
+class StreamTimeouts(NamedTuple):
+    connect: Optional[float]
+    first_chunk: float
+    idle: float
+
+
+class TransportResponse(object):
+    """Response returned by `Transport.send`."""
+
+    status_code: int
+    headers: Mapping[str, str]
+
+    def read(self) -> bytes:
+        """Reads the whole body."""
+        raise NotImplementedError
+
+    def iter_lines(self) -> Iterator[bytes]:
+        """Iterates over the lines of the body."""
+        raise NotImplementedError
+
+    def set_read_timeout(self, timeout: Optional[float]) -> None:
+        """Sets the timeout of subsequent reads, if supported."""
+
+    def close(self) -> None:
+        """Releases the connection."""
+        raise NotImplementedError
+
+
+class AsyncTransportResponse(object):
+    """Response returned by `Transport.asend`."""
+
+    status_code: int
+    headers: Mapping[str, str]
+
+    async def read(self) -> bytes:
+        """Reads the whole body."""
+        raise NotImplementedError
+
+    def iter_lines(self) -> AsyncIterator[bytes]:
+        """Iterates over the lines of the body."""
+        raise NotImplementedError
+
+    async def aclose(self) -> None:
+        """Releases the connection."""
+        raise NotImplementedError
+
+
+class Transport(object):
+    """Sends HTTP requests on behalf of `erniebot.http_client.EBClient`.
+
+    A transport can be configured via the `transport` setting. If it is not
+    set, synchronous requests are sent by `RequestsTransport` and
+    asynchronous requests by `AiohttpTransport`.
+
+    Implementations must raise `erniebot.errors.TimeoutError` on timeouts and
+    `erniebot.errors.ConnectionError` on other network errors, both when
+    sending a request and when reading the response.
+    """
+
+    def send(
+        self,
+        method: str,
+        url: str,
+        *,
+        headers: Optional[HeadersType],
+        data: Optional[bytes],
+        stream: bool,
+        timeout: float,
+        stream_timeouts: Optional[StreamTimeouts] = None,
+    ) -> TransportResponse:
+        """Sends a request and returns once the response headers arrive.
+
+        Args:
+            method: HTTP method.
+            url: URL of the request.
+            headers: Headers of the request.
+            data: Body of the request.
+            stream: Whether the body should be read incrementally.
+            timeout: Timeout of the whole request.
+            stream_timeouts: If given, `timeout` is ignored, and the
+                connection setup and the wait for the response headers are
+                limited by `stream_timeouts.connect` and
+                `stream_timeouts.first_chunk`, respectively.
+        """
+        raise NotImplementedError(f"{self.__class__.__name__} does not support synchronous requests.")
+
+    async def asend(
+        self,
+        method: str,
+        url: str,
+        *,
+        headers: Optional[HeadersType],
+        data: Optional[bytes],
+        stream: bool,
+        timeout: float,
+        stream_timeouts: Optional[StreamTimeouts] = None,
+    ) -> AsyncTransportResponse:
+        """Asynchronous version of `send`."""
+        raise NotImplementedError(f"{self.__class__.__name__} does not support asynchronous requests.")
+
+    def preconnect(self, url: str, num_connections: int, timeout: float) -> int:
+        """Opens connections to the host of `url` and keeps them in the pool.
+
+        The default implementation sends `num_connections` concurrent `HEAD`
+        requests, regardless of their status codes.
+
+        Args:
+            url: URL to connect to.
+            num_connections: Number of connections to open.
+            timeout: Timeout of each request.
+
+        Returns:
+            The number of connections opened.
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=num_connections) as executor:
+            futures = [
+                executor.submit(self._send_head_request, url, timeout) for _ in range(num_connections)
+            ]
+        for future in futures:
+            future.result()
+        return num_connections
+
+    async def apreconnect(self, url: str, num_connections: int, timeout: float) -> int:
+        """Asynchronous version of `preconnect`.
+
+        The connections are opened for use on the running event loop.
+        """
+        await asyncio.gather(*(self._asend_head_request(url, timeout) for _ in range(num_connections)))
+        return num_connections
+
+    def close(self) -> None:
+        """Closes the connections held by the transport."""
+
+    async def aclose(self) -> None:
+        """Asynchronous version of `close`."""
+        self.close()
+
+    def _send_head_request(self, url: str, timeout: float) -> None:
+        self.send("HEAD", url, headers=None, data=None, stream=False, timeout=timeout).close()
+
+    async def _asend_head_request(self, url: str, timeout: float) -> None:
+        response = await self.asend("HEAD", url, headers=None, data=None, stream=False, timeout=timeout)
+        await response.aclose()
+
+
+class RequestsTransport(Transport):
+    """Transport based on requests, which supports synchronous requests
+    only."""
+
+    def __init__(self, session: Optional[requests.Session] = None, proxy: Optional[str] = None) -> None:
+        """Initializes the transport.
+
+        Args:
+            session: Session to send requests with. If not given, a session is
+                created for each request.
+            proxy: Proxy to use.
+        """
+        super().__init__()
+        self._session = session
+        self._proxies = {"http": proxy, "https": proxy} if proxy is not None else None
+
+    def preconnect(self, url: str, num_connections: int, timeout: float) -> int:
+        # Connections are not reused without a shared session.
+        if self._session is None:
+            return 0
+        return super().preconnect(url, num_connections, timeout)
+
+    def send(
+        self,
+        method: str,
+        url: str,
+        *,
+        headers: Optional[HeadersType],
+        data: Optional[bytes],
+        stream: bool,
+        timeout: float,
+        stream_timeouts: Optional[StreamTimeouts] = None,
+    ) -> TransportResponse:
+        req_timeout: Any
+        if stream_timeouts is not None:
+            # The read timeout applies to the response headers here. It can be
+            # adjusted for the body with `set_read_timeout`.
+            req_timeout = (stream_timeouts.connect, stream_timeouts.first_chunk)
+        else:
+            req_timeout = timeout
+        session = self._session if self._session is not None else requests.Session()
+        try:
+            response = session.request(
+                method,
+                url,
+                headers=headers,
+                data=data,
+                stream=stream,
+                timeout=req_timeout,
+                proxies=self._proxies,
+            )
+        except BaseException as e:
+            if session is not self._session:
+                session.close()
+            if isinstance(e, requests.exceptions.Timeout):
+                raise errors.TimeoutError(f"Request timed out: {e}") from e
+            if isinstance(e, requests.exceptions.RequestException):
+                raise errors.ConnectionError(f"Error communicating with server: {e}") from e
+            raise
+        return _RequestsResponse(response, session if session is not self._session else None)
+
+
+class _RequestsResponse(TransportResponse):
+    def __init__(self, response: requests.Response, owned_session: Optional[requests.Session]) -> None:
+        super().__init__()
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self._response = response
+        self._owned_session = owned_session
+
+    def read(self) -> bytes:
+        with _map_requests_errors():
+            return self._response.content
+
+    def iter_lines(self) -> Iterator[bytes]:
+        with _map_requests_errors():
+            yield from self._response.iter_lines()
+
+    def set_read_timeout(self, timeout: Optional[float]) -> None:
+        # Socket timeouts apply to each read.
+        sock = getattr(getattr(self._response.raw, "connection", None), "sock", None)
+        if sock is not None:
+            sock.settimeout(timeout)
+
+    def close(self) -> None:
+        self._response.close()
+        if self._owned_session is not None:
+            self._owned_session.close()
+
+
+@contextlib.contextmanager
+def _map_requests_errors() -> Iterator[None]:
+    try:
+        yield
+    except requests.exceptions.ConnectionError as e:
+        if len(e.args) > 0 and isinstance(e.args[0], urllib3.exceptions.ReadTimeoutError):
+            raise errors.TimeoutError(f"Request timed out: {e}") from e
+        raise errors.ConnectionError(f"Error communicating with server: {e}") from e
+    except requests.exceptions.RequestException as e:
+        raise errors.ConnectionError(f"Error communicating with server: {e}") from e
+
+
+class AiohttpTransport(Transport):
+    """Transport based on aiohttp, which supports asynchronous requests
+    only."""
+
+    def __init__(self, session: Optional[aiohttp.ClientSession] = None, proxy: Optional[str] = None) -> None:
+        """Initializes the transport.
+
+        Args:
+            session: Session to send requests with. If not given, a session is
+                created for each request.
+            proxy: Proxy to use.
+        """
+        super().__init__()
+        self._session = session
+        self._proxy = proxy
+
+    async def apreconnect(self, url: str, num_connections: int, timeout: float) -> int:
+        # Connections are not reused without a shared session.
+        if self._session is None:
+            return 0
+        return await super().apreconnect(url, num_connections, timeout)
+
+    async def asend(
+        self,
+        method: str,
+        url: str,
+        *,
+        headers: Optional[HeadersType],
+        data: Optional[bytes],
+        stream: bool,
+        timeout: float,
+        stream_timeouts: Optional[StreamTimeouts] = None,
+    ) -> AsyncTransportResponse:
+        if stream_timeouts is not None:
+            # Do not limit the total time, so that long generations are not
+            # interrupted.
+            client_timeout = aiohttp.ClientTimeout(total=None, sock_connect=stream_timeouts.connect)
+        else:
+            client_timeout = aiohttp.ClientTimeout(total=timeout)
+        session = self._session if self._session is not None else aiohttp.ClientSession()
+        try:
+            coro = session.request(
+                method=method,
+                url=url,
+                headers=headers,
+                data=data,
+                timeout=client_timeout,
+                proxy=self._proxy,
+            )
+            if stream_timeouts is not None:
+                response = await asyncio.wait_for(coro, stream_timeouts.first_chunk)
+            else:
+                response = await coro
+        except BaseException as e:
+            if session is not self._session:
+                await session.close()
+            if isinstance(e, (aiohttp.ServerTimeoutError, asyncio.TimeoutError)):
+                raise errors.TimeoutError(f"Request timed out: {e}") from e
+            if isinstance(e, aiohttp.ClientError):
+                raise errors.ConnectionError(f"Error communicating with server: {e}") from e
+            raise
+        return _AiohttpResponse(response, session if session is not self._session else None)
+
+
+class _AiohttpResponse(AsyncTransportResponse):
+    def __init__(
+        self, response: aiohttp.ClientResponse, owned_session: Optional[aiohttp.ClientSession]
+    ) -> None:
+        super().__init__()
+        self.status_code = response.status
+        self.headers = response.headers
+        self._response = response
+        self._owned_session = owned_session
+
+    async def read(self) -> bytes:
+        try:
+            return await self._response.read()
+        except (aiohttp.ServerTimeoutError, asyncio.TimeoutError) as e:
+            raise errors.TimeoutError(f"Request timed out: {e}") from e
+        except aiohttp.ClientError as e:
+            raise errors.ConnectionError(f"Error communicating with server: {e}") from e
+
+    async def iter_lines(self) -> AsyncIterator[bytes]:
+        try:
+            async for line in self._response.content:
+                yield line
+        except aiohttp.ServerTimeoutError as e:
+            raise errors.TimeoutError(f"Request timed out: {e}") from e
+        except aiohttp.ClientError as e:
+            raise errors.ConnectionError(f"Error communicating with server: {e}") from e
+
+    async def aclose(self) -> None:
+        # Closes the connection if the body is not fully read.
+        self._response.release()
+        if self._owned_session is not None:
+            await self._owned_session.close()
+
+
+class HTTPXTransport(Transport):
+    """Transport based on httpx, which supports HTTP/2.
+
+    With HTTP/2, concurrent requests to the same endpoint are multiplexed over
+    a few connections, so many concurrent streams do not need as many
+    connections. The transport supports both synchronous and asynchronous
+    requests. The connection pool of asynchronous requests is created per
+    event loop.
+
+    httpx does not limit the total time of a request; `request_timeout`
+    applies to connecting and to each read and write instead. For synchronous
+    streams over HTTP/1.1, the idle timeout of streamed requests falls back to
+    the first-chunk timeout.
+
+    This transport requires `httpx`, and `h2` if HTTP/2 is enabled. Both can
+    be installed with `pip install httpx[http2]`.
+    """
+
+    def __init__(
+        self,
+        *,
+        http2: bool = True,
+        max_connections: Optional[int] = 100,
+        max_keepalive_connections: Optional[int] = 20,
+        keepalive_expiry: Optional[float] = 5.0,
+        proxy: Optional[str] = None,
+        verify: Union[bool, str] = True,
+    ) -> None:
+        """Initializes the transport.
+
+        Args:
+            http2: Whether to use HTTP/2 when the server supports it.
+            max_connections: Maximum number of connections.
+            max_keepalive_connections: Maximum number of idle connections.
+            keepalive_expiry: Seconds after which idle connections are closed.
+            proxy: Proxy to use.
+            verify: Whether to verify TLS certificates, or the path of a CA
+                bundle to verify them with.
+        """
+        super().__init__()
+        try:
+            import httpx  # type: ignore
+        except ImportError as e:
+            raise ImportError(
+                f"{self.__class__.__name__} requires httpx. "
+                "Please install it with `pip install httpx[http2]`."
+            ) from e
+        if http2:
+            try:
+                import h2  # type: ignore  # noqa: F401
+            except ImportError as e:
+                raise ImportError(
+                    "HTTP/2 support requires h2. Please install it with `pip install httpx[http2]`."
+                ) from e
+        self._httpx = httpx
+        self._client_kwargs: Dict[str, Any] = dict(
+            http2=http2,
+            verify=verify,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+        )
+        if proxy is not None:
+            self._client_kwargs["proxy"] = proxy
+        self._client: Any = None
+        self._aclients: MutableMapping[asyncio.AbstractEventLoop, Any] = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def send(
+        self,
+        method: str,
+        url: str,
+        *,
+        headers: Optional[HeadersType],
+        data: Optional[bytes],
+        stream: bool,
+        timeout: float,
+        stream_timeouts: Optional[StreamTimeouts] = None,
+    ) -> TransportResponse:
+        with self._lock:
+            if self._client is None:
+                self._client = self._httpx.Client(**self._client_kwargs)
+            client = self._client
+        if stream_timeouts is not None:
+            first_chunk = stream_timeouts.first_chunk
+            req_timeout = self._httpx.Timeout(
+                connect=stream_timeouts.connect, read=first_chunk, write=first_chunk, pool=first_chunk
+            )
+        else:
+            req_timeout = self._httpx.Timeout(timeout)
+        request = client.build_request(method, url, headers=headers, content=data, timeout=req_timeout)
+        with self._map_errors():
+            response = client.send(request, stream=True)
+        return _HTTPXResponse(response, self._map_errors)
+
+    async def asend(
+        self,
+        method: str,
+        url: str,
+        *,
+        headers: Optional[HeadersType],
+        data: Optional[bytes],
+        stream: bool,
+        timeout: float,
+        stream_timeouts: Optional[StreamTimeouts] = None,
+    ) -> AsyncTransportResponse:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._aclients.get(loop, None)
+            if client is None:
+                client = self._httpx.AsyncClient(**self._client_kwargs)
+                self._aclients[loop] = client
+        if stream_timeouts is not None:
+            # `EBClient` enforces the first-chunk and idle timeouts itself.
+            first_chunk = stream_timeouts.first_chunk
+            req_timeout = self._httpx.Timeout(
+                connect=stream_timeouts.connect, read=None, write=first_chunk, pool=first_chunk
+            )
+        else:
+            req_timeout = self._httpx.Timeout(timeout)
+        request = client.build_request(method, url, headers=headers, content=data, timeout=req_timeout)
+        with self._map_errors():
+            if stream_timeouts is not None:
+                response = await asyncio.wait_for(
+                    client.send(request, stream=True), stream_timeouts.first_chunk
+                )
+            else:
+                response = await client.send(request, stream=True)
+        return _AsyncHTTPXResponse(response, self._map_errors)
+
+    def close(self) -> None:
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+    async def aclose(self) -> None:
+        self.close()
+        with self._lock:
+            aclient = self._aclients.pop(asyncio.get_running_loop(), None)
+        if aclient is not None:
+            await aclient.aclose()
+
+    def _map_errors(self) -> ContextManager[None]:
+        return _map_httpx_errors(self._httpx)
+
+
+@contextlib.contextmanager
+def _map_httpx_errors(httpx: Any) -> Iterator[None]:
+    try:
+        yield
+    except (httpx.TimeoutException, asyncio.TimeoutError) as e:
+        raise errors.TimeoutError(f"Request timed out: {e}") from e
+    except httpx.HTTPError as e:
+        raise errors.ConnectionError(f"Error communicating with server: {e}") from e
+
+
+class _HTTPXResponse(TransportResponse):
+    def __init__(self, response: Any, map_errors: Callable[[], ContextManager[None]]) -> None:
+        super().__init__()
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self._response = response
+        self._map_errors = map_errors
+
+    def read(self) -> bytes:
+        with self._map_errors():
+            return self._response.read()
+
+    def iter_lines(self) -> Iterator[bytes]:
+        with self._map_errors():
+            for line in self._response.iter_lines():
+                yield line.encode("utf-8")
+
+    def set_read_timeout(self, timeout: Optional[float]) -> None:
+        # With HTTP/1.1, httpcore fixes the read timeout once the body starts
+        # to be read.
+        if self._response.http_version == "HTTP/2":
+            self._response.request.extensions["timeout"]["read"] = timeout
+
+    def close(self) -> None:
+        self._response.close()
+
+
+class _AsyncHTTPXResponse(AsyncTransportResponse):
+    def __init__(self, response: Any, map_errors: Callable[[], ContextManager[None]]) -> None:
+        super().__init__()
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self._response = response
+        self._map_errors = map_errors
+
+    async def read(self) -> bytes:
+        with self._map_errors():
+            return await self._response.aread()
+
+    async def iter_lines(self) -> AsyncIterator[bytes]:
+        with self._map_errors():
+            async for line in self._response.aiter_lines():
+                yield line.encode("utf-8")
+
+    async def aclose(self) -> None:
+        await self._response.aclose()
@@ -14,8 +14,9 @@
 
 from __future__ import annotations
 
+import json
 from dataclasses import dataclass
-from typing import Any, AsyncIterator, Dict, Iterator, Optional, TypeVar
+from typing import Any, AsyncIterator, Dict, Iterator, Mapping, Optional, TypeVar
 
 from typing_extensions import TypeAlias
 
@@ -25,6 +26,7 @@ __all__ = [
     "ConfigDictType",
     "HeadersType",
     "ParamsType",
+    "PreEncodedParams",
     "Request",
     "RequestWithStream",
     "ResponseT",
@@ -35,6 +37,46 @@ ConfigDictType: TypeAlias = Dict[str, Optional[Any]]
 HeadersType: TypeAlias = Dict[str, str]
 ParamsType: TypeAlias = Dict[str, Any]
 
+
+class PreEncodedParams(Dict[str, Any]):
+    """Request parameters with a pre-encoded static part.
+
+    The static parameters are serialized once, at construction time. When the
+    parameters are encoded as JSON, only the other parameters are serialized,
+    and the results are spliced together. A static parameter that is replaced
+    later (compared by identity) is serialized as usual. A static value that is
+    modified in place is not detected, so the values must not be modified
+    after construction.
+    """
+
+    def __init__(
+        self, static_params: Mapping[str, Any], encoded_static_params: Optional[bytes] = None
+    ) -> None:
+        super().__init__(static_params)
+        self._static_params = dict(static_params)
+        if encoded_static_params is None:
+            encoded_static_params = self.encode_static_params(static_params)
+        self._encoded_static_params = encoded_static_params
+
+    @staticmethod
+    def encode_static_params(static_params: Mapping[str, Any]) -> bytes:
+        # The result is the body of a JSON object, without braces.
+        return json.dumps(dict(static_params)).encode()[1:-1]
+
+    def to_json_bytes(self) -> bytes:
+        """Encodes the parameters as JSON, equivalent to `json.dumps`."""
+        static_params = self._static_params
+        if any(key not in self or self[key] is not val for key, val in static_params.items()):
+            return json.dumps(self).encode()
+        dynamic_params = {k: v for k, v in self.items() if k not in static_params}
+        if len(dynamic_params) == 0:
+            return b"{" + self._encoded_static_params + b"}"
+        encoded_dynamic_params = json.dumps(dynamic_params).encode()
+        if len(static_params) == 0:
+            return encoded_dynamic_params
+        return b"{" + self._encoded_static_params + b", " + encoded_dynamic_params[1:]
+
+
 ResponseT = TypeVar("ResponseT", EBResponse, Iterator[EBResponse], AsyncIterator[EBResponse])
 
 
@@ -45,6 +87,8 @@ class Request(object):
     params: ParamsType
     headers: HeadersType
     timeout: Optional[float] = None
+    # Name of the model, used to meter the usage.
+    model: Optional[str] = None
 
 
 @dataclass
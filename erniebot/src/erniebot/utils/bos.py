@@ -12,9 +12,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import Optional
+import asyncio
+import concurrent.futures
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, Final, List, Optional
 
-__all__ = ["upload_file_to_bos"]
+import tenacity
+
+from . import logging
+
+__all__ = ["upload_file_to_bos", "aupload_file_to_bos"]
+
+DEFAULT_PART_SIZE: Final[int] = 16 * 1024 * 1024
+MIN_PART_SIZE: Final[int] = 5 * 1024 * 1024
+MAX_NUM_PARTS: Final[int] = 10000
+
+ProgressCallback = Callable[[int, int], None]
 
 
 def upload_file_to_bos(
@@ -25,7 +40,111 @@ def upload_file_to_bos(
     bos_bucket: str = "ernie-bot-sdk",
     access_key_id: Optional[str] = None,
     secret_access_key: Optional[str] = None,
+    *,
+    part_size: int = DEFAULT_PART_SIZE,
+    max_workers: int = 4,
+    max_retries_per_part: int = 3,
+    progress_callback: Optional[ProgressCallback] = None,
+    checkpoint_file: Optional[str] = None,
 ) -> str:
+    """Uploads a local file to BOS.
+
+    The file is never loaded into memory as a whole. Files larger than
+    `part_size` are uploaded in parts concurrently using multipart upload.
+
+    Args:
+        origin_file: Path of the local file.
+        upload_file_name: Name of the uploaded object.
+        category_dir: Directory of the uploaded object in the bucket.
+        bos_host: BOS endpoint.
+        bos_bucket: Name of the bucket.
+        access_key_id: Access key ID.
+        secret_access_key: Secret access key.
+        part_size: Size of each part in bytes. It is increased automatically if
+            the file would otherwise be split into too many parts.
+        max_workers: Maximum number of parts uploaded concurrently.
+        max_retries_per_part: Maximum number of retries for each part.
+        progress_callback: Function called with the number of uploaded bytes
+            and the total number of bytes whenever a part is done.
+        checkpoint_file: Path of a file that records the upload progress. If
+            given, an interrupted upload can be resumed by calling this
+            function again with the same arguments. The file is removed once
+            the upload is complete.
+
+    Returns:
+        URL of the uploaded object.
+    """
+    bos_client = _create_bos_client(bos_host, access_key_id, secret_access_key)
+    key = f"{category_dir}/{upload_file_name}"
+    total_size = os.path.getsize(origin_file)
+    if total_size <= part_size:
+        bos_client.put_object_from_file(bos_bucket, key, origin_file)
+        if progress_callback is not None:
+            progress_callback(total_size, total_size)
+    else:
+        uploader = _MultipartUploader(
+            bos_client,
+            bos_bucket,
+            key,
+            origin_file,
+            total_size,
+            part_size=part_size,
+            max_retries_per_part=max_retries_per_part,
+            progress_callback=progress_callback,
+            checkpoint_file=checkpoint_file,
+        )
+        uploader.upload(max_workers)
+    url = f"https://bj.bcebos.com/{bos_bucket}/{key}"
+    return url
+
+
+async def aupload_file_to_bos(
+    origin_file: str,
+    upload_file_name: str,
+    category_dir: str = "erniebot",
+    bos_host: str = "bj.bcebos.com",
+    bos_bucket: str = "ernie-bot-sdk",
+    access_key_id: Optional[str] = None,
+    secret_access_key: Optional[str] = None,
+    *,
+    part_size: int = DEFAULT_PART_SIZE,
+    max_workers: int = 4,
+    max_retries_per_part: int = 3,
+    progress_callback: Optional[ProgressCallback] = None,
+    checkpoint_file: Optional[str] = None,
+) -> str:
+    """Asynchronous version of `upload_file_to_bos`.
+
+    The BOS client is blocking, so the requests are made in worker threads,
+    and the event loop is not blocked. Note that `progress_callback` is called
+    from the worker threads.
+    """
+    loop = asyncio.get_running_loop()
+    bos_client = _create_bos_client(bos_host, access_key_id, secret_access_key)
+    key = f"{category_dir}/{upload_file_name}"
+    total_size = os.path.getsize(origin_file)
+    if total_size <= part_size:
+        await loop.run_in_executor(None, bos_client.put_object_from_file, bos_bucket, key, origin_file)
+        if progress_callback is not None:
+            progress_callback(total_size, total_size)
+    else:
+        uploader = _MultipartUploader(
+            bos_client,
+            bos_bucket,
+            key,
+            origin_file,
+            total_size,
+            part_size=part_size,
+            max_retries_per_part=max_retries_per_part,
+            progress_callback=progress_callback,
+            checkpoint_file=checkpoint_file,
+        )
+        await uploader.aupload(max_workers)
+    url = f"https://bj.bcebos.com/{bos_bucket}/{key}"
+    return url
+
+
+def _create_bos_client(bos_host: str, access_key_id: Optional[str], secret_access_key: Optional[str]) -> Any:
     from baidubce.auth.bce_credentials import BceCredentials  # type: ignore
     from baidubce.bce_client_configuration import BceClientConfiguration  # type: ignore
     from baidubce.services.bos.bos_client import BosClient  # type: ignore
@@ -33,8 +152,188 @@ def upload_file_to_bos(
     b_config = BceClientConfiguration(
         credentials=BceCredentials(access_key_id, secret_access_key), endpoint=bos_host
     )
-    bos_client = BosClient(b_config)
-    with open(origin_file, "rb") as f:
-        bos_client.put_object_from_string(bos_bucket, f"{category_dir}/{upload_file_name}", f.read())
-    url = f"https://bj.bcebos.com/{bos_bucket}/{category_dir}/{upload_file_name}"
-    return url
+    return BosClient(b_config)
+
+
+class _MultipartUploader(object):
+    def __init__(
+        self,
+        bos_client: Any,
+        bucket: str,
+        key: str,
+        file_path: str,
+        total_size: int,
+        *,
+        part_size: int,
+        max_retries_per_part: int,
+        progress_callback: Optional[ProgressCallback],
+        checkpoint_file: Optional[str],
+    ) -> None:
+        super().__init__()
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"`part_size` must be at least {MIN_PART_SIZE} bytes.")
+        # Round up so that the number of parts does not exceed the limit.
+        min_part_size = -(-total_size // MAX_NUM_PARTS)
+        self.part_size = max(part_size, min_part_size)
+        self.num_parts = -(-total_size // self.part_size)
+        self.bos_client = bos_client
+        self.bucket = bucket
+        self.key = key
+        self.file_path = file_path
+        self.total_size = total_size
+        self.max_retries_per_part = max_retries_per_part
+        self.progress_callback = progress_callback
+        self.checkpoint_file = checkpoint_file
+        self.upload_id: Optional[str] = None
+        self.etags: Dict[int, str] = {}
+        self._num_uploaded_bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending_parts(self) -> List[int]:
+        return [n for n in range(1, self.num_parts + 1) if n not in self.etags]
+
+    def upload(self, max_workers: int) -> None:
+        self.start()
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [
+                    executor.submit(self.upload_part, part_number) for part_number in self.pending_parts
+                ]
+                try:
+                    for future in concurrent.futures.as_completed(futures):
+                        future.result()
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+            self.complete()
+        except BaseException:
+            self.abort_unless_resumable()
+            raise
+
+    async def aupload(self, max_workers: int) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.start)
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            tasks = [
+                loop.run_in_executor(executor, self.upload_part, part_number)
+                for part_number in self.pending_parts
+            ]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                raise
+            await loop.run_in_executor(None, self.complete)
+        except BaseException:
+            # Wait for the parts in flight, so that the checkpoint is final,
+            # before aborting. The cleanup is shielded so that it is not
+            # interrupted if the upload was cancelled.
+            await asyncio.shield(loop.run_in_executor(None, self._clean_up_failed_upload, executor))
+            raise
+        finally:
+            # Do not block the event loop on parts that are still being uploaded.
+            executor.shutdown(wait=False)
+
+    def start(self) -> None:
+        if not self._load_checkpoint():
+            resp = self.bos_client.initiate_multipart_upload(self.bucket, self.key)
+            self.upload_id = resp.upload_id
+            self._save_checkpoint()
+        else:
+            logging.info("Resuming upload %s with %d parts done.", self.upload_id, len(self.etags))
+        self._num_uploaded_bytes = sum(self._get_part_size(n) for n in self.etags)
+        self._report_progress()
+
+    def upload_part(self, part_number: int) -> None:
+        size = self._get_part_size(part_number)
+        retrying = tenacity.Retrying(
+            stop=tenacity.stop_after_attempt(self.max_retries_per_part + 1),
+            wait=tenacity.wait_exponential(multiplier=1, max=10),
+            before_sleep=lambda state: logging.warning(
+                "Failed to upload part %d (attempt %d). Retrying.", part_number, state.attempt_number
+            ),
+            reraise=True,
+        )
+        resp = retrying(
+            self.bos_client.upload_part_from_file,
+            self.bucket,
+            self.key,
+            self.upload_id,
+            part_number,
+            size,
+            self.file_path,
+            (part_number - 1) * self.part_size,
+        )
+        with self._lock:
+            self.etags[part_number] = resp.metadata.etag
+            self._num_uploaded_bytes += size
+            self._save_checkpoint()
+        self._report_progress()
+
+    def complete(self) -> None:
+        part_list = [{"partNumber": n, "eTag": self.etags[n]} for n in range(1, self.num_parts + 1)]
+        self.bos_client.complete_multipart_upload(self.bucket, self.key, self.upload_id, part_list)
+        if self.checkpoint_file is not None and os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+
+    def abort_unless_resumable(self) -> None:
+        """Aborts a failed upload, so that the uploaded parts do not pile up in
+        the bucket. Uploads with a checkpoint file are kept for resuming."""
+        if self.checkpoint_file is not None or self.upload_id is None:
+            return
+        try:
+            self.bos_client.abort_multipart_upload(self.bucket, self.key, self.upload_id)
+        except Exception as e:
+            logging.warning("Failed to abort upload %s: %s", self.upload_id, e)
+
+    def _clean_up_failed_upload(self, executor: concurrent.futures.ThreadPoolExecutor) -> None:
+        executor.shutdown(wait=True)
+        self.abort_unless_resumable()
+
+    def _get_part_size(self, part_number: int) -> int:
+        return min(self.part_size, self.total_size - (part_number - 1) * self.part_size)
+
+    def _report_progress(self) -> None:
+        if self.progress_callback is not None:
+            self.progress_callback(self._num_uploaded_bytes, self.total_size)
+
+    def _get_checkpoint_meta(self) -> Dict[str, Any]:
+        return {
+            "bucket": self.bucket,
+            "key": self.key,
+            "file_path": os.path.abspath(self.file_path),
+            "file_size": self.total_size,
+            "file_mtime": os.path.getmtime(self.file_path),
+            "part_size": self.part_size,
+        }
+
+    def _load_checkpoint(self) -> bool:
+        if self.checkpoint_file is None or not os.path.exists(self.checkpoint_file):
+            return False
+        try:
+            with open(self.checkpoint_file, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            logging.warning("Failed to read the checkpoint file. Starting a new upload.")
+            return False
+        if checkpoint.get("meta", None) != self._get_checkpoint_meta():
+            logging.warning("The checkpoint file does not match the upload. Starting a new upload.")
+            return False
+        self.upload_id = checkpoint["upload_id"]
+        self.etags = {int(n): etag for n, etag in checkpoint["etags"].items()}
+        return True
+
+    def _save_checkpoint(self) -> None:
+        if self.checkpoint_file is None:
+            return
+        checkpoint = {"meta": self._get_checkpoint_meta(), "upload_id": self.upload_id, "etags": self.etags}
+        # Write to a temporary file first so that the checkpoint is never left
+        # half-written.
+        temp_file = self.checkpoint_file + ".tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+        os.replace(temp_file, self.checkpoint_file)
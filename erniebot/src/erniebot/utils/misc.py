@@ -16,6 +16,13 @@ import threading
 from collections.abc import AsyncIterator, Iterator
 from typing import ClassVar
 
+from ..streaming import (
+    AsyncResponseStream,
+    ClosingAsyncIterator,
+    ClosingIterator,
+    ResponseStream,
+)
+
 __all__ = ["Constant", "SingletonMeta", "NOT_GIVEN", "NotGiven", "filter_args", "transform"]
 
 
@@ -61,8 +68,8 @@ def filter_args(**kwargs):
 
 def transform(func, data):
     if isinstance(data, Iterator):
-        return (func(d) for d in data)
+        return ResponseStream(ClosingIterator(data, func=func))
     elif isinstance(data, AsyncIterator):
-        return (func(d) async for d in data)
+        return AsyncResponseStream(ClosingAsyncIterator(data, func=func))
     else:
         return func(data)
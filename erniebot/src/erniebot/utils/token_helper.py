@@ -17,23 +17,13 @@ import re
 
 __all__ = ["approx_num_tokens"]
 
+_HAN_PATTERN = re.compile(r"[\u4e00-\u9fff]")
+# Chinese characters and punctuation marks separate words.
+_SEPARATOR_PATTERN = re.compile(r"[\u4e00-\u9fff]|[^\w\s]")
+
 
 def approx_num_tokens(text: str) -> int:
     """Estimates the number of tokens for a text."""
-    cnt_han = 0
-    cnt_word = 0
-
-    res = []
-    for char in text:
-        if re.match(r"[\u4e00-\u9fff]", char):
-            cnt_han += 1
-            res.append(" ")
-        elif re.match(r"[^\w\s]", char):
-            res.append(" ")
-        else:
-            res.append(char)
-
-    res_text = "".join(res)
-    cnt_word = len(res_text.split())
-
+    cnt_han = len(_HAN_PATTERN.findall(text))
+    cnt_word = len(_SEPARATOR_PATTERN.sub(" ", text).split())
     return cnt_han + int(math.floor(cnt_word * 1.3))
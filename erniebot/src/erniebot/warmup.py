@@ -0,0 +1,252 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import concurrent.futures
+import importlib
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Literal, Optional, Sequence, Tuple, Union, overload
+
+from .api_types import APIType, convert_str_to_api_type
+from .backends import build_backend
+from .backends.base import EBBackend
+from .config import GlobalConfig
+from .types import ConfigDictType
+from .utils import logging
+
+__all__ = ["WarmupReport", "warmup", "awarmup"]
+
+# Modules that are imported lazily on the request path.
+_DEFAULT_MODULES: Tuple[str, ...] = ("encodings.idna", "baidubce.services.bos.bos_client")
+
+
+@dataclass
+class WarmupReport(object):
+    """Outcome of a warm-up.
+
+    Attributes:
+        durations: Seconds spent in each phase, keyed by `"imports"`,
+            `"auth"`, and `"connections"`.
+        num_modules: Number of modules imported.
+        num_tokens: Number of auth tokens fetched.
+        num_connections: Number of connections opened.
+        errors: Messages of the errors that occurred. A failing step does not
+            abort the warm-up.
+    """
+
+    durations: Dict[str, float] = field(default_factory=dict)
+    num_modules: int = 0
+    num_tokens: int = 0
+    num_connections: int = 0
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return len(self.errors) == 0
+
+    @property
+    def total_duration(self) -> float:
+        return sum(self.durations.values())
+
+
+@overload
+def warmup(
+    api_types: Optional[Sequence[Union[str, APIType]]] = ...,
+    *,
+    num_connections: int = ...,
+    modules: Sequence[str] = ...,
+    timeout: Optional[float] = ...,
+    background: Literal[False] = ...,
+    _config_: Optional[ConfigDictType] = ...,
+) -> WarmupReport:
+    ...
+
+
+@overload
+def warmup(
+    api_types: Optional[Sequence[Union[str, APIType]]] = ...,
+    *,
+    num_connections: int = ...,
+    modules: Sequence[str] = ...,
+    timeout: Optional[float] = ...,
+    background: Literal[True],
+    _config_: Optional[ConfigDictType] = ...,
+) -> "concurrent.futures.Future[WarmupReport]":
+    ...
+
+
+def warmup(
+    api_types: Optional[Sequence[Union[str, APIType]]] = None,
+    *,
+    num_connections: int = 1,
+    modules: Sequence[str] = _DEFAULT_MODULES,
+    timeout: Optional[float] = None,
+    background: bool = False,
+    _config_: Optional[ConfigDictType] = None,
+) -> Union[WarmupReport, "concurrent.futures.Future[WarmupReport]"]:
+    """Prepares for the first requests.
+
+    The warm-up runs in three phases: importing `modules`, fetching the auth
+    tokens of the configured credentials (including those in the credential
+    pool), and opening `num_connections` connections to the base URL of each
+    backend. Connections can only be kept for later requests if they are
+    pooled, i.e., if `requests_session` or `transport` is configured.
+
+    Args:
+        api_types: Backends to warm up. Defaults to the configured
+            `api_type`.
+        num_connections: Number of connections to open for each backend.
+        modules: Modules to import. Modules that are not installed are
+            skipped.
+        timeout: Timeout of each request made to open a connection.
+        background: Whether to run the warm-up in a daemon thread. If true, a
+            future that can be waited on, e.g. by a readiness probe, is
+            returned.
+        _config_: Overrides the global settings.
+
+    Returns:
+        A report with the time each phase took, or a future of it.
+    """
+    if not background:
+        return _warmup(api_types, num_connections, modules, timeout, _config_)
+
+    future: "concurrent.futures.Future[WarmupReport]" = concurrent.futures.Future()
+
+    def _run() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(_warmup(api_types, num_connections, modules, timeout, _config_))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=_run, name="erniebot-warmup", daemon=True).start()
+    return future
+
+
+async def awarmup(
+    api_types: Optional[Sequence[Union[str, APIType]]] = None,
+    *,
+    num_connections: int = 1,
+    modules: Sequence[str] = _DEFAULT_MODULES,
+    timeout: Optional[float] = None,
+    _config_: Optional[ConfigDictType] = None,
+) -> WarmupReport:
+    """Asynchronous version of `warmup`.
+
+    The connections are opened for asynchronous requests made on the running
+    event loop. They are kept only if `aiohttp_session` or `transport` is
+    configured. To run the warm-up in the background, wrap the coroutine in a
+    task.
+    """
+    loop = asyncio.get_running_loop()
+    report = WarmupReport()
+    # XXX: The default executor is used.
+    await loop.run_in_executor(None, _import_modules, modules, report)
+    backends = _build_backends(api_types, _config_, report)
+    await loop.run_in_executor(None, _prefetch_auth_tokens, backends, report)
+    start = time.monotonic()
+    results = await asyncio.gather(
+        *(backend.apreconnect(num_connections, timeout) for backend in backends), return_exceptions=True
+    )
+    for backend, result in zip(backends, results):
+        if isinstance(result, BaseException):
+            _record_error(report, "connections", backend, result)
+        else:
+            report.num_connections += result
+    report.durations["connections"] = time.monotonic() - start
+    _log_report(report)
+    return report
+
+
+def _warmup(
+    api_types: Optional[Sequence[Union[str, APIType]]],
+    num_connections: int,
+    modules: Sequence[str],
+    timeout: Optional[float],
+    config: Optional[ConfigDictType],
+) -> WarmupReport:
+    report = WarmupReport()
+    _import_modules(modules, report)
+    backends = _build_backends(api_types, config, report)
+    _prefetch_auth_tokens(backends, report)
+    start = time.monotonic()
+    for backend in backends:
+        try:
+            report.num_connections += backend.preconnect(num_connections, timeout)
+        except Exception as e:
+            _record_error(report, "connections", backend, e)
+    report.durations["connections"] = time.monotonic() - start
+    _log_report(report)
+    return report
+
+
+def _import_modules(modules: Sequence[str], report: WarmupReport) -> None:
+    start = time.monotonic()
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            logging.debug("Module %s is not available and will not be imported.", name)
+        else:
+            report.num_modules += 1
+    report.durations["imports"] = time.monotonic() - start
+
+
+def _build_backends(
+    api_types: Optional[Sequence[Union[str, APIType]]],
+    config: Optional[ConfigDictType],
+    report: WarmupReport,
+) -> List[EBBackend]:
+    cfg = GlobalConfig().create_dict(**(config or {}))
+    if api_types is None:
+        if cfg["api_type"] is None:
+            raise RuntimeError("API type is not configured.")
+        api_types = [cfg["api_type"]]
+    backends = []
+    for api_type in api_types:
+        if isinstance(api_type, str):
+            api_type = convert_str_to_api_type(api_type)
+        try:
+            backends.append(build_backend(api_type, {**cfg, "api_type": api_type}))
+        except Exception as e:
+            report.errors.append(f"Failed to set up {api_type.name}: {e}")
+    return backends
+
+
+def _prefetch_auth_tokens(backends: Sequence[EBBackend], report: WarmupReport) -> None:
+    start = time.monotonic()
+    for backend in backends:
+        try:
+            report.num_tokens += backend.prefetch_auth_tokens()
+        except Exception as e:
+            _record_error(report, "auth", backend, e)
+    report.durations["auth"] = time.monotonic() - start
+
+
+def _record_error(report: WarmupReport, phase: str, backend: EBBackend, error: BaseException) -> None:
+    cause: Any = error.__cause__ if error.__cause__ is not None else error
+    report.errors.append(f"Phase {repr(phase)} failed for {backend.api_type.name}: {cause}")
+
+
+def _log_report(report: WarmupReport) -> None:
+    for message in report.errors:
+        logging.warning("Warm-up: %s", message)
+    logging.info(
+        "Warm-up finished in %.3f seconds (%s).",
+        report.total_duration,
+        ", ".join(f"{phase}: {secs:.3f}s" for phase, secs in report.durations.items()),
+    )
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import itertools
+
+import erniebot.errors as errors
+from erniebot.bench import run_benchmark
+
+# Offline test of `run_benchmark` with a fake request function.
+
+
+class FakeChunk(object):
+    def __init__(self, text):
+        self.text = text
+        self.usage = {"completion_tokens": 2}
+
+    def get_result(self):
+        return self.text
+
+
+def test_errors_are_counted_by_type():
+    counter = itertools.count()
+
+    async def _request(config):
+        await asyncio.sleep(0.001)
+        idx = next(counter) % 4
+        if idx == 1:
+            raise errors.RateLimitError("Too many requests.")
+        if idx == 2:
+            raise KeyError("result")
+
+        async def _stream():
+            yield FakeChunk("a")
+            if idx == 3:
+                raise ValueError("Malformed chunk.")
+            yield FakeChunk("b")
+
+        return _stream()
+
+    result = asyncio.run(run_benchmark(_request, duration=0.1, concurrency=2, stream=True))
+    assert result.num_succeeded > 0
+    assert set(result.errors) == {"RateLimitError", "KeyError", "ValueError"}
+    assert result.num_succeeded + result.num_failed == next(counter)
+    assert all(sample.num_output_tokens == 2 and sample.ttft is not None for sample in result.samples)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import os
+import threading
+import types
+from unittest import mock
+
+import pytest
+
+from erniebot.utils import bos
+
+# Offline tests of the multipart upload to BOS. The BOS client is faked, and
+# the parts it receives are checked against the local file.
+
+PART_SIZE = bos.MIN_PART_SIZE
+FILE_SIZE = 3 * PART_SIZE + 123
+
+
+class FakeBosClient(object):
+    def __init__(self, failing_parts=()):
+        self.failing_parts = set(failing_parts)
+        self.uploads = {}
+        self.uploaded_parts = []
+        self.completed = []
+        self.aborted = []
+        self._next_upload_id = 0
+        self._lock = threading.Lock()
+
+    def put_object_from_file(self, bucket, key, file_path):
+        self.completed.append((bucket, key, None))
+
+    def initiate_multipart_upload(self, bucket, key):
+        with self._lock:
+            upload_id = f"upload-{self._next_upload_id}"
+            self._next_upload_id += 1
+            self.uploads[upload_id] = {}
+        return types.SimpleNamespace(upload_id=upload_id)
+
+    def upload_part_from_file(self, bucket, key, upload_id, part_number, size, file_path, offset):
+        if part_number in self.failing_parts:
+            raise OSError(f"Failed to upload part {part_number}.")
+        with open(file_path, "rb") as f:
+            f.seek(offset)
+            data = f.read(size)
+        assert len(data) == size
+        with self._lock:
+            self.uploads[upload_id][part_number] = data
+            self.uploaded_parts.append(part_number)
+        return types.SimpleNamespace(metadata=types.SimpleNamespace(etag=f"etag-{part_number}"))
+
+    def complete_multipart_upload(self, bucket, key, upload_id, part_list):
+        parts = self.uploads.pop(upload_id)
+        assert [p["partNumber"] for p in part_list] == sorted(parts)
+        assert all(p["eTag"] == f"etag-{p['partNumber']}" for p in part_list)
+        self.completed.append((bucket, key, b"".join(parts[n] for n in sorted(parts))))
+
+    def abort_multipart_upload(self, bucket, key, upload_id):
+        del self.uploads[upload_id]
+        self.aborted.append(upload_id)
+
+
+@pytest.fixture
+def file_path(tmp_path):
+    path = tmp_path / "data.bin"
+    with open(path, "wb") as f:
+        for i in range(FILE_SIZE // 4096 + 1):
+            f.write(bytes([i % 256]) * 4096)
+        f.truncate(FILE_SIZE)
+    return str(path)
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _upload(bos_client, file_path, use_async, **kwargs):
+    kwargs.setdefault("part_size", PART_SIZE)
+    kwargs.setdefault("max_retries_per_part", 0)
+    with mock.patch.object(bos, "_create_bos_client", return_value=bos_client):
+        if use_async:
+            return asyncio.run(bos.aupload_file_to_bos(file_path, "data.bin", **kwargs))
+        else:
+            return bos.upload_file_to_bos(file_path, "data.bin", **kwargs)
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_multipart_upload(file_path, use_async):
+    bos_client = FakeBosClient()
+    progress = []
+    url = _upload(bos_client, file_path, use_async, progress_callback=lambda n, total: progress.append(n))
+    assert url == "https://bj.bcebos.com/ernie-bot-sdk/erniebot/data.bin"
+    assert sorted(bos_client.uploaded_parts) == [1, 2, 3, 4]
+    assert bos_client.completed == [("ernie-bot-sdk", "erniebot/data.bin", _read(file_path))]
+    assert progress[0] == 0 and progress[-1] == FILE_SIZE
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_failed_part_aborts_upload(file_path, use_async):
+    bos_client = FakeBosClient(failing_parts=[2])
+    with pytest.raises(OSError):
+        _upload(bos_client, file_path, use_async)
+    assert bos_client.aborted == ["upload-0"]
+    assert bos_client.uploads == {}
+    assert bos_client.completed == []
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_resume_from_checkpoint(file_path, tmp_path, use_async):
+    checkpoint_file = str(tmp_path / "upload.ckpt")
+    bos_client = FakeBosClient(failing_parts=[2])
+    with pytest.raises(OSError):
+        _upload(bos_client, file_path, use_async, checkpoint_file=checkpoint_file, max_workers=1)
+    # The upload is kept for resuming.
+    assert bos_client.aborted == []
+    assert os.path.exists(checkpoint_file)
+    first_parts = list(bos_client.uploaded_parts)
+    assert 1 in first_parts and 2 not in first_parts
+
+    bos_client.failing_parts.clear()
+    bos_client.uploaded_parts.clear()
+    _upload(bos_client, file_path, use_async, checkpoint_file=checkpoint_file)
+    # Only the missing parts are uploaded, to the same upload.
+    assert sorted(bos_client.uploaded_parts + first_parts) == [1, 2, 3, 4]
+    assert bos_client.completed == [("ernie-bot-sdk", "erniebot/data.bin", _read(file_path))]
+    assert bos_client.uploads == {}
+    assert not os.path.exists(checkpoint_file)
+
+
+def test_checkpoint_of_modified_file_is_ignored(file_path, tmp_path):
+    checkpoint_file = str(tmp_path / "upload.ckpt")
+    bos_client = FakeBosClient(failing_parts=[2])
+    with pytest.raises(OSError):
+        _upload(bos_client, file_path, False, checkpoint_file=checkpoint_file, max_workers=1)
+
+    with open(file_path, "ab") as f:
+        f.write(b"more")
+    bos_client.failing_parts.clear()
+    _upload(bos_client, file_path, False, checkpoint_file=checkpoint_file)
+    assert bos_client.completed == [("ernie-bot-sdk", "erniebot/data.bin", _read(file_path))]
+    assert "upload-0" in bos_client.uploads
+
+
+def test_small_file_is_uploaded_in_one_request(file_path):
+    bos_client = FakeBosClient()
+    _upload(bos_client, file_path, False, part_size=FILE_SIZE)
+    assert bos_client.completed == [("ernie-bot-sdk", "erniebot/data.bin", None)]
+    assert bos_client.uploaded_parts == []
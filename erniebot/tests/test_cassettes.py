@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import time
+
+import pytest
+
+import erniebot
+import erniebot.errors as errors
+from erniebot.cassettes import CassetteTransport
+from erniebot.transports import AsyncTransportResponse, Transport, TransportResponse
+
+# Offline tests of recording and replaying cassettes. The stub transport
+# streams chunks at a fixed interval.
+
+CHUNKS = [
+    b'data: {"errorCode": 0, "errorMsg": "", "result": {"result": "%d", "is_end": false}}' % i
+    for i in range(3)
+]
+CHUNK_INTERVAL = 0.05
+URL = "https://aistudio.baidu.com/llm/lmapi/v1/chat/completions"
+
+
+class StubResponse(TransportResponse):
+    status_code = 200
+    headers = {"Content-Type": "text/event-stream"}
+
+    def iter_lines(self):
+        for chunk in CHUNKS:
+            time.sleep(CHUNK_INTERVAL)
+            yield chunk
+
+    def close(self):
+        pass
+
+
+class AsyncStubResponse(AsyncTransportResponse):
+    status_code = 200
+    headers = {"Content-Type": "text/event-stream"}
+
+    async def iter_lines(self):
+        for chunk in CHUNKS:
+            await asyncio.sleep(CHUNK_INTERVAL)
+            yield chunk
+
+    async def aclose(self):
+        pass
+
+
+class StubTransport(Transport):
+    def __init__(self):
+        self.num_requests = 0
+
+    def send(self, method, url, *, headers, data, stream, timeout, stream_timeouts=None):
+        self.num_requests += 1
+        return StubResponse()
+
+    async def asend(self, method, url, *, headers, data, stream, timeout, stream_timeouts=None):
+        self.num_requests += 1
+        return AsyncStubResponse()
+
+
+def _send(transport, data=b'{"a": 1}', url=URL):
+    start = time.monotonic()
+    response = transport.send("POST", url, headers=None, data=data, stream=True, timeout=5)
+    chunks = list(response.iter_lines())
+    response.close()
+    return chunks, time.monotonic() - start
+
+
+async def _asend(transport, data=b'{"a": 1}', url=URL):
+    start = time.monotonic()
+    response = await transport.asend("POST", url, headers=None, data=data, stream=True, timeout=5)
+    chunks = [chunk async for chunk in response.iter_lines()]
+    await response.aclose()
+    return chunks, time.monotonic() - start
+
+
+def test_replayed_stream_matches_recording(tmp_path):
+    path = str(tmp_path / "cassette.jsonl")
+    stub = StubTransport()
+    recorded, recording_time = _send(CassetteTransport(path, mode="record", transport=stub))
+    assert recorded == CHUNKS
+
+    # Credentials in the URL and the order of keys in the body do not matter.
+    replayed, replay_time = _send(
+        CassetteTransport(path, mode="replay", time_scale=1), url=URL + "?access_token=other"
+    )
+    assert replayed == CHUNKS
+    assert stub.num_requests == 1
+    assert replay_time >= 0.8 * len(CHUNKS) * CHUNK_INTERVAL
+
+    replayed, fast_replay_time = _send(CassetteTransport(path, mode="replay", time_scale=0.1))
+    assert replayed == CHUNKS
+    assert fast_replay_time < 0.5 * replay_time
+
+
+def test_async_replayed_stream_matches_recording(tmp_path):
+    path = str(tmp_path / "cassette.jsonl")
+
+    async def _run():
+        recorded, _ = await _asend(CassetteTransport(path, mode="record", transport=StubTransport()))
+        replayed, replay_time = await _asend(CassetteTransport(path, mode="replay", time_scale=1))
+        _, fast_replay_time = await _asend(CassetteTransport(path, mode="replay", time_scale=0))
+        return recorded, replayed, replay_time, fast_replay_time
+
+    recorded, replayed, replay_time, fast_replay_time = asyncio.run(_run())
+    assert recorded == replayed == CHUNKS
+    assert replay_time >= 0.8 * len(CHUNKS) * CHUNK_INTERVAL
+    assert fast_replay_time < 0.5 * replay_time
+
+
+def test_chat_stream_is_replayed(tmp_path):
+    path = str(tmp_path / "cassette.jsonl")
+    messages = [{"role": "user", "content": "Hi"}]
+
+    def _create_chat_stream(**config):
+        stream = erniebot.ChatCompletion.create(
+            model="ernie-3.5",
+            messages=messages,
+            stream=True,
+            _config_=dict(api_type="aistudio", access_token="token", **config),
+        )
+        return [resp.get_result() for resp in stream]
+
+    recorded = _create_chat_stream(
+        transport=CassetteTransport(path, mode="record", transport=StubTransport())
+    )
+    replayed = _create_chat_stream(cassette_path=path, cassette_mode="replay")
+    assert recorded == replayed == ["0", "1", "2"]
+
+
+def test_unrecorded_request_raises(tmp_path):
+    path = str(tmp_path / "cassette.jsonl")
+    _send(CassetteTransport(path, mode="record", transport=StubTransport()))
+
+    transport = CassetteTransport(path, mode="replay")
+    with pytest.raises(errors.UnrecordedRequestError, match="No exchange for POST .* is recorded in"):
+        _send(transport, data=b'{"a": 2}')
+    with pytest.raises(errors.UnrecordedRequestError):
+        asyncio.run(_asend(transport, data=b'{"a": 2}'))
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import json
+
+import erniebot.errors as errors
+from erniebot.cli import _BatchRunner
+
+# Offline tests of the batch mode of the CLI. The resource is faked, and fails
+# for the prompts listed in `failing_prompts`.
+
+
+class FakeResponse(object):
+    def __init__(self, result):
+        self.result = result
+
+    def to_dict(self):
+        return {"result": self.result}
+
+
+class FakeChatCompletion(object):
+    failing_prompts = set()
+    prompts = []
+
+    @classmethod
+    async def acreate(cls, messages, _config_, **kwargs):
+        prompt = messages[-1]["content"]
+        cls.prompts.append(prompt)
+        if prompt in cls.failing_prompts:
+            raise errors.APIError("Service unavailable.")
+        return FakeResponse(prompt.upper())
+
+
+def write_input(path, prompts):
+    with open(path, "w", encoding="utf-8") as f:
+        for i, prompt in enumerate(prompts):
+            f.write(json.dumps({"custom_id": f"req-{i}", "messages": [{"role": "user", "content": prompt}]}))
+            f.write("\n")
+
+
+def read_output(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def run_batch(input_path, output_path, retry_failed=False):
+    FakeChatCompletion.prompts = []
+    runner = _BatchRunner(FakeChatCompletion, concurrency=2)
+    return asyncio.run(runner.run(input_path, output_path, retry_failed=retry_failed))
+
+
+def test_resume_and_retry(tmp_path):
+    input_path = str(tmp_path / "input.jsonl")
+    output_path = str(tmp_path / "output.jsonl")
+    write_input(input_path, ["a", "b", "c", "d"])
+
+    FakeChatCompletion.failing_prompts = {"b", "d"}
+    stats = run_batch(input_path, output_path)
+    assert stats == {"succeeded": 2, "failed": 2, "skipped": 0}
+    records = read_output(output_path)
+    assert sorted(r["index"] for r in records) == [0, 1, 2, 3]
+    assert {r["custom_id"]: "error" in r for r in records} == {
+        "req-0": False,
+        "req-1": True,
+        "req-2": False,
+        "req-3": True,
+    }
+
+    # Simulate an interrupted write.
+    with open(output_path, "a", encoding="utf-8") as f:
+        f.write('{"index": 2, "respo')
+
+    # Without `retry_failed`, all requests with results are skipped.
+    stats = run_batch(input_path, output_path)
+    assert stats == {"succeeded": 0, "failed": 0, "skipped": 4}
+    assert FakeChatCompletion.prompts == []
+    assert len(read_output(output_path)) == 4
+
+    # With `retry_failed`, the failures are replaced by the new results.
+    FakeChatCompletion.failing_prompts = {"d"}
+    stats = run_batch(input_path, output_path, retry_failed=True)
+    assert stats == {"succeeded": 1, "failed": 1, "skipped": 2}
+    assert sorted(FakeChatCompletion.prompts) == ["b", "d"]
+    records = read_output(output_path)
+    assert sorted(r["index"] for r in records) == [0, 1, 2, 3]
+    by_index = {r["index"]: r for r in records}
+    assert by_index[1]["response"] == {"result": "B"}
+    assert by_index[3]["error"]["type"] == "APIError"
+    assert not (tmp_path / "output.jsonl.tmp").exists()
+
+
+def test_invalid_lines_are_recorded_as_failures(tmp_path):
+    input_path = str(tmp_path / "input.jsonl")
+    output_path = str(tmp_path / "output.jsonl")
+    with open(input_path, "w", encoding="utf-8") as f:
+        f.write("[1, 2]\n\n")
+        f.write(json.dumps({"messages": [{"role": "user", "content": "a"}], "stream": True}) + "\n")
+
+    stats = run_batch(input_path, output_path)
+    assert stats == {"succeeded": 0, "failed": 2, "skipped": 1}
+    assert [r["error"]["type"] for r in read_output(output_path)] == ["ValueError", "ValueError"]
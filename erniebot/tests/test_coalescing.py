@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+from erniebot.coalescing import RequestCoalescer, make_request_key
+
+# Offline tests of `RequestCoalescer`. Fake request functions are held until
+# all callers have joined, and count how many requests are actually sent.
+
+NUM_CALLERS = 5
+
+
+class FakeAsyncRequests(object):
+    def __init__(self, num_chunks=3, error=None):
+        self.num_chunks = num_chunks
+        self.error = error
+        self.num_sent = 0
+        self.num_cancelled = 0
+        self.num_chunks_fetched = 0
+        self.upstream_closed = False
+        self.gate = asyncio.Event()
+
+    async def request(self):
+        self.num_sent += 1
+        try:
+            await self.gate.wait()
+        except asyncio.CancelledError:
+            self.num_cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        return {"result": "ok"}
+
+    async def request_stream(self):
+        self.num_sent += 1
+        await self.gate.wait()
+
+        async def _stream():
+            try:
+                for i in range(self.num_chunks):
+                    await asyncio.sleep(0)
+                    self.num_chunks_fetched += 1
+                    yield f"chunk{i}"
+                if self.error is not None:
+                    raise self.error
+            finally:
+                self.upstream_closed = True
+
+        return _stream()
+
+
+async def _wait_until(predicate, timeout=5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        if loop.time() > deadline:
+            raise AssertionError("Condition not met in time.")
+        await asyncio.sleep(0.001)
+
+
+async def _start_callers(coalescer, func, num_callers=NUM_CALLERS, stream=False):
+    tasks = [asyncio.ensure_future(coalescer.arun("key", func, stream=stream)) for _ in range(num_callers)]
+    await _wait_until(lambda: coalescer.get_metrics()["num_coalesced"] == num_callers - 1)
+    return tasks
+
+
+def test_request_key_ignores_key_order():
+    assert make_request_key("POST", {"a": 1, "b": [1, 2]}) == make_request_key("POST", {"b": [1, 2], "a": 1})
+    assert make_request_key("POST", {"a": 1}) != make_request_key("POST", {"a": 2})
+
+
+def test_followers_share_the_result_of_the_leader():
+    async def _run():
+        coalescer = RequestCoalescer()
+        requests = FakeAsyncRequests()
+        tasks = await _start_callers(coalescer, requests.request)
+        requests.gate.set()
+        results = await asyncio.gather(*tasks)
+        assert all(result is results[0] for result in results)
+        assert requests.num_sent == 1
+        assert coalescer.get_metrics() == {"num_in_flight": 0, "num_requests": 1, "num_coalesced": 4}
+
+        # Results are not cached beyond the lifetime of the request.
+        await coalescer.arun("key", requests.request, stream=False)
+        assert requests.num_sent == 2
+
+    asyncio.run(_run())
+
+
+def test_leader_failure_propagates_to_followers():
+    async def _run():
+        coalescer = RequestCoalescer()
+        requests = FakeAsyncRequests(error=ValueError("Bad request."))
+        tasks = await _start_callers(coalescer, requests.request)
+        requests.gate.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        assert requests.num_sent == 1
+        assert coalescer.get_metrics()["num_in_flight"] == 0
+
+    asyncio.run(_run())
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    async def _run():
+        coalescer = RequestCoalescer()
+        requests = FakeAsyncRequests()
+        leader, *followers = await _start_callers(coalescer, requests.request)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        requests.gate.set()
+        results = await asyncio.gather(*followers)
+        assert results == [{"result": "ok"}] * (NUM_CALLERS - 1)
+        assert requests.num_sent == 1
+        assert requests.num_cancelled == 0
+
+    asyncio.run(_run())
+
+
+def test_request_is_cancelled_with_all_callers():
+    async def _run():
+        coalescer = RequestCoalescer()
+        requests = FakeAsyncRequests()
+        tasks = await _start_callers(coalescer, requests.request)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await _wait_until(lambda: requests.num_cancelled == 1)
+        assert coalescer.get_metrics()["num_in_flight"] == 0
+
+    asyncio.run(_run())
+
+
+def test_stream_fan_out():
+    async def _run():
+        coalescer = RequestCoalescer()
+        requests = FakeAsyncRequests(num_chunks=3)
+        tasks = await _start_callers(coalescer, requests.request_stream, num_callers=2, stream=True)
+        requests.gate.set()
+        streams = await asyncio.gather(*tasks)
+        first = [await streams[0].__anext__()]
+
+        # A caller that joins late still receives all chunks from the
+        # beginning.
+        late = await coalescer.arun("key", requests.request_stream, stream=True)
+        chunks = [
+            first + [chunk async for chunk in streams[0]],
+            [chunk async for chunk in streams[1]],
+            [chunk async for chunk in late],
+        ]
+        assert chunks == [["chunk0", "chunk1", "chunk2"]] * 3
+        assert requests.num_sent == 1
+        assert requests.num_chunks_fetched == 3
+        assert coalescer.get_metrics()["num_in_flight"] == 0
+
+    asyncio.run(_run())
+
+
+def test_stream_error_propagates_to_all_consumers():
+    async def _run():
+        coalescer = RequestCoalescer()
+        requests = FakeAsyncRequests(num_chunks=1, error=ValueError("Malformed chunk."))
+        tasks = await _start_callers(coalescer, requests.request_stream, num_callers=2, stream=True)
+        requests.gate.set()
+        for stream in await asyncio.gather(*tasks):
+            assert await stream.__anext__() == "chunk0"
+            with pytest.raises(ValueError):
+                await stream.__anext__()
+
+    asyncio.run(_run())
+
+
+def test_upstream_is_closed_when_all_consumers_stop():
+    async def _run():
+        coalescer = RequestCoalescer()
+        requests = FakeAsyncRequests(num_chunks=10)
+        tasks = await _start_callers(coalescer, requests.request_stream, num_callers=2, stream=True)
+        requests.gate.set()
+        streams = await asyncio.gather(*tasks)
+        assert await streams[0].__anext__() == "chunk0"
+        await streams[0].aclose()
+        # The other consumer keeps the upstream open.
+        assert await streams[1].__anext__() == "chunk0"
+        assert await streams[1].__anext__() == "chunk1"
+        assert not requests.upstream_closed
+        await streams[1].aclose()
+        await _wait_until(lambda: requests.upstream_closed)
+        assert requests.num_chunks_fetched < 10
+
+    asyncio.run(_run())
+
+
+def _start_sync_callers(executor, coalescer, func, stream=False, consume=None):
+    def _call():
+        result = coalescer.run("key", func, stream=stream)
+        return consume(result) if consume is not None else result
+
+    num_coalesced = coalescer.get_metrics()["num_coalesced"]
+    futures = [executor.submit(_call) for _ in range(NUM_CALLERS)]
+    deadline = time.monotonic() + 5
+    while coalescer.get_metrics()["num_coalesced"] < num_coalesced + NUM_CALLERS - 1:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+    return futures
+
+
+def test_sync_followers_share_result_and_errors():
+    coalescer = RequestCoalescer()
+    gate = threading.Event()
+    num_sent = []
+
+    def _request():
+        num_sent.append(1)
+        gate.wait(5)
+        return {"result": "ok"}
+
+    def _failing_request():
+        gate.wait(5)
+        raise ValueError("Bad request.")
+
+    with concurrent.futures.ThreadPoolExecutor(NUM_CALLERS) as executor:
+        futures = _start_sync_callers(executor, coalescer, _request)
+        gate.set()
+        results = [future.result() for future in futures]
+        assert all(result is results[0] for result in results)
+        assert len(num_sent) == 1
+
+        gate.clear()
+        futures = _start_sync_callers(executor, coalescer, _failing_request)
+        gate.set()
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result()
+    assert coalescer.get_metrics()["num_in_flight"] == 0
+
+
+def test_sync_stream_fan_out():
+    coalescer = RequestCoalescer()
+    gate = threading.Event()
+    num_fetched = []
+
+    def _request_stream():
+        gate.wait(5)
+
+        def _stream():
+            for i in range(3):
+                num_fetched.append(i)
+                yield f"chunk{i}"
+
+        return _stream()
+
+    with concurrent.futures.ThreadPoolExecutor(NUM_CALLERS) as executor:
+        futures = _start_sync_callers(executor, coalescer, _request_stream, stream=True, consume=list)
+        gate.set()
+        assert [future.result() for future in futures] == [["chunk0", "chunk1", "chunk2"]] * NUM_CALLERS
+    assert num_fetched == [0, 1, 2]
+    assert coalescer.get_metrics()["num_in_flight"] == 0
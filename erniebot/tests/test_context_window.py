@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import json
+
+import pytest
+
+import erniebot.errors as errors
+from erniebot.context_window import ContextWindowFitter
+
+# Offline tests of `ContextWindowFitter`. One character counts as one token, and
+# no safety margin is applied, so that budgets are exact.
+
+
+def make_fitter(policy, **kwargs):
+    return ContextWindowFitter(policy, safety_margin=0, token_counter=len, **kwargs)
+
+
+def make_messages(num_turns, length=10):
+    messages = []
+    for i in range(num_turns):
+        messages.append({"role": "user", "content": str(i) * length})
+        messages.append({"role": "assistant", "content": str(i) * length})
+    return messages
+
+
+def test_request_within_budget_is_unchanged():
+    messages = make_messages(2)
+    fitted = make_fitter("drop_oldest").fit(messages, 43, system="sys")
+    assert fitted.messages is messages
+    assert fitted.system == "sys"
+    assert fitted.num_tokens == 43
+
+
+def test_drop_oldest():
+    messages = make_messages(3)
+    original = copy.deepcopy(messages)
+    fitted = make_fitter("drop_oldest").fit(messages, 45)
+    assert fitted.messages == messages[2:]
+    assert fitted.num_tokens == 40
+    assert messages == original
+
+    # The last turn is always kept, even if it does not fit on its own.
+    with pytest.raises(errors.ContextWindowExceededError):
+        make_fitter("drop_oldest").fit(messages, 15)
+
+
+def test_truncate_longest():
+    messages = make_messages(1)
+    messages[0]["content"] = "x" * 100
+    fitted = make_fitter("truncate_longest").fit(messages, 60)
+    assert fitted.num_tokens <= 60
+    assert fitted.messages[0]["content"].startswith("xxx")
+    assert fitted.messages[0]["content"].endswith("...")
+    assert fitted.messages[1] == messages[1]
+    assert len(messages[0]["content"]) == 100
+
+
+def test_truncate_longest_keeps_function_messages_intact():
+    function_content = json.dumps({"result": "y" * 100})
+    messages = [
+        {"role": "user", "content": "x" * 30},
+        {"role": "assistant", "content": None, "function_call": {"name": "f", "arguments": "{}"}},
+        {"role": "function", "name": "f", "content": function_content},
+        {"role": "assistant", "content": "z" * 30},
+    ]
+    fitted = make_fitter("truncate_longest").fit(messages, 160)
+    assert fitted.messages[2]["content"] == function_content
+    assert fitted.num_tokens <= 160
+
+
+def test_summarize_reserves_room_for_summary():
+    summaries = []
+
+    def _summarize(dropped):
+        summaries.append(len(dropped))
+        return "s" * 15
+
+    messages = make_messages(3)
+    # The last two turns fit the budget, but not together with the summary.
+    fitted = make_fitter("summarize", summarize_func=_summarize).fit(messages, 50, system="sys")
+    assert fitted.messages == messages[4:]
+    assert fitted.system == "s" * 15 + "\nsys"
+    assert fitted.num_tokens == 20 + 15 + 1 + 3
+    assert summaries == [2, 4]
+
+
+def test_summarize_raises_if_last_turn_does_not_fit():
+    fitter = make_fitter("summarize", summarize_func=lambda dropped: "s" * 100)
+    with pytest.raises(errors.ContextWindowExceededError):
+        fitter.fit(make_messages(3), 50)
+
+
+def test_functions_and_system_count_towards_budget():
+    fitter = make_fitter("drop_oldest")
+    functions = [{"name": "f", "description": "d", "parameters": {}}]
+    num_function_tokens = len(json.dumps(functions, ensure_ascii=False))
+    messages = make_messages(2)
+    assert fitter.count_tokens(messages, system="sys", functions=functions) == 40 + 3 + num_function_tokens
+    fitted = fitter.fit(messages, 39 + num_function_tokens, functions=functions)
+    assert fitted.messages == messages[2:]
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        ContextWindowFitter("unknown")
+    with pytest.raises(ValueError):
+        ContextWindowFitter("summarize")
+    with pytest.raises(ValueError):
+        ContextWindowFitter(safety_margin=1)
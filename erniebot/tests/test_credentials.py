@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from unittest import mock
+
+import pytest
+
+import erniebot
+import erniebot.errors as errors
+from erniebot.credentials import Credential, CredentialPool
+from erniebot.scheduling import RequestScheduler
+from erniebot.transports import AsyncTransportResponse, Transport, TransportResponse
+
+# Offline tests of `CredentialPool`. The fake backend fails for some keys, and
+# the clock is faked so that cooldowns can be checked deterministically.
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeBackend(object):
+    def __init__(self, failures=None):
+        self.failures = failures or {}
+        self.used_tokens = []
+
+    def request(self, credential):
+        self.used_tokens.append(credential.access_token)
+        error_cls = self.failures.get(credential.access_token, None)
+        if error_cls is not None:
+            raise error_cls("failed")
+        return credential.access_token
+
+    def request_stream(self, credential):
+        self.used_tokens.append(credential.access_token)
+        return iter(["a", "b"])
+
+    async def arequest_stream(self, credential):
+        self.used_tokens.append(credential.access_token)
+
+        async def _gen():
+            yield "a"
+            yield "b"
+
+        return _gen()
+
+
+CHUNK = b'data: {"errorCode": 0, "errorMsg": "", "result": {"result": "a", "is_end": false}}'
+
+
+class FakeStreamResponse(TransportResponse):
+    status_code = 200
+    headers = {"Content-Type": "text/event-stream"}
+
+    def iter_lines(self):
+        return iter([CHUNK, CHUNK])
+
+    def close(self):
+        pass
+
+
+class AsyncFakeStreamResponse(AsyncTransportResponse):
+    status_code = 200
+    headers = {"Content-Type": "text/event-stream"}
+
+    async def iter_lines(self):
+        yield CHUNK
+        yield CHUNK
+
+    async def aclose(self):
+        pass
+
+
+class FakeStreamTransport(Transport):
+    def send(self, method, url, **kwargs):
+        return FakeStreamResponse()
+
+    async def asend(self, method, url, **kwargs):
+        return AsyncFakeStreamResponse()
+
+
+@pytest.fixture
+def clock():
+    clock = FakeClock()
+    with mock.patch("erniebot.credentials.time.monotonic", clock):
+        yield clock
+
+
+def make_pool(**kwargs):
+    return CredentialPool(
+        [{"access_token": "key1"}, {"access_token": "key2"}, Credential(access_token="key3")],
+        rate_limit_cooldown_secs=10,
+        auth_error_cooldown_secs=300,
+        **kwargs,
+    )
+
+
+def test_round_robin(clock):
+    pool = make_pool()
+    backend = FakeBackend()
+    results = [pool.run(backend.request) for _ in range(4)]
+    assert results == ["key1", "key2", "key3", "key1"]
+    assert all(stats["num_in_flight"] == 0 for stats in pool.get_stats())
+
+
+def test_rate_limited_credential_is_sidelined_until_cooldown(clock):
+    pool = make_pool()
+    backend = FakeBackend(failures={"key1": errors.RateLimitError})
+    with pytest.raises(errors.RateLimitError):
+        pool.run(backend.request)
+    backend.failures.clear()
+
+    assert [pool.run(backend.request) for _ in range(4)] == ["key2", "key3", "key2", "key3"]
+    stats = pool.get_stats()[0]
+    assert stats["num_rate_limited"] == 1
+    assert stats["sidelined_for_secs"] == 10
+
+    clock.now += 10
+    assert "key1" in [pool.run(backend.request) for _ in range(3)]
+
+
+def test_auth_error_uses_longer_cooldown(clock):
+    pool = make_pool()
+    backend = FakeBackend(failures={"key1": errors.InvalidTokenError})
+    with pytest.raises(errors.InvalidTokenError):
+        pool.run(backend.request)
+    stats = pool.get_stats()[0]
+    assert stats["num_auth_errors"] == 1
+    assert stats["sidelined_for_secs"] == 300
+
+    # Other errors do not sideline the credential.
+    backend.failures = {"key2": ValueError}
+    with pytest.raises(ValueError):
+        pool.run(backend.request)
+    assert pool.get_stats()[1]["sidelined_for_secs"] == 0
+
+
+def test_all_sidelined_uses_the_soonest_available(clock):
+    pool = make_pool()
+    backend = FakeBackend(
+        failures={
+            "key1": errors.InvalidTokenError,
+            "key2": errors.RateLimitError,
+            "key3": errors.InvalidTokenError,
+        }
+    )
+    for _ in range(3):
+        with pytest.raises(errors.APIError):
+            pool.run(backend.request)
+    backend.failures.clear()
+    assert pool.run(backend.request) == "key2"
+
+
+def test_least_loaded(clock):
+    pool = make_pool(strategy="least_loaded")
+    backend = FakeBackend()
+    # Unfinished streams keep their credentials in use.
+    stream1 = pool.run(backend.request_stream)
+    stream2 = pool.run(backend.request_stream)
+    assert [s["num_in_flight"] for s in pool.get_stats()] == [1, 1, 0]
+    assert pool.run(backend.request) == "key3"
+    list(stream1)
+    assert pool.run(backend.request) == "key1"
+    stream2.close()
+    assert [s["num_in_flight"] for s in pool.get_stats()] == [0, 0, 0]
+
+
+def test_release_on_iterator_exhaustion(clock):
+    pool = make_pool()
+    backend = FakeBackend()
+    stream = pool.run(backend.request_stream)
+    assert pool.get_stats()[0]["num_in_flight"] == 1
+    assert list(stream) == ["a", "b"]
+    assert pool.get_stats()[0]["num_in_flight"] == 0
+
+    async def _consume():
+        stream = await pool.arun(backend.arequest_stream)
+        assert pool.get_stats()[1]["num_in_flight"] == 1
+        items = [item async for item in stream]
+        assert pool.get_stats()[1]["num_in_flight"] == 0
+        return items
+
+    assert asyncio.run(_consume()) == ["a", "b"]
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        CredentialPool([])
+    with pytest.raises(ValueError):
+        CredentialPool([{"access_token": "key"}], strategy="random")
+    with pytest.raises(ValueError):
+        Credential(ak="ak")
+
+
+@pytest.mark.parametrize("num_chunks_read", [0, 1])
+def test_chat_streams_closed_early_release_credentials(clock, num_chunks_read):
+    pool = make_pool()
+    # The scheduler and the meter wrap the stream of the pool.
+    config = dict(
+        api_type="aistudio",
+        credential_pool=pool,
+        transport=FakeStreamTransport(),
+        scheduler=RequestScheduler(4),
+        usage_meter=erniebot.UsageMeter(),
+    )
+    kwargs = dict(
+        model="ernie-3.5", messages=[{"role": "user", "content": "Hi"}], stream=True, _config_=config
+    )
+
+    stream = erniebot.ChatCompletion.create(**kwargs)
+    assert sum(s["num_in_flight"] for s in pool.get_stats()) == 1
+    for _ in range(num_chunks_read):
+        next(stream)
+    stream.close()
+    assert sum(s["num_in_flight"] for s in pool.get_stats()) == 0
+
+    async def _run():
+        stream = await erniebot.ChatCompletion.acreate(**kwargs)
+        assert sum(s["num_in_flight"] for s in pool.get_stats()) == 1
+        for _ in range(num_chunks_read):
+            await stream.__anext__()
+        await stream.aclose()
+        assert sum(s["num_in_flight"] for s in pool.get_stats()) == 0
+
+    asyncio.run(_run())
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import concurrent.futures
+from unittest import mock
+
+import pytest
+
+import erniebot
+from erniebot.response import EBResponse
+
+# Offline tests of usage metering. Requests of a resource are faked, and the
+# counters of a `UsageMeter` are checked.
+
+
+def _make_response(prompt_tokens, completion_tokens):
+    usage = {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+    return EBResponse(200, {"result": "ok", "usage": usage}, {})
+
+
+def _make_resource(meter, **config):
+    return erniebot.ChatCompletion(ak="ak", sk="sk", usage_meter=meter, **config)
+
+
+def _get_entries(meter):
+    return {(entry["model"], entry["tags"].get("team")): entry for entry in meter.snapshot()["entries"]}
+
+
+def test_usage_is_aggregated_across_threads():
+    meter = erniebot.UsageMeter()
+
+    def _request(idx):
+        team = "a" if idx % 2 == 0 else "b"
+        resource = _make_resource(meter, usage_tags={"team": team})
+        with mock.patch.object(resource, "_request_coalesced", return_value=_make_response(3, 2)):
+            resource.request("POST", "/chat", False, model="ernie-3.5")
+
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        list(executor.map(_request, range(20)))
+
+    entries = _get_entries(meter)
+    assert set(entries) == {("ernie-3.5", "a"), ("ernie-3.5", "b")}
+    for entry in entries.values():
+        assert entry["credential"] == "ak"
+        assert entry["num_requests"] == 10
+        assert entry["num_errors"] == 0
+        assert (entry["prompt_tokens"], entry["completion_tokens"], entry["total_tokens"]) == (30, 20, 50)
+
+
+def test_failed_and_cancelled_requests_are_counted():
+    meter = erniebot.UsageMeter()
+    resource = _make_resource(meter)
+
+    with mock.patch.object(resource, "_request_coalesced", side_effect=erniebot.errors.APIError("Failed.")):
+        with pytest.raises(erniebot.errors.APIError):
+            resource.request("POST", "/chat", False, model="ernie-3.5")
+
+    async def _hang(*args):
+        await asyncio.sleep(3600)
+
+    async def _run():
+        with mock.patch.object(resource, "_arequest_coalesced", _hang):
+            task = asyncio.ensure_future(resource.arequest("POST", "/chat", False, model="ernie-3.5"))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+    asyncio.run(_run())
+
+    (entry,) = meter.snapshot()["entries"]
+    assert entry["num_requests"] == 2
+    assert entry["num_errors"] == 2
+    assert entry["total_tokens"] == 0
+
+
+def test_streams_are_recorded_when_they_end():
+    meter = erniebot.UsageMeter()
+    resource = _make_resource(meter)
+
+    def _stream():
+        # The usage in chunks is cumulative.
+        for i in range(1, 4):
+            yield _make_response(5, i)
+
+    with mock.patch.object(resource, "_request_coalesced", side_effect=lambda *args: _stream()):
+        stream = resource.request("POST", "/chat", True, model="ernie-3.5")
+        assert meter.snapshot()["entries"] == []
+        assert len(list(stream)) == 3
+
+        # Stopping early is not a failure.
+        stream = resource.request("POST", "/chat", True, model="ernie-3.5")
+        next(stream)
+        stream.close()
+
+    (entry,) = meter.snapshot()["entries"]
+    assert entry["num_requests"] == 2
+    assert entry["num_errors"] == 0
+    assert entry["completion_tokens"] == 3 + 1
+    assert entry["prompt_tokens"] == 10
+
+
+def test_streams_closed_before_the_first_chunk_are_failures():
+    meter = erniebot.UsageMeter()
+    resource = _make_resource(meter)
+
+    def _stream(*args):
+        yield _make_response(5, 1)
+
+    async def _astream(*args):
+        async def _stream():
+            yield _make_response(5, 1)
+
+        return _stream()
+
+    with mock.patch.object(resource, "_request_coalesced", side_effect=_stream):
+        resource.request("POST", "/chat", True, model="ernie-3.5").close()
+
+    async def _run():
+        with mock.patch.object(resource, "_arequest_coalesced", _astream):
+            stream = await resource.arequest("POST", "/chat", True, model="ernie-3.5")
+            await stream.aclose()
+
+    asyncio.run(_run())
+
+    (entry,) = meter.snapshot()["entries"]
+    assert entry["num_requests"] == 2
+    assert entry["num_errors"] == 2
+    assert entry["total_tokens"] == 0
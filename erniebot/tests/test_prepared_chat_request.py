@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import json
+
+import erniebot
+from erniebot.transports import AsyncTransportResponse, Transport, TransportResponse
+
+# Offline tests of `PreparedChatRequest`. The fake transport records the
+# bodies of the requests, which are compared with those of `ChatCompletion`.
+
+FUNCTIONS = [
+    {
+        "name": "get_weather",
+        "description": "Gets the weather of a city.",
+        "parameters": {"type": "object", "properties": {"city": {"type": "string"}}},
+    }
+]
+RESPONSE_BODY = json.dumps({"errorCode": 0, "errorMsg": "", "result": {"result": "ok"}}).encode()
+
+
+class FakeResponse(TransportResponse):
+    status_code = 200
+    headers = {"Content-Type": "application/json"}
+
+    def read(self):
+        return RESPONSE_BODY
+
+    def close(self):
+        pass
+
+
+class AsyncFakeResponse(AsyncTransportResponse):
+    status_code = 200
+    headers = {"Content-Type": "application/json"}
+
+    async def read(self):
+        return RESPONSE_BODY
+
+    async def aclose(self):
+        pass
+
+
+class RecordingTransport(Transport):
+    def __init__(self):
+        self.bodies = []
+
+    def send(self, method, url, *, headers, data, stream, timeout, stream_timeouts=None):
+        self.bodies.append(data)
+        return FakeResponse()
+
+    async def asend(self, method, url, *, headers, data, stream, timeout, stream_timeouts=None):
+        self.bodies.append(data)
+        return AsyncFakeResponse()
+
+
+def _make_config(transport):
+    return dict(api_type="aistudio", access_token="token", transport=transport)
+
+
+def _make_messages(content):
+    return [{"role": "user", "content": content}]
+
+
+def test_body_matches_unprepared_request():
+    transport = RecordingTransport()
+    config = _make_config(transport)
+    erniebot.ChatCompletion.create(
+        model="ernie-3.5",
+        messages=_make_messages("Hi"),
+        functions=FUNCTIONS,
+        system="You are helpful.",
+        temperature=0.5,
+        _config_=config,
+    )
+    prepared = erniebot.ChatCompletion.prepare(
+        model="ernie-3.5", functions=FUNCTIONS, system="You are helpful.", _config_=config
+    )
+    response = prepared.create(messages=_make_messages("Hi"), temperature=0.5)
+    assert response.get_result() == "ok"
+    expected, actual = transport.bodies
+    assert json.loads(actual) == json.loads(expected)
+
+    async def _acreate():
+        return await prepared.acreate(messages=_make_messages("Hi"), temperature=0.5)
+
+    asyncio.run(_acreate())
+    assert json.loads(transport.bodies[-1]) == json.loads(expected)
+
+
+def test_dynamic_params_are_re_encoded():
+    transport = RecordingTransport()
+    functions = json.loads(json.dumps(FUNCTIONS))
+    prepared = erniebot.ChatCompletion.prepare(
+        model="ernie-3.5", functions=functions, _config_=_make_config(transport)
+    )
+    prepared.create(messages=_make_messages("first"))
+    prepared.create(messages=_make_messages("second"), top_p=0.2)
+    prepared.create(messages=_make_messages("third"))
+
+    bodies = [json.loads(body) for body in transport.bodies]
+    assert [body["messages"][0]["content"] for body in bodies] == ["first", "second", "third"]
+    assert [body.get("top_p", None) for body in bodies] == [None, 0.2, None]
+    assert all(body["functions"] == FUNCTIONS for body in bodies)
+
+    # The template keeps the functions it was prepared with, both in the
+    # encoded body and in the parameters seen by the SDK.
+    functions[0]["name"] = "changed"
+    functions.append(functions[0])
+    prepared.create(messages=_make_messages("fourth"))
+    assert json.loads(transport.bodies[-1])["functions"] == FUNCTIONS
+    request = prepared._prepare(dict(messages=_make_messages("fifth")), None, None, None)
+    assert request.params["functions"] == FUNCTIONS
@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from unittest import mock
+
+import pytest
+
+import erniebot
+import erniebot.errors as errors
+from erniebot.rate_limiting import RateLimiter, TokenBucketRateLimiter
+from erniebot.response import EBResponse
+from erniebot.scheduling import RequestScheduler
+
+# Offline tests of `RequestScheduler` and `TokenBucketRateLimiter`. Requests
+# are fake: they acquire a ticket, record the admission order, and release the
+# ticket when the test says so.
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRateLimiter(RateLimiter):
+    def __init__(self, num_permits):
+        super().__init__()
+        self.num_permits = num_permits
+
+    def reserve(self, cost=1):
+        if self.num_permits >= cost:
+            self.num_permits -= cost
+            return 0
+        return 0.01
+
+
+async def _wait_until(predicate, timeout=5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        if loop.time() > deadline:
+            raise AssertionError("Condition not met in time.")
+        await asyncio.sleep(0.001)
+
+
+class FakeRequests(object):
+    """Queues requests behind a held slot, then admits them one at a time."""
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.admitted = []
+        self.tasks = {}
+
+    async def submit(self, name, priority=None, tenant=None):
+        async def _request():
+            ticket = await self.scheduler.aacquire(priority=priority, tenant=tenant)
+            self.admitted.append(name)
+            return ticket
+
+        self.tasks[name] = asyncio.ensure_future(_request())
+        # Let the request enter the queue.
+        await asyncio.sleep(0)
+
+    async def admit_all(self, holder):
+        ticket = holder
+        while True:
+            num_admitted = len(self.admitted)
+            self.scheduler.release(ticket)
+            if all(task.done() for task in self.tasks.values()):
+                return self.admitted
+            await _wait_until(lambda: len(self.admitted) > num_admitted)
+            ticket = await self.tasks[self.admitted[-1]]
+
+
+def test_priority_order():
+    async def _run():
+        scheduler = RequestScheduler(1)
+        holder = await scheduler.aacquire()
+        requests = FakeRequests(scheduler)
+        await requests.submit("batch", priority="batch")
+        await requests.submit("default")
+        await requests.submit("interactive", priority="interactive")
+        await requests.submit("default2")
+        metrics = scheduler.get_metrics()
+        assert metrics["default"]["queue_depth"] == 2
+        assert metrics["default"]["num_in_flight"] == 1
+        return await requests.admit_all(holder), scheduler.get_metrics()
+
+    admitted, metrics = asyncio.run(_run())
+    assert admitted == ["interactive", "default", "default2", "batch"]
+    assert metrics["default"]["num_admitted"] == 3
+    assert all(m["num_in_flight"] == 0 and m["queue_depth"] == 0 for m in metrics.values())
+
+
+def test_weighted_fair_queuing():
+    async def _run():
+        scheduler = RequestScheduler(1, tenant_weights={"heavy": 2})
+        holder = await scheduler.aacquire()
+        requests = FakeRequests(scheduler)
+        for i in range(4):
+            await requests.submit(f"light{i}", tenant="light")
+        for i in range(4):
+            await requests.submit(f"heavy{i}", tenant="heavy")
+        return await requests.admit_all(holder)
+
+    admitted = asyncio.run(_run())
+    # The heavy tenant gets twice the share of the light tenant, even though
+    # its requests arrived later.
+    assert admitted[:6] == ["heavy0", "light0", "heavy1", "heavy2", "light1", "heavy3"]
+
+
+def test_preemption_and_rejection():
+    async def _run():
+        scheduler = RequestScheduler(1, max_queue_size=2)
+        holder = await scheduler.aacquire()
+        requests = FakeRequests(scheduler)
+        await requests.submit("batch0", priority="batch")
+        await requests.submit("batch1", priority="batch")
+        # The queue is full: the most recently queued lower-priority request
+        # is preempted.
+        await requests.submit("interactive", priority="interactive")
+        await asyncio.sleep(0)
+        with pytest.raises(errors.RequestRejectedError) as exc_info:
+            await requests.tasks["batch1"]
+        assert exc_info.value.reason == "preempted"
+
+        # Nothing has a lower priority than a batch request.
+        with pytest.raises(errors.RequestRejectedError) as exc_info:
+            await scheduler.aacquire(priority="batch")
+        assert exc_info.value.reason == "queue_full"
+
+        admitted = await requests.admit_all(holder)
+        return admitted, scheduler.get_metrics()
+
+    admitted, metrics = asyncio.run(_run())
+    assert admitted == ["interactive", "batch0"]
+    assert metrics["batch"]["num_rejected"] == {"preempted": 1, "queue_full": 1}
+
+
+def test_queue_timeout_and_cancellation():
+    async def _run():
+        scheduler = RequestScheduler(1)
+        holder = await scheduler.aacquire()
+        with pytest.raises(errors.RequestRejectedError) as exc_info:
+            await scheduler.aacquire(timeout=0.01)
+        assert exc_info.value.reason == "timeout"
+
+        task = asyncio.ensure_future(scheduler.aacquire())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert scheduler.get_metrics()["default"]["queue_depth"] == 0
+
+        scheduler.release(holder)
+        # Releasing twice is a no-op.
+        scheduler.release(holder)
+        ticket = await scheduler.aacquire(timeout=0)
+        scheduler.release(ticket)
+        return scheduler.get_metrics()["default"]
+
+    metrics = asyncio.run(_run())
+    assert metrics["num_in_flight"] == 0
+    assert metrics["num_rejected"] == {"timeout": 1}
+
+
+def test_sync_acquire():
+    scheduler = RequestScheduler(1)
+    ticket = scheduler.acquire()
+    with pytest.raises(errors.RequestRejectedError):
+        scheduler.acquire(timeout=0.01)
+    scheduler.release(ticket)
+    scheduler.release(scheduler.acquire(timeout=0))
+
+
+def _fake_stream(*args, **kwargs):
+    for i in range(3):
+        yield EBResponse(200, {"result": str(i)}, {})
+
+
+async def _afake_stream(*args, **kwargs):
+    async def _stream():
+        for i in range(3):
+            yield EBResponse(200, {"result": str(i)}, {})
+
+    return _stream()
+
+
+@pytest.mark.parametrize("num_chunks_read", [0, 1, 3])
+def test_closed_streams_release_tickets(num_chunks_read):
+    scheduler = RequestScheduler(1, queue_timeout_secs=0.01)
+    resource = erniebot.ChatCompletion(api_type="aistudio", access_token="token", scheduler=scheduler)
+
+    with mock.patch.object(resource._backend, "request", _fake_stream):
+        for _ in range(3):
+            stream = resource.request("POST", "/chat", True)
+            for _ in range(num_chunks_read):
+                next(stream)
+            stream.close()
+            assert scheduler.get_metrics()["default"]["num_in_flight"] == 0
+
+        # Streams dropped without being closed release their tickets too.
+        stream = resource.request("POST", "/chat", True)
+        del stream
+        assert scheduler.get_metrics()["default"]["num_in_flight"] == 0
+
+    async def _run():
+        with mock.patch.object(resource._backend, "arequest", _afake_stream):
+            for _ in range(3):
+                stream = await resource.arequest("POST", "/chat", True)
+                for _ in range(num_chunks_read):
+                    await stream.__anext__()
+                await stream.aclose()
+                assert scheduler.get_metrics()["default"]["num_in_flight"] == 0
+
+    asyncio.run(_run())
+
+
+def test_rate_limited_admission():
+    async def _run():
+        limiter = FakeRateLimiter(num_permits=1)
+        scheduler = RequestScheduler(4, rate_limiter=limiter)
+        requests = FakeRequests(scheduler)
+        await requests.submit("first")
+        await requests.submit("second", priority="batch")
+        await requests.submit("third", priority="interactive")
+        await _wait_until(lambda: len(requests.admitted) == 1)
+        # Slots are free, but no permits are left.
+        await asyncio.sleep(0.05)
+        assert requests.admitted == ["first"]
+
+        # Queued requests obtain permits in scheduling order.
+        limiter.num_permits = 2
+        await _wait_until(lambda: len(requests.admitted) == 3)
+        return requests.admitted
+
+    assert asyncio.run(_run()) == ["first", "third", "second"]
+
+
+def test_invalid_scheduler_arguments():
+    with pytest.raises(ValueError):
+        RequestScheduler(0)
+    with pytest.raises(ValueError):
+        RequestScheduler(1, priority_classes=())
+    with pytest.raises(ValueError):
+        RequestScheduler(1, default_priority="unknown")
+    with pytest.raises(ValueError):
+        RequestScheduler(1).acquire(priority="unknown")
+
+
+def test_token_bucket():
+    clock = FakeClock()
+    with mock.patch("erniebot.rate_limiting.time.monotonic", clock):
+        limiter = TokenBucketRateLimiter(rate=2, burst=3)
+        assert [limiter.reserve() for _ in range(3)] == [0, 0, 0]
+        assert limiter.reserve() == pytest.approx(0.5)
+        # A denied reservation takes no permits.
+        assert limiter.reserve() == pytest.approx(0.5)
+
+        clock.now += 0.5
+        assert limiter.reserve() == 0
+        assert limiter.reserve(cost=2) == pytest.approx(1.0)
+
+        # The bucket does not fill beyond its capacity.
+        clock.now += 100
+        assert limiter.reserve(cost=3) == 0
+        assert limiter.reserve() == pytest.approx(0.5)
+
+        with pytest.raises(ValueError):
+            limiter.reserve(cost=4)
+    with pytest.raises(ValueError):
+        TokenBucketRateLimiter(rate=0)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import multiprocessing
+import os
+import sys
+import time
+
+import pytest
+
+import erniebot
+
+# Tests of `SharedTokenBucketRateLimiter` with several processes drawing from
+# the same bucket file.
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="POSIX only")
+
+NUM_PROCS = 3
+RATE = 40.0
+BURST = 4.0
+DURATION = 1.0
+
+
+def _run_worker(path, start_at, queue):
+    limiter = erniebot.SharedTokenBucketRateLimiter(path, rate=RATE, burst=BURST)
+    num_acquired = 0
+    time.sleep(max(0.0, start_at - time.monotonic()))
+    deadline = start_at + DURATION
+    while True:
+        wait_secs = limiter.reserve()
+        if time.monotonic() >= deadline:
+            break
+        if wait_secs <= 0:
+            num_acquired += 1
+        else:
+            time.sleep(min(wait_secs, max(0.0, deadline - time.monotonic())))
+    limiter.close()
+    queue.put(num_acquired)
+
+
+def test_processes_share_the_rate(tmp_path):
+    path = str(tmp_path / "bucket")
+    erniebot.SharedTokenBucketRateLimiter(path, rate=RATE, burst=BURST).close()
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    # Leave time for the interpreters to start.
+    start_at = time.monotonic() + 2
+    procs = [ctx.Process(target=_run_worker, args=(path, start_at, queue)) for _ in range(NUM_PROCS)]
+    for proc in procs:
+        proc.start()
+    try:
+        counts = [queue.get(timeout=30) for _ in procs]
+    finally:
+        for proc in procs:
+            proc.join(timeout=30)
+
+    # Without sharing, each process would be admitted at the full rate.
+    assert sum(counts) <= RATE * DURATION + BURST
+    assert sum(counts) >= 0.5 * RATE * DURATION
+    assert all(count > 0 for count in counts)
+
+
+def test_state_survives_reopening(tmp_path):
+    path = str(tmp_path / "bucket")
+    limiter = erniebot.SharedTokenBucketRateLimiter(path, rate=0.001, burst=2)
+    assert limiter.reserve() == 0
+    limiter.close()
+
+    # Another limiter on the same file sees the permits taken by the first.
+    limiter = erniebot.SharedTokenBucketRateLimiter(path, rate=0.001, burst=2)
+    assert limiter.reserve() == 0
+    assert limiter.reserve() > 0
+    limiter.close()
+    assert os.path.getsize(path) == erniebot.SharedTokenBucketRateLimiter._STATE_SIZE
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+
+import pytest
+
+import erniebot
+import erniebot.errors as errors
+from erniebot.http_client import EBClient
+from erniebot.transports import AsyncTransportResponse, Transport, TransportResponse
+
+# Offline tests of the stream timeouts and the closing of streams. The fake
+# transport sends one chunk and then stalls.
+
+CHUNK = b'data: {"result": "a"}'
+AISTUDIO_CHUNK = b'data: {"errorCode": 0, "errorMsg": "", "result": {"result": "a", "is_end": false}}'
+
+
+class StalledResponse(TransportResponse):
+    status_code = 200
+    headers = {"Content-Type": "text/event-stream"}
+
+    def __init__(self, chunk):
+        self.chunk = chunk
+        self.read_timeouts = []
+        self.closed = False
+
+    def iter_lines(self):
+        yield self.chunk
+        # A real transport raises once the read timeout elapses.
+        if self.read_timeouts[-1] is None:
+            raise AssertionError("The stream would hang forever.")
+        raise errors.TimeoutError("Read timed out.")
+
+    def set_read_timeout(self, timeout):
+        self.read_timeouts.append(timeout)
+
+    def close(self):
+        self.closed = True
+
+
+class AsyncStalledResponse(AsyncTransportResponse):
+    status_code = 200
+    headers = {"Content-Type": "text/event-stream"}
+
+    def __init__(self, chunk):
+        self.chunk = chunk
+        self.closed = False
+
+    async def iter_lines(self):
+        yield self.chunk
+        await asyncio.sleep(3600)
+
+    async def aclose(self):
+        self.closed = True
+
+
+class StalledTransport(Transport):
+    def __init__(self, chunk=CHUNK):
+        self.chunk = chunk
+        self.response = None
+        self.stream_timeouts = None
+
+    def send(self, method, url, *, headers, data, stream, timeout, stream_timeouts=None):
+        self.stream_timeouts = stream_timeouts
+        self.response = StalledResponse(self.chunk)
+        return self.response
+
+    async def asend(self, method, url, *, headers, data, stream, timeout, stream_timeouts=None):
+        self.stream_timeouts = stream_timeouts
+        self.response = AsyncStalledResponse(self.chunk)
+        return self.response
+
+
+@pytest.mark.parametrize(
+    "stream_timeout_kwargs", [{"stream_first_chunk_timeout": 5}, {"stream_connect_timeout": 5}]
+)
+def test_idle_timeout_defaults_to_request_timeout(stream_timeout_kwargs):
+    transport = StalledTransport()
+    client = EBClient("https://example.com", transport=transport, **stream_timeout_kwargs)
+    stream = client.send_request("POST", "https://example.com/chat", True, request_timeout=0.05)
+    assert next(stream).result == "a"
+    with pytest.raises(errors.TimeoutError, match="the next chunk"):
+        next(stream)
+    assert transport.stream_timeouts.idle == 0.05
+    assert transport.response.read_timeouts[-1] == 0.05
+    assert transport.response.closed
+
+
+@pytest.mark.parametrize(
+    "stream_timeout_kwargs", [{"stream_first_chunk_timeout": 5}, {"stream_connect_timeout": 5}]
+)
+def test_async_idle_timeout_defaults_to_request_timeout(stream_timeout_kwargs):
+    async def _run():
+        transport = StalledTransport()
+        client = EBClient("https://example.com", transport=transport, **stream_timeout_kwargs)
+        stream = await client.asend_request("POST", "https://example.com/chat", True, request_timeout=0.05)
+        assert (await stream.__anext__()).result == "a"
+        with pytest.raises(errors.TimeoutError, match="the next chunk"):
+            await asyncio.wait_for(stream.__anext__(), 5)
+        assert transport.stream_timeouts.idle == 0.05
+        assert transport.response.closed
+
+    asyncio.run(_run())
+
+
+def test_explicit_idle_timeout_is_kept():
+    client = EBClient("https://example.com", stream_idle_timeout=1, transport=StalledTransport())
+    assert client._get_stream_timeouts(0.05) == (None, 0.05, 1)
+    assert client._get_stream_timeouts(None) == (None, EBClient.DEFAULT_REQUEST_TIMEOUT_SECS, 1)
+
+
+def _create_chat_stream(transport, use_async):
+    kwargs = dict(
+        model="ernie-3.5",
+        messages=[{"role": "user", "content": "Hi"}],
+        stream=True,
+        _config_=dict(api_type="aistudio", access_token="token", transport=transport),
+    )
+    if use_async:
+        return erniebot.ChatCompletion.acreate(**kwargs)
+    return erniebot.ChatCompletion.create(**kwargs)
+
+
+@pytest.mark.parametrize("num_chunks_read", [0, 1])
+def test_closing_stream_closes_response(num_chunks_read):
+    transport = StalledTransport(AISTUDIO_CHUNK)
+    stream = _create_chat_stream(transport, use_async=False)
+    for _ in range(num_chunks_read):
+        assert next(stream).get_result() == "a"
+    assert not transport.response.closed
+    stream.close()
+    assert transport.response.closed
+    with pytest.raises(StopIteration):
+        next(stream)
+
+
+@pytest.mark.parametrize("num_chunks_read", [0, 1])
+def test_closing_async_stream_closes_response(num_chunks_read):
+    async def _run():
+        transport = StalledTransport(AISTUDIO_CHUNK)
+        stream = await _create_chat_stream(transport, use_async=True)
+        for _ in range(num_chunks_read):
+            assert (await stream.__anext__()).get_result() == "a"
+        assert not transport.response.closed
+        await stream.aclose()
+        assert transport.response.closed
+        with pytest.raises(StopAsyncIteration):
+            await stream.__anext__()
+
+    asyncio.run(_run())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+import erniebot
+
+# Offline tests of `SyncClient`. Fake coroutines stand in for API calls and
+# record where and how concurrently they run.
+
+NUM_THREADS = 32
+
+
+class FakeCalls(object):
+    def __init__(self, client):
+        self.client = client
+        self.num_running = 0
+        self.max_running = 0
+        self.num_started = 0
+        self.closed_streams = 0
+        self.release = None
+
+    async def request(self, idx, delay=0.01):
+        assert threading.current_thread() is self.client._thread
+        self.num_started += 1
+        self.num_running += 1
+        self.max_running = max(self.max_running, self.num_running)
+        try:
+            if self.release is not None:
+                await self.release.wait()
+            await asyncio.sleep(delay)
+        finally:
+            self.num_running -= 1
+        return idx * 2
+
+    async def request_stream(self, idx):
+        async def _stream():
+            try:
+                for i in range(3):
+                    await asyncio.sleep(0.001)
+                    yield f"{idx}-{i}"
+            finally:
+                self.closed_streams += 1
+
+        return _stream()
+
+
+def _run_in_threads(target, num_threads=NUM_THREADS):
+    with concurrent.futures.ThreadPoolExecutor(num_threads) as executor:
+        return list(executor.map(target, range(num_threads)))
+
+
+def _wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("Condition not met in time.")
+        time.sleep(0.001)
+
+
+def test_thread_safety():
+    with erniebot.SyncClient(max_connections=4) as client:
+        calls = FakeCalls(client)
+        results = _run_in_threads(lambda idx: client.call(calls.request, idx))
+        assert results == [idx * 2 for idx in range(NUM_THREADS)]
+        # The calls of all threads are multiplexed on the background loop.
+        assert calls.max_running > 1
+
+        streams = _run_in_threads(lambda idx: list(client.call(calls.request_stream, idx)))
+        assert streams == [[f"{idx}-{i}" for i in range(3)] for idx in range(NUM_THREADS)]
+        assert calls.closed_streams == NUM_THREADS
+        assert len(client._pending) == 0
+
+
+def test_close_waits_for_calls_that_finish_in_time():
+    client = erniebot.SyncClient()
+    calls = FakeCalls(client)
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        futures = [executor.submit(client.call, calls.request, idx, 0.05) for idx in range(4)]
+        _wait_until(lambda: calls.num_started == 4)
+        client.close(timeout=5)
+        assert [future.result() for future in futures] == [0, 2, 4, 6]
+
+
+def test_close_cancels_calls_in_flight():
+    client = erniebot.SyncClient()
+    calls = FakeCalls(client)
+    calls.release = client.call(_create_event)
+
+    # Leave a stream unfinished.
+    stream = client.call(calls.request_stream, 0)
+    assert next(stream) == "0-0"
+
+    with concurrent.futures.ThreadPoolExecutor(NUM_THREADS) as executor:
+        futures = [executor.submit(client.call, calls.request, idx) for idx in range(NUM_THREADS)]
+        _wait_until(lambda: calls.num_started == NUM_THREADS)
+        client.close(timeout=0.05)
+        for future in futures:
+            with pytest.raises(concurrent.futures.CancelledError):
+                future.result()
+
+    assert client.closed
+    assert client._session.closed
+    assert not client._thread.is_alive()
+    assert calls.num_running == 0
+    assert calls.closed_streams == 1
+    assert len(client._pending) == 0
+
+    # New calls are rejected.
+    with pytest.raises(RuntimeError):
+        client.call(calls.request, 0)
+    with pytest.raises(RuntimeError):
+        next(stream)
+    # Closing twice is a no-op.
+    client.close()
+
+
+async def _create_event():
+    return asyncio.Event()
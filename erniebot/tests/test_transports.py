@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import http.server
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+import erniebot.errors as errors
+from erniebot.transports import AiohttpTransport, HTTPXTransport, RequestsTransport
+
+# Offline tests of the built-in transports against a local HTTP server.
+
+NUM_LINES = 3
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def _handle(self):
+        self.server.paths.append(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length > 0 else b""
+        if self.path.endswith("/stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            try:
+                for i in range(NUM_LINES):
+                    self.wfile.write(f"data: {i}\n\n".encode())
+                    self.wfile.flush()
+                    time.sleep(0.01)
+            except OSError:
+                # The client closed the stream.
+                pass
+        else:
+            data = json.dumps({"method": self.command, "body": body.decode()}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    server.paths = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _get_url(server, path):
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+
+def _get_unused_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}/json"
+
+
+def _is_closed(response):
+    inner = response._response
+    if hasattr(inner, "is_closed"):
+        return inner.is_closed
+    if hasattr(inner, "raw"):
+        return inner.raw.closed
+    return inner.closed
+
+
+def _make_sync_transports():
+    return [RequestsTransport(), HTTPXTransport(http2=False), HTTPXTransport(http2=True)]
+
+
+def _make_async_transports():
+    return [AiohttpTransport(), HTTPXTransport(http2=False), HTTPXTransport(http2=True)]
+
+
+@pytest.mark.parametrize("transport_idx", range(3))
+def test_sync_send(server, transport_idx):
+    transport = _make_sync_transports()[transport_idx]
+    response = transport.send(
+        "POST", _get_url(server, "/json"), headers=None, data=b'{"a": 1}', stream=False, timeout=5
+    )
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "application/json"
+    assert json.loads(response.read()) == {"method": "POST", "body": '{"a": 1}'}
+    response.close()
+
+    response = transport.send(
+        "GET", _get_url(server, "/stream"), headers=None, data=None, stream=True, timeout=5
+    )
+    lines = [line for line in response.iter_lines() if line]
+    assert lines == [f"data: {i}".encode() for i in range(NUM_LINES)]
+    response.close()
+
+    # Closing a stream before it ends releases the response.
+    response = transport.send(
+        "GET", _get_url(server, "/stream"), headers=None, data=None, stream=True, timeout=5
+    )
+    assert next(iter(response.iter_lines())) == b"data: 0"
+    response.close()
+    assert _is_closed(response)
+
+    with pytest.raises(errors.ConnectionError):
+        transport.send("GET", _get_unused_url(), headers=None, data=None, stream=False, timeout=5)
+    transport.close()
+
+
+@pytest.mark.parametrize("transport_idx", range(3))
+def test_async_send(server, transport_idx):
+    async def _run():
+        transport = _make_async_transports()[transport_idx]
+        response = await transport.asend(
+            "POST", _get_url(server, "/json"), headers=None, data=b'{"a": 1}', stream=False, timeout=5
+        )
+        assert response.status_code == 200
+        assert json.loads(await response.read()) == {"method": "POST", "body": '{"a": 1}'}
+        await response.aclose()
+
+        response = await transport.asend(
+            "GET", _get_url(server, "/stream"), headers=None, data=None, stream=True, timeout=5
+        )
+        lines = [line.strip() async for line in response.iter_lines() if line.strip()]
+        assert lines == [f"data: {i}".encode() for i in range(NUM_LINES)]
+        await response.aclose()
+
+        response = await transport.asend(
+            "GET", _get_url(server, "/stream"), headers=None, data=None, stream=True, timeout=5
+        )
+        assert (await response.iter_lines().__anext__()).strip() == b"data: 0"
+        await response.aclose()
+        assert _is_closed(response)
+
+        with pytest.raises(errors.ConnectionError):
+            await transport.asend("GET", _get_unused_url(), headers=None, data=None, stream=False, timeout=5)
+        await transport.aclose()
+
+    asyncio.run(_run())
+
+
+def test_proxies(server):
+    # The local server acts as the proxy, so it receives absolute URLs.
+    proxy = _get_url(server, "")
+    target = "http://upstream.invalid/json"
+
+    response = RequestsTransport(proxy=proxy).send(
+        "GET", target, headers=None, data=None, stream=False, timeout=5
+    )
+    response.close()
+    assert server.paths[-1] == target
+
+    async def _run():
+        response = await AiohttpTransport(proxy=proxy).asend(
+            "GET", target, headers=None, data=None, stream=False, timeout=5
+        )
+        await response.aclose()
+
+    asyncio.run(_run())
+    assert server.paths[-1] == target
+
+
+def test_httpx_clients_are_created_per_loop(server):
+    transport = HTTPXTransport(http2=False)
+
+    async def _send_twice():
+        clients = []
+        for _ in range(2):
+            response = await transport.asend(
+                "GET", _get_url(server, "/json"), headers=None, data=None, stream=False, timeout=5
+            )
+            await response.read()
+            await response.aclose()
+            clients.append(transport._aclients[asyncio.get_running_loop()])
+        assert clients[0] is clients[1]
+        return clients[0]
+
+    async def _send_and_close():
+        client = await _send_twice()
+        await transport.aclose()
+        assert asyncio.get_running_loop() not in transport._aclients
+        return client
+
+    first = asyncio.run(_send_twice())
+    second = asyncio.run(_send_and_close())
+    assert first is not second
+    assert second.is_closed
+
+
+def test_httpx_read_timeout_of_http2_streams():
+    import httpx
+
+    def _handler(request):
+        return httpx.Response(
+            200,
+            headers={"Content-Type": "text/event-stream"},
+            content=b"data: 0\n\n",
+            extensions={"http_version": b"HTTP/2"},
+        )
+
+    transport = HTTPXTransport(http2=True)
+    transport._client_kwargs["transport"] = httpx.MockTransport(_handler)
+    response = transport.send(
+        "POST", "http://example.invalid/chat", headers=None, data=b"{}", stream=True, timeout=5
+    )
+    response.set_read_timeout(0.5)
+    assert response._response.request.extensions["timeout"]["read"] == 0.5
+    assert list(response.iter_lines()) == [b"data: 0", b""]
+    response.close()
+    transport.close()
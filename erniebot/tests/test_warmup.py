@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import concurrent.futures
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+import erniebot
+import erniebot.errors as errors
+from erniebot.backends.aistudio import AIStudioBackend
+from erniebot.transports import Transport
+
+# Offline tests of the warm-up. The fake transport and the patched backend
+# take a known time in each phase.
+
+PHASE_SECS = 0.05
+
+
+class PreconnectingTransport(Transport):
+    def __init__(self, gate=None, error=None):
+        self.gate = gate
+        self.error = error
+        self.num_connections = 0
+
+    def preconnect(self, url, num_connections, timeout):
+        if self.gate is not None:
+            self.gate.wait()
+        time.sleep(PHASE_SECS)
+        if self.error is not None:
+            raise self.error
+        self.num_connections += num_connections
+        return num_connections
+
+    async def apreconnect(self, url, num_connections, timeout):
+        await asyncio.sleep(PHASE_SECS)
+        if self.error is not None:
+            raise self.error
+        self.num_connections += num_connections
+        return num_connections
+
+
+def _prefetch_auth_tokens(self):
+    time.sleep(PHASE_SECS)
+    return 1
+
+
+def _make_config(transport):
+    return dict(api_type="aistudio", access_token="token", transport=transport)
+
+
+def _check_durations(report):
+    assert set(report.durations) == {"imports", "auth", "connections"}
+    assert report.durations["auth"] >= 0.8 * PHASE_SECS
+    assert report.durations["connections"] >= 0.8 * PHASE_SECS
+    assert report.total_duration == pytest.approx(sum(report.durations.values()))
+
+
+@mock.patch.object(AIStudioBackend, "prefetch_auth_tokens", _prefetch_auth_tokens)
+def test_report_times_each_phase():
+    transport = PreconnectingTransport()
+    report = erniebot.warmup(num_connections=2, modules=["json"], _config_=_make_config(transport))
+    assert report.ok
+    assert (report.num_modules, report.num_tokens, report.num_connections) == (1, 1, 2)
+    assert transport.num_connections == 2
+    _check_durations(report)
+
+
+@mock.patch.object(AIStudioBackend, "prefetch_auth_tokens", _prefetch_auth_tokens)
+def test_async_report_times_each_phase():
+    transport = PreconnectingTransport()
+    report = asyncio.run(
+        erniebot.awarmup(num_connections=2, modules=["json"], _config_=_make_config(transport))
+    )
+    assert report.ok
+    assert (report.num_modules, report.num_tokens, report.num_connections) == (1, 1, 2)
+    _check_durations(report)
+
+
+def test_failing_phases_are_reported():
+    transport = PreconnectingTransport(error=errors.ConnectionError("refused"))
+    report = erniebot.warmup(modules=["json", "no_such_module"], _config_=_make_config(transport))
+    assert not report.ok
+    assert report.num_modules == 1
+    assert report.num_connections == 0
+    assert report.errors == ["Phase 'connections' failed for AISTUDIO: refused"]
+
+
+@mock.patch.object(AIStudioBackend, "prefetch_auth_tokens", _prefetch_auth_tokens)
+def test_background_warmup_can_be_waited_on():
+    gate = threading.Event()
+    transport = PreconnectingTransport(gate=gate)
+    future = erniebot.warmup(modules=[], background=True, _config_=_make_config(transport))
+
+    # A readiness probe fails until the warm-up is done.
+    with pytest.raises(concurrent.futures.TimeoutError):
+        future.result(timeout=2 * PHASE_SECS)
+    assert not future.done()
+
+    gate.set()
+    report = future.result(timeout=5)
+    assert report.ok
+    assert report.num_connections == 1
+    _check_durations(report)
+
+
+def test_background_warmup_propagates_errors():
+    future = erniebot.warmup(background=True, _config_=dict(api_type=None))
+    with pytest.raises(RuntimeError, match="API type is not configured"):
+        future.result(timeout=5)